@@ -0,0 +1,471 @@
+"""Misclassification analytics: labelled position estimates joined against the venue map.
+
+Input is a CSV of labelled estimates, one row per scan, in time order:
+
+    t,device,true_room,predicted_room[,confidence][,x,y][,true_zone,predicted_zone]
+
+`true_pin` can replace `true_room` (and `x`,`y`) for walk tests that stand on pins. The
+file is read in chunks and folded into a `MisclassificationReport`, so a full event never
+has to fit in memory:
+
+- confusion counts per (true, predicted) room pair, and per zone pair when zones are given
+- an error heatmap over the venue grid at the true positions, with mean confidence
+- stickiness: runs where one device stays on the same wrong room, with their durations
+
+Results are written through the generator as Room/Zone `extra_properties`, Metadata
+properties, an `ErrorCell` GeoJSON layer and an SVG heatmap layer:
+
+    python3 analytics.py --observations labelled.csv --out-svg analytics.svg --out-geojson analytics.geojson
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import math
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from extent import VenueExtent
+from mapgen import default_anchors, venue_collections, v6
+from obsstore import parse_time
+from spatial import LevelIndex
+
+CHUNK_ROWS = 100_000
+MAX_GAP_S = 30.0
+MIN_STICKY_S = 10.0
+MAX_CONFUSIONS = 50
+
+
+def _locate_many(index: LevelIndex, xs: np.ndarray, ys: np.ndarray, levels: np.ndarray, codes: Dict[str, int]) -> np.ndarray:
+    """Code of the item containing each point on its level (-1 outside), locating each distinct point once."""
+    out = np.full(len(xs), -1, dtype=np.int64)
+    valid = ~(np.isnan(xs) | np.isnan(ys))
+    for level in sorted(set(levels[valid])):
+        rows = valid & (levels == level)
+        xy, inverse = np.unique(np.stack([xs[rows], ys[rows]], axis=1), axis=0, return_inverse=True)
+        located = np.array([codes.get(index.locate(float(x), float(y), level or None) or "", -1) for x, y in xy], dtype=np.int64)
+        out[rows] = located[inverse.ravel()]
+    return out
+
+
+def heat_color(level: float) -> str:
+    """Green (0) -> yellow -> red (1) SVG fill, e.g. for error rates; public so other layers share the ramp."""
+    level = min(1.0, max(0.0, level))
+    r = int(round(255 * min(1.0, 2 * level)))
+    g = int(round(255 * min(1.0, 2 * (1 - level))))
+    return f"#{r:02X}{g:02X}00"
+
+
+class MisclassificationReport:
+    def __init__(
+        self,
+        rooms_: List[Dict[str, Any]],
+        zones_: List[Dict[str, Any]],
+        pins_: List[Dict[str, Any]],
+        cell_m: float = 1.0,
+        max_gap_s: float = MAX_GAP_S,
+        min_sticky_s: float = MIN_STICKY_S,
+        extent: Optional[VenueExtent] = None,
+        levels_: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        self.room_ids = [r["id"] for r in rooms_ if r.get("id")]
+        self.zone_ids = [z["id"] for z in zones_ if z.get("id")]
+        self._room_code = {r: i for i, r in enumerate(self.room_ids)}
+        self._zone_code = {z: i for i, z in enumerate(self.zone_ids)}
+        default_level = levels_[0]["id"] if levels_ else None
+        self._room_index = LevelIndex([r for r in rooms_ if r.get("id")], default_level)
+        self._zone_index = LevelIndex([z for z in zones_ if z.get("id")], default_level)
+        self.pins = {p["id"]: p for p in pins_ if p.get("id")}
+        self.max_gap_s = max_gap_s
+        self.min_sticky_s = min_sticky_s
+
+        frame = (extent or VenueExtent({"rooms": rooms_, "zones": zones_})).frame(("rooms", "zones"))
+        self.cell_m = cell_m
+        self.x0, self.y0 = frame.min_x, frame.min_y
+        self.nx = max(1, math.ceil(frame.width / cell_m))
+        self.ny = max(1, math.ceil(frame.height / cell_m))
+
+        # Index len(ids) is "unknown / outside every room".
+        n = len(self.room_ids) + 1
+        self.samples = 0
+        self.room_confusion = np.zeros((n, n), dtype=np.int64)
+        self.zone_confusion = np.zeros((len(self.zone_ids) + 1,) * 2, dtype=np.int64)
+        self.room_confidence = np.zeros(n)
+        self.room_confidence_n = np.zeros(n, dtype=np.int64)
+        self.sticky_runs = np.zeros((n, n), dtype=np.int64)
+        self.sticky_seconds = np.zeros((n, n))
+        self.sticky_max = np.zeros((n, n))
+        cells = self.nx * self.ny
+        self.cell_samples = np.zeros(cells, dtype=np.int64)
+        self.cell_errors = np.zeros(cells, dtype=np.int64)
+        self.cell_confidence = np.zeros(cells)
+        self.cell_confidence_n = np.zeros(cells, dtype=np.int64)
+
+        self._device_code: Dict[str, int] = {}
+        # device -> (true, predicted, t_start, t_end) of its still-open run
+        self._open_runs: Dict[int, Tuple[int, int, float, float]] = {}
+
+    # Folding
+
+    def _codes(self, values: Sequence[Optional[str]], table: Dict[str, int]) -> np.ndarray:
+        unknown = len(table)
+        return np.fromiter((table.get(v, unknown) if v else unknown for v in values), dtype=np.int64, count=len(values))
+
+    def update(
+        self,
+        t: Sequence[float],
+        devices: Sequence[str],
+        true_rooms: Sequence[Optional[str]],
+        predicted_rooms: Sequence[Optional[str]],
+        confidence: Optional[Sequence[float]] = None,
+        xs: Optional[Sequence[float]] = None,
+        ys: Optional[Sequence[float]] = None,
+        true_zones: Optional[Sequence[Optional[str]]] = None,
+        predicted_zones: Optional[Sequence[Optional[str]]] = None,
+        levels: Optional[Sequence[Optional[str]]] = None,
+    ) -> None:
+        """Fold one chunk of rows (times in seconds) into the report.
+
+        Rows without a true room or zone are located from x/y on their `levels` entry.
+        """
+        n = len(t)
+        if n == 0:
+            return
+        unknown_room = len(self.room_ids)
+        tt = np.asarray(t, dtype=np.float64)
+        xs_ = np.full(n, np.nan) if xs is None else np.asarray(xs, dtype=np.float64)
+        ys_ = np.full(n, np.nan) if ys is None else np.asarray(ys, dtype=np.float64)
+        levels_ = np.array([lv or "" for lv in levels], dtype=object) if levels is not None else np.full(n, "", dtype=object)
+        true = self._codes(true_rooms, self._room_code)
+        missing = true == unknown_room
+        if missing.any():
+            located = _locate_many(self._room_index, xs_[missing], ys_[missing], levels_[missing], self._room_code)
+            true[missing] = np.where(located >= 0, located, unknown_room)
+        pred = self._codes(predicted_rooms, self._room_code)
+        conf = np.full(n, np.nan) if confidence is None else np.asarray(confidence, dtype=np.float64)
+
+        self.samples += n
+        size = unknown_room + 1
+        self.room_confusion += np.bincount(true * size + pred, minlength=size * size).reshape(size, size)
+        has_conf = ~np.isnan(conf)
+        self.room_confidence += np.bincount(true[has_conf], weights=conf[has_conf], minlength=size)
+        self.room_confidence_n += np.bincount(true[has_conf], minlength=size)
+
+        if predicted_zones is not None:
+            unknown_zone = len(self.zone_ids)
+            true_zone = self._codes(true_zones, self._zone_code) if true_zones is not None else np.full(n, unknown_zone)
+            missing = true_zone == unknown_zone
+            if missing.any():
+                located = _locate_many(self._zone_index, xs_[missing], ys_[missing], levels_[missing], self._zone_code)
+                true_zone[missing] = np.where(located >= 0, located, unknown_zone)
+            pred_zone = self._codes(predicted_zones, self._zone_code)
+            zsize = unknown_zone + 1
+            self.zone_confusion += np.bincount(true_zone * zsize + pred_zone, minlength=zsize * zsize).reshape(zsize, zsize)
+
+        ix = np.floor((xs_ - self.x0) / self.cell_m)
+        iy = np.floor((ys_ - self.y0) / self.cell_m)
+        on_grid = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)
+        cell = (iy[on_grid] * self.nx + ix[on_grid]).astype(np.int64)
+        cells = self.nx * self.ny
+        self.cell_samples += np.bincount(cell, minlength=cells)
+        self.cell_errors += np.bincount(cell, weights=(true != pred)[on_grid], minlength=cells).astype(np.int64)
+        cell_conf = has_conf[on_grid]
+        self.cell_confidence += np.bincount(cell[cell_conf], weights=conf[on_grid][cell_conf], minlength=cells)
+        self.cell_confidence_n += np.bincount(cell[cell_conf], minlength=cells)
+
+        for device in set(devices) - self._device_code.keys():
+            self._device_code[device] = len(self._device_code)
+        dev = np.fromiter((self._device_code[d] for d in devices), dtype=np.int64, count=n)
+        self._fold_runs(dev, tt, true, pred)
+
+    def _fold_runs(self, dev: np.ndarray, t: np.ndarray, true: np.ndarray, pred: np.ndarray) -> None:
+        order = np.lexsort((t, dev))
+        dev, t, true, pred = dev[order], t[order], true[order], pred[order]
+        brk = np.ones(len(t), dtype=bool)
+        brk[1:] = (dev[1:] != dev[:-1]) | (true[1:] != true[:-1]) | (pred[1:] != pred[:-1]) | (t[1:] - t[:-1] > self.max_gap_s)
+        starts = np.flatnonzero(brk)
+        ends = np.append(starts[1:], len(t)) - 1
+        r_dev, r_true, r_pred = dev[starts], true[starts], pred[starts]
+        r_t0, r_t1 = t[starts].copy(), t[ends]
+
+        first = np.ones(len(starts), dtype=bool)
+        first[1:] = r_dev[1:] != r_dev[:-1]
+        last = np.ones(len(starts), dtype=bool)
+        last[:-1] = r_dev[:-1] != r_dev[1:]
+
+        # Runs stay open across chunks: a device's first run may continue its open run,
+        # and its last run stays open until the next chunk (or `finish`) shows how it ends.
+        closed: List[Tuple[int, int, float, float]] = []
+        for i in np.flatnonzero(first):
+            open_run = self._open_runs.pop(int(r_dev[i]), None)
+            if open_run is None:
+                continue
+            o_true, o_pred, o_t0, o_t1 = open_run
+            if o_true == r_true[i] and o_pred == r_pred[i] and r_t0[i] - o_t1 <= self.max_gap_s:
+                r_t0[i] = o_t0
+            else:
+                closed.append(open_run)
+        for i in np.flatnonzero(last):
+            self._open_runs[int(r_dev[i])] = (int(r_true[i]), int(r_pred[i]), float(r_t0[i]), float(r_t1[i]))
+
+        done = ~last
+        if closed:
+            c_true, c_pred, c_t0, c_t1 = (np.array(col) for col in zip(*closed))
+        else:
+            c_true = c_pred = np.empty(0, dtype=np.int64)
+            c_t0 = c_t1 = np.empty(0)
+        self._tally_runs(
+            np.concatenate([r_true[done], c_true]).astype(np.int64),
+            np.concatenate([r_pred[done], c_pred]).astype(np.int64),
+            np.concatenate([r_t1[done] - r_t0[done], c_t1 - c_t0]),
+        )
+
+    def _tally_runs(self, true: np.ndarray, pred: np.ndarray, duration: np.ndarray) -> None:
+        sticky = (true != pred) & (duration >= self.min_sticky_s)
+        if not sticky.any():
+            return
+        size = len(self.room_ids) + 1
+        pair = true[sticky] * size + pred[sticky]
+        self.sticky_runs += np.bincount(pair, minlength=size * size).reshape(size, size)
+        self.sticky_seconds += np.bincount(pair, weights=duration[sticky], minlength=size * size).reshape(size, size)
+        np.maximum.at(self.sticky_max.reshape(-1), pair, duration[sticky])
+
+    def finish(self) -> None:
+        """Close every open run; call once after the last chunk."""
+        runs = list(self._open_runs.values())
+        self._open_runs.clear()
+        if runs:
+            true, pred, t0, t1 = (np.array(col) for col in zip(*runs))
+            self._tally_runs(true.astype(np.int64), pred.astype(np.int64), t1 - t0)
+
+    # Results
+
+    def _room_name(self, code: int) -> str:
+        return self.room_ids[code] if code < len(self.room_ids) else ""
+
+    def room_properties(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for code, room_id in enumerate(self.room_ids):
+            row = self.room_confusion[code]
+            samples = int(row.sum())
+            if samples == 0:
+                continue
+            off = row.copy()
+            off[code] = 0
+            conf_n = self.room_confidence_n[code]
+            out[room_id] = {
+                "analytics_samples": samples,
+                "analytics_accuracy": round(float(row[code] / samples), 4),
+                "analytics_confused_with": self._room_name(int(off.argmax())) if off.any() else None,
+                "analytics_mean_confidence": round(float(self.room_confidence[code] / conf_n), 4) if conf_n else None,
+                "analytics_sticky_runs": int(self.sticky_runs[code].sum()),
+                "analytics_sticky_s": round(float(self.sticky_seconds[code].sum()), 1),
+                "analytics_max_sticky_s": round(float(self.sticky_max[code].max()), 1),
+            }
+        return out
+
+    def zone_properties(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for code, zone_id in enumerate(self.zone_ids):
+            row = self.zone_confusion[code]
+            samples = int(row.sum())
+            if samples:
+                out[zone_id] = {"analytics_samples": samples, "analytics_accuracy": round(float(row[code] / samples), 4)}
+        return out
+
+    def confusions(self, limit: int = MAX_CONFUSIONS) -> List[Dict[str, Any]]:
+        """Most frequent off-diagonal (true, predicted) room pairs."""
+        counts = self.room_confusion.copy()
+        np.fill_diagonal(counts, 0)
+        flat = np.argsort(counts, axis=None)[::-1][:limit]
+        out = []
+        for true, pred in zip(*np.unravel_index(flat, counts.shape)):
+            if counts[true, pred] == 0:
+                break
+            out.append(
+                {
+                    "true": self._room_name(int(true)),
+                    "predicted": self._room_name(int(pred)),
+                    "count": int(counts[true, pred]),
+                    "sticky_runs": int(self.sticky_runs[true, pred]),
+                    "sticky_s": round(float(self.sticky_seconds[true, pred]), 1),
+                    "max_sticky_s": round(float(self.sticky_max[true, pred]), 1),
+                }
+            )
+        return out
+
+    def metadata_properties(self) -> Dict[str, Any]:
+        correct = int(np.trace(self.room_confusion))
+        return {
+            "analytics_samples": self.samples,
+            "analytics_accuracy": round(correct / self.samples, 4) if self.samples else None,
+            "analytics_confusions": self.confusions(),
+        }
+
+    def extra_properties(self) -> Dict[str, Dict[str, Any]]:
+        return {**self.room_properties(), **self.zone_properties()}
+
+    def error_cells(self, min_samples: int = 1) -> List[Dict[str, Any]]:
+        """Heatmap cells with at least `min_samples` samples, as meter-space rectangles."""
+        out = []
+        for cell in np.flatnonzero(self.cell_samples >= max(1, min_samples)):
+            iy, ix = divmod(int(cell), self.nx)
+            samples = int(self.cell_samples[cell])
+            conf_n = self.cell_confidence_n[cell]
+            out.append(
+                {
+                    "x": self.x0 + ix * self.cell_m,
+                    "y": self.y0 + iy * self.cell_m,
+                    "w": self.cell_m,
+                    "h": self.cell_m,
+                    "properties": {
+                        "samples": samples,
+                        "errors": int(self.cell_errors[cell]),
+                        "error_rate": round(float(self.cell_errors[cell] / samples), 4),
+                        "mean_confidence": round(float(self.cell_confidence[cell] / conf_n), 4) if conf_n else None,
+                    },
+                }
+            )
+        return out
+
+    def svg_layer(self, min_samples: int = 1) -> Callable[[float], List[str]]:
+        """An `extra_layers` renderer for `generate_svg`: heatmap cells colored by error rate."""
+        cells = self.error_cells(min_samples)
+
+        def render(scale: float) -> List[str]:
+            out = []
+            for c in cells:
+                rate = c["properties"]["error_rate"]
+                out.append(
+                    f'<rect x="{c["x"] * scale}" y="{c["y"] * scale}" width="{c["w"] * scale}" height="{c["h"] * scale}" '
+                    f'fill="{heat_color(rate)}" fill-opacity="0.55" stroke="none"><title>{c["properties"]["errors"]}/'
+                    f'{c["properties"]["samples"]} wrong</title></rect>'
+                )
+            return out
+
+        return render
+
+
+def read_labelled_csv(filename: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[List[Dict[str, str]]]:
+    with open(filename, newline="") as f:
+        reader = csv.DictReader(f)
+        while True:
+            rows = list(itertools.islice(reader, chunk_rows))
+            if not rows:
+                return
+            yield rows
+
+
+def update_from_rows(report: MisclassificationReport, rows: List[Dict[str, str]]) -> None:
+    def column(name: str) -> Optional[List[Optional[str]]]:
+        return [row.get(name) or None for row in rows] if name in rows[0] else None
+
+    def numbers(name: str) -> Optional[List[float]]:
+        return [float(row[name]) if row.get(name) not in (None, "") else math.nan for row in rows] if name in rows[0] else None
+
+    xs, ys = numbers("x"), numbers("y")
+    levels = column("level")
+    true_rooms = column("true_room")
+    true_pins = column("true_pin")
+    if true_pins is not None:
+        # Walk tests on pins: the pin gives the true position; its room comes from the map.
+        xs = xs or [math.nan] * len(rows)
+        ys = ys or [math.nan] * len(rows)
+        true_rooms = true_rooms or [None] * len(rows)
+        levels = levels or [None] * len(rows)
+        for i, pin_id in enumerate(true_pins):
+            pin = report.pins.get(pin_id or "")
+            if pin is not None and math.isnan(xs[i]):
+                xs[i], ys[i] = float(pin["x"]), float(pin["y"])
+                levels[i] = levels[i] or pin.get("level")
+    report.update(
+        t=[parse_time(row["t"]) / 1000.0 for row in rows],
+        devices=[row.get("device", "") for row in rows],
+        true_rooms=true_rooms or [None] * len(rows),
+        predicted_rooms=column("predicted_room") or [None] * len(rows),
+        confidence=numbers("confidence"),
+        xs=xs,
+        ys=ys,
+        true_zones=column("true_zone"),
+        predicted_zones=column("predicted_zone"),
+        levels=levels,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--observations", dest="observations", required=True)
+    parser.add_argument("--chunk", dest="chunk_rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--cell", dest="cell_m", type=float, default=1.0)
+    parser.add_argument("--min-samples", dest="min_samples", type=int, default=3)
+    parser.add_argument("--max-gap", dest="max_gap_s", type=float, default=MAX_GAP_S)
+    parser.add_argument("--min-sticky", dest="min_sticky_s", type=float, default=MIN_STICKY_S)
+    parser.add_argument("--out-svg", dest="out_svg", default="analytics.svg")
+    parser.add_argument("--out-geojson", dest="out_geojson", default="analytics.geojson")
+    parser.add_argument("--out-json", dest="out_json", default=None)
+    args = parser.parse_args()
+
+    venue = venue_collections()
+    venue["anchors"] = default_anchors()
+    extent = VenueExtent(venue)
+    report = MisclassificationReport(
+        venue["rooms"],
+        venue["zones"],
+        venue["pins"],
+        cell_m=args.cell_m,
+        max_gap_s=args.max_gap_s,
+        min_sticky_s=args.min_sticky_s,
+        extent=extent,
+        levels_=venue["levels"],
+    )
+    for rows in read_labelled_csv(args.observations, args.chunk_rows):
+        update_from_rows(report, rows)
+    report.finish()
+
+    v6.generate_svg(
+        rooms_=venue["rooms"],
+        zones_=venue["zones"],
+        doors_=venue["doors"],
+        polygons_=venue["polygons"],
+        pins_=venue["pins"],
+        anchors_=venue["anchors"],
+        filename=args.out_svg,
+        include_structure=True,
+        include_measurements=False,
+        include_labels=True,
+        include_markers=True,
+        stairs_=venue["stairs"],
+        extent=extent,
+        extra_layers={"analytics": report.svg_layer(args.min_samples)},
+    )
+    v6.generate_geojson(
+        rooms_=venue["rooms"],
+        zones_=venue["zones"],
+        polygons_=venue["polygons"],
+        pins_=venue["pins"],
+        anchors_=venue["anchors"],
+        origin=v6.GEO_ORIGIN,
+        filename=args.out_geojson,
+        include_rooms=True,
+        include_zones=True,
+        include_polygons=True,
+        include_pins=True,
+        include_anchors=True,
+        include_metadata=True,
+        extra_properties=report.extra_properties(),
+        metadata_properties=report.metadata_properties(),
+        levels_=venue["levels"],
+        stairs_=venue["stairs"],
+        extent=extent,
+        extra_layers={"ErrorCell": report.error_cells(args.min_samples)},
+    )
+    if args.out_json:
+        with open(args.out_json, "w") as f:
+            json.dump({**report.metadata_properties(), "rooms": report.room_properties(), "zones": report.zone_properties()}, f, indent=2)
+        print(f"Generated analytics report: {args.out_json}")
+
+
+if __name__ == "__main__":
+    main()
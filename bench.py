@@ -0,0 +1,241 @@
+"""Benchmarks for the map generator's hot paths on synthetic venues.
+
+Each case runs against venues built by `synthetic.build_venue` at several room counts.
+Wall time (min/median over repeats) and tracemalloc peak memory are recorded, and the
+results are written as JSON tagged with the current git commit so runs can be compared.
+
+    python3 bench.py                                  # 10, 1k and 100k rooms
+    python3 bench.py --scales 10,1000 --repeat 5
+    python3 bench.py --compare bench-results/<previous>.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from labels import map_labels
+from mapgen import v6
+from synthetic import build_venue, feature_count
+from venue_model import VenueModel
+
+Venue = Dict[str, List[Dict[str, Any]]]
+
+CASES: Dict[str, Callable[[Venue], Any]] = {}
+# Cases that do untimed setup first and return the seconds of the part being measured.
+SELF_TIMED: Set[str] = set()
+
+
+def case(name: str, self_timed: bool = False) -> Callable[[Callable[[Venue], Any]], Callable[[Venue], Any]]:
+    def register(fn: Callable[[Venue], Any]) -> Callable[[Venue], Any]:
+        CASES[name] = fn
+        if self_timed:
+            SELF_TIMED.add(name)
+        return fn
+
+    return register
+
+
+@case("compute_bounds_m")
+def _bench_bounds(venue: Venue) -> Any:
+    return v6.compute_bounds_m(venue["rooms"], venue["zones"], venue["doors"], venue["polygons"], venue["pins"], venue["anchors"])
+
+
+@case("recommend_anchors")
+def _bench_recommend(venue: Venue) -> Any:
+    return v6.recommend_anchors(venue["rooms"])
+
+
+@case("generate_svg")
+def _bench_svg(venue: Venue) -> Any:
+    with contextlib.redirect_stdout(io.StringIO()):
+        v6.generate_svg(
+            rooms_=venue["rooms"],
+            zones_=venue["zones"],
+            doors_=venue["doors"],
+            polygons_=venue["polygons"],
+            pins_=venue["pins"],
+            anchors_=venue["anchors"],
+            filename=os.devnull,
+            include_structure=True,
+            include_measurements=True,
+            include_labels=True,
+            include_markers=True,
+        )
+
+
+@case("generate_geojson")
+def _bench_geojson(venue: Venue) -> Any:
+    with contextlib.redirect_stdout(io.StringIO()):
+        v6.generate_geojson(
+            rooms_=venue["rooms"],
+            zones_=venue["zones"],
+            polygons_=venue["polygons"],
+            pins_=venue["pins"],
+            anchors_=venue["anchors"],
+            origin=v6.GEO_ORIGIN,
+            filename=os.devnull,
+            include_rooms=True,
+            include_zones=True,
+            include_polygons=True,
+            include_pins=True,
+            include_anchors=True,
+            include_metadata=True,
+        )
+
+
+@case("meters_to_gps")
+def _bench_to_gps(venue: Venue) -> Any:
+    origin = v6.GEO_ORIGIN
+    return [v6.meters_to_gps(float(p["x"]), float(p["y"]), origin) for p in venue["rooms"] + venue["pins"] + venue["anchors"]]
+
+
+@case("gps_to_meters", self_timed=True)
+def _bench_to_meters(venue: Venue) -> Any:
+    origin = v6.GEO_ORIGIN
+    fixes = [v6.meters_to_gps(float(p["x"]), float(p["y"]), origin) for p in venue["rooms"] + venue["pins"] + venue["anchors"]]
+    start = time.perf_counter()
+    for fix in fixes:
+        v6.gps_to_meters(fix["lat"], fix["lon"], origin)
+    return time.perf_counter() - start
+
+
+@case("venue_model.from_dicts")
+def _bench_model(venue: Venue) -> Any:
+    return VenueModel.from_dicts(venue)
+
+
+@case("venue_model.write_geojson", self_timed=True)
+def _bench_model_geojson(venue: Venue) -> Any:
+    model = VenueModel.from_dicts(venue)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.write_geojson(os.devnull, v6.GEO_ORIGIN)
+    return time.perf_counter() - start
+
+
+@case("venue_model.bounds", self_timed=True)
+def _bench_model_bounds(venue: Venue) -> Any:
+    model = VenueModel.from_dicts(venue)
+    start = time.perf_counter()
+    model.bounds()
+    return time.perf_counter() - start
+
+
+@case("map_labels")
+def _bench_labels(venue: Venue) -> Any:
+    return map_labels(venue, lambda x, y: (x * 20, y * 20))
+
+
+def _time_case(fn: Callable[[Venue], Any], venue: Venue, repeat: int, self_timed: bool = False) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(venue)
+        elapsed = time.perf_counter() - start
+        timings.append(float(result) if self_timed else elapsed)
+    return timings
+
+
+def _peak_memory(fn: Callable[[Venue], Any], venue: Venue) -> int:
+    tracemalloc.start()
+    try:
+        fn(venue)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def git_revision() -> Dict[str, Any]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": None}
+    return {"commit": sha, "dirty": dirty}
+
+
+def run(scales: List[int], cases: List[str], repeat: int, memory: bool) -> Dict[str, Any]:
+    results = []
+    for scale in scales:
+        venue = build_venue(scale)
+        features = feature_count(venue)
+        reps = repeat if scale < 100_000 else 1
+        for name in cases:
+            timings = _time_case(CASES[name], venue, reps, name in SELF_TIMED)
+            entry: Dict[str, Any] = {
+                "case": name,
+                "rooms": len(venue["rooms"]),
+                "features": features,
+                "repeat": reps,
+                "seconds_min": min(timings),
+                "seconds_median": statistics.median(timings),
+            }
+            if memory:
+                entry["peak_bytes"] = _peak_memory(CASES[name], venue)
+            results.append(entry)
+            print(f"{name:>22} rooms={entry['rooms']:<7} min={entry['seconds_min'] * 1e3:10.3f} ms" + (f"  peak={entry['peak_bytes'] / 1024:10.1f} KiB" if memory else ""))
+    return {
+        **git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any], threshold: float) -> List[str]:
+    before = {(r["case"], r["rooms"]): r for r in previous.get("results", [])}
+    regressions = []
+    for r in current["results"]:
+        old = before.get((r["case"], r["rooms"]))
+        if old is None or old["seconds_min"] <= 0:
+            continue
+        ratio = r["seconds_min"] / old["seconds_min"]
+        line = f"{r['case']:>22} rooms={r['rooms']:<7} {ratio:6.2f}x vs {previous.get('commit', '?')}"
+        print(line)
+        if ratio > threshold:
+            regressions.append(line)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", dest="scales", default="10,1000,100000")
+    parser.add_argument("--case", dest="cases", action="append", default=None, choices=sorted(CASES))
+    parser.add_argument("--repeat", dest="repeat", type=int, default=3)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", default=True)
+    parser.add_argument("--out-dir", dest="out_dir", default="bench-results")
+    parser.add_argument("--compare", dest="compare", default=None)
+    parser.add_argument("--threshold", dest="threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s]
+    report = run(scales, args.cases or list(CASES), args.repeat, args.memory)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    filename = os.path.join(args.out_dir, f"{report['timestamp'].replace(':', '')}-{report['commit']}.json")
+    with open(filename, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Generated benchmark results: {filename}")
+
+    previous: Optional[Dict[str, Any]] = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    if previous is not None and compare(report, previous, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
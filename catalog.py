@@ -0,0 +1,413 @@
+"""Multi-venue catalog: which generated map(s) contain or are near a GPS fix.
+
+Every venue is indexed by the lon/lat bounding box of its `generate_geojson` output
+(the Metadata feature's `bbox`). Index cells are the geohash cells of `precision`
+characters (6 by default, about 1.2 km x 0.6 km). A venue is registered in every cell
+its bbox touches. A lookup enumerates the cells under the fix (or under the fix's
+radius), binary-searches their keys and tests the few candidate bboxes exactly.
+
+The catalog is a single file: a small JSON header followed by 64-byte aligned arrays,
+opened with `numpy.memmap` (the `fingerprints.py` / `obsstore.py` layout). Opening a
+fleet of thousands of venues reads only the header.
+
+    python3 catalog.py build --out venues.vcat maps/*.geojson
+    python3 catalog.py locate --catalog venues.vcat --lat 47.66125 --lon -122.36550 --radius 250
+    python3 catalog.py serve --catalog venues.vcat --port 8000     # GET /locate?lat=..&lon=..&radius=.. and /venues/<id>
+    python3 catalog.py bench --venues 10000 --queries 100000
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import struct
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+
+from mapgen import v6
+
+MAGIC = b"VCAT1\x00\x00\x00"
+ALIGN = 64
+PRECISION = 6
+EARTH_RADIUS_M = 6378137.0
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("bbox", "<f8"),  # (venues, 4): min lon, min lat, max lon, max lat
+    ("origin", "<f8"),  # (venues, 6): lat, lon, then the geo matrix (a, b, c, d), NaN when absent
+    ("cell_keys", "<u8"),  # (cells,) sorted
+    ("cell_start", "<i4"),  # (cells + 1,) CSR offsets into cell_venues
+    ("cell_venues", "<i4"),
+    ("string_offsets", "<i8"),  # (2 * venues + 1,): venue id, then map path, per venue
+    ("strings", "u1"),
+)
+
+
+class Match(NamedTuple):
+    venue: str
+    path: str
+    distance_m: float
+    x_m: float
+    y_m: float
+
+    @property
+    def inside(self) -> bool:
+        return self.distance_m == 0.0
+
+
+def _aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _axis_bits(precision: int) -> Tuple[int, int]:
+    """Geohash splits 5 bits per character between lon and lat, lon first."""
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2
+
+
+def geohash(lat: float, lon: float, precision: int = PRECISION) -> str:
+    lon_bits, lat_bits = _axis_bits(precision)
+    lon_i = min(int((lon + 180.0) / 360.0 * (1 << lon_bits)), (1 << lon_bits) - 1)
+    lat_i = min(int((lat + 90.0) / 180.0 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    value = 0
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            value = (value << 1) | ((lon_i >> (lon_bits - 1 - bit // 2)) & 1)
+        else:
+            value = (value << 1) | ((lat_i >> (lat_bits - 1 - bit // 2)) & 1)
+    return "".join(GEOHASH_BASE32[(value >> (5 * (precision - 1 - i))) & 31] for i in range(precision))
+
+
+def _bbox_to_meters(lat: float, d_lon: float, d_lat: float) -> Tuple[float, float]:
+    return math.radians(d_lon) * EARTH_RADIUS_M * math.cos(math.radians(lat)), math.radians(d_lat) * EARTH_RADIUS_M
+
+
+def venue_entry(filename: str) -> Dict[str, Any]:
+    """Catalog entry (id, path, bbox, origin) from a `generate_geojson` output's Metadata feature."""
+    with open(filename) as f:
+        collection = json.load(f)
+    meta = next((ft["properties"] for ft in collection.get("features", []) if ft.get("properties", {}).get("type") == "Metadata"), None)
+    if meta is None:
+        raise ValueError(f"{filename} has no Metadata feature (generate it with include_metadata=True)")
+    origin = {"lat": meta["geo_origin_lat"], "lon": meta["geo_origin_lon"]}
+    if "geo_matrix" in meta:
+        origin["matrix"] = meta["geo_matrix"]
+    bbox = meta.get("bbox")
+    if bbox is None:
+        x0, y0 = 0.0, 0.0
+        x1, y1 = float(meta.get("width_m", 0.0)), float(meta.get("height_m", 0.0))
+        if "bbox_m" in meta:
+            x0, y0, x1, y1 = meta["bbox_m"]
+        corners = [v6.meters_to_gps(x, y, origin) for x in (x0, x1) for y in (y0, y1)]
+        bbox = [min(c["lon"] for c in corners), min(c["lat"] for c in corners), max(c["lon"] for c in corners), max(c["lat"] for c in corners)]
+    venue_id = meta.get("venue_id") or os.path.splitext(os.path.basename(filename))[0]
+    return {"id": venue_id, "path": filename, "bbox": [float(v) for v in bbox], "origin": origin}
+
+
+class VenueCatalog:
+    def __init__(self, header: Dict[str, Any], columns: Dict[str, np.ndarray], root: str = "") -> None:
+        self.header = header
+        self.count = header["count"]
+        self.precision = header["precision"]
+        self.root = root
+        self.lon_bits, self.lat_bits = _axis_bits(self.precision)
+        # Plain ndarray views of the mapped columns: same pages, no per-slice memmap overhead.
+        columns = {name: np.asarray(values) for name, values in columns.items()}
+        self._cell_lon = 360.0 / (1 << self.lon_bits)
+        self._cell_lat = 180.0 / (1 << self.lat_bits)
+        self.bbox = columns["bbox"].reshape(self.count, 4)
+        self.origin = columns["origin"].reshape(self.count, 6)
+        self.cell_keys = columns["cell_keys"]
+        self.cell_start = columns["cell_start"]
+        self.cell_venues = columns["cell_venues"]
+        self._string_offsets = columns["string_offsets"]
+        self._strings = columns["strings"]
+
+    # Building and opening
+
+    @staticmethod
+    def write(filename: str, entries: Sequence[Dict[str, Any]], precision: int = PRECISION) -> Dict[str, Any]:
+        """Index `entries` (see `venue_entry`) into a catalog file; returns its header."""
+        n = len(entries)
+        lon_bits, lat_bits = _axis_bits(precision)
+        bbox = np.array([e["bbox"] for e in entries], dtype=np.float64).reshape(n, 4)
+        for i in np.flatnonzero((bbox[:, 0] > bbox[:, 2]) | (bbox[:, 1] > bbox[:, 3])):
+            # A min lon past the max lon is a bbox across the antimeridian; the lon cell range cannot wrap.
+            raise ValueError(f"Venue {entries[i]['id']} has bbox {bbox[i].tolist()} with a min past its max (antimeridian bboxes are not supported)")
+        origin = np.full((n, 6), np.nan)
+        for i, e in enumerate(entries):
+            origin[i, :2] = e["origin"]["lat"], e["origin"]["lon"]
+            if "matrix" in e["origin"]:
+                origin[i, 2:] = np.ravel(e["origin"]["matrix"])
+
+        # Every (cell, venue) pair covered by each bbox, as packed (lon index, lat index) keys.
+        lon_i = np.floor((bbox[:, [0, 2]] + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64)
+        lat_i = np.floor((bbox[:, [1, 3]] + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64)
+        lon_i = np.clip(lon_i, 0, (1 << lon_bits) - 1)
+        lat_i = np.clip(lat_i, 0, (1 << lat_bits) - 1)
+        spans = (lon_i[:, 1] - lon_i[:, 0] + 1) * (lat_i[:, 1] - lat_i[:, 0] + 1)
+        venue_of = np.repeat(np.arange(n), spans)
+        local = np.arange(int(spans.sum())) - np.repeat(np.cumsum(spans) - spans, spans)
+        width = np.repeat(lon_i[:, 1] - lon_i[:, 0] + 1, spans)
+        keys = ((np.repeat(lon_i[:, 0], spans) + local % width) << lat_bits) | (np.repeat(lat_i[:, 0], spans) + local // width)
+        order = np.lexsort((venue_of, keys))
+        keys, venue_of = keys[order].astype(np.uint64), venue_of[order]
+        cell_keys, first = np.unique(keys, return_index=True)
+        cell_start = np.append(first, len(keys))
+
+        strings = bytearray()
+        string_offsets = [0]
+        for e in entries:
+            for value in (e["id"], e["path"]):
+                strings += value.encode("utf-8")
+                string_offsets.append(len(strings))
+
+        arrays = {
+            "bbox": bbox,
+            "origin": origin,
+            "cell_keys": cell_keys,
+            "cell_start": cell_start,
+            "cell_venues": venue_of,
+            "string_offsets": np.array(string_offsets),
+            "strings": np.frombuffer(bytes(strings), dtype=np.uint8),
+        }
+        lengths = {name: int(np.asarray(arrays[name]).size) for name, _ in COLUMNS}
+        offsets: Dict[str, int] = {name: 0 for name, _ in COLUMNS}
+        header = {"version": 1, "count": n, "precision": precision, "lengths": lengths, "offsets": offsets}
+        # Offsets depend on the header length, so size the header with placeholders first.
+        position = _aligned(len(MAGIC) + 8 + len(json.dumps(header)) + 16 * len(COLUMNS))
+        for name, dtype in COLUMNS:
+            offsets[name] = position
+            position = _aligned(position + lengths[name] * np.dtype(dtype).itemsize)
+        blob = json.dumps(header).encode("utf-8")
+
+        with open(filename, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(blob)))
+            f.write(blob)
+            for name, dtype in COLUMNS:
+                f.write(b"\x00" * (offsets[name] - f.tell()))
+                f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        return header
+
+    @classmethod
+    def open(cls, filename: str) -> "VenueCatalog":
+        with open(filename, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filename} is not a venue catalog")
+            (blob_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(blob_len).decode("utf-8"))
+        columns = {
+            name: np.memmap(filename, dtype=dtype, mode="r", offset=header["offsets"][name], shape=(header["lengths"][name],))
+            if header["lengths"][name]
+            else np.empty(0, dtype=dtype)
+            for name, dtype in COLUMNS
+        }
+        return cls(header, columns, root=os.path.dirname(os.path.abspath(filename)))
+
+    # Lookup
+
+    def _string(self, k: int) -> str:
+        return bytes(self._strings[self._string_offsets[k] : self._string_offsets[k + 1]]).decode("utf-8")
+
+    def venue_id(self, i: int) -> str:
+        return self._string(2 * i)
+
+    def map_path(self, i: int) -> str:
+        """The venue's compiled map; relative paths resolve against the catalog's directory."""
+        path = self._string(2 * i + 1)
+        return path if os.path.isabs(path) else os.path.join(self.root, path)
+
+    def origin_of(self, i: int) -> Dict[str, Any]:
+        row = self.origin[i]
+        origin: Dict[str, Any] = {"lat": float(row[0]), "lon": float(row[1])}
+        if not math.isnan(row[2]):
+            origin["matrix"] = [[float(row[2]), float(row[3])], [float(row[4]), float(row[5])]]
+        return origin
+
+    def candidates(self, lat: float, lon: float, radius_m: float = 0.0) -> List[int]:
+        """Venues registered in any cell within `radius_m` of the fix (a superset of the matches)."""
+        d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+        d_lon = d_lat / max(math.cos(math.radians(lat)), 1e-9)
+        i0 = max(int((lon - d_lon + 180.0) // self._cell_lon), 0)
+        i1 = min(int((lon + d_lon + 180.0) // self._cell_lon), (1 << self.lon_bits) - 1)
+        j0 = max(int((lat - d_lat + 90.0) // self._cell_lat), 0)
+        j1 = min(int((lat + d_lat + 90.0) // self._cell_lat), (1 << self.lat_bits) - 1)
+        keys = self.cell_keys
+        if i0 == i1 and j0 == j1:
+            key = (i0 << self.lat_bits) | j0
+            k = int(keys.searchsorted(np.uint64(key)))
+            if k == len(keys) or keys[k] != key:
+                return []
+            return self.cell_venues[self.cell_start[k] : self.cell_start[k + 1]].tolist()
+        wanted = np.array([(i << self.lat_bits) | j for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)], dtype=np.uint64)
+        ks = np.searchsorted(keys, wanted)
+        hit = ks < len(keys)
+        hit[hit] = keys[ks[hit]] == wanted[hit]
+        out: set = set()
+        for k in ks[hit]:
+            out.update(self.cell_venues[self.cell_start[k] : self.cell_start[k + 1]].tolist())
+        return sorted(out)
+
+    def locate(self, lat: float, lon: float, radius_m: float = 0.0, limit: Optional[int] = None) -> List[Match]:
+        """Venues whose bbox contains the fix or lies within `radius_m` of it, nearest first."""
+        found = []
+        for i in self.candidates(lat, lon, radius_m):
+            min_lon, min_lat, max_lon, max_lat = self.bbox[i].tolist()
+            dx, dy = _bbox_to_meters(lat, max(min_lon - lon, 0.0, lon - max_lon), max(min_lat - lat, 0.0, lat - max_lat))
+            distance = math.hypot(dx, dy)
+            if distance <= radius_m:
+                found.append((distance, i))
+        found.sort()
+        out = []
+        for distance, i in found[:limit]:
+            local = v6.gps_to_meters(lat, lon, self.origin_of(i))
+            out.append(Match(self.venue_id(i), self.map_path(i), round(distance, 3), round(local["x"], 3), round(local["y"], 3)))
+        return out
+
+
+def serve(catalog: VenueCatalog, host: str, port: int) -> None:
+    """`GET /locate?lat=&lon=[&radius=&limit=]` -> JSON matches; `GET /venues/<id>` -> that venue's GeoJSON."""
+    by_id = {catalog.venue_id(i): i for i in range(catalog.count)}
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: bytes, content_type: str) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            if url.path == "/locate":
+                query = parse_qs(url.query)
+                try:
+                    lat, lon = float(query["lat"][0]), float(query["lon"][0])
+                    radius = float(query.get("radius", ["0"])[0])
+                    limit = int(query["limit"][0]) if "limit" in query else None
+                except (KeyError, ValueError):
+                    self._send(400, b'{"error": "lat and lon are required numbers"}', "application/json")
+                    return
+                matches = catalog.locate(lat, lon, radius, limit)
+                body = [{**m._asdict(), "inside": m.inside, "url": f"/venues/{m.venue}"} for m in matches]
+                for entry in body:
+                    del entry["path"]
+                self._send(200, json.dumps(body).encode("utf-8"), "application/json")
+                return
+            venue = unquote(url.path[len("/venues/") :]) if url.path.startswith("/venues/") else None
+            if venue in by_id:
+                with open(catalog.map_path(by_id[venue]), "rb") as f:
+                    self._send(200, f.read(), "application/geo+json")
+            else:
+                self._send(404, b'{"error": "not found"}', "application/json")
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Serving {catalog.count} venues on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def synthetic_entries(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """`n` venue bboxes (30-300 m) scattered over a few metro areas, for benchmarks."""
+    rng = random.Random(seed)
+    metros = [(rng.uniform(-50, 60), rng.uniform(-120, 140)) for _ in range(max(1, n // 500))]
+    out = []
+    for i in range(n):
+        lat0, lon0 = rng.choice(metros)
+        lat, lon = lat0 + rng.gauss(0, 0.1), lon0 + rng.gauss(0, 0.1)
+        w, h = rng.uniform(30, 300), rng.uniform(30, 300)
+        d_lat = math.degrees(h / EARTH_RADIUS_M)
+        d_lon = math.degrees(w / (EARTH_RADIUS_M * math.cos(math.radians(lat))))
+        out.append({"id": f"venue_{i}", "path": f"venue_{i}.geojson", "bbox": [lon, lat - d_lat, lon + d_lon, lat], "origin": {"lat": lat, "lon": lon}})
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build")
+    build.add_argument("maps", nargs="+", help="generate_geojson outputs (with Metadata)")
+    build.add_argument("--out", dest="out", required=True)
+    build.add_argument("--precision", dest="precision", type=int, default=PRECISION, help="geohash characters per index cell")
+    build.add_argument("--absolute", dest="absolute", action="store_true", help="store absolute map paths")
+
+    locate = sub.add_parser("locate")
+    locate.add_argument("--catalog", dest="catalog", required=True)
+    locate.add_argument("--lat", dest="lat", type=float, required=True)
+    locate.add_argument("--lon", dest="lon", type=float, required=True)
+    locate.add_argument("--radius", dest="radius_m", type=float, default=0.0)
+    locate.add_argument("--limit", dest="limit", type=int, default=None)
+
+    srv = sub.add_parser("serve")
+    srv.add_argument("--catalog", dest="catalog", required=True)
+    srv.add_argument("--host", dest="host", default="127.0.0.1")
+    srv.add_argument("--port", dest="port", type=int, default=8000)
+
+    bench = sub.add_parser("bench")
+    bench.add_argument("--venues", dest="venues", type=int, default=10000)
+    bench.add_argument("--queries", dest="queries", type=int, default=100000)
+    bench.add_argument("--radius", dest="radius_m", type=float, default=0.0)
+    bench.add_argument("--precision", dest="precision", type=int, default=PRECISION)
+    bench.add_argument("--out", dest="out", default=None, help="keep the catalog here (default: a temporary file, removed afterwards)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        root = os.path.dirname(os.path.abspath(args.out))
+        entries = []
+        for filename in args.maps:
+            entry = venue_entry(filename)
+            entry["path"] = os.path.abspath(filename) if args.absolute else os.path.relpath(os.path.abspath(filename), root)
+            entries.append(entry)
+        header = VenueCatalog.write(args.out, entries, args.precision)
+        print(f"Generated catalog: {args.out} ({header['count']} venues, {header['lengths']['cell_keys']} cells)")
+    elif args.command == "locate":
+        catalog = VenueCatalog.open(args.catalog)
+        matches = catalog.locate(args.lat, args.lon, args.radius_m, args.limit)
+        print(f"{len(matches)} venue(s) at {args.lat}, {args.lon} (geohash {geohash(args.lat, args.lon, 9)}) within {args.radius_m:g} m")
+        for m in matches:
+            where = "inside" if m.inside else f"{m.distance_m:.1f} m away"
+            print(f"  {m.venue}: {where}, map ({m.x_m:.2f}, {m.y_m:.2f}) m -> {m.path}")
+    elif args.command == "serve":
+        serve(VenueCatalog.open(args.catalog), args.host, args.port)
+    else:
+        entries = synthetic_entries(args.venues)
+        out = args.out
+        if out is None:
+            fd, out = tempfile.mkstemp(suffix=".vcat")
+            os.close(fd)
+        try:
+            start = time.perf_counter()
+            header = VenueCatalog.write(out, entries, args.precision)
+            built = time.perf_counter() - start
+            start = time.perf_counter()
+            catalog = VenueCatalog.open(out)
+            opened = time.perf_counter() - start
+            rng = random.Random(1)
+            fixes = []
+            for _ in range(args.queries):
+                min_lon, min_lat, max_lon, max_lat = rng.choice(entries)["bbox"]
+                fixes.append((rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)))
+            start = time.perf_counter()
+            hits = sum(len(catalog.locate(lat, lon, args.radius_m)) for lat, lon in fixes)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{args.venues} venues, {header['lengths']['cell_keys']} cells, {os.path.getsize(out) / 1024:.0f} KiB: "
+                f"built in {built * 1e3:.1f} ms, opened in {opened * 1e6:.0f} us; "
+                f"{args.queries} lookups in {elapsed:.2f} s ({elapsed / args.queries * 1e6:.1f} us each, {hits / args.queries:.2f} matches)"
+            )
+        finally:
+            if args.out is None:
+                os.remove(out)
+
+
+if __name__ == "__main__":
+    main()
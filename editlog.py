@@ -0,0 +1,318 @@
+"""Append-only venue edit log with versioned, structurally shared snapshots.
+
+Every edit (move an anchor, add a pin, resize a zone, ...) is one JSON line in the log.
+Replaying the log produces one snapshot per version; snapshots share every collection
+and trie node the edit did not touch, and each version remembers which keys it changed,
+so a diff between any two versions only looks at the edits in between.
+
+    python3 editlog.py --log venue-edits.jsonl append '{"op": "add_anchor", "item": {"id": "anchor_annex_01", "x": 6, "y": 22, "kind": "beacon", "room": "annex"}}'
+    python3 editlog.py --log venue-edits.jsonl append '{"op": "move_anchor", "id": "anchor_annex_01", "x": 7.5, "y": 24}'
+    python3 editlog.py --log venue-edits.jsonl history
+    python3 map-generator-v6.py --edit-log venue-edits.jsonl --diff 1 2
+"""
+
+import argparse
+import copy
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from mapgen import v6, venue_collections
+
+COLLECTIONS = ("rooms", "zones", "doors", "polygons", "pins", "anchors", "levels", "stairs")
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+_DEPTH = 4
+_REMOVED = object()
+
+
+def item_key(item: Dict[str, Any]) -> str:
+    return str(item.get("id") or item.get("name") or "")
+
+
+def _assoc(node: Optional[tuple], h: int, level: int, key: str, value: Any) -> tuple:
+    if level == _DEPTH:
+        bucket = tuple(kv for kv in (node or ()) if kv[0] != key)
+        return bucket + ((key, value),) if value is not _REMOVED else bucket
+    children = list(node) if node is not None else [None] * _WIDTH
+    slot = (h >> (level * _BITS)) & _MASK
+    children[slot] = _assoc(children[slot], h, level + 1, key, value)
+    return tuple(children)
+
+
+def _find(node: Optional[tuple], h: int, key: str) -> Any:
+    for level in range(_DEPTH):
+        if node is None:
+            return None
+        node = node[(h >> (level * _BITS)) & _MASK]
+    for k, v in node or ():
+        if k == key:
+            return v
+    return None
+
+
+def _walk(node: Optional[tuple], level: int = 0) -> Iterator[Tuple[str, Any]]:
+    if node is None:
+        return
+    if level == _DEPTH:
+        yield from node
+        return
+    for child in node:
+        yield from _walk(child, level + 1)
+
+
+class PMap:
+    """Immutable hash trie: `set`/`remove` copy only the path to the changed key."""
+
+    __slots__ = ("_root", "_size")
+
+    def __init__(self, root: Optional[tuple] = None, size: int = 0) -> None:
+        self._root = root
+        self._size = size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get(self, key: str) -> Any:
+        return _find(self._root, hash(key), key)
+
+    def set(self, key: str, value: Any) -> "PMap":
+        grow = 0 if self.get(key) is not None else 1
+        return PMap(_assoc(self._root, hash(key), 0, key, value), self._size + grow)
+
+    def remove(self, key: str) -> "PMap":
+        if self.get(key) is None:
+            return self
+        return PMap(_assoc(self._root, hash(key), 0, key, _REMOVED), self._size - 1)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return _walk(self._root)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: int
+    collections: Dict[str, PMap]
+    next_seq: int
+
+    def get(self, collection: str, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.collections[collection].get(key)
+        return entry[1] if entry is not None else None
+
+    def items(self, collection: str) -> List[Dict[str, Any]]:
+        entries = sorted(self.collections[collection].items(), key=lambda kv: kv[1][0])
+        return [item for _, (_, item) in entries]
+
+    def materialize(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Deep copies of every collection; `get` and `items` return the shared, read-only items."""
+        return {name: copy.deepcopy(self.items(name)) for name in COLLECTIONS}
+
+
+@dataclass(frozen=True)
+class Change:
+    collection: str
+    key: str
+    before: Optional[Dict[str, Any]]
+    after: Optional[Dict[str, Any]]
+
+    @property
+    def kind(self) -> str:
+        if self.before is None:
+            return "added"
+        if self.after is None:
+            return "removed"
+        return "modified"
+
+
+class EditError(ValueError):
+    pass
+
+
+_REQUIRED = {
+    "move_anchor": ("id", "x", "y"),
+    "move_pin": ("id", "x", "y"),
+    "add_pin": ("item",),
+    "add_anchor": ("item",),
+    "resize_zone": ("id",),
+    "add": ("collection", "item"),
+    "update": ("collection", "id", "set"),
+    "remove": ("collection", "id"),
+}
+
+
+def _normalize(event: Dict[str, Any]) -> Tuple[str, str, str, Dict[str, Any]]:
+    op = event.get("op", "")
+    if op not in _REQUIRED:
+        raise EditError(f"Unknown edit op {op!r}")
+    missing = [key for key in _REQUIRED[op] if key not in event]
+    if missing:
+        raise EditError(f"{op} edit is missing {', '.join(missing)}")
+    if "item" in _REQUIRED[op] and not (isinstance(event["item"], dict) and item_key(event["item"])):
+        raise EditError(f"{op} edit needs an item with an id")
+    if op == "move_anchor":
+        return "update", "anchors", event["id"], {"x": event["x"], "y": event["y"]}
+    if op == "move_pin":
+        return "update", "pins", event["id"], {"x": event["x"], "y": event["y"]}
+    if op == "add_pin":
+        return "add", "pins", item_key(event["item"]), event["item"]
+    if op == "add_anchor":
+        return "add", "anchors", item_key(event["item"]), event["item"]
+    if op == "resize_zone":
+        return "update", "zones", event["id"], {k: event[k] for k in ("x", "y", "w", "h", "points", "holes") if k in event}
+    if op == "add":
+        return "add", event["collection"], item_key(event["item"]), event["item"]
+    if op == "update":
+        return "update", event["collection"], event["id"], event["set"]
+    if op == "remove":
+        return "remove", event["collection"], event["id"], {}
+
+
+class EditLog:
+    def __init__(self, base: Dict[str, List[Dict[str, Any]]], filename: Optional[str] = None) -> None:
+        self.filename = filename
+        self.events: List[Dict[str, Any]] = []
+        collections: Dict[str, PMap] = {}
+        seq = 0
+        for name in COLLECTIONS:
+            pmap = PMap()
+            for item in base.get(name, []):
+                pmap = pmap.set(item_key(item), (seq, copy.deepcopy(item)))
+                seq += 1
+            collections[name] = pmap
+        self._snapshots: List[Snapshot] = [Snapshot(0, collections, seq)]
+        self._changed: List[Set[Tuple[str, str]]] = [set()]
+
+    @classmethod
+    def open(cls, filename: str, base: Dict[str, List[Dict[str, Any]]]) -> "EditLog":
+        log = cls(base)
+        if os.path.exists(filename):
+            with open(filename) as f:
+                for line in f:
+                    if line.strip():
+                        log._apply(json.loads(line))
+        log.filename = filename
+        return log
+
+    @property
+    def version(self) -> int:
+        return len(self._snapshots) - 1
+
+    def snapshot(self, version: Optional[int] = None) -> Snapshot:
+        if version is None:
+            return self._snapshots[-1]
+        if not 0 <= version <= self.version:
+            raise EditError(f"Version {version} out of range 0..{self.version}")
+        return self._snapshots[version]
+
+    def _apply(self, event: Dict[str, Any]) -> Snapshot:
+        action, collection, key, payload = _normalize(event)
+        if collection not in COLLECTIONS:
+            raise EditError(f"Unknown collection {collection!r}")
+        head = self._snapshots[-1]
+        pmap = head.collections[collection]
+        entry = pmap.get(key)
+        next_seq = head.next_seq
+        if action == "add":
+            if entry is not None:
+                raise EditError(f"{collection}/{key} already exists")
+            pmap = pmap.set(key, (next_seq, copy.deepcopy(payload)))
+            next_seq += 1
+        elif entry is None:
+            raise EditError(f"{collection}/{key} does not exist")
+        elif action == "update":
+            pmap = pmap.set(key, (entry[0], {**entry[1], **payload}))
+        else:
+            pmap = pmap.remove(key)
+        snapshot = Snapshot(head.version + 1, {**head.collections, collection: pmap}, next_seq)
+        self._snapshots.append(snapshot)
+        self._changed.append({(collection, key)})
+        self.events.append(event)
+        return snapshot
+
+    def append(self, event: Dict[str, Any]) -> Snapshot:
+        event = {**event, "ts": event.get("ts", time.time())}
+        snapshot = self._apply(event)
+        if self.filename:
+            with open(self.filename, "a") as f:
+                f.write(json.dumps(event, sort_keys=True) + "\n")
+        return snapshot
+
+    def diff(self, from_version: int, to_version: int) -> List[Change]:
+        a = self.snapshot(from_version)
+        b = self.snapshot(to_version)
+        lo, hi = sorted((a.version, b.version))
+        touched: Set[Tuple[str, str]] = set()
+        for changed in self._changed[lo + 1 : hi + 1]:
+            touched |= changed
+        changes = []
+        for collection, key in sorted(touched):
+            before = a.get(collection, key)
+            after = b.get(collection, key)
+            if before != after:
+                changes.append(Change(collection, key, before, after))
+        return changes
+
+
+def diff_geojson(log: EditLog, from_version: int, to_version: int, origin: Dict[str, float]) -> Dict[str, Any]:
+    """GeoJSON containing only the features that changed between two versions.
+
+    Added/modified features are emitted in full; removed ones as geometry-less stubs
+    with `removed: true`. Doors and levels are not exported as features, so their edits are skipped.
+    """
+    changes = log.diff(from_version, to_version)
+    current: Dict[str, List[Dict[str, Any]]] = {name: [] for name in COLLECTIONS}
+    removed: List[Dict[str, Any]] = []
+    feature_type = {"rooms": "Room", "zones": "Zone", "polygons": "Polygon", "pins": "Pin", "anchors": "Anchor", "stairs": "Stairs"}
+    for change in changes:
+        if change.collection not in feature_type:
+            continue
+        if change.after is None:
+            removed.append(
+                {"type": "Feature", "properties": {"id": change.key, "type": feature_type[change.collection], "removed": True}, "geometry": None}
+            )
+        else:
+            current[change.collection].append(change.after)
+
+    collection = v6.build_geojson(
+        rooms_=current["rooms"],
+        zones_=current["zones"],
+        polygons_=current["polygons"],
+        pins_=current["pins"],
+        anchors_=current["anchors"],
+        origin=origin,
+        include_metadata=False,
+        levels_=log.snapshot(to_version).items("levels") or None,
+        stairs_=current["stairs"],
+    )
+    collection["features"].extend(removed)
+    collection["properties"] = {"diff_from": from_version, "diff_to": to_version, "changes": len(changes)}
+    return collection
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", dest="log", required=True)
+    sub = parser.add_subparsers(dest="command", required=True)
+    append = sub.add_parser("append")
+    append.add_argument("event")
+    sub.add_parser("history")
+    args = parser.parse_args()
+
+    try:
+        log = EditLog.open(args.log, venue_collections())
+        snapshot = log.append(json.loads(args.event)) if args.command == "append" else None
+    except EditError as e:
+        parser.error(str(e))
+    if snapshot is not None:
+        print(f"Appended edit -> version {snapshot.version}")
+    else:
+        for version, event in enumerate(log.events, start=1):
+            print(f"{version}: {json.dumps(event, sort_keys=True)}")
+
+
+if __name__ == "__main__":
+    main()
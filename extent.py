@@ -0,0 +1,177 @@
+"""Exact venue extents: min/max bounding boxes per item, per collection and per layer.
+
+A `VenueExtent` scans every collection once. Outputs that need bounds (SVG viewBox,
+GeoJSON Metadata, RF grids, tiles) share one instance instead of rescanning, and edits
+update it incrementally:
+
+    extent = VenueExtent(venue)
+    extent.frame()                 # bbox of everything, extended to include (0, 0)
+    extent.item("rooms", "annex")  # one room
+    extent.layer("markers")        # pins + anchors
+    extent.apply(change)           # an editlog.Change
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set
+
+from geometry import shape_of
+
+COLLECTIONS = ("rooms", "zones", "doors", "polygons", "pins", "anchors", "stairs")
+
+LAYERS: Dict[str, Sequence[str]] = {
+    "structure": ("rooms", "zones", "doors", "polygons", "stairs"),
+    "markers": ("pins", "anchors"),
+}
+
+
+class BBox(NamedTuple):
+    min_x: float
+    min_y: float
+    max_x: float
+    max_y: float
+
+    @property
+    def width(self) -> float:
+        return self.max_x - self.min_x
+
+    @property
+    def height(self) -> float:
+        return self.max_y - self.min_y
+
+    def union(self, other: Optional["BBox"]) -> "BBox":
+        if other is None:
+            return self
+        return BBox(min(self.min_x, other.min_x), min(self.min_y, other.min_y), max(self.max_x, other.max_x), max(self.max_y, other.max_y))
+
+    def covers(self, other: "BBox") -> bool:
+        return self.min_x <= other.min_x and self.min_y <= other.min_y and self.max_x >= other.max_x and self.max_y >= other.max_y
+
+    def on_edge_of(self, outer: "BBox") -> bool:
+        return self.min_x == outer.min_x or self.min_y == outer.min_y or self.max_x == outer.max_x or self.max_y == outer.max_y
+
+    def as_list(self) -> List[float]:
+        return list(self)
+
+
+ORIGIN = BBox(0, 0, 0, 0)
+
+
+def item_bbox(item: Dict[str, Any]) -> BBox:
+    if "points" in item:
+        return BBox(*shape_of(item).bbox)
+    x, y = item["x"], item["y"]
+    if "w" in item:
+        return BBox(x, y, x + item["w"], y + item["h"])
+    return BBox(x, y, x, y)
+
+
+def union_all(boxes: Iterable[Optional[BBox]]) -> Optional[BBox]:
+    out: Optional[BBox] = None
+    for box in boxes:
+        if box is not None:
+            out = box if out is None else out.union(box)
+    return out
+
+
+def collection_bbox(items: Sequence[Dict[str, Any]]) -> Optional[BBox]:
+    """Bounding box of a whole collection in one pass, without building per-item boxes."""
+    min_x = min_y = math.inf
+    max_x = max_y = -math.inf
+    for i in items:
+        if "w" in i:
+            x0 = i["x"]
+            y0 = i["y"]
+            x1 = x0 + i["w"]
+            y1 = y0 + i["h"]
+        elif "points" in i:
+            # Holes lie inside their outer ring, so only the outer ring can reach the edge.
+            xs = [pt[0] for pt in i["points"]]
+            ys = [pt[1] for pt in i["points"]]
+            x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+        else:
+            x0 = x1 = i["x"]
+            y0 = y1 = i["y"]
+        if x0 < min_x:
+            min_x = x0
+        if y0 < min_y:
+            min_y = y0
+        if x1 > max_x:
+            max_x = x1
+        if y1 > max_y:
+            max_y = y1
+    return BBox(min_x, min_y, max_x, max_y) if max_x >= min_x else None
+
+
+def _key(item: Dict[str, Any], index: int) -> str:
+    return str(item.get("id") or item.get("name") or f"#{index}")
+
+
+class VenueExtent:
+    """Collection boxes are computed up front; per-item boxes on first use of a collection."""
+
+    def __init__(self, venue: Dict[str, List[Dict[str, Any]]]) -> None:
+        self._venue = venue
+        self._items: Dict[str, Dict[str, BBox]] = {}
+        self._collections: Dict[str, Optional[BBox]] = {name: collection_bbox(venue.get(name, ())) for name in COLLECTIONS}
+        self._stale: Set[str] = set()
+
+    def _boxes(self, collection: str) -> Dict[str, BBox]:
+        boxes = self._items.get(collection)
+        if boxes is None:
+            boxes = {}
+            for i, item in enumerate(self._venue.get(collection, ())):
+                key = _key(item, i)
+                boxes[key if key not in boxes else f"{key}#{i}"] = item_bbox(item)
+            self._items[collection] = boxes
+        return boxes
+
+    def item(self, collection: str, key: str) -> Optional[BBox]:
+        return self._boxes(collection).get(key)
+
+    def room(self, room_id: str) -> Optional[BBox]:
+        return self.item("rooms", room_id)
+
+    def collection(self, name: str) -> Optional[BBox]:
+        if name in self._stale:
+            self._collections[name] = union_all(self._items[name].values())
+            self._stale.discard(name)
+        return self._collections.get(name)
+
+    def bbox(self, collections: Sequence[str] = COLLECTIONS) -> Optional[BBox]:
+        return union_all(self.collection(name) for name in collections)
+
+    def layer(self, name: str) -> Optional[BBox]:
+        return self.bbox(LAYERS[name])
+
+    def frame(self, collections: Sequence[str] = COLLECTIONS) -> BBox:
+        """`bbox` extended to include the origin, so maps keep (0, 0) in view."""
+        return ORIGIN.union(self.bbox(collections))
+
+    def set(self, collection: str, key: str, item: Dict[str, Any]) -> None:
+        box = item_bbox(item)
+        boxes = self._boxes(collection)
+        old = boxes.get(key)
+        boxes[key] = box
+        current = self._collections.get(collection)
+        if collection in self._stale:
+            return
+        if old is not None and current is not None and old.on_edge_of(current) and not box.covers(old):
+            # The item may have been the one holding this edge; rescan lazily.
+            self._stale.add(collection)
+        else:
+            self._collections[collection] = box.union(current)
+
+    def remove(self, collection: str, key: str) -> None:
+        old = self._boxes(collection).pop(key, None)
+        current = self._collections.get(collection)
+        if old is not None and current is not None and old.on_edge_of(current):
+            self._stale.add(collection)
+
+    def apply(self, change: Any) -> None:
+        """Apply an `editlog.Change` (anything with collection, key and after)."""
+        if change.collection not in COLLECTIONS:
+            return
+        if change.after is None:
+            self.remove(change.collection, change.key)
+        else:
+            self.set(change.collection, change.key, change.after)
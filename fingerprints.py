@@ -0,0 +1,356 @@
+"""Radio-map fingerprint database: (x, y, room) -> per-anchor RSSI vector, with kNN lookup.
+
+Fingerprints are keyed to the anchor/room set of a venue generated by
+map-generator-v6.py. Storage is float32, partitioned by room so a query that already
+knows the candidate room(s) only touches those rows, and the on-disk format is a single
+file whose arrays can be memory-mapped.
+
+    python3 fingerprints.py points --geojson detailed.geojson --pins --grid 2 > walk.csv
+    python3 fingerprints.py build --geojson detailed.geojson --out venue.fpdb --walk walk.csv
+    python3 fingerprints.py insert --db venue.fpdb --walk walk2.csv
+    python3 fingerprints.py query --db venue.fpdb --rssi anchor_annex_01=-61,anchor_annex_02=-70 -k 3
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import math
+import struct
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geometry import shape_of
+from mapgen import default_anchors, load_geojson_venue, v6
+from spatial import LevelIndex
+
+RSSI_FLOOR = -100.0
+MAGIC = b"VFPDB1\x00\x00"
+ALIGN = 64
+UNKNOWN_ROOM = ""
+
+# (x, y, {anchor id: dBm}, room or None, level or None)
+Sample = Tuple[float, float, Dict[str, float], Optional[str], Optional[str]]
+
+
+def venue_key(anchor_ids: Sequence[str], room_ids: Sequence[str]) -> str:
+    digest = hashlib.sha256(json.dumps([list(anchor_ids), list(room_ids)]).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class _Partition:
+    def __init__(self, n_anchors: int, xy: Optional[np.ndarray] = None, rssi: Optional[np.ndarray] = None) -> None:
+        if xy is None or rssi is None:
+            self.xy = np.empty((16, 2), dtype=np.float32)
+            self.rssi = np.empty((16, n_anchors), dtype=np.float32)
+            self.size = 0
+            self.owned = True
+        else:
+            self.xy = xy
+            self.rssi = rssi
+            self.size = len(xy)
+            self.owned = False
+        self.sq_norm = np.empty(len(self.xy), dtype=np.float32)
+        self.sq_norm[: self.size] = np.einsum("ij,ij->i", self.rssi[: self.size], self.rssi[: self.size])
+
+    def append(self, xy: np.ndarray, rssi: np.ndarray) -> None:
+        n = len(xy)
+        need = self.size + n
+        if not self.owned or need > len(self.xy):
+            capacity = max(16, need, 2 * len(self.xy))
+            new_xy = np.empty((capacity, 2), dtype=np.float32)
+            new_rssi = np.empty((capacity, self.rssi.shape[1]), dtype=np.float32)
+            new_sq_norm = np.empty(capacity, dtype=np.float32)
+            new_xy[: self.size] = self.xy[: self.size]
+            new_rssi[: self.size] = self.rssi[: self.size]
+            new_sq_norm[: self.size] = self.sq_norm[: self.size]
+            self.xy, self.rssi, self.sq_norm, self.owned = new_xy, new_rssi, new_sq_norm, True
+        self.xy[self.size : need] = xy
+        self.rssi[self.size : need] = rssi
+        self.sq_norm[self.size : need] = np.einsum("ij,ij->i", rssi, rssi)
+        self.size = need
+
+
+@dataclass(frozen=True)
+class Neighbours:
+    distances: np.ndarray
+    xy: np.ndarray
+    rooms: List[List[str]]
+
+
+class FingerprintStore:
+    def __init__(self, anchor_ids: Sequence[str], room_ids: Sequence[str]) -> None:
+        self.anchor_ids = list(anchor_ids)
+        self.room_ids = list(room_ids)
+        self._anchor_pos = {a: i for i, a in enumerate(self.anchor_ids)}
+        self._room_code = {r: i for i, r in enumerate(self.room_ids)}
+        self.key = venue_key(self.anchor_ids, self.room_ids)
+        self._partitions: Dict[int, _Partition] = {}
+        self._room_index: Optional[LevelIndex] = None
+
+    @classmethod
+    def for_venue(
+        cls, rooms_: List[Dict[str, Any]], anchors_: List[Dict[str, Any]], levels_: Optional[List[Dict[str, Any]]] = None
+    ) -> "FingerprintStore":
+        store = cls([a["id"] for a in anchors_], [r["id"] for r in rooms_ if r.get("id")])
+        store.attach_rooms(rooms_, levels_)
+        return store
+
+    def __len__(self) -> int:
+        return sum(p.size for p in self._partitions.values())
+
+    def room_counts(self) -> Dict[str, int]:
+        return {self._room_name(code): p.size for code, p in sorted(self._partitions.items())}
+
+    def _room_name(self, code: int) -> str:
+        return self.room_ids[code] if 0 <= code < len(self.room_ids) else UNKNOWN_ROOM
+
+    def _code_for(self, room: Optional[str], x: float, y: float, level: Optional[str] = None) -> int:
+        if room is None and self._room_index is not None:
+            room = self._room_index.locate(x, y, level)
+        if room is None or room == UNKNOWN_ROOM:
+            return -1
+        if room not in self._room_code:
+            raise KeyError(f"Unknown room {room!r} for venue {self.key}")
+        return self._room_code[room]
+
+    def vectorize(self, readings: Dict[str, float]) -> np.ndarray:
+        vec = np.full(len(self.anchor_ids), RSSI_FLOOR, dtype=np.float32)
+        for anchor_id, value in readings.items():
+            pos = self._anchor_pos.get(anchor_id)
+            if pos is not None and value is not None and not math.isnan(float(value)):
+                vec[pos] = max(float(value), RSSI_FLOOR)
+        return vec
+
+    def insert(self, x: float, y: float, readings: Dict[str, float], room: Optional[str] = None, level: Optional[str] = None) -> None:
+        self.insert_many([(x, y, readings, room, level)])
+
+    def insert_many(self, samples: Iterable[Sample]) -> int:
+        """Insert (x, y, readings, room, level) samples; a missing room is looked up on the sample's level."""
+        grouped: Dict[int, Tuple[List[Tuple[float, float]], List[np.ndarray]]] = {}
+        count = 0
+        for x, y, readings, room, level in samples:
+            code = self._code_for(room, x, y, level)
+            bucket = grouped.setdefault(code, ([], []))
+            bucket[0].append((x, y))
+            bucket[1].append(self.vectorize(readings))
+            count += 1
+        for code, (xy, vecs) in grouped.items():
+            part = self._partitions.get(code)
+            if part is None:
+                part = self._partitions[code] = _Partition(len(self.anchor_ids))
+            part.append(np.asarray(xy, dtype=np.float32), np.stack(vecs))
+        return count
+
+    def knn(self, queries: np.ndarray, k: int = 3, rooms: Optional[Sequence[str]] = None) -> Neighbours:
+        q = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        q_norm = np.einsum("ij,ij->i", q, q)
+        if rooms is None:
+            codes = sorted(self._partitions)
+        else:
+            codes = [self._room_code[r] for r in rooms if r in self._room_code and self._room_code[r] in self._partitions]
+
+        best_d = np.full((len(q), 0), np.inf, dtype=np.float32)
+        best_xy = np.zeros((len(q), 0, 2), dtype=np.float32)
+        best_room = np.zeros((len(q), 0), dtype=np.int32)
+        for code in codes:
+            part = self._partitions[code]
+            if part.size == 0:
+                continue
+            d2 = part.sq_norm[None, : part.size] - 2.0 * (q @ part.rssi[: part.size].T) + q_norm[:, None]
+            kk = min(k, part.size)
+            idx = np.argpartition(d2, kk - 1, axis=1)[:, :kk]
+            best_d = np.concatenate([best_d, np.take_along_axis(d2, idx, axis=1)], axis=1)
+            best_xy = np.concatenate([best_xy, part.xy[idx]], axis=1)
+            best_room = np.concatenate([best_room, np.full(idx.shape, code, dtype=np.int32)], axis=1)
+            if best_d.shape[1] > k:
+                keep = np.argpartition(best_d, k - 1, axis=1)[:, :k]
+                best_d = np.take_along_axis(best_d, keep, axis=1)
+                best_xy = np.take_along_axis(best_xy, keep[:, :, None], axis=1)
+                best_room = np.take_along_axis(best_room, keep, axis=1)
+
+        order = np.argsort(best_d, axis=1)
+        best_d = np.sqrt(np.maximum(np.take_along_axis(best_d, order, axis=1), 0.0))
+        best_xy = np.take_along_axis(best_xy, order[:, :, None], axis=1)
+        best_room = np.take_along_axis(best_room, order, axis=1)
+        return Neighbours(best_d, best_xy, [[self._room_name(c) for c in row] for row in best_room])
+
+    def estimate(self, readings: Dict[str, float], k: int = 3, rooms: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        nn = self.knn(self.vectorize(readings), k=k, rooms=rooms)
+        if nn.distances.shape[1] == 0:
+            return {"x": None, "y": None, "room": None, "neighbours": 0}
+        weights = 1.0 / (nn.distances[0] + 1e-3)
+        x, y = (nn.xy[0] * weights[:, None]).sum(axis=0) / weights.sum()
+        votes: Dict[str, float] = {}
+        for room, w in zip(nn.rooms[0], weights):
+            votes[room] = votes.get(room, 0.0) + float(w)
+        return {"x": float(x), "y": float(y), "room": max(votes, key=votes.get), "neighbours": len(weights)}
+
+    def save(self, filename: str) -> None:
+        codes = sorted(self._partitions)
+        partitions = []
+        start = 0
+        for code in codes:
+            size = self._partitions[code].size
+            partitions.append([code, start, size])
+            start += size
+        total = start
+
+        offsets: Dict[str, int] = {}
+        header = {
+            "version": 1,
+            "venue_key": self.key,
+            "anchors": self.anchor_ids,
+            "rooms": self.room_ids,
+            "count": total,
+            "partitions": partitions,
+            "offsets": offsets,
+        }
+        # Offsets depend on the header length, so size the header with placeholders first.
+        offsets.update({"xy": 0, "rssi": 0})
+        header_len = _aligned(len(MAGIC) + 8 + len(json.dumps(header)) + 64)
+        offsets["xy"] = header_len
+        offsets["rssi"] = _aligned(header_len + total * 2 * 4)
+        blob = json.dumps(header).encode("utf-8")
+
+        with open(filename, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(blob)))
+            f.write(blob)
+            f.write(b"\x00" * (offsets["xy"] - f.tell()))
+            for code in codes:
+                part = self._partitions[code]
+                f.write(np.ascontiguousarray(part.xy[: part.size], dtype="<f4").tobytes())
+            f.write(b"\x00" * (offsets["rssi"] - f.tell()))
+            for code in codes:
+                part = self._partitions[code]
+                f.write(np.ascontiguousarray(part.rssi[: part.size], dtype="<f4").tobytes())
+
+    @classmethod
+    def open(cls, filename: str, mmap: bool = True) -> "FingerprintStore":
+        with open(filename, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filename} is not a fingerprint database")
+            (blob_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(blob_len).decode("utf-8"))
+        store = cls(header["anchors"], header["rooms"])
+        if store.key != header["venue_key"]:
+            raise ValueError(f"{filename}: venue key mismatch")
+        total = header["count"]
+        n_anchors = len(store.anchor_ids)
+        mode = "r" if mmap else "c"
+        xy = np.memmap(filename, dtype="<f4", mode=mode, offset=header["offsets"]["xy"], shape=(total, 2)) if total else np.empty((0, 2), np.float32)
+        rssi = (
+            np.memmap(filename, dtype="<f4", mode=mode, offset=header["offsets"]["rssi"], shape=(total, n_anchors))
+            if total and n_anchors
+            else np.empty((total, n_anchors), np.float32)
+        )
+        if not mmap:
+            xy, rssi = np.array(xy), np.array(rssi)
+        for code, start, size in header["partitions"]:
+            store._partitions[code] = _Partition(n_anchors, xy[start : start + size], rssi[start : start + size])
+        return store
+
+    def attach_rooms(self, rooms_: List[Dict[str, Any]], levels_: Optional[List[Dict[str, Any]]] = None) -> None:
+        self._room_index = LevelIndex([r for r in rooms_ if r.get("id") in self._room_code], levels_[0]["id"] if levels_ else None)
+
+
+def read_walk_csv(filename: str, anchor_ids: Sequence[str]) -> List[Sample]:
+    samples = []
+    with open(filename, newline="") as f:
+        for row in csv.DictReader(f):
+            readings = {a: float(row[a]) for a in anchor_ids if row.get(a) not in (None, "")}
+            samples.append((float(row["x"]), float(row["y"]), readings, row.get("room") or None, row.get("level") or None))
+    return samples
+
+
+def seed_points(rooms_: List[Dict[str, Any]], pins_: List[Dict[str, Any]], include_pins: bool, grid_m: float) -> List[Tuple[float, float]]:
+    points: List[Tuple[float, float]] = []
+    if include_pins:
+        points.extend((float(p["x"]), float(p["y"])) for p in pins_)
+    if grid_m > 0:
+        for r in rooms_:
+            shape = shape_of(r)
+            x0, y0 = shape.bbox[0], shape.bbox[1]
+            w, h = shape.width, shape.height
+            nx = max(1, int(w // grid_m))
+            ny = max(1, int(h // grid_m))
+            for i in range(nx):
+                for j in range(ny):
+                    x, y = x0 + (i + 0.5) * w / nx, y0 + (j + 0.5) * h / ny
+                    if shape.contains(x, y):
+                        points.append((x, y))
+    return points
+
+
+def _load_venue(geojson: Optional[str]) -> Dict[str, Any]:
+    if geojson:
+        return load_geojson_venue(geojson)
+    return {"rooms": v6.rooms, "pins": v6.pins, "anchors": default_anchors(), "levels": v6.levels}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build")
+    build.add_argument("--geojson", dest="geojson", default=None)
+    build.add_argument("--out", dest="out", default="venue.fpdb")
+    build.add_argument("--walk", dest="walk", default=None)
+
+    insert = sub.add_parser("insert")
+    insert.add_argument("--db", dest="db", required=True)
+    insert.add_argument("--walk", dest="walk", required=True)
+    insert.add_argument("--geojson", dest="geojson", default=None)
+
+    query = sub.add_parser("query")
+    query.add_argument("--db", dest="db", required=True)
+    query.add_argument("--rssi", dest="rssi", required=True)
+    query.add_argument("-k", dest="k", type=int, default=3)
+    query.add_argument("--room", dest="rooms", action="append", default=None)
+
+    points = sub.add_parser("points")
+    points.add_argument("--geojson", dest="geojson", default=None)
+    points.add_argument("--pins", dest="pins", action="store_true")
+    points.add_argument("--grid", dest="grid", type=float, default=0.0)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        venue = _load_venue(args.geojson)
+        store = FingerprintStore.for_venue(venue["rooms"], venue["anchors"], venue.get("levels"))
+        if args.walk:
+            store.insert_many(read_walk_csv(args.walk, store.anchor_ids))
+        store.save(args.out)
+        print(f"Generated fingerprint DB: {args.out} ({len(store)} fingerprints, {len(store.anchor_ids)} anchors)")
+    elif args.command == "insert":
+        store = FingerprintStore.open(args.db, mmap=False)
+        venue = _load_venue(args.geojson)
+        store.attach_rooms(venue["rooms"], venue.get("levels"))
+        added = store.insert_many(read_walk_csv(args.walk, store.anchor_ids))
+        store.save(args.db)
+        print(f"Inserted {added} fingerprints into {args.db} ({len(store)} total)")
+    elif args.command == "query":
+        store = FingerprintStore.open(args.db)
+        readings = {}
+        for part in args.rssi.split(","):
+            anchor_id, value = part.split("=")
+            readings[anchor_id.strip()] = float(value)
+        print(json.dumps(store.estimate(readings, k=args.k, rooms=args.rooms)))
+    elif args.command == "points":
+        venue = _load_venue(args.geojson)
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["x", "y"] + [a["id"] for a in venue["anchors"]])
+        for x, y in seed_points(venue["rooms"], venue["pins"], args.pins, args.grid):
+            writer.writerow([round(x, 3), round(y, 3)] + [""] * len(venue["anchors"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""Streaming headcounts per room/zone and origin->destination flows per door.
+
+`FlowAggregator` consumes device place updates (room, optional zone, e.g. the smoothed
+output of `transitions.TransitionEngine`) and keeps:
+
+- the live headcount of every room and zone;
+- over a sliding window: entries, exits, peak and mean headcount per place, and
+  crossings per door in each direction.
+
+Room changes are attributed to the door linking the two rooms (`transitions.door_links`).
+A door touching a single room is an exterior door, used for arrivals and departures.
+When several doors fit, the one nearest the device's position wins if a position is
+given, otherwise the first.
+
+The window is a ring of `bucket_s` buckets (numpy columns). An update touches one
+bucket cell per counter, and a new bucket clears one column, so work per event is O(1)
+and memory is fixed by places x buckets. Device state is one (room, zone) pair per
+device currently in the venue.
+
+Snapshots export through the generators: `properties()` for
+`generate_geojson(extra_properties=...)`, `door_features()` for
+`generate_geojson(extra_layers={"DoorFlow": ...})` and `svg_layer()` for
+`generate_svg(extra_layers=...)` (rooms and zones filled by people per square meter).
+
+    flows = FlowAggregator(v6.rooms, v6.zones, v6.doors, window_s=900)
+    flows.update(t, "device-1", "hallway", zone=None)
+    flows.properties(t)["hallway"]["headcount"]
+
+    python3 flows.py --simulate --devices 500 --duration 3600 --every 600 --out-dir flows
+    python3 flows.py --events places.csv --window 300 --out-dir flows
+"""
+
+import argparse
+import csv
+import math
+import os
+import random
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from analytics import heat_color
+from geometry import shape_of
+from occupancy import FULL_HOUSE_DENSITY
+from transitions import DOOR_REACH_M, door_links
+
+WINDOW_S = 900.0
+BUCKET_S = 30.0
+OUTSIDE = -1
+
+
+def _reaches_outside(door: Dict[str, Any], shapes: Sequence[Any], reach_m: float = DOOR_REACH_M) -> bool:
+    """Whether the door's rectangle, grown by `reach_m`, leaves every room (the venue outline)."""
+    xs = np.linspace(door["x"] - reach_m, door["x"] + door["w"] + reach_m, 5)
+    ys = np.linspace(door["y"] - reach_m, door["y"] + door["h"] + reach_m, 5)
+    gx, gy = (g.ravel() for g in np.meshgrid(xs, ys))
+    inside = np.zeros(len(gx), dtype=bool)
+    for shape in shapes:
+        inside |= np.asarray(shape.contains_many(gx, gy), dtype=bool)
+    return not inside.all()
+
+
+def _edge_distance(bbox: Tuple[float, float, float, float], point: Tuple[float, float]) -> float:
+    x0, y0, x1, y1 = bbox
+    return min(abs(point[0] - x0), abs(point[0] - x1), abs(point[1] - y0), abs(point[1] - y1))
+
+
+class RingWindow:
+    """Per-row counters over the last `window_s` seconds, in a ring of `bucket_s` columns."""
+
+    def __init__(self, rows: int, channels: Sequence[str], window_s: float, bucket_s: float) -> None:
+        self.bucket_s = bucket_s
+        self.n_buckets = max(1, int(math.ceil(window_s / bucket_s)))
+        self.data = {name: np.zeros((rows, self.n_buckets)) for name in channels}
+        self.bucket: Optional[int] = None
+
+    @property
+    def column(self) -> int:
+        return (self.bucket or 0) % self.n_buckets
+
+    def advance(self, t: float, on_rotate: Optional[Callable[[float], None]] = None) -> None:
+        """Move to the bucket holding `t`, clearing buckets that fall out of the window."""
+        bucket = int(t // self.bucket_s)
+        if self.bucket is None:
+            self.bucket = bucket
+            return
+        while self.bucket < bucket:
+            if bucket - self.bucket > self.n_buckets:
+                # A long gap: close the current bucket at the start of the oldest one still in
+                # the window, drop everything, and rotate normally through the window from there.
+                jump = bucket - self.n_buckets
+                if on_rotate is not None:
+                    on_rotate(jump * self.bucket_s)
+                for values in self.data.values():
+                    values[:] = 0.0
+                self.bucket = jump
+                continue
+            if on_rotate is not None:
+                on_rotate((self.bucket + 1) * self.bucket_s)
+            self.bucket += 1
+            for values in self.data.values():
+                values[:, self.column] = 0.0
+
+    def span_s(self, t: float) -> float:
+        """Seconds covered by the window's buckets at `t`: the full old buckets plus the current partial one."""
+        return (self.n_buckets - 1) * self.bucket_s + (t - (self.bucket or 0) * self.bucket_s)
+
+    def total(self, channel: str) -> np.ndarray:
+        return self.data[channel].sum(axis=1)
+
+    def peak(self, channel: str) -> np.ndarray:
+        return self.data[channel].max(axis=1)
+
+
+class FlowAggregator:
+    def __init__(
+        self,
+        rooms_: List[Dict[str, Any]],
+        zones_: List[Dict[str, Any]],
+        doors_: List[Dict[str, Any]],
+        window_s: float = WINDOW_S,
+        bucket_s: float = BUCKET_S,
+    ) -> None:
+        self.rooms = [r for r in rooms_ if r.get("id")]
+        self.zones = [z for z in zones_ if z.get("id")]
+        self.doors = list(doors_)
+        self.place_ids = [r["id"] for r in self.rooms] + [z["id"] for z in self.zones]
+        self.place_code = {place_id: i for i, place_id in enumerate(self.place_ids)}
+        self.window_s = window_s
+        self.area = np.array([shape_of(item).area for item in self.rooms + self.zones])
+
+        # Each door's two sides, as room codes. Only a door reaching past the venue outline is
+        # exterior (OUTSIDE on its far side); one lying inside a single room links nothing.
+        shapes = [shape_of(r) for r in self.rooms]
+        self.door_sides: List[Tuple[int, int]] = []
+        self.door_center: List[Tuple[float, float]] = []
+        self._doors_between: Dict[Tuple[int, int], List[int]] = {}
+        for i, (door, hits) in enumerate(zip(self.doors, door_links(self.rooms, self.doors))):
+            if len(hits) == 1 and _reaches_outside(door, shapes):
+                hits = [OUTSIDE, hits[0]]
+            sides = (hits[0], hits[1]) if len(hits) >= 2 else (hits[0], hits[0]) if hits else (OUTSIDE, OUTSIDE)
+            self.door_sides.append(sides)
+            self.door_center.append((door["x"] + door["w"] / 2, door["y"] + door["h"] / 2))
+            for a in hits:
+                for b in hits:
+                    if a != b:
+                        self._doors_between.setdefault((a, b), []).append(i)
+        # Without a position, the first candidate is charged: put exterior doors on the room's outline first.
+        for (a, b), candidates in self._doors_between.items():
+            if OUTSIDE in (a, b):
+                room = shapes[b if a == OUTSIDE else a]
+                candidates.sort(key=lambda i: _edge_distance(room.bbox, self.door_center[i]))
+
+        self.headcount = np.zeros(len(self.place_ids))
+        self._changed_at = np.zeros(len(self.place_ids))
+        self.places = RingWindow(len(self.place_ids), ("entries", "exits", "peak", "person_s"), window_s, bucket_s)
+        # Door rows: 2 * door for side a -> side b, 2 * door + 1 for b -> a.
+        self.door_window = RingWindow(2 * len(self.doors), ("crossings",), window_s, bucket_s)
+        self.devices: Dict[str, Tuple[int, int]] = {}
+        self.unattributed = 0
+        self.started_at: Optional[float] = None
+
+    def _flush(self, t: float) -> None:
+        """Book headcount x time since each place's last change into the current bucket."""
+        self.places.data["person_s"][:, self.places.column] += self.headcount * (t - self._changed_at)
+        self._changed_at[:] = t
+
+    def _advance(self, t: float) -> None:
+        if self.started_at is None:
+            self.started_at = t
+            self._changed_at[:] = t
+        self.places.advance(t, self._flush)
+        self.door_window.advance(t)
+
+    def _move(self, t: float, code: int, delta: int) -> None:
+        column = self.places.column
+        self.places.data["person_s"][code, column] += self.headcount[code] * (t - self._changed_at[code])
+        self._changed_at[code] = t
+        # The pre-move count may have been held since before this bucket opened (a bucket with
+        # only departures), so the peak records both sides of the move.
+        peak = self.places.data["peak"]
+        peak[code, column] = max(peak[code, column], self.headcount[code], self.headcount[code] + delta)
+        self.headcount[code] += delta
+        self.places.data["entries" if delta > 0 else "exits"][code, column] += 1
+
+    def _door(self, a: int, b: int, position: Optional[Tuple[float, float]]) -> None:
+        candidates = self._doors_between.get((a, b))
+        if not candidates:
+            self.unattributed += 1
+            return
+        door = candidates[0]
+        if position is not None and len(candidates) > 1:
+            door = min(candidates, key=lambda i: math.dist(position, self.door_center[i]))
+        row = 2 * door + (0 if self.door_sides[door][0] == a else 1)
+        self.door_window.data["crossings"][row, self.door_window.column] += 1
+
+    def update(
+        self, t: float, device: str, room: Optional[str], zone: Optional[str] = None, position: Optional[Tuple[float, float]] = None
+    ) -> None:
+        """A device's place at time `t` (non-decreasing); `room=None` means it left the venue."""
+        self._advance(t)
+        new_room = self.place_code.get(room, OUTSIDE) if room else OUTSIDE
+        new_zone = self.place_code.get(zone, OUTSIDE) if zone and new_room != OUTSIDE else OUTSIDE
+        old_room, old_zone = self.devices.get(device, (OUTSIDE, OUTSIDE))
+        if new_room != old_room:
+            if old_room != OUTSIDE:
+                self._move(t, old_room, -1)
+            if new_room != OUTSIDE:
+                self._move(t, new_room, +1)
+            self._door(old_room, new_room, position)
+        if new_zone != old_zone:
+            if old_zone != OUTSIDE:
+                self._move(t, old_zone, -1)
+            if new_zone != OUTSIDE:
+                self._move(t, new_zone, +1)
+        if new_room == OUTSIDE:
+            self.devices.pop(device, None)
+        else:
+            self.devices[device] = (new_room, new_zone)
+
+    def leave(self, t: float, device: str) -> None:
+        self.update(t, device, None)
+
+    def _covered_s(self, t: float) -> float:
+        return min(self.places.span_s(t), t - self.started_at) if self.started_at is not None else 0.0
+
+    def properties(self, t: float) -> Dict[str, Dict[str, Any]]:
+        """Snapshot at `t` for `generate_geojson(extra_properties=...)`, keyed by room/zone id."""
+        self._advance(t)
+        self._flush(t)
+        covered = self._covered_s(t)
+        entries, exits = self.places.total("entries"), self.places.total("exits")
+        peak = np.maximum(self.places.peak("peak"), self.headcount)
+        mean = self.places.total("person_s") / covered if covered > 0 else self.headcount
+        out = {}
+        for code, place_id in enumerate(self.place_ids):
+            area = float(self.area[code])
+            out[place_id] = {
+                "headcount": int(self.headcount[code]),
+                "density_ppm2": round(float(self.headcount[code]) / area, 4) if area > 0 else 0.0,
+                "headcount_mean": round(float(mean[code]), 2),
+                "headcount_peak": int(peak[code]),
+                "entries": int(entries[code]),
+                "exits": int(exits[code]),
+                "window_s": self.window_s,
+            }
+        return out
+
+    def door_flows(self, t: float) -> List[Dict[str, Any]]:
+        self._advance(t)
+        crossings = self.door_window.total("crossings")
+        out = []
+        for i, door in enumerate(self.doors):
+            a, b = self.door_sides[i]
+            out.append(
+                {
+                    "door": door.get("id") or door.get("name", f"door_{i}"),
+                    "side_a": self.place_ids[a] if a != OUTSIDE else "outside",
+                    "side_b": self.place_ids[b] if b != OUTSIDE else "outside",
+                    "a_to_b": int(crossings[2 * i]),
+                    "b_to_a": int(crossings[2 * i + 1]),
+                    "window_s": self.window_s,
+                }
+            )
+        return out
+
+    def door_features(self, t: float) -> List[Dict[str, Any]]:
+        """Door rectangles with their flows, for `generate_geojson(extra_layers={"DoorFlow": ...})`."""
+        return [{"x": d["x"], "y": d["y"], "w": d["w"], "h": d["h"], "properties": flows} for d, flows in zip(self.doors, self.door_flows(t))]
+
+    def svg_layer(self, t: float) -> Callable[[float], List[str]]:
+        """An `extra_layers` renderer for `generate_svg`: places filled by density, doors labelled with flows."""
+        props = self.properties(t)
+        flows = self.door_flows(t)
+        items = self.rooms + self.zones
+
+        def render(scale: float) -> List[str]:
+            out = []
+            for item in items:
+                p = props[item["id"]]
+                path = " ".join(
+                    "M " + " L ".join(f"{x * scale} {y * scale}" for x, y in ring) + " Z" for ring in shape_of(item).rings()
+                )
+                out.append(
+                    f'<path d="{path}" fill="{heat_color(p["density_ppm2"] / FULL_HOUSE_DENSITY)}" fill-opacity="0.5" fill-rule="evenodd" stroke="none">'
+                    f'<title>{item["id"]}: {p["headcount"]} now, peak {p["headcount_peak"]}</title></path>'
+                )
+            for door, f in zip(self.doors, flows):
+                out.append(
+                    f'<rect x="{door["x"] * scale}" y="{door["y"] * scale}" width="{door["w"] * scale}" height="{door["h"] * scale}" '
+                    f'fill="#1E90FF" fill-opacity="0.8" stroke="none"><title>{f["door"]}: {f["side_a"]}->{f["side_b"]} {f["a_to_b"]}, '
+                    f'{f["side_b"]}->{f["side_a"]} {f["b_to_a"]}</title></rect>'
+                )
+            return out
+
+        return render
+
+
+def simulate(flows: FlowAggregator, n_devices: int, duration_s: float, mean_stay_s: float = 300.0, seed: int = 0) -> List[Tuple[float, str, Optional[str], Optional[str]]]:
+    """Synthetic visits: arrive through an exterior door, wander room to room through doors, leave the same way."""
+    rng = random.Random(seed)
+    neighbours: Dict[int, List[int]] = {}
+    for a, b in flows._doors_between:
+        neighbours.setdefault(a, []).append(b)
+    zones_in: Dict[int, List[int]] = {}
+    for z in flows.zones:
+        if z.get("parent") in flows.place_code:
+            zones_in.setdefault(flows.place_code[z["parent"]], []).append(flows.place_code[z["id"]])
+    events: List[Tuple[float, str, Optional[str], Optional[str]]] = []
+    for i in range(n_devices):
+        device = f"dev{i}"
+        t = rng.uniform(0, duration_s)
+        room = rng.choice(neighbours.get(OUTSIDE) or [0])
+        leave = t + rng.expovariate(1 / (3 * mean_stay_s))
+        while room != OUTSIDE:
+            zone = rng.choice(zones_in[room]) if room in zones_in and rng.random() < 0.5 else None
+            events.append((t, device, flows.place_ids[room], flows.place_ids[zone] if zone is not None else None))
+            t += rng.expovariate(1 / mean_stay_s)
+            options = neighbours.get(room, [])
+            if t >= leave and OUTSIDE in options:
+                room = OUTSIDE
+            else:
+                room = rng.choice([o for o in options if o != OUTSIDE] or [room])
+        events.append((t, device, None, None))
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def main() -> None:
+    from mapgen import default_anchors, venue_collections, v6
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", dest="events", default=None, help="CSV with t,device,room[,zone,x,y]")
+    parser.add_argument("--simulate", dest="simulate", action="store_true")
+    parser.add_argument("--devices", dest="devices", type=int, default=500)
+    parser.add_argument("--duration", dest="duration", type=float, default=3600.0)
+    parser.add_argument("--window", dest="window", type=float, default=WINDOW_S)
+    parser.add_argument("--bucket", dest="bucket", type=float, default=BUCKET_S)
+    parser.add_argument("--every", dest="every", type=float, default=600.0, help="snapshot interval in seconds")
+    parser.add_argument("--out-dir", dest="out_dir", default=None)
+    args = parser.parse_args()
+    if args.every <= 0:
+        parser.error("--every must be positive")
+
+    venue = venue_collections()
+    flows = FlowAggregator(venue["rooms"], venue["zones"], venue["doors"], args.window, args.bucket)
+    if args.simulate:
+        events = simulate(flows, args.devices, args.duration)
+    elif args.events:
+        with open(args.events, newline="") as f:
+            events = [
+                (float(r["t"]), r["device"], r.get("room") or None, r.get("zone") or None, (float(r["x"]), float(r["y"])) if r.get("x") and r.get("y") else None)
+                for r in csv.DictReader(f)
+            ]
+        events.sort(key=lambda e: e[0])
+    else:
+        parser.error("pass --simulate or --events")
+
+    anchors_out = default_anchors()
+
+    def snapshot(t: float) -> None:
+        busiest = sorted(flows.properties(t).items(), key=lambda kv: -kv[1]["headcount"])[:3]
+        print(f"t={t:g}: " + ", ".join(f"{place} {p['headcount']} (peak {p['headcount_peak']})" for place, p in busiest))
+        if not args.out_dir:
+            return
+        os.makedirs(args.out_dir, exist_ok=True)
+        label = f"{int(t)}"
+        v6.generate_geojson(
+            rooms_=venue["rooms"],
+            zones_=venue["zones"],
+            polygons_=venue["polygons"],
+            pins_=venue["pins"],
+            anchors_=anchors_out,
+            origin=v6.GEO_ORIGIN,
+            filename=os.path.join(args.out_dir, f"flows-{label}.geojson"),
+            include_rooms=True,
+            include_zones=True,
+            include_polygons=True,
+            include_pins=True,
+            include_anchors=True,
+            include_metadata=True,
+            extra_properties=flows.properties(t),
+            levels_=venue["levels"],
+            stairs_=venue["stairs"],
+            extra_layers={"DoorFlow": flows.door_features(t)},
+        )
+        v6.generate_svg(
+            rooms_=venue["rooms"],
+            zones_=venue["zones"],
+            doors_=venue["doors"],
+            polygons_=venue["polygons"],
+            pins_=venue["pins"],
+            anchors_=anchors_out,
+            filename=os.path.join(args.out_dir, f"flows-{label}.svg"),
+            include_structure=True,
+            include_measurements=False,
+            include_labels=True,
+            include_markers=False,
+            stairs_=venue["stairs"],
+            extra_layers={"flows": flows.svg_layer(t)},
+        )
+
+    next_snapshot = math.floor(events[0][0] / args.every + 1) * args.every if events else 0.0
+    for event in events:
+        while event[0] >= next_snapshot:
+            snapshot(next_snapshot)
+            next_snapshot += args.every
+        flows.update(*event)
+    if events:
+        snapshot(events[-1][0])
+    print(f"{len(events)} updates, {len(flows.devices)} devices still inside, {flows.unattributed} room changes without a matching door")
+    for f in flows.door_flows(events[-1][0] if events else 0.0):
+        print(f"  {f['door']}: {f['side_a']}->{f['side_b']} {f['a_to_b']}, {f['side_b']}->{f['side_a']} {f['b_to_a']}")
+
+
+if __name__ == "__main__":
+    main()
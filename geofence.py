@@ -0,0 +1,462 @@
+"""Geofence triggers: enter/exit/dwell events for many devices against an indexed fence set.
+
+`compile_fences` turns zones, polygons and pins into one `FenceSet`:
+
+- zones and polygons keep their outline (rectangle or polygon, holes included);
+- pins become circles of `fence_radius_m` (default `PIN_RADIUS_M`);
+- every fence is bucketed into the square grid cells its bounding box touches, per level.
+
+`GeofenceEngine` evaluates batches of device positions (or room/zone states from
+`transitions.py`) against it. Each position is tested only against the fences bucketed
+in its own grid cell, plus the fences the device is currently inside (to notice it
+leaving). Membership of every (device, fence) pair in play is kept in sorted arrays, so
+a batch is a handful of vectorized operations however many devices it holds.
+
+- `enter` fires once a device has been inside a fence for `fence_debounce_s`, and `exit`
+  once it has been outside for as long. This stops jitter on a boundary from retriggering.
+- `dwell` fires once per visit, `fence_dwell_s` after the enter.
+- Scans under `min_confidence` are skipped entirely: they are neither "in" nor "out".
+
+Items may pin their own `fence_radius_m`, `fence_debounce_s` and `fence_dwell_s`.
+
+    fences = compile_geojson("detailed.geojson")
+    engine = GeofenceEngine(fences, min_confidence=0.8)
+    engine.subscribe("uwb", fences=["zone_handoff"], kinds=("enter", "exit"))
+    events = engine.process(devices, t, xs, ys, confidence=confidence)
+    engine.route(events)["uwb"]
+
+    python3 geofence.py --simulate --devices 10000 --seconds 10
+    python3 geofence.py --geojson detailed.geojson --replay positions.csv --out-csv events.csv
+"""
+
+import argparse
+import csv
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geometry import Shape, shape_of
+from mapgen import load_geojson_venue, v6
+from transitions import scan_rounds
+
+CELL_M = 4.0
+PIN_RADIUS_M = 1.5
+DEBOUNCE_S = 1.0
+DWELL_S = 5.0
+
+RECT, CIRCLE, POLYGON = 0, 1, 2
+EVENT_KINDS = ("enter", "exit", "dwell")
+ENTER, EXIT, DWELL = 0, 1, 2
+
+
+class Event(NamedTuple):
+    t: float
+    device: str
+    fence: str
+    kind: str
+
+
+@dataclass(frozen=True)
+class FenceSet:
+    ids: List[str]
+    shape_kind: np.ndarray
+    # Bounding boxes; circles also use (cx, cy, radius).
+    x0: np.ndarray
+    y0: np.ndarray
+    x1: np.ndarray
+    y1: np.ndarray
+    cx: np.ndarray
+    cy: np.ndarray
+    radius: np.ndarray
+    level: np.ndarray
+    debounce_s: np.ndarray
+    dwell_s: np.ndarray
+    shapes: Dict[int, Shape]
+    levels: List[str]
+    # Grid: cell (level, iy, ix) -> fences in cell_fences[cell_start[c]:cell_start[c + 1]].
+    gx0: float
+    gy0: float
+    cell_m: float
+    nx: int
+    ny: int
+    cell_start: np.ndarray
+    cell_fences: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def level_codes(self, levels_: Optional[Sequence[Optional[str]]], n: int) -> np.ndarray:
+        """Level ids to codes; None is the default (first) level, unknown levels are -1."""
+        if levels_ is None:
+            return np.zeros(n, dtype=np.int64)
+        lookup = {level_id: i for i, level_id in enumerate(self.levels)}
+        return np.fromiter((lookup.get(lv, -1) if lv is not None else 0 for lv in levels_), dtype=np.int64, count=n)
+
+    def cells(self, xs: np.ndarray, ys: np.ndarray, level: np.ndarray) -> np.ndarray:
+        ix = np.floor((xs - self.gx0) / self.cell_m).astype(np.int64)
+        iy = np.floor((ys - self.gy0) / self.cell_m).astype(np.int64)
+        inside = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny) & (level >= 0)
+        return np.where(inside, (level * self.ny + iy) * self.nx + ix, -1)
+
+    def candidates(self, cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(scan index, fence) for every fence bucketed in each scan's cell."""
+        valid = np.flatnonzero(cells >= 0)
+        starts = self.cell_start[cells[valid]]
+        counts = self.cell_start[cells[valid] + 1] - starts
+        scan = np.repeat(valid, counts)
+        offsets = np.arange(len(scan)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return scan, self.cell_fences[np.repeat(starts, counts) + offsets]
+
+    def contains(self, xs: np.ndarray, ys: np.ndarray, fences: np.ndarray) -> np.ndarray:
+        """Exact test of point i against fence i."""
+        kind = self.shape_kind[fences]
+        out = (xs >= self.x0[fences]) & (xs <= self.x1[fences]) & (ys >= self.y0[fences]) & (ys <= self.y1[fences])
+        circle = kind == CIRCLE
+        out[circle] &= (xs[circle] - self.cx[fences[circle]]) ** 2 + (ys[circle] - self.cy[fences[circle]]) ** 2 <= self.radius[fences[circle]] ** 2
+        polygon = np.flatnonzero(out & (kind == POLYGON))
+        if len(polygon):
+            order = polygon[np.argsort(fences[polygon], kind="stable")]
+            split = np.flatnonzero(np.diff(fences[order])) + 1
+            for group in np.split(order, split):
+                out[group] = self.shapes[int(fences[group[0]])].contains_many(xs[group], ys[group])
+        return out
+
+
+def compile_fences(
+    zones_: List[Dict[str, Any]],
+    polygons_: List[Dict[str, Any]],
+    pins_: List[Dict[str, Any]],
+    levels_: Optional[List[Dict[str, Any]]] = None,
+    cell_m: float = CELL_M,
+    pin_radius_m: float = PIN_RADIUS_M,
+    debounce_s: float = DEBOUNCE_S,
+    dwell_s: float = DWELL_S,
+) -> FenceSet:
+    levels_ = levels_ or v6.levels
+    level_ids = [lv["id"] for lv in levels_]
+    rows: List[Tuple[str, int, float, float, float, float, float, float, float, str, float, float]] = []
+    shapes: Dict[int, Shape] = {}
+    for item in list(zones_) + list(polygons_):
+        shape = shape_of(item)
+        if not shape.is_rect:
+            shapes[len(rows)] = shape
+        x0, y0, x1, y1 = shape.bbox
+        rows.append((item.get("id", ""), RECT if shape.is_rect else POLYGON, x0, y0, x1, y1, 0.0, 0.0, 0.0, v6.level_of(item, levels_), float(item.get("fence_debounce_s", debounce_s)), float(item.get("fence_dwell_s", dwell_s))))
+    for pin in pins_:
+        x, y = float(pin["x"]), float(pin["y"])
+        r = float(pin.get("fence_radius_m", pin_radius_m))
+        rows.append((pin.get("id", ""), CIRCLE, x - r, y - r, x + r, y + r, x, y, r, v6.level_of(pin, levels_), float(pin.get("fence_debounce_s", debounce_s)), float(pin.get("fence_dwell_s", dwell_s))))
+    for row in rows:
+        if row[9] not in level_ids:
+            level_ids.append(row[9])
+
+    columns = list(zip(*rows)) if rows else [[] for _ in range(12)]
+    x0, y0, x1, y1 = (np.asarray(columns[k], dtype=np.float64) for k in range(2, 6))
+    level = np.fromiter((level_ids.index(lv) for lv in columns[9]), dtype=np.int64, count=len(rows))
+    gx0 = math.floor(float(x0.min()) / cell_m) * cell_m if rows else 0.0
+    gy0 = math.floor(float(y0.min()) / cell_m) * cell_m if rows else 0.0
+    nx = int((float(x1.max()) - gx0) // cell_m) + 1 if rows else 1
+    ny = int((float(y1.max()) - gy0) // cell_m) + 1 if rows else 1
+
+    # Bucket every fence into the cells its bounding box touches.
+    cell_lists: List[np.ndarray] = []
+    fence_lists: List[np.ndarray] = []
+    for i in range(len(rows)):
+        ix = np.arange(int((x0[i] - gx0) // cell_m), int((x1[i] - gx0) // cell_m) + 1)
+        iy = np.arange(int((y0[i] - gy0) // cell_m), int((y1[i] - gy0) // cell_m) + 1)
+        cells = ((level[i] * ny + iy[:, None]) * nx + ix[None, :]).ravel()
+        cell_lists.append(cells)
+        fence_lists.append(np.full(len(cells), i, dtype=np.int64))
+    cells = np.concatenate(cell_lists) if cell_lists else np.zeros(0, dtype=np.int64)
+    fences = np.concatenate(fence_lists) if fence_lists else np.zeros(0, dtype=np.int64)
+    order = np.argsort(cells, kind="stable")
+    cell_start = np.searchsorted(cells[order], np.arange(len(level_ids) * nx * ny + 1))
+
+    return FenceSet(
+        ids=list(columns[0]),
+        shape_kind=np.asarray(columns[1], dtype=np.int8),
+        x0=x0,
+        y0=y0,
+        x1=x1,
+        y1=y1,
+        cx=np.asarray(columns[6], dtype=np.float64),
+        cy=np.asarray(columns[7], dtype=np.float64),
+        radius=np.asarray(columns[8], dtype=np.float64),
+        level=level,
+        debounce_s=np.asarray(columns[10], dtype=np.float64),
+        dwell_s=np.asarray(columns[11], dtype=np.float64),
+        shapes=shapes,
+        levels=level_ids,
+        gx0=gx0,
+        gy0=gy0,
+        cell_m=cell_m,
+        nx=nx,
+        ny=ny,
+        cell_start=cell_start,
+        cell_fences=fences[order],
+    )
+
+
+def compile_geojson(filename: str, **kwargs: Any) -> FenceSet:
+    """Fences from a `generate_geojson` output (zones, polygons and pins)."""
+    venue = load_geojson_venue(filename)
+    return compile_fences(venue["zones"], venue["polygons"], venue["pins"], **kwargs)
+
+
+class GeofenceEngine:
+    """Debounced fence membership for every device, kept as sorted (device, fence) pair arrays."""
+
+    def __init__(self, fences: FenceSet, min_confidence: float = 0.0, capacity: int = 1024) -> None:
+        self.fences = fences
+        self.min_confidence = min_confidence
+        self.devices: List[str] = []
+        self.slots: Dict[str, int] = {}
+        self.last_t = np.zeros(capacity)
+        self._by_id: Dict[str, List[int]] = {}
+        for i, fence_id in enumerate(fences.ids):
+            self._by_id.setdefault(fence_id, []).append(i)
+        # One entry per (device, fence) pair that is inside or about to enter.
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.inside = np.zeros(0, dtype=bool)
+        self.pending_since = np.zeros(0)
+        self.entered_at = np.zeros(0)
+        self.dwelled = np.zeros(0, dtype=bool)
+        self._subscribers: Dict[int, List[Tuple[str, frozenset]]] = {}
+        self._all_fences: List[Tuple[str, frozenset]] = []
+
+    def _slots_for(self, devices: Sequence[str]) -> np.ndarray:
+        for device in devices:
+            if device not in self.slots:
+                self.slots[device] = len(self.devices)
+                self.devices.append(device)
+        if len(self.devices) > len(self.last_t):
+            self.last_t = np.append(self.last_t, np.zeros(max(len(self.devices), 2 * len(self.last_t)) - len(self.last_t)))
+        return np.fromiter((self.slots[d] for d in devices), dtype=np.int64, count=len(devices))
+
+    def inside_of(self, device: str) -> List[str]:
+        slot = self.slots.get(device)
+        if slot is None:
+            return []
+        n = len(self.fences)
+        lo, hi = np.searchsorted(self.keys, [slot * n, (slot + 1) * n])
+        return [self.fences.ids[k % n] for k, inside in zip(self.keys[lo:hi].tolist(), self.inside[lo:hi].tolist()) if inside]
+
+    def step(self, slots: np.ndarray, t: np.ndarray, hit_scan: np.ndarray, hit_fence: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Advance distinct device `slots` by one scan each, given the fences each scan is in.
+
+        Returns the (pair key, event kind) of every event fired.
+        """
+        n = len(self.fences)
+        hits = np.unique(slots[hit_scan] * n + hit_fence)
+        self.last_t[slots] = t
+
+        # Start tracking pairs hit for the first time.
+        pos = np.searchsorted(self.keys, hits)
+        new = hits[(pos >= len(self.keys)) | (self.keys[np.minimum(pos, len(self.keys) - 1)] != hits)] if len(self.keys) else hits
+        if len(new):
+            keys = np.concatenate([self.keys, new])
+            order = np.argsort(keys, kind="stable")
+            self.keys = keys[order]
+            self.inside = np.concatenate([self.inside, np.zeros(len(new), dtype=bool)])[order]
+            self.pending_since = np.concatenate([self.pending_since, np.full(len(new), np.nan)])[order]
+            self.entered_at = np.concatenate([self.entered_at, np.zeros(len(new))])[order]
+            self.dwelled = np.concatenate([self.dwelled, np.zeros(len(new), dtype=bool)])[order]
+
+        in_batch = np.zeros(len(self.last_t), dtype=bool)
+        in_batch[slots] = True
+        idx = np.flatnonzero(in_batch[self.keys // n])
+        keys = self.keys[idx]
+        fence = keys % n
+        now = self.last_t[keys // n]
+        pos = np.searchsorted(hits, keys)
+        raw = (pos < len(hits)) & (hits[np.minimum(pos, len(hits) - 1)] == keys) if len(hits) else np.zeros(len(keys), dtype=bool)
+
+        inside = self.inside[idx]
+        pending = np.where(raw == inside, np.nan, np.where(np.isnan(self.pending_since[idx]), now, self.pending_since[idx]))
+        flip = ~np.isnan(pending) & (now - pending >= self.fences.debounce_s[fence])
+        entered = flip & raw
+        exited = flip & ~raw
+        inside = inside ^ flip
+        entered_at = np.where(entered, now, self.entered_at[idx])
+        dwelled = self.dwelled[idx] & ~entered
+        dwell = inside & ~dwelled & (now - entered_at >= self.fences.dwell_s[fence])
+
+        self.inside[idx] = inside
+        self.pending_since[idx] = np.where(flip, np.nan, pending)
+        self.entered_at[idx] = entered_at
+        self.dwelled[idx] = dwelled | dwell
+
+        keep = self.inside | ~np.isnan(self.pending_since)
+        if not keep.all():
+            self.keys, self.inside, self.pending_since, self.entered_at, self.dwelled = (
+                a[keep] for a in (self.keys, self.inside, self.pending_since, self.entered_at, self.dwelled)
+            )
+
+        event_keys = np.concatenate([keys[entered], keys[exited], keys[dwell]])
+        event_kinds = np.repeat([ENTER, EXIT, DWELL], [int(entered.sum()), int(exited.sum()), int(dwell.sum())])
+        return event_keys, event_kinds
+
+    def _run(self, slots: np.ndarray, t: np.ndarray, hits_for: Any) -> List[Event]:
+        n = len(self.fences)
+        out: List[Event] = []
+        if len(slots) == 0:
+            return out
+        for idx in scan_rounds(slots, t):
+            hit_scan, hit_fence = hits_for(idx)
+            event_keys, event_kinds = self.step(slots[idx], t[idx], hit_scan, hit_fence)
+            for key, kind in zip(event_keys.tolist(), event_kinds.tolist()):
+                out.append(Event(float(self.last_t[key // n]), self.devices[key // n], self.fences.ids[key % n], EVENT_KINDS[kind]))
+        return out
+
+    def process(
+        self,
+        devices: Sequence[str],
+        t: Sequence[float],
+        xs: Sequence[float],
+        ys: Sequence[float],
+        levels_: Optional[Sequence[Optional[str]]] = None,
+        confidence: Optional[Sequence[float]] = None,
+    ) -> List[Event]:
+        """Evaluate a batch of positions (any mix of devices, times in seconds); returns the events fired."""
+        fences = self.fences
+        n = len(t)
+        keep = np.ones(n, dtype=bool) if confidence is None else np.asarray(confidence, dtype=np.float64) >= self.min_confidence
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        keep &= ~(np.isnan(xs) | np.isnan(ys))
+        slots = self._slots_for(devices)[keep]
+        tt = np.asarray(t, dtype=np.float64)[keep]
+        xs, ys = xs[keep], ys[keep]
+        cells = fences.cells(xs, ys, fences.level_codes(levels_, n)[keep])
+
+        def hits_for(idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            scan, fence = fences.candidates(cells[idx])
+            inside = fences.contains(xs[idx][scan], ys[idx][scan], fence)
+            return scan[inside], fence[inside]
+
+        return self._run(slots, tt, hits_for)
+
+    def process_places(
+        self,
+        devices: Sequence[str],
+        t: Sequence[float],
+        places: Sequence[Optional[str]],
+        confidence: Optional[Sequence[float]] = None,
+    ) -> List[Event]:
+        """Evaluate room/zone states (e.g. `TransitionEngine.process` output): a device is inside the fences with its place's id."""
+        n = len(t)
+        keep = np.ones(n, dtype=bool) if confidence is None else np.asarray(confidence, dtype=np.float64) >= self.min_confidence
+        slots = self._slots_for(devices)[keep]
+        tt = np.asarray(t, dtype=np.float64)[keep]
+        kept = [p for p, k in zip(places, keep.tolist()) if k]
+
+        def hits_for(idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            scan: List[int] = []
+            fence: List[int] = []
+            for j, i in enumerate(idx.tolist()):
+                for f in self._by_id.get(kept[i] or "", ()):
+                    scan.append(j)
+                    fence.append(f)
+            return np.asarray(scan, dtype=np.int64), np.asarray(fence, dtype=np.int64)
+
+        return self._run(slots, tt, hits_for)
+
+    def subscribe(self, subscriber: str, fences: Optional[Iterable[str]] = None, kinds: Iterable[str] = EVENT_KINDS) -> None:
+        """Route `kinds` of events on `fences` (all fences if None) to `subscriber`."""
+        entry = (subscriber, frozenset(kinds))
+        if fences is None:
+            self._all_fences.append(entry)
+            return
+        for fence_id in fences:
+            for i in self._by_id.get(fence_id, ()):
+                self._subscribers.setdefault(i, []).append(entry)
+
+    def route(self, events: Iterable[Event]) -> Dict[str, List[Event]]:
+        out: Dict[str, List[Event]] = {}
+        for event in events:
+            targets = self._all_fences + [s for i in self._by_id.get(event.fence, ()) for s in self._subscribers.get(i, ())]
+            for subscriber, kinds in targets:
+                if event.kind in kinds:
+                    out.setdefault(subscriber, []).append(event)
+        return out
+
+
+def simulate(fences: FenceSet, n_devices: int, seconds: int, rate_hz: float, seed: int = 0) -> Iterator[Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]]:
+    """Random walks at walking speed over the fence grid: per-tick (devices, t, xs, ys) batches."""
+    rng = np.random.default_rng(seed)
+    width, height = fences.nx * fences.cell_m, fences.ny * fences.cell_m
+    x = fences.gx0 + rng.uniform(0, width, n_devices)
+    y = fences.gy0 + rng.uniform(0, height, n_devices)
+    heading = rng.uniform(0, 2 * np.pi, n_devices)
+    devices = [f"d{i}" for i in range(n_devices)]
+    dt = 1.0 / rate_hz
+    for k in range(int(seconds * rate_hz)):
+        heading += rng.normal(0, 0.5, n_devices)
+        x = np.clip(x + np.cos(heading) * 1.2 * dt, fences.gx0, fences.gx0 + width)
+        y = np.clip(y + np.sin(heading) * 1.2 * dt, fences.gy0, fences.gy0 + height)
+        yield devices, np.full(n_devices, k * dt), x + rng.normal(0, 0.5, n_devices), y + rng.normal(0, 0.5, n_devices)
+
+
+def main() -> None:
+    from analytics import read_labelled_csv
+    from mapgen import venue_collections
+    from obsstore import parse_time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--geojson", dest="geojson", default=None)
+    parser.add_argument("--replay", dest="replay", default=None)
+    parser.add_argument("--out-csv", dest="out_csv", default=None)
+    parser.add_argument("--simulate", dest="simulate", action="store_true")
+    parser.add_argument("--devices", dest="devices", type=int, default=10000)
+    parser.add_argument("--seconds", dest="seconds", type=int, default=10)
+    parser.add_argument("--rate", dest="rate", type=float, default=1.0)
+    parser.add_argument("--cell", dest="cell", type=float, default=CELL_M)
+    parser.add_argument("--pin-radius", dest="pin_radius", type=float, default=PIN_RADIUS_M)
+    parser.add_argument("--debounce", dest="debounce", type=float, default=DEBOUNCE_S)
+    parser.add_argument("--dwell", dest="dwell", type=float, default=DWELL_S)
+    parser.add_argument("--min-confidence", dest="min_confidence", type=float, default=0.0)
+    args = parser.parse_args()
+
+    options = {"cell_m": args.cell, "pin_radius_m": args.pin_radius, "debounce_s": args.debounce, "dwell_s": args.dwell}
+    if args.geojson:
+        fences = compile_geojson(args.geojson, **options)
+    else:
+        venue = venue_collections()
+        fences = compile_fences(venue["zones"], venue["polygons"], venue["pins"], venue["levels"], **options)
+    print(f"{len(fences)} fences in {len(fences.levels)} level(s), {fences.nx}x{fences.ny} cells of {fences.cell_m} m")
+    engine = GeofenceEngine(fences, args.min_confidence)
+    events: List[Event] = []
+
+    if args.simulate:
+        scans = 0
+        start = time.perf_counter()
+        for devices, t, xs, ys in simulate(fences, args.devices, args.seconds, args.rate):
+            events += engine.process(devices, t, xs, ys)
+            scans += len(devices)
+        elapsed = time.perf_counter() - start
+        counts = {kind: sum(e.kind == kind for e in events) for kind in EVENT_KINDS}
+        print(f"{scans} scans in {elapsed:.2f} s ({scans / elapsed:,.0f} scans/s); events: {counts}")
+    if args.replay:
+        for rows in read_labelled_csv(args.replay):
+            events += engine.process(
+                [row.get("device", "") for row in rows],
+                [parse_time(row["t"]) / 1000.0 for row in rows],
+                [float(row["x"]) if row.get("x") else math.nan for row in rows],
+                [float(row["y"]) if row.get("y") else math.nan for row in rows],
+                [row.get("level") or None for row in rows],
+                [float(row["confidence"]) if row.get("confidence") else 1.0 for row in rows],
+            )
+        print(f"{len(events)} events")
+    if args.out_csv:
+        with open(args.out_csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(Event._fields)
+            writer.writerows(events)
+        print(f"Generated geofence events: {args.out_csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Geometry kernel for venue items: axis-aligned rectangles and polygons with holes.
+
+A room or zone is either a rectangle (`x`, `y`, `w`, `h`) or a polygon (`points` as the
+outer ring, optional `holes` as a list of rings), all in meters. `shape_of(item)` returns
+a cached `Shape` with its area, centroid and bounding box computed once; shapes are
+cached by geometry value, so edited items get a fresh shape automatically.
+
+Point-in-polygon tests over many points use NumPy when it is installed and fall back to
+a pure-Python even-odd test otherwise, so the generator itself keeps working without it.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional for the generator
+    np = None  # type: ignore[assignment]
+
+Point = Tuple[float, float]
+Ring = Tuple[Point, ...]
+
+_CHUNK = 4096
+
+
+def _ring_centroid_terms(ring: Ring) -> Tuple[float, float, float]:
+    a = cx = cy = 0.0
+    n = len(ring)
+    for i in range(n):
+        x0, y0 = ring[i]
+        x1, y1 = ring[(i + 1) % n]
+        cross = x0 * y1 - x1 * y0
+        a += cross
+        cx += (x0 + x1) * cross
+        cy += (y0 + y1) * cross
+    return a / 2.0, cx, cy
+
+
+def _ring_contains(ring: Ring, x: float, y: float) -> bool:
+    inside = False
+    n = len(ring)
+    j = n - 1
+    for i in range(n):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _area_centroid(outer: Ring, holes: Tuple[Ring, ...], bbox: Tuple[float, float, float, float]) -> Tuple[float, Point]:
+    a_outer, cx, cy = _ring_centroid_terms(outer)
+    sign = 1.0 if a_outer >= 0 else -1.0
+    area = abs(a_outer)
+    cx *= sign
+    cy *= sign
+    for hole in holes:
+        a_h, cx_h, cy_h = _ring_centroid_terms(hole)
+        hole_sign = 1.0 if a_h >= 0 else -1.0
+        area -= abs(a_h)
+        cx -= cx_h * hole_sign
+        cy -= cy_h * hole_sign
+    if area <= 0:
+        return 0.0, ((bbox[0] + bbox[2]) / 2.0, (bbox[1] + bbox[3]) / 2.0)
+    return area, (cx / (6.0 * area), cy / (6.0 * area))
+
+
+class Shape:
+    __slots__ = ("outer", "holes", "is_rect", "bbox", "area", "centroid", "_edges")
+
+    def __init__(self, outer: Ring, holes: Tuple[Ring, ...] = (), is_rect: bool = False) -> None:
+        self.outer = outer
+        self.holes = holes
+        self.is_rect = is_rect
+        xs = [p[0] for p in outer]
+        ys = [p[1] for p in outer]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+        self.area, self.centroid = _area_centroid(outer, holes, self.bbox)
+        self._edges: Optional[Any] = None
+
+    @classmethod
+    def rect(cls, x: float, y: float, w: float, h: float) -> "Shape":
+        shape = cls(((x, y), (x + w, y), (x + w, y + h), (x, y + h)), is_rect=True)
+        shape.area = w * h
+        shape.centroid = (x + w / 2, y + h / 2)
+        return shape
+
+    @property
+    def width(self) -> float:
+        return self.bbox[2] - self.bbox[0]
+
+    @property
+    def height(self) -> float:
+        return self.bbox[3] - self.bbox[1]
+
+    def rings(self) -> List[Ring]:
+        return [self.outer, *self.holes]
+
+    def contains(self, x: float, y: float) -> bool:
+        x0, y0, x1, y1 = self.bbox
+        if x < x0 or x > x1 or y < y0 or y > y1:
+            return False
+        if self.is_rect:
+            return True
+        if not _ring_contains(self.outer, x, y):
+            return False
+        return not any(_ring_contains(h, x, y) for h in self.holes)
+
+    def contains_many(self, xs: Sequence[float], ys: Sequence[float]) -> Any:
+        """Vectorized even-odd test; returns a bool ndarray (or list without NumPy)."""
+        if np is None:
+            return [self.contains(x, y) for x, y in zip(xs, ys)]
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        x0, y0, x1, y1 = self.bbox
+        out = (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+        if self.is_rect:
+            return out
+        candidates = np.flatnonzero(out)
+        if len(candidates) == 0:
+            return out
+        ax, ay, bx, by = self._edge_arrays()
+        dy = by - ay
+        safe_dy = np.where(dy == 0, 1.0, dy)
+        for start in range(0, len(candidates), _CHUNK):
+            idx = candidates[start : start + _CHUNK]
+            px = xs[idx][:, None]
+            py = ys[idx][:, None]
+            crosses = ((ay > py) != (by > py)) & (px < (bx - ax) * (py - ay) / safe_dy + ax)
+            out[idx] = (crosses.sum(axis=1) & 1).astype(bool)
+        return out
+
+    def _edge_arrays(self) -> Tuple[Any, Any, Any, Any]:
+        if self._edges is None:
+            ax: List[float] = []
+            ay: List[float] = []
+            bx: List[float] = []
+            by: List[float] = []
+            for ring in self.rings():
+                n = len(ring)
+                for i in range(n):
+                    ax.append(ring[i][0])
+                    ay.append(ring[i][1])
+                    bx.append(ring[(i + 1) % n][0])
+                    by.append(ring[(i + 1) % n][1])
+            self._edges = tuple(np.array(v, dtype=np.float64)[None, :] for v in (ax, ay, bx, by))
+        return self._edges
+
+    def label_point(self) -> Point:
+        """Centroid when it falls inside the shape, else the middle of the widest interior span."""
+        cx, cy = self.centroid
+        if self.contains(cx, cy):
+            return cx, cy
+        best: Optional[Tuple[float, Point]] = None
+        for frac in (0.5, 0.35, 0.65, 0.2, 0.8):
+            y = self.bbox[1] + self.height * frac
+            xs = sorted(_crossings(self.rings(), y))
+            for a, b in zip(xs[0::2], xs[1::2]):
+                if best is None or b - a > best[0]:
+                    best = (b - a, ((a + b) / 2.0, y))
+        return best[1] if best else (cx, cy)
+
+
+def _crossings(rings: List[Ring], y: float) -> List[float]:
+    out = []
+    for ring in rings:
+        n = len(ring)
+        for i in range(n):
+            (x0, y0), (x1, y1) = ring[i], ring[(i + 1) % n]
+            if (y0 > y) != (y1 > y):
+                out.append(x0 + (y - y0) * (x1 - x0) / (y1 - y0))
+    return out
+
+
+def _ring(points: Sequence[Sequence[float]]) -> Ring:
+    ring = tuple((float(p[0]), float(p[1])) for p in points)
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring = ring[:-1]
+    return ring
+
+
+@lru_cache(maxsize=65536)
+def _cached_shape(key: Tuple[Any, ...]) -> Shape:
+    if key[0] == "rect":
+        return Shape.rect(*key[1:])
+    _, outer, holes = key
+    return Shape(outer, holes)
+
+
+def shape_key(item: Dict[str, Any]) -> Tuple[Any, ...]:
+    if "points" in item:
+        return ("poly", _ring(item["points"]), tuple(_ring(h) for h in item.get("holes") or ()))
+    return ("rect", float(item["x"]), float(item["y"]), float(item["w"]), float(item["h"]))
+
+
+def shape_of(item: Dict[str, Any]) -> Shape:
+    return _cached_shape(shape_key(item))
+
+
+def is_polygon(item: Dict[str, Any]) -> bool:
+    return "points" in item
@@ -0,0 +1,277 @@
+"""Surveyed georeferencing: fit the map-to-GPS transform from pins with known lat/lon.
+
+`meters_to_gps` with a bare `GEO_ORIGIN` assumes the map's +x axis points due east and
+its top-left corner sits at the origin. A rotated (or slightly mis-scaled) building
+needs a fitted transform instead. Survey a few pins, then:
+
+    survey = [{"id": "pin_entrance", "lat": 47.66130, "lon": -122.36536}, ...]
+    ref = fit(surveyed_points(v6.pins, survey), method="similarity")
+    ref.residuals_m                      # per-point misfit, meters
+    origin = ref.origin()                # pass as `origin=` to build_geojson / meters_to_gps
+    lon, lat = ref.to_gps(xs, ys)        # batch, NumPy arrays in and out
+    xs, ys = ref.to_meters(lats, lons)   # incoming GPS fixes
+
+- `similarity`: rotation, uniform scale and translation (4 parameters, 2+ points).
+- `affine`: independent x/y scale and shear as well (6 parameters, 3+ points).
+
+The fit runs in local east/north meters around the transform's own origin (the GPS
+position of map point (0, 0)), with the same equirectangular projection as
+`meters_to_gps`, so generator output and the batch transforms agree. The generator only
+needs `origin["matrix"]`; the fit itself is plain Python and NumPy is only used for
+the batch transforms.
+
+    python3 georef.py --survey survey.json --method similarity --out-json georef.json
+    python3 map-generator-v6.py --georef similarity --survey survey.json
+"""
+
+import argparse
+import csv
+import json
+import math
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional for the generator
+    np = None  # type: ignore[assignment]
+
+EARTH_RADIUS_M = 6378137.0
+METHODS = ("similarity", "affine")
+MIN_POINTS = {"similarity": 2, "affine": 3}
+FIT_ITERATIONS = 4
+SURVEY_NUMERIC = ("x", "y", "lat", "lon")
+
+Matrix = Tuple[Tuple[float, float], Tuple[float, float]]
+Affine = Tuple[Tuple[float, float, float], Tuple[float, float, float]]
+
+
+def surveyed_points(pins_: List[Dict[str, Any]], survey: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """`{"id", "x", "y", "lat", "lon"}` control points.
+
+    Pins that carry `lat`/`lon` count as surveyed. `survey` entries either name a pin by
+    `id` (its map position is taken from the pin) or give `x`/`y` themselves.
+    """
+    by_id = {p.get("id"): p for p in pins_ if p.get("id")}
+    points: Dict[str, Dict[str, Any]] = {}
+    for p in pins_:
+        if p.get("id") and "lat" in p and "lon" in p:
+            points[p["id"]] = {"id": p["id"], "x": float(p["x"]), "y": float(p["y"]), "lat": float(p["lat"]), "lon": float(p["lon"])}
+    for i, s in enumerate(survey or []):
+        point_id = s.get("id") or f"survey_{i}"
+        pin = by_id.get(point_id, {})
+        if "x" not in s and not pin:
+            raise ValueError(f"survey point {point_id!r} has no x/y and matches no pin")
+        points[point_id] = {
+            "id": point_id,
+            "x": float(s.get("x", pin.get("x", 0.0))),
+            "y": float(s.get("y", pin.get("y", 0.0))),
+            "lat": float(s["lat"]),
+            "lon": float(s["lon"]),
+        }
+    return list(points.values())
+
+
+def load_survey(filename: str) -> List[Dict[str, Any]]:
+    """Survey points from JSON (a list, or `{id: {"lat", "lon"}}`) or CSV with `id,lat,lon[,x,y]`."""
+    if filename.endswith(".csv"):
+        with open(filename, newline="") as f:
+            # Only the coordinates are numeric; other columns (name, note, ...) are kept as text.
+            return [{k: (float(v) if k in SURVEY_NUMERIC else v) for k, v in row.items() if v != ""} for row in csv.DictReader(f)]
+    with open(filename) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return [{"id": point_id, **values} for point_id, values in data.items()]
+    return data
+
+
+def _enu(lat: float, lon: float, lat0: float, lon0: float) -> Tuple[float, float]:
+    east = math.radians(lon - lon0) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+    north = math.radians(lat - lat0) * EARTH_RADIUS_M
+    return east, north
+
+
+def _fit_linear(xy: Sequence[Tuple[float, float]], en: Sequence[Tuple[float, float]], method: str) -> Tuple[Matrix, Tuple[float, float]]:
+    """Least-squares (matrix, translation) with east/north = matrix @ (x, y) + translation."""
+    n = len(xy)
+    mx = sum(p[0] for p in xy) / n
+    my = sum(p[1] for p in xy) / n
+    me = sum(p[0] for p in en) / n
+    mn = sum(p[1] for p in en) / n
+    if method == "similarity":
+        # Map y points down, so fit on (x, -y): a rotation plus uniform scale of that frame.
+        sxx = sa = sb = 0.0
+        for (x, y), (e, nn) in zip(xy, en):
+            u, v = x - mx, -(y - my)
+            de, dn = e - me, nn - mn
+            sxx += u * u + v * v
+            sa += u * de + v * dn
+            sb += u * dn - v * de
+        if sxx < 1e-12:
+            raise ValueError("control points coincide; a similarity fit needs two distinct points")
+        a, b = sa / sxx, sb / sxx
+        matrix: Matrix = ((a, b), (b, -a))
+    else:
+        # Normal equations on centered coordinates, one 2x2 system per output axis.
+        sxx = sum((x - mx) ** 2 for x, _ in xy)
+        sxy = sum((x - mx) * (y - my) for x, y in xy)
+        syy = sum((y - my) ** 2 for _, y in xy)
+        det = sxx * syy - sxy * sxy
+        if abs(det) < 1e-9 * max(sxx * syy, 1e-12):
+            raise ValueError("control points are collinear; an affine fit needs points spread in both directions")
+        rows = []
+        for k, mean in ((0, me), (1, mn)):
+            sxv = sum((x - mx) * (p[k] - mean) for (x, _), p in zip(xy, en))
+            syv = sum((y - my) * (p[k] - mean) for (_, y), p in zip(xy, en))
+            rows.append(((sxv * syy - syv * sxy) / det, (syv * sxx - sxv * sxy) / det))
+        matrix = (rows[0], rows[1])
+    tx = me - matrix[0][0] * mx - matrix[0][1] * my
+    ty = mn - matrix[1][0] * mx - matrix[1][1] * my
+    return matrix, (tx, ty)
+
+
+@dataclass(frozen=True)
+class GeoReference:
+    lat: float
+    lon: float
+    matrix: Matrix
+    method: str = "similarity"
+    residuals_m: Optional[Dict[str, float]] = None
+
+    @classmethod
+    def from_origin(cls, origin: Dict[str, Any]) -> "GeoReference":
+        """The transform a generator `origin` dict describes (a bare origin is east-up, y-down)."""
+        matrix = origin.get("matrix") or ((1.0, 0.0), (0.0, -1.0))
+        return cls(float(origin["lat"]), float(origin["lon"]), (tuple(matrix[0]), tuple(matrix[1])), origin.get("method", "origin"))
+
+    def origin(self) -> Dict[str, Any]:
+        return {"lat": self.lat, "lon": self.lon, "matrix": [list(self.matrix[0]), list(self.matrix[1])]}
+
+    # Compiled matrices
+
+    @cached_property
+    def forward(self) -> Affine:
+        """Map meters (x, y, 1) -> (lon, lat) in degrees."""
+        k_lat = 180.0 / (math.pi * EARTH_RADIUS_M)
+        k_lon = k_lat / math.cos(math.pi * self.lat / 180)
+        (m00, m01), (m10, m11) = self.matrix
+        return ((k_lon * m00, k_lon * m01, self.lon), (k_lat * m10, k_lat * m11, self.lat))
+
+    @cached_property
+    def inverse(self) -> Affine:
+        """(lon, lat, 1) in degrees -> map meters (x, y)."""
+        (a, b, c), (d, e, f) = self.forward
+        det = a * e - b * d
+        ia, ib, id_, ie = e / det, -b / det, -d / det, a / det
+        return ((ia, ib, -(ia * c + ib * f)), (id_, ie, -(id_ * c + ie * f)))
+
+    @property
+    def scale(self) -> float:
+        (m00, m01), (m10, m11) = self.matrix
+        return math.sqrt(abs(m00 * m11 - m01 * m10))
+
+    @property
+    def bearing_deg(self) -> float:
+        """Compass bearing of the map's +x axis (90 = due east)."""
+        (m00, _), (m10, _) = self.matrix
+        return math.degrees(math.atan2(m00, m10)) % 360.0
+
+    # Batch transforms
+
+    def to_gps(self, xs: Any, ys: Any) -> Tuple[Any, Any]:
+        """(lon, lat) arrays for map points; same numbers as `meters_to_gps`."""
+        (a, b, c), (d, e, f) = self.forward
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        return a * xs + b * ys + c, d * xs + e * ys + f
+
+    def to_meters(self, lats: Any, lons: Any) -> Tuple[Any, Any]:
+        """(x, y) arrays in map meters for GPS fixes."""
+        (a, b, c), (d, e, f) = self.inverse
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        return a * lons + b * lats + c, d * lons + e * lats + f
+
+    def metadata_properties(self) -> Dict[str, Any]:
+        residuals = self.residuals_m or {}
+        values = list(residuals.values())
+        return {
+            "georef_method": self.method,
+            "georef_points": len(values),
+            "georef_rms_m": round(math.sqrt(sum(r * r for r in values) / len(values)), 4) if values else None,
+            "georef_max_m": round(max(values), 4) if values else None,
+            "georef_residuals_m": {k: round(v, 4) for k, v in residuals.items()},
+            "georef_scale": round(self.scale, 6),
+            "georef_bearing_deg": round(self.bearing_deg, 4),
+            "georef_forward": [list(row) for row in self.forward],
+            "georef_inverse": [list(row) for row in self.inverse],
+        }
+
+
+def fit(points: List[Dict[str, Any]], method: str = "similarity") -> GeoReference:
+    """Least-squares transform from control points, with per-point residuals in meters."""
+    if method not in METHODS:
+        raise ValueError(f"unknown georeference method {method!r}; expected one of {METHODS}")
+    if len(points) < MIN_POINTS[method]:
+        raise ValueError(f"a {method} fit needs at least {MIN_POINTS[method]} surveyed points, got {len(points)}")
+    xy = [(p["x"], p["y"]) for p in points]
+    lat0 = sum(p["lat"] for p in points) / len(points)
+    lon0 = sum(p["lon"] for p in points) / len(points)
+    # Re-center on the fitted position of map (0, 0) until the translation vanishes, so the
+    # projection is taken at the same origin `meters_to_gps` will use.
+    for _ in range(FIT_ITERATIONS):
+        en = [_enu(p["lat"], p["lon"], lat0, lon0) for p in points]
+        matrix, (tx, ty) = _fit_linear(xy, en, method)
+        lat0 += math.degrees(ty / EARTH_RADIUS_M)
+        lon0 += math.degrees(tx / (EARTH_RADIUS_M * math.cos(math.radians(lat0))))
+        if math.hypot(tx, ty) < 1e-6:
+            break
+    (m00, m01), (m10, m11) = matrix
+    residuals = {}
+    for p in points:
+        e, n = _enu(p["lat"], p["lon"], lat0, lon0)
+        residuals[p["id"]] = math.hypot(m00 * p["x"] + m01 * p["y"] - e, m10 * p["x"] + m11 * p["y"] - n)
+    return GeoReference(lat0, lon0, matrix, method, residuals)
+
+
+def main() -> None:
+    from mapgen import v6
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--survey", dest="survey", default=None, help="JSON or CSV of surveyed pins (id, lat, lon[, x, y])")
+    parser.add_argument("--method", dest="method", choices=METHODS, default="similarity")
+    parser.add_argument("--out-json", dest="out_json", default=None)
+    parser.add_argument("--convert", dest="convert", default=None, help="CSV of GPS fixes with lat,lon columns to convert to map meters")
+    parser.add_argument("--out-csv", dest="out_csv", default="fixes_m.csv")
+    args = parser.parse_args()
+
+    points = surveyed_points(v6.pins, load_survey(args.survey) if args.survey else None)
+    try:
+        ref = fit(points, args.method)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    props = ref.metadata_properties()
+    print(f"{args.method} fit from {props['georef_points']} points: rms {props['georef_rms_m']} m, max {props['georef_max_m']} m")
+    print(f"Origin (map 0,0): {ref.lat:.7f}, {ref.lon:.7f}; +x bearing {props['georef_bearing_deg']} deg; scale {props['georef_scale']}")
+    for point_id, r in sorted(ref.residuals_m.items(), key=lambda kv: -kv[1]):
+        print(f"  {point_id}: {r:.3f} m")
+    if args.out_json:
+        with open(args.out_json, "w") as f:
+            json.dump({"origin": ref.origin(), **props}, f, indent=2)
+        print(f"Generated georeference: {args.out_json}")
+
+    if args.convert:
+        with open(args.convert, newline="") as f:
+            rows = list(csv.DictReader(f))
+        xs, ys = ref.to_meters([float(r["lat"]) for r in rows], [float(r["lon"]) for r in rows])
+        with open(args.out_csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) + ["x", "y"] if rows else ["x", "y"])
+            writer.writeheader()
+            for row, x, y in zip(rows, xs, ys):
+                writer.writerow({**row, "x": round(float(x), 3), "y": round(float(y), 3)})
+        print(f"Generated converted fixes: {args.out_csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Lightweight spans and counters for the generation pipeline.
+
+Code under measurement always receives a recorder; when instrumentation is off it is
+`NULL_RECORDER`, whose `span()` returns one shared no-op context manager and whose
+`count()` does nothing, so disabled instrumentation costs one method call per stage.
+"""
+
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder: "Recorder", name: str) -> None:
+        self.recorder = recorder
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.recorder._stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        end = time.perf_counter()
+        self.recorder._stack.pop()
+        self.recorder.add_span(self.name, self.start, end)
+
+
+class Recorder:
+    enabled = True
+
+    def __init__(self, origin: Optional[float] = None) -> None:
+        # Spans that started before the recorder existed (argument parsing) pass the earlier clock in.
+        self.origin = time.perf_counter() if origin is None else origin
+        self.spans: List[Dict[str, Any]] = []
+        self.counters: Dict[str, int] = {}
+        self._stack: List[str] = []
+
+    def span(self, name: str) -> Any:
+        return _Span(self, name)
+
+    def add_span(self, name: str, start: float, end: float) -> None:
+        self.spans.append(
+            {
+                "name": name,
+                "parent": self._stack[-1] if self._stack else None,
+                "start_ms": round((start - self.origin) * 1e3, 4),
+                "duration_ms": round((end - start) * 1e3, 4),
+            }
+        )
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self) -> Dict[str, Any]:
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            totals[s["name"]] = round(totals.get(s["name"], 0.0) + s["duration_ms"], 4)
+        return {"spans": self.spans, "totals_ms": totals, "counters": self.counters}
+
+
+class NullRecorder:
+    enabled = False
+    _null = nullcontext()
+
+    def span(self, name: str) -> Any:
+        return self._null
+
+    def add_span(self, name: str, start: float, end: float) -> None:
+        pass
+
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+
+NULL_RECORDER = NullRecorder()
+
+
+class Profiler:
+    """cProfile + tracemalloc capture for a whole run."""
+
+    def __init__(self, top: int = 25) -> None:
+        self.top = top
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        tracemalloc.start()
+        self._profile.enable()
+
+    def stop(self) -> Dict[str, Any]:
+        self._profile.disable()
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        stats = pstats.Stats(self._profile, stream=io.StringIO())
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():  # type: ignore[attr-defined]
+            rows.append({"function": f"{filename}:{line}({func})", "ncalls": nc, "primitive_calls": cc, "tottime_s": tt, "cumtime_s": ct})
+        rows.sort(key=lambda r: r["cumtime_s"], reverse=True)
+
+        allocations = [
+            {"location": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[: self.top]
+        ]
+        return {
+            "cprofile": rows[: self.top],
+            "memory": {"current_bytes": current, "peak_bytes": peak, "top_allocations": allocations},
+        }
+
+
+def recorder_or_null(recorder: Optional[Recorder]) -> Any:
+    return recorder if recorder is not None else NULL_RECORDER
@@ -0,0 +1,302 @@
+"""Collision-free label placement for room, zone, polygon and marker labels.
+
+Each label has a list of candidate slots (x, baseline y, text-anchor) in preference
+order. Placed label boxes and obstacles (marker circles) live in a spatial hash, so an
+overlap check only looks at the few boxes sharing the candidate's cells.
+
+- Greedy pass, in priority order: each label takes its first slot that overlaps nothing.
+  If none is free, it takes the slot with the least overlap.
+- Annealing pass, only over labels still in conflict: random slot moves are accepted
+  by the Metropolis rule, cooling geometrically. It runs 5 steps per conflicted label,
+  capped at ANNEAL_MAX_STEPS.
+- Optional labels (marker names) still overlapping afterwards are dropped,
+  lowest priority first. Area labels are never dropped.
+
+Uncontested labels keep their first slot. That is the position the generators always
+used, so sparse maps render exactly as before. Slots whose box leaves the image frame
+are discarded up front; a marker name with no slot inside the frame is dropped.
+
+`map_labels` builds the requests for a venue and is shared by `generate_svg` and
+`raster.layer_ops`, so vector and raster output put labels in the same places.
+
+    python3 labels.py --pins 10000    # ~0.6 s on one core; 20000 pins ~1.5-1.9 s, 40000 ~3-4 s
+"""
+
+import argparse
+import math
+import random
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from geometry import shape_of
+
+Box = Tuple[float, float, float, float]
+Slot = Tuple[float, float, str]
+
+ROOM_FONT_PX = 14
+ZONE_FONT_PX = 10
+MARKER_FONT_PX = 10
+PIN_RADIUS_PX = 5
+ANCHOR_RADIUS_PX = 7
+ANNEAL_MAX_STEPS = 50_000
+
+
+class LabelRequest(NamedTuple):
+    text: str
+    width: float
+    height: float
+    slots: List[Slot]
+    optional: bool = False
+
+
+def text_width(text: str, font_px: float, bold: bool = False) -> float:
+    """Rough sans-serif advance width; good enough to keep labels apart."""
+    return len(text) * font_px * (0.62 if bold else 0.55)
+
+
+def slot_box(slot: Slot, width: float, height: float) -> Box:
+    x, y, anchor = slot
+    left = x - width / 2 if anchor == "middle" else x - width if anchor == "end" else x
+    return left, y - 0.8 * height, left + width, y + 0.2 * height
+
+
+class SpatialHash:
+    """Boxes bucketed on a uniform grid; keys are label indices (>= 0) or obstacles (< 0).
+
+    Each cell holds `(key, x0, y0, x1, y1)` entries, so a scan never looks a box up by key.
+    """
+
+    def __init__(self, cell: float) -> None:
+        self.cell = cell
+        self.cells: Dict[Tuple[int, int], List[Tuple[int, float, float, float, float]]] = {}
+        self.boxes: Dict[int, Box] = {}
+
+    def _span(self, box: Box) -> List[Tuple[int, int]]:
+        c = self.cell
+        i0, i1 = int(box[0] // c), int(box[2] // c)
+        j0, j1 = int(box[1] // c), int(box[3] // c)
+        return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+    def insert(self, key: int, box: Box) -> None:
+        self.boxes[key] = box
+        entry = (key,) + tuple(box)
+        for cell in self._span(box):
+            self.cells.setdefault(cell, []).append(entry)
+
+    def remove(self, key: int) -> None:
+        box = self.boxes.pop(key)
+        entry = (key,) + tuple(box)
+        for cell in self._span(box):
+            self.cells[cell].remove(entry)
+
+    def overlap(self, box: Box, skip: int, stop_at: float = math.inf) -> float:
+        """Total overlap area of `box` with every stored box except `skip` (early exit past `stop_at`)."""
+        x0, y0, x1, y1 = box
+        c = self.cell
+        cells = self.cells
+        total = 0.0
+        for i in range(int(x0 // c), int(x1 // c) + 1):
+            for j in range(int(y0 // c), int(y1 // c) + 1):
+                for key, bx0, by0, bx1, by1 in cells.get((i, j), ()):
+                    left = x0 if x0 > bx0 else bx0
+                    w = (x1 if x1 < bx1 else bx1) - left
+                    if w <= 0 or key == skip:
+                        continue
+                    top = y0 if y0 > by0 else by0
+                    h = (y1 if y1 < by1 else by1) - top
+                    # A box met in several shared cells counts once, in the cell holding the overlap's top-left corner.
+                    if h <= 0 or int(left // c) != i or int(top // c) != j:
+                        continue
+                    total += w * h
+                    if total > stop_at:
+                        return total
+        return total
+
+
+def place_labels(
+    requests: Sequence[LabelRequest],
+    obstacles: Sequence[Box] = (),
+    anneal_steps: Optional[int] = None,
+    slot_penalty: float = 0.5,
+    seed: int = 0,
+) -> List[Optional[Slot]]:
+    """Pick one slot per request (in priority order); `None` for dropped optional labels."""
+    if not requests:
+        return []
+    sizes = sorted(max(r.width, r.height) for r in requests)
+    grid = SpatialHash(max(8.0, sizes[len(sizes) // 2]))
+    for i, box in enumerate(obstacles):
+        grid.insert(-1 - i, box)
+
+    choice = [0] * len(requests)
+    cost = [0.0] * len(requests)
+    for i, req in enumerate(requests):
+        best, best_cost = 0, math.inf
+        for k, slot in enumerate(req.slots):
+            area = grid.overlap(slot_box(slot, req.width, req.height), i, best_cost - slot_penalty * k)
+            if area == 0.0:
+                best, best_cost = k, 0.0
+                break
+            if area + slot_penalty * k < best_cost:
+                best, best_cost = k, area + slot_penalty * k
+        choice[i] = best
+        cost[i] = best_cost
+        grid.insert(i, slot_box(req.slots[best], req.width, req.height))
+
+    conflicted = [i for i, c in enumerate(cost) if c > 0 and len(requests[i].slots) > 1]
+    if conflicted:
+        rng = random.Random(seed)
+        steps = anneal_steps if anneal_steps is not None else min(5 * len(conflicted), ANNEAL_MAX_STEPS)
+        temperature = max(1.0, sum(cost[i] for i in conflicted) / len(conflicted))
+        cooling = (0.01) ** (1.0 / max(steps, 1))
+        for _ in range(steps):
+            i = conflicted[rng.randrange(len(conflicted))]
+            req = requests[i]
+            k = rng.randrange(len(req.slots))
+            if k == choice[i]:
+                continue
+            # Metropolis: accept iff new <= old - T ln(u). Drawing u first bounds the new
+            # box's overlap, so its scan stops as soon as the move is sure to be rejected.
+            u = rng.random()
+            limit = grid.overlap(grid.boxes[i], i) + slot_penalty * (choice[i] - k) - (temperature * math.log(u) if u > 0 else -math.inf)
+            new_box = slot_box(req.slots[k], req.width, req.height)
+            if grid.overlap(new_box, i, limit) <= limit:
+                grid.remove(i)
+                grid.insert(i, new_box)
+                choice[i] = k
+            temperature *= cooling
+
+    placed: List[Optional[Slot]] = [req.slots[k] for req, k in zip(requests, choice)]
+    for i in sorted(conflicted, reverse=True):
+        if requests[i].optional and grid.overlap(grid.boxes[i], i) > 0:
+            grid.remove(i)
+            placed[i] = None
+    return placed
+
+
+def area_slots(
+    item: Dict[str, Any], point: Tuple[float, float], to_px: Callable[[float, float], Tuple[float, float]], width: float, height: float
+) -> List[Slot]:
+    """`point` (meters) first, then shifts by whole lines and quarter widths that stay inside the item."""
+    cx, cy = to_px(*point)
+    x0, y0, x1, y1 = shape_of(item).bbox
+    (bx0, by0), (bx1, by1) = to_px(x0, y0), to_px(x1, y1)
+    slots = [(cx, cy, "middle")]
+    line = 1.2 * height
+    # Offsets keeping the whole box (x ± width/2, y - 0.8h .. y + 0.2h) inside the item's bbox.
+    dx_ok = bx0 - (cx - width / 2), bx1 - (cx + width / 2)
+    dy_ok = by0 - (cy - 0.8 * height), by1 - (cy + 0.2 * height)
+    for dx in (0.0, -width / 4, width / 4):
+        if not dx_ok[0] <= dx <= dx_ok[1]:
+            continue
+        for dy in (line, -line, 2 * line, -2 * line) if dx == 0.0 else (0.0, line, -line):
+            if dy_ok[0] <= dy <= dy_ok[1]:
+                slots.append((cx + dx, cy + dy, "middle"))
+    return slots
+
+
+def marker_slots(x: float, y: float, radius: float, height: float, gap: float) -> List[Slot]:
+    """Right of the marker first (the historical spot), then left, above, below and diagonals."""
+    d = radius * 0.7 + gap / 2
+    return [
+        (x + radius + gap, y + gap, "start"),
+        (x - radius - gap, y + gap, "end"),
+        (x, y - radius - gap, "middle"),
+        (x, y + radius + gap + 0.8 * height, "middle"),
+        (x + d, y - d, "start"),
+        (x + d, y + d + 0.8 * height, "start"),
+        (x - d, y - d, "end"),
+        (x - d, y + d + 0.8 * height, "end"),
+    ]
+
+
+def in_frame(slots: List[Slot], width: float, height: float, bounds: Optional[Box]) -> List[Slot]:
+    """The slots whose box lies inside `bounds` (pixels), in their original order."""
+    if bounds is None:
+        return slots
+    fx0, fy0, fx1, fy1 = bounds
+    out = []
+    for slot in slots:
+        x0, y0, x1, y1 = slot_box(slot, width, height)
+        if x0 >= fx0 and y0 >= fy0 and x1 <= fx1 and y1 <= fy1:
+            out.append(slot)
+    return out
+
+
+def map_labels(
+    venue: Dict[str, List[Dict[str, Any]]],
+    to_px: Callable[[float, float], Tuple[float, float]],
+    zoom: float = 1.0,
+    include_labels: bool = True,
+    include_markers: bool = True,
+    measure: Callable[[str, float, bool], float] = text_width,
+    bounds: Optional[Box] = None,
+) -> Dict[str, List[Optional[Slot]]]:
+    """Slots for every room/zone/polygon label and pin/anchor name, per collection and item index.
+
+    Items without a label (or in a collection that is not drawn) get `None`, as do marker
+    names that cannot fit inside `bounds` (the image frame in pixels). Area labels keep
+    their first slot if none fits.
+    """
+    requests: List[LabelRequest] = []
+    owners: List[Tuple[str, int]] = []
+    obstacles: List[Box] = []
+    out: Dict[str, List[Optional[Slot]]] = {name: [None] * len(venue.get(name, [])) for name in ("rooms", "polygons", "zones", "pins", "anchors")}
+
+    if include_labels:
+        for name, font_px, bold in (("rooms", ROOM_FONT_PX, True), ("polygons", ROOM_FONT_PX, True), ("zones", ZONE_FONT_PX, False)):
+            for i, item in enumerate(venue.get(name, [])):
+                text = item.get("name")
+                if name == "polygons" and not text:
+                    continue
+                if name == "polygons":
+                    point = (sum(pt[0] for pt in item["points"]) / len(item["points"]), sum(pt[1] for pt in item["points"]) / len(item["points"]))
+                else:
+                    point = shape_of(item).label_point()
+                width, height = measure(text or "", font_px * zoom, bold), font_px * zoom
+                slots = area_slots(item, point, to_px, width, height)
+                requests.append(LabelRequest(text or "", width, height, in_frame(slots, width, height, bounds) or slots[:1]))
+                owners.append((name, i))
+    if include_markers:
+        for name, radius in (("anchors", ANCHOR_RADIUS_PX), ("pins", PIN_RADIUS_PX)):
+            for i, item in enumerate(venue.get(name, [])):
+                x, y = to_px(float(item["x"]), float(item["y"]))
+                r = radius * zoom
+                obstacles.append((x - r, y - r, x + r, y + r))
+                text = item.get("name") or item.get("id")
+                if text:
+                    width, height = measure(text, MARKER_FONT_PX * zoom, False), MARKER_FONT_PX * zoom
+                    slots = in_frame(marker_slots(x, y, r, height, 4 * zoom), width, height, bounds)
+                    if slots:
+                        requests.append(LabelRequest(text, width, height, slots, optional=True))
+                        owners.append((name, i))
+
+    for (name, i), slot in zip(owners, place_labels(requests, obstacles)):
+        out[name][i] = slot
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pins", dest="pins", type=int, default=10000)
+    parser.add_argument("--size", dest="size_m", type=float, default=0.0, help="square venue side in meters (default: ~2 m^2 per pin)")
+    parser.add_argument("--scale", dest="scale", type=float, default=20.0)
+    parser.add_argument("--seed", dest="seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    side = args.size_m or math.sqrt(args.pins * 2.0)
+    pins_ = [{"id": f"pin_{i}", "name": f"P{i}", "x": rng.uniform(0, side), "y": rng.uniform(0, side)} for i in range(args.pins)]
+    venue = {"rooms": [{"id": "floor", "name": "Floor", "x": 0, "y": 0, "w": side, "h": side}], "pins": pins_}
+
+    start = time.perf_counter()
+    layout = map_labels(venue, lambda x, y: (x * args.scale, y * args.scale))
+    elapsed = time.perf_counter() - start
+
+    placed = [s for s in layout["pins"] if s is not None]
+    moved = sum(1 for s, p in zip(layout["pins"], pins_) if s is not None and s[2] != "start")
+    print(f"{len(pins_)} pin labels on {side:.0f} x {side:.0f} m: {len(placed)} placed ({moved} off the default slot), {len(pins_) - len(placed)} dropped in {elapsed * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
 import argparse
 import json
 import math
+import os
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from extent import VenueExtent
+from geometry import Shape, shape_of
+from instrument import Profiler, Recorder, recorder_or_null
+from labels import ANCHOR_RADIUS_PX, PIN_RADIUS_PX, map_labels
 
 GEO_ORIGIN = {"lat": 47.661378, "lon": -122.365703}
 
@@ -47,99 +54,177 @@ pins: List[Dict[str, Any]] = [
 anchors: List[Dict[str, Any]] = [
 ]
 
+levels: List[Dict[str, Any]] = [
+    {"id": "ground", "name": "Ground", "elevation_m": 0.0},
+]
+
+stairs: List[Dict[str, Any]] = [
+]
+
 @dataclass(frozen=True)
 class Bounds:
     width_m: float
     height_m: float
 
 
-def meters_to_gps(x_meters: float, y_meters: float, origin: Dict[str, float]) -> Dict[str, float]:
+def meters_to_gps(x_meters: float, y_meters: float, origin: Dict[str, Any]) -> Dict[str, float]:
+    # `origin["matrix"]` (fitted by georef.py) maps map meters to east/north meters for a
+    # rotated or scaled building; without it +x is east and +y is south.
     earth_radius = 6378137
-    dy = -y_meters
-    dx = x_meters
+    matrix = origin.get("matrix")
+    if matrix is None:
+        dy = -y_meters
+        dx = x_meters
+    else:
+        dx = matrix[0][0] * x_meters + matrix[0][1] * y_meters
+        dy = matrix[1][0] * x_meters + matrix[1][1] * y_meters
     d_lat = (dy / earth_radius) * (180 / math.pi)
     d_lon = (dx / (earth_radius * math.cos(math.pi * origin["lat"] / 180))) * (180 / math.pi)
     return {"lat": origin["lat"] + d_lat, "lon": origin["lon"] + d_lon}
 
 
-def gps_to_meters(lat: float, lon: float, origin: Dict[str, float]) -> Dict[str, float]:
+def gps_to_meters(lat: float, lon: float, origin: Dict[str, Any]) -> Dict[str, float]:
     earth_radius = 6378137
     d_lat = (lat - origin["lat"]) * (math.pi / 180)
     d_lon = (lon - origin["lon"]) * (math.pi / 180)
     dy = d_lat * earth_radius
     dx = d_lon * (earth_radius * math.cos(math.pi * origin["lat"] / 180))
-    return {"x": dx, "y": -dy}
+    matrix = origin.get("matrix")
+    if matrix is None:
+        return {"x": dx, "y": -dy}
+    (a, b), (c, d) = matrix
+    det = a * d - b * c
+    return {"x": (d * dx - b * dy) / det, "y": (a * dy - c * dx) / det}
 
 
-def compute_bounds_m(rooms_: List[Dict[str, Any]], zones_: List[Dict[str, Any]], doors_: List[Dict[str, Any]], polygons_: List[Dict[str, Any]], pins_: List[Dict[str, Any]], anchors_: List[Dict[str, Any]]) -> Bounds:
-    rect_items = rooms_ + zones_ + doors_
-    max_x_rect = max([r["x"] + r["w"] for r in rect_items]) if rect_items else 0
-    max_y_rect = max([r["y"] + r["h"] for r in rect_items]) if rect_items else 0
+def level_of(item: Dict[str, Any], levels_: Optional[List[Dict[str, Any]]] = None) -> str:
+    return item.get("level") or (levels_ or levels)[0]["id"]
 
-    def poly_max(items: List[Dict[str, Any]], axis: int) -> float:
-        if not items:
-            return 0
-        return max(max(pt[axis] for pt in p["points"]) for p in items)
 
-    max_x_poly = poly_max(polygons_, 0)
-    max_y_poly = poly_max(polygons_, 1)
+def venue_on_level(venue: Dict[str, List[Dict[str, Any]]], level_id: str, levels_: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for name, items in venue.items():
+        if name == "levels":
+            out[name] = items
+        elif name == "stairs":
+            out[name] = [s for s in items if level_id in (s.get("from_level"), s.get("to_level"))]
+        else:
+            out[name] = [i for i in items if level_of(i, levels_) == level_id]
+    return out
+
+
+def compute_bounds_m(rooms_: List[Dict[str, Any]], zones_: List[Dict[str, Any]], doors_: List[Dict[str, Any]], polygons_: List[Dict[str, Any]], pins_: List[Dict[str, Any]], anchors_: List[Dict[str, Any]]) -> Bounds:
+    venue = {"rooms": rooms_, "zones": zones_, "doors": doors_, "polygons": polygons_, "pins": pins_, "anchors": anchors_}
+    frame = VenueExtent(venue).frame()
+    return Bounds(width_m=frame.width, height_m=frame.height)
 
-    max_x_pts = max([p["x"] for p in pins_ + anchors_], default=0)
-    max_y_pts = max([p["y"] for p in pins_ + anchors_], default=0)
 
-    return Bounds(width_m=max(max_x_rect, max_x_poly, max_x_pts), height_m=max(max_y_rect, max_y_poly, max_y_pts))
+def _anchor_offset(shape: Optional[Shape], cx: float, cy: float, candidates: Tuple[Tuple[float, float], ...]) -> Optional[Tuple[float, float]]:
+    # Rectangles keep the first offset; polygon rooms mirror or halve an offset whose
+    # point would land outside the room or within half a meter of a wall.
+    if shape is None:
+        return cx + candidates[0][0], cy + candidates[0][1]
+    for dx, dy in candidates + tuple((dx / 2, dy / 2) for dx, dy in candidates):
+        px, py = cx + dx, cy + dy
+        if all(shape.contains(px + ex, py + ey) for ex, ey in ((0, 0), (0.5, 0), (-0.5, 0), (0, 0.5), (0, -0.5))):
+            return px, py
+    return None
 
 
-def recommend_anchors(rooms_: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def recommend_anchors(rooms_: List[Dict[str, Any]], per_room: Optional[int] = None) -> List[Dict[str, Any]]:
     out: List[Dict[str, Any]] = []
     for r in rooms_:
         room_id = r.get("id", "")
         if not room_id:
             continue
-        area = float(r.get("w", 0)) * float(r.get("h", 0))
+        # A forced per-room count can exceed what a narrow room fits, so those placements
+        # take the clearance-checked path that polygon rooms use.
+        shape = shape_of(r) if "points" in r or per_room is not None else None
+        area = shape.area if shape is not None else float(r.get("w", 0)) * float(r.get("h", 0))
         if area <= 0:
             continue
 
-        w = float(r["w"])
-        h = float(r["h"])
-        x0 = float(r["x"])
-        y0 = float(r["y"])
-        cx = x0 + w / 2
-        cy = y0 + h / 2
-
-        if area < 60:
+        if shape is not None:
+            w = shape.width
+            h = shape.height
+            cx, cy = shape.label_point()
+        else:
+            w = float(r["w"])
+            h = float(r["h"])
+            cx = float(r["x"]) + w / 2
+            cy = float(r["y"]) + h / 2
+
+        if per_room is not None:
+            count = per_room
+        elif area < 60:
             count = 1
         elif area < 150:
             count = 2
         else:
             count = 3
 
+        ox = max(1.0, min(w * 0.25, 4.0))
+        oy = max(1.0, min(h * 0.25, 4.0))
         points: List[Tuple[float, float]] = [(cx, cy)]
-        if count >= 2:
-            ox = max(1.0, min(w * 0.25, 4.0))
-            oy = max(1.0, min(h * 0.25, 4.0))
-            points.append((cx + ox, cy + oy))
-        if count >= 3:
-            ox = max(1.0, min(w * 0.25, 4.0))
-            oy = max(1.0, min(h * 0.25, 4.0))
-            points.append((cx - ox, cy + oy))
+        for candidates in (((ox, oy), (ox, -oy), (-ox, -oy)), ((-ox, oy), (-ox, -oy), (ox, -oy)))[: count - 1]:
+            point = _anchor_offset(shape, cx, cy, candidates)
+            if point is not None:
+                points.append(point)
 
         for idx, (ax, ay) in enumerate(points):
-            out.append(
-                {
-                    "id": f"anchor_suggested_{room_id}_{idx}",
-                    "name": f"Suggested Anchor {idx + 1}",
-                    "x": ax,
-                    "y": ay,
-                    "kind": "beacon",
-                    "room": room_id,
-                    "suggested": True,
-                    "color": "#FF1493",
-                }
-            )
+            anchor = {
+                "id": f"anchor_suggested_{room_id}_{idx}",
+                "name": f"Suggested Anchor {idx + 1}",
+                "x": ax,
+                "y": ay,
+                "kind": "beacon",
+                "room": room_id,
+                "suggested": True,
+                "color": "#FF1493",
+            }
+            # Suggested anchors sit on their room's floor; level_of() would put them on the first level.
+            if r.get("level"):
+                anchor["level"] = r["level"]
+            out.append(anchor)
     return out
 
 
+def validate_venue(venue: Dict[str, List[Dict[str, Any]]]) -> List[str]:
+    problems: List[str] = []
+    room_ids = {r.get("id") for r in venue.get("rooms", [])}
+    for name, items in venue.items():
+        seen = set()
+        for item in items:
+            key = item.get("id") or item.get("name")
+            if key in seen:
+                problems.append(f"{name}: duplicate id {key!r}")
+            seen.add(key)
+            if "points" in item:
+                rings = [item["points"], *(item.get("holes") or [])]
+                if any(len(ring) < 3 for ring in rings):
+                    problems.append(f"{name}/{key}: polygon ring needs at least 3 points")
+                elif name in ("rooms", "zones") and shape_of(item).area <= 0:
+                    problems.append(f"{name}/{key}: polygon has no area")
+            elif "w" in item and (float(item["w"]) <= 0 or float(item.get("h", 0)) <= 0):
+                problems.append(f"{name}/{key}: non-positive size")
+    for z in venue.get("zones", []):
+        if z.get("parent") and z["parent"] not in room_ids:
+            problems.append(f"zones/{z.get('id')}: unknown parent {z['parent']!r}")
+    levels_ = venue.get("levels") or levels
+    level_ids = {lv["id"] for lv in levels_}
+    for name, items in venue.items():
+        if name in ("levels", "stairs"):
+            continue
+        for item in items:
+            if item.get("level") and item["level"] not in level_ids:
+                problems.append(f"{name}/{item.get('id') or item.get('name')}: unknown level {item['level']!r}")
+    for s in venue.get("stairs", []):
+        for key in ("from_level", "to_level"):
+            if s.get(key) not in level_ids:
+                problems.append(f"stairs/{s.get('id') or s.get('name')}: unknown {key} {s.get(key)!r}")
+    return problems
+
+
 def generate_svg(
     rooms_: List[Dict[str, Any]],
     zones_: List[Dict[str, Any]],
@@ -152,17 +237,28 @@ def generate_svg(
     include_measurements: bool,
     include_labels: bool,
     include_markers: bool,
+    recorder: Optional[Recorder] = None,
+    stairs_: Optional[List[Dict[str, Any]]] = None,
+    extent: Optional[VenueExtent] = None,
+    extra_layers: Optional[Dict[str, Callable[[float], List[str]]]] = None,
 ) -> None:
+    rec = recorder_or_null(recorder)
+    stairs_ = stairs_ or []
     scale = 20
     padding = 50
 
-    bounds = compute_bounds_m(rooms_, zones_, doors_, polygons_, pins_, anchors_)
-    max_x = bounds.width_m * scale
-    max_y = bounds.height_m * scale
+    with rec.span("svg.bounds"):
+        if extent is None:
+            extent = VenueExtent({"rooms": rooms_, "zones": zones_, "doors": doors_, "polygons": polygons_, "pins": pins_, "anchors": anchors_, "stairs": stairs_})
+        frame = extent.frame()
+    min_x = frame.min_x * scale
+    min_y = frame.min_y * scale
+    max_x = frame.width * scale
+    max_y = frame.height * scale
 
     svg: List[str] = [
         f'<svg width="{max_x + padding * 2}" height="{max_y + padding * 2}" '
-        f'viewBox="-{padding} -{padding} {max_x + padding * 2} {max_y + padding * 2}" '
+        f'viewBox="{min_x - padding} {min_y - padding} {max_x + padding * 2} {max_y + padding * 2}" '
         f'xmlns="http://www.w3.org/2000/svg">',
         "<defs><style>",
         ".wall { fill: none; stroke: black; stroke-width: 3; }",
@@ -170,6 +266,7 @@ def generate_svg(
         ".zone-line { fill: none; stroke: #333; stroke-width: 1; stroke-dasharray: 5,5; }",
         ".room-fill { fill-opacity: 0.2; stroke: none; }",
         ".door-gap { fill: white; stroke: none; }",
+        ".stairs { fill: #EEE; stroke: #777; stroke-width: 1; }",
         ".dim-line { stroke: #555; stroke-width: 1; stroke-dasharray: 2; }",
         ".dim-text { font-family: sans-serif; font-size: 10px; fill: #666; text-anchor: middle; }",
         ".label-room { font-family: sans-serif; font-size: 14px; font-weight: bold; fill: black; text-anchor: middle; }",
@@ -180,122 +277,179 @@ def generate_svg(
         "</style></defs>",
     ]
 
-    if include_structure:
-        svg.append('<g id="layer1-structure">')
-        for r in rooms_:
-            svg.append(
-                f'<rect x="{r["x"] * scale}" y="{r["y"] * scale}" width="{r["w"] * scale}" height="{r["h"] * scale}" class="room-fill" fill="{r["color"]}" />'
-            )
-        for z in zones_:
-            svg.append(
-                f'<rect x="{z["x"] * scale}" y="{z["y"] * scale}" width="{z["w"] * scale}" height="{z["h"] * scale}" class="zone-fill" fill="{z["color"]}" />'
-            )
-            svg.append(
-                f'<rect x="{z["x"] * scale}" y="{z["y"] * scale}" width="{z["w"] * scale}" height="{z["h"] * scale}" class="zone-line" />'
-            )
-        for p in polygons_:
-            points_str = " ".join([f"{pt[0] * scale},{pt[1] * scale}" for pt in p["points"]])
-            svg.append(f'<polygon points="{points_str}" class="room-fill" fill="{p["color"]}" />')
-        for r in rooms_:
-            svg.append(
-                f'<rect x="{r["x"] * scale}" y="{r["y"] * scale}" width="{r["w"] * scale}" height="{r["h"] * scale}" class="wall" />'
-            )
-        for d in doors_:
-            svg.append(
-                f'<rect x="{(d["x"] * scale) - 2}" y="{(d["y"] * scale) - 2}" width="{(d["w"] * scale) + 4}" height="{(d["h"] * scale) + 4}" class="door-gap" />'
-            )
-        svg.append("</g>")
+    def outline(item: Dict[str, Any], klass: str, fill: Optional[str] = None) -> str:
+        fill_attr = f' fill="{fill}"' if fill else ""
+        if "points" not in item:
+            return f'<rect x="{item["x"] * scale}" y="{item["y"] * scale}" width="{item["w"] * scale}" height="{item["h"] * scale}" class="{klass}"{fill_attr} />'
+        d = " ".join("M " + " L ".join(f"{x * scale},{y * scale}" for x, y in ring) + " Z" for ring in shape_of(item).rings())
+        return f'<path d="{d}" fill-rule="evenodd" class="{klass}"{fill_attr} />'
 
-    if include_measurements:
-        svg.append('<g id="layer2-measurements">')
-
-        def draw_dim(x: float, y: float, w: float, h: float, val: float, axis: str) -> None:
-            if axis == "x":
-                sx, sy, ex, ey = x * scale, (y * scale) - 10, (x + w) * scale, (y * scale) - 10
-                svg.append(f'<line x1="{sx}" y1="{sy}" x2="{ex}" y2="{ey}" class="dim-line" />')
-                svg.append(f'<text x="{sx + (ex - sx) / 2}" y="{sy - 5}" class="dim-text">{val}m</text>')
-            else:
-                sx, sy, ex, ey = (x * scale) - 10, y * scale, (x * scale) - 10, (y + h) * scale
-                svg.append(f'<line x1="{sx}" y1="{sy}" x2="{ex}" y2="{ey}" class="dim-line" />')
-                svg.append(f'<text x="{sx - 15}" y="{sy + (ey - sy) / 2}" class="dim-text">{val}m</text>')
+    if include_structure:
+        with rec.span("svg.layer.structure"):
+            svg.append('<g id="layer1-structure">')
+            for r in rooms_:
+                svg.append(outline(r, "room-fill", r["color"]))
+            for z in zones_:
+                svg.append(outline(z, "zone-fill", z["color"]))
+                svg.append(outline(z, "zone-line"))
+            for p in polygons_:
+                points_str = " ".join([f"{pt[0] * scale},{pt[1] * scale}" for pt in p["points"]])
+                svg.append(f'<polygon points="{points_str}" class="room-fill" fill="{p["color"]}" />')
+            for r in rooms_:
+                svg.append(outline(r, "wall"))
+            for d in doors_:
+                svg.append(
+                    f'<rect x="{(d["x"] * scale) - 2}" y="{(d["y"] * scale) - 2}" width="{(d["w"] * scale) + 4}" height="{(d["h"] * scale) + 4}" class="door-gap" />'
+                )
+            for st in stairs_:
+                svg.append(
+                    f'<rect x="{st["x"] * scale}" y="{st["y"] * scale}" width="{st["w"] * scale}" height="{st["h"] * scale}" class="stairs" />'
+                )
+            svg.append("</g>")
 
-        for r in rooms_:
-            draw_dim(float(r["x"]), float(r["y"]), float(r["w"]), float(r["h"]), float(r["w"]), "x")
-            draw_dim(float(r["x"]), float(r["y"]), float(r["w"]), float(r["h"]), float(r["h"]), "y")
+    # Extra layers (analytics, heatmaps, ...) get the px-per-meter scale and return SVG
+    # elements; they sit above the structure and below measurements, labels and markers.
+    for name, render in (extra_layers or {}).items():
+        with rec.span(f"svg.layer.{name}"):
+            svg.append(f'<g id="layer-{name}">')
+            svg.extend(render(scale))
+            svg.append("</g>")
 
-        svg.append("</g>")
+    if include_measurements:
+        with rec.span("svg.layer.measurements"):
+            svg.append('<g id="layer2-measurements">')
+
+            def draw_dim(x: float, y: float, w: float, h: float, val: float, axis: str) -> None:
+                if axis == "x":
+                    sx, sy, ex, ey = x * scale, (y * scale) - 10, (x + w) * scale, (y * scale) - 10
+                    svg.append(f'<line x1="{sx}" y1="{sy}" x2="{ex}" y2="{ey}" class="dim-line" />')
+                    svg.append(f'<text x="{sx + (ex - sx) / 2}" y="{sy - 5}" class="dim-text">{val}m</text>')
+                else:
+                    sx, sy, ex, ey = (x * scale) - 10, y * scale, (x * scale) - 10, (y + h) * scale
+                    svg.append(f'<line x1="{sx}" y1="{sy}" x2="{ex}" y2="{ey}" class="dim-line" />')
+                    svg.append(f'<text x="{sx - 15}" y="{sy + (ey - sy) / 2}" class="dim-text">{val}m</text>')
+
+            for r in rooms_:
+                if "points" in r:
+                    # Polygon rooms are dimensioned by their bounding box.
+                    shape = shape_of(r)
+                    x, y, w, h = shape.bbox[0], shape.bbox[1], round(shape.width, 2), round(shape.height, 2)
+                else:
+                    x, y, w, h = float(r["x"]), float(r["y"]), float(r["w"]), float(r["h"])
+                draw_dim(x, y, w, h, w, "x")
+                draw_dim(x, y, w, h, h, "y")
+
+            svg.append("</g>")
+
+    layout = {}
+    if include_labels or include_markers:
+        with rec.span("svg.labels.place"):
+            venue = {"rooms": rooms_, "zones": zones_, "polygons": polygons_, "pins": pins_, "anchors": anchors_}
+            bounds = (min_x - padding, min_y - padding, min_x + max_x + padding, min_y + max_y + padding)
+            layout = map_labels(venue, lambda x, y: (x * scale, y * scale), 1.0, include_labels, include_markers, bounds=bounds)
+
+    def text(slot: Optional[Tuple[float, float, str]], klass: str, label: str, default_anchor: str) -> None:
+        if slot is None:
+            return
+        x, y, anchor = slot
+        attr = "" if anchor == default_anchor else f' text-anchor="{anchor}"'
+        svg.append(f'<text x="{x}" y="{y}" class="{klass}"{attr}>{label}</text>')
 
     if include_labels:
-        svg.append('<g id="layer3-labels">')
-        for r in rooms_:
-            cx, cy = (r["x"] + r["w"] / 2) * scale, (r["y"] + r["h"] / 2) * scale
-            if r.get("id") == "front_room":
-                cy += 20
-            svg.append(f'<text x="{cx}" y="{cy}" class="label-room">{r["name"]}</text>')
-        for z in zones_:
-            cx, cy = (z["x"] + z["w"] / 2) * scale, (z["y"] + z["h"] / 2) * scale
-            svg.append(f'<text x="{cx}" y="{cy}" class="label-zone">{z["name"]}</text>')
-        for p in polygons_:
-            if p.get("name"):
-                xs = [pt[0] for pt in p["points"]]
-                ys = [pt[1] for pt in p["points"]]
-                cx = sum(xs) / len(xs) * scale
-                cy = sum(ys) / len(ys) * scale
-                svg.append(f'<text x="{cx}" y="{cy}" class="label-room">{p["name"]}</text>')
-        svg.append("</g>")
+        with rec.span("svg.layer.labels"):
+            svg.append('<g id="layer3-labels">')
+            for r, slot in zip(rooms_, layout["rooms"]):
+                text(slot, "label-room", r["name"], "middle")
+            for z, slot in zip(zones_, layout["zones"]):
+                text(slot, "label-zone", z["name"], "middle")
+            for p, slot in zip(polygons_, layout["polygons"]):
+                text(slot, "label-room", p.get("name", ""), "middle")
+            svg.append("</g>")
 
     if include_markers:
-        svg.append('<g id="layer4-markers">')
+        with rec.span("svg.layer.markers"):
+            svg.append('<g id="layer4-markers">')
 
-        def marker(item: Dict[str, Any], radius: float, klass: str) -> None:
-            x = float(item["x"]) * scale
-            y = float(item["y"]) * scale
-            color = item.get("color", "#FF1493")
-            svg.append(f'<circle cx="{x}" cy="{y}" r="{radius}" fill="{color}" class="{klass}" />')
-            label = item.get("name") or item.get("id")
-            if label:
-                svg.append(f'<text x="{x + radius + 4}" y="{y + 4}" class="marker-label">{label}</text>')
+            def marker(item: Dict[str, Any], radius: float, klass: str, slot: Optional[Tuple[float, float, str]]) -> None:
+                x = float(item["x"]) * scale
+                y = float(item["y"]) * scale
+                color = item.get("color", "#FF1493")
+                svg.append(f'<circle cx="{x}" cy="{y}" r="{radius}" fill="{color}" class="{klass}" />')
+                text(slot, "marker-label", item.get("name") or item.get("id"), "start")
 
-        for p in pins_:
-            marker(p, radius=5, klass="marker-pin")
-        for a in anchors_:
-            marker(a, radius=7, klass="marker-anchor")
+            for p, slot in zip(pins_, layout["pins"]):
+                marker(p, radius=PIN_RADIUS_PX, klass="marker-pin", slot=slot)
+            for a, slot in zip(anchors_, layout["anchors"]):
+                marker(a, radius=ANCHOR_RADIUS_PX, klass="marker-anchor", slot=slot)
 
-        svg.append("</g>")
+            svg.append("</g>")
 
     svg.append("</svg>")
+    rec.count("svg.elements", len(svg))
 
-    with open(filename, "w") as f:
-        f.write("\n".join(svg))
+    with rec.span("svg.write"):
+        content = "\n".join(svg)
+        with open(filename, "w") as f:
+            f.write(content)
+    rec.count("svg.bytes", len(content.encode("utf-8")))
     print(f"Generated SVG: {filename}")
 
 
 
-def generate_geojson(
+def build_geojson(
     rooms_: List[Dict[str, Any]],
     zones_: List[Dict[str, Any]],
     polygons_: List[Dict[str, Any]],
     pins_: List[Dict[str, Any]],
     anchors_: List[Dict[str, Any]],
-    origin: Dict[str, float],
-    filename: str,
-    include_rooms: bool,
-    include_zones: bool,
-    include_polygons: bool,
-    include_pins: bool,
-    include_anchors: bool,
-    include_metadata: bool,
-) -> None:
+    origin: Dict[str, Any],
+    include_rooms: bool = True,
+    include_zones: bool = True,
+    include_polygons: bool = True,
+    include_pins: bool = True,
+    include_anchors: bool = True,
+    include_metadata: bool = True,
+    extra_properties: Optional[Dict[str, Dict[str, Any]]] = None,
+    metadata_properties: Optional[Dict[str, Any]] = None,
+    recorder: Optional[Recorder] = None,
+    levels_: Optional[List[Dict[str, Any]]] = None,
+    stairs_: Optional[List[Dict[str, Any]]] = None,
+    include_stairs: bool = True,
+    extent: Optional[VenueExtent] = None,
+    extra_layers: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+) -> Dict[str, Any]:
+    rec = recorder_or_null(recorder)
     features: List[Dict[str, Any]] = []
+    extra = extra_properties or {}
+    levels_ = levels_ or levels
+    stairs_ = stairs_ or []
+    elevation = {lv["id"]: float(lv.get("elevation_m", 0.0)) for lv in levels_}
+
+    def level_props(item: Dict[str, Any]) -> Dict[str, Any]:
+        level_id = level_of(item, levels_)
+        return {"level": level_id, "elevation_m": elevation.get(level_id, 0.0)}
+
+    def bbox_properties(box: Any) -> Dict[str, Any]:
+        if "matrix" in origin:
+            # A rotated map's corners are not its south-west / north-east extremes.
+            corners = [meters_to_gps(x, y, origin) for x in (box.min_x, box.max_x) for y in (box.min_y, box.max_y)]
+            lons = [c["lon"] for c in corners]
+            lats = [c["lat"] for c in corners]
+            return {"bbox_m": box.as_list(), "bbox": [min(lons), min(lats), max(lons), max(lats)]}
+        sw = meters_to_gps(box.min_x, box.max_y, origin)
+        ne = meters_to_gps(box.max_x, box.min_y, origin)
+        return {"bbox_m": box.as_list(), "bbox": [sw["lon"], sw["lat"], ne["lon"], ne["lat"]]}
 
     def make_rect_feature(item: Dict[str, Any], properties: Dict[str, Any], poly_type: str) -> Dict[str, Any]:
+        if "points" in item:
+            return make_shape_feature(item, properties, poly_type)
         tl = meters_to_gps(item["x"], item["y"], origin)
         tr = meters_to_gps(item["x"] + item["w"], item["y"], origin)
         br = meters_to_gps(item["x"] + item["w"], item["y"] + item["h"], origin)
         bl = meters_to_gps(item["x"], item["y"] + item["h"], origin)
         return {
             "type": "Feature",
-            "properties": {**properties, "type": poly_type},
+            "properties": {**properties, **level_props(item), **extra.get(properties.get("id", ""), {}), "type": poly_type},
             "geometry": {
                 "type": "Polygon",
                 "coordinates": [
@@ -310,12 +464,27 @@ def generate_geojson(
             },
         }
 
+    def make_shape_feature(item: Dict[str, Any], properties: Dict[str, Any], poly_type: str) -> Dict[str, Any]:
+        rings = []
+        for ring in shape_of(item).rings():
+            coords = []
+            for x, y in ring:
+                gps = meters_to_gps(x, y, origin)
+                coords.append([gps["lon"], gps["lat"]])
+            coords.append(coords[0])
+            rings.append(coords)
+        return {
+            "type": "Feature",
+            "properties": {**properties, **level_props(item), **extra.get(properties.get("id", ""), {}), "type": poly_type},
+            "geometry": {"type": "Polygon", "coordinates": rings},
+        }
+
     def make_poly_feature(item: Dict[str, Any], properties: Dict[str, Any]) -> Dict[str, Any]:
         coords = [[meters_to_gps(pt[0], pt[1], origin)["lon"], meters_to_gps(pt[0], pt[1], origin)["lat"]] for pt in item["points"]]
         coords.append(coords[0])
         return {
             "type": "Feature",
-            "properties": {**properties, "type": "Polygon"},
+            "properties": {**properties, **level_props(item), **extra.get(properties.get("id", ""), {}), "type": "Polygon"},
             "geometry": {"type": "Polygon", "coordinates": [coords]},
         }
 
@@ -323,81 +492,186 @@ def generate_geojson(
         gps = meters_to_gps(float(item["x"]), float(item["y"]), origin)
         return {
             "type": "Feature",
-            "properties": {**properties, "type": point_type, "x_m": float(item["x"]), "y_m": float(item["y"])},
+            "properties": {
+                **properties,
+                **level_props(item),
+                **extra.get(properties.get("id", ""), {}),
+                "type": point_type,
+                "x_m": float(item["x"]),
+                "y_m": float(item["y"]),
+            },
             "geometry": {"type": "Point", "coordinates": [gps["lon"], gps["lat"]]},
         }
 
-    bounds = compute_bounds_m(rooms_, zones_, [], polygons_, pins_, anchors_)
+    with rec.span("geojson.bounds"):
+        if extent is None:
+            extent = VenueExtent({"rooms": rooms_, "zones": zones_, "polygons": polygons_, "pins": pins_, "anchors": anchors_, "stairs": stairs_})
+        # Doors are not exported, so they do not count towards the GeoJSON extent.
+        exported = ("rooms", "zones", "polygons", "pins", "anchors", "stairs")
+        frame = extent.frame(exported)
+        bbox = extent.bbox(exported)
 
     if include_metadata:
-        features.append(
-            {
-                "type": "Feature",
-                "properties": {
-                    "type": "Metadata",
-                    "geo_origin_lat": origin["lat"],
-                    "geo_origin_lon": origin["lon"],
-                    "width_m": bounds.width_m,
-                    "height_m": bounds.height_m,
-                },
-                "geometry": {"type": "Point", "coordinates": [origin["lon"], origin["lat"]]},
-            }
-        )
+        with rec.span("geojson.Metadata"):
+            features.append(
+                {
+                    "type": "Feature",
+                    "properties": {
+                        "type": "Metadata",
+                        "geo_origin_lat": origin["lat"],
+                        "geo_origin_lon": origin["lon"],
+                        **({"geo_matrix": origin["matrix"]} if "matrix" in origin else {}),
+                        "width_m": frame.width,
+                        "height_m": frame.height,
+                        **(bbox_properties(bbox) if bbox is not None else {}),
+                        "levels": [{"id": lv["id"], "name": lv.get("name", ""), "elevation_m": elevation[lv["id"]]} for lv in levels_],
+                        **(metadata_properties or {}),
+                    },
+                    "geometry": {"type": "Point", "coordinates": [origin["lon"], origin["lat"]]},
+                }
+            )
 
     if include_rooms:
-        for r in rooms_:
-            features.append(make_rect_feature(r, {"id": r.get("id", ""), "name": r.get("name", ""), "height": r.get("h", None)}, "Room"))
+        with rec.span("geojson.Room"):
+            for r in rooms_:
+                depth = round(shape_of(r).height, 6) if "points" in r else r.get("h", None)
+                features.append(make_rect_feature(r, {"id": r.get("id", ""), "name": r.get("name", ""), "height": depth, "depth_m": depth}, "Room"))
+            rec.count("geojson.features.Room", len(rooms_))
 
     if include_zones:
-        for z in zones_:
-            features.append(make_rect_feature(z, {"id": z.get("id", ""), "name": z.get("name", ""), "parent": z.get("parent", "")}, "Zone"))
+        with rec.span("geojson.Zone"):
+            for z in zones_:
+                features.append(make_rect_feature(z, {"id": z.get("id", ""), "name": z.get("name", ""), "parent": z.get("parent", "")}, "Zone"))
+            rec.count("geojson.features.Zone", len(zones_))
 
     if include_polygons:
-        for p in polygons_:
-            features.append(make_poly_feature(p, {"id": p.get("id", ""), "name": p.get("name", "")}))
+        with rec.span("geojson.Polygon"):
+            for p in polygons_:
+                features.append(make_poly_feature(p, {"id": p.get("id", ""), "name": p.get("name", "")}))
+            rec.count("geojson.features.Polygon", len(polygons_))
 
     if include_pins:
-        for p in pins_:
-            features.append(
-                make_point_feature(
-                    p,
-                    {
-                        "id": p.get("id", ""),
-                        "name": p.get("name", ""),
-                        "kind": p.get("kind", "pin"),
-                        "color": p.get("color", ""),
-                    },
-                    "Pin",
+        with rec.span("geojson.Pin"):
+            for p in pins_:
+                features.append(
+                    make_point_feature(
+                        p,
+                        {
+                            "id": p.get("id", ""),
+                            "name": p.get("name", ""),
+                            "kind": p.get("kind", "pin"),
+                            "color": p.get("color", ""),
+                        },
+                        "Pin",
+                    )
                 )
-            )
+            rec.count("geojson.features.Pin", len(pins_))
 
     if include_anchors:
-        for a in anchors_:
-            features.append(
-                make_point_feature(
-                    a,
-                    {
-                        "id": a.get("id", ""),
-                        "name": a.get("name", ""),
-                        "kind": a.get("kind", "beacon"),
-                        "room": a.get("room", ""),
-                        "suggested": bool(a.get("suggested", False)),
-                        "color": a.get("color", ""),
-                        "roleId": a.get("roleId", None),
-                        "tgId": a.get("tgId", None),
-                    },
-                    "Anchor",
+        with rec.span("geojson.Anchor"):
+            for a in anchors_:
+                features.append(
+                    make_point_feature(
+                        a,
+                        {
+                            "id": a.get("id", ""),
+                            "name": a.get("name", ""),
+                            "kind": a.get("kind", "beacon"),
+                            "room": a.get("room", ""),
+                            "suggested": bool(a.get("suggested", False)),
+                            "color": a.get("color", ""),
+                            "roleId": a.get("roleId", None),
+                            "tgId": a.get("tgId", None),
+                        },
+                        "Anchor",
+                    )
                 )
-            )
+            rec.count("geojson.features.Anchor", len(anchors_))
+
+    if include_stairs:
+        with rec.span("geojson.Stairs"):
+            for st in stairs_:
+                props = {
+                    "id": st.get("id", ""),
+                    "name": st.get("name", ""),
+                    "from_level": st.get("from_level", ""),
+                    "to_level": st.get("to_level", ""),
+                }
+                feature = make_rect_feature({**st, "level": st.get("from_level")}, props, "Stairs")
+                features.append(feature)
+            rec.count("geojson.features.Stairs", len(stairs_))
 
-    geojson = {"type": "FeatureCollection", "features": features}
+    # Extra layers map a feature type to meter-space items: rectangles or polygons become
+    # Polygon features and bare points become Point features, with the item's `properties`.
+    for feature_type, items in (extra_layers or {}).items():
+        with rec.span(f"geojson.{feature_type}"):
+            for item in items:
+                props = dict(item.get("properties", {}))
+                if "w" in item or "points" in item:
+                    features.append(make_rect_feature(item, props, feature_type))
+                else:
+                    features.append(make_point_feature(item, props, feature_type))
+            rec.count(f"geojson.features.{feature_type}", len(items))
 
-    with open(filename, "w") as f:
-        json.dump(geojson, f, indent=2)
+    return {"type": "FeatureCollection", "features": features}
+
+
+def generate_geojson(
+    rooms_: List[Dict[str, Any]],
+    zones_: List[Dict[str, Any]],
+    polygons_: List[Dict[str, Any]],
+    pins_: List[Dict[str, Any]],
+    anchors_: List[Dict[str, Any]],
+    origin: Dict[str, Any],
+    filename: str,
+    include_rooms: bool,
+    include_zones: bool,
+    include_polygons: bool,
+    include_pins: bool,
+    include_anchors: bool,
+    include_metadata: bool,
+    extra_properties: Optional[Dict[str, Dict[str, Any]]] = None,
+    metadata_properties: Optional[Dict[str, Any]] = None,
+    recorder: Optional[Recorder] = None,
+    levels_: Optional[List[Dict[str, Any]]] = None,
+    stairs_: Optional[List[Dict[str, Any]]] = None,
+    include_stairs: bool = True,
+    extent: Optional[VenueExtent] = None,
+    extra_layers: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+) -> None:
+    rec = recorder_or_null(recorder)
+    geojson = build_geojson(
+        rooms_=rooms_,
+        zones_=zones_,
+        polygons_=polygons_,
+        pins_=pins_,
+        anchors_=anchors_,
+        origin=origin,
+        include_rooms=include_rooms,
+        include_zones=include_zones,
+        include_polygons=include_polygons,
+        include_pins=include_pins,
+        include_anchors=include_anchors,
+        include_metadata=include_metadata,
+        extra_properties=extra_properties,
+        metadata_properties=metadata_properties,
+        recorder=recorder,
+        levels_=levels_,
+        stairs_=stairs_,
+        include_stairs=include_stairs,
+        extent=extent,
+        extra_layers=extra_layers,
+    )
+
+    with rec.span("geojson.write"):
+        with open(filename, "w") as f:
+            json.dump(geojson, f, indent=2)
+            rec.count("geojson.bytes", f.tell())
     print(f"Generated GeoJSON: {filename}")
 
 
 def main() -> None:
+    parse_start = time.perf_counter()
     parser = argparse.ArgumentParser()
     parser.add_argument("--svg", dest="svg", action="store_true")
     parser.add_argument("--geojson", dest="geojson", action="store_true")
@@ -415,50 +689,209 @@ def main() -> None:
     parser.add_argument("--no-pins", dest="include_pins", action="store_false", default=True)
     parser.add_argument("--no-anchors", dest="include_anchors", action="store_false", default=True)
     parser.add_argument("--no-metadata", dest="include_metadata", action="store_false", default=True)
+    parser.add_argument("--no-stairs", dest="include_stairs", action="store_false", default=True)
+
+    parser.add_argument("--per-level", dest="per_level", action="store_true")
 
     parser.add_argument("--auto-anchors", dest="auto_anchors", action="store_true")
+    parser.add_argument("--subdivide", dest="subdivide", choices=("grid", "voronoi", "capacity"), default=None)
+    parser.add_argument("--max-virtual-area", dest="max_virtual_area", type=float, default=150.0)
 
-    args = parser.parse_args()
+    parser.add_argument("--edit-log", dest="edit_log", default=None)
+    parser.add_argument("--at-version", dest="at_version", type=int, default=None)
+    parser.add_argument("--diff", dest="diff", nargs=2, type=int, metavar=("FROM", "TO"), default=None)
+    parser.add_argument("--out-diff", dest="out_diff", default="detailed.diff.geojson")
+    parser.add_argument("--patch-from", dest="patch_from", default=None)
+    parser.add_argument("--out-patch", dest="out_patch", default="detailed.patch.json")
+
+    parser.add_argument("--georef", dest="georef", choices=("similarity", "affine"), default=None)
+    parser.add_argument("--survey", dest="survey", default=None)
 
-    anchors_out = list(anchors)
-    if args.auto_anchors:
-        anchors_out = anchors_out + recommend_anchors(rooms)
+    parser.add_argument("--timings-out", dest="timings_out", default=None)
+    parser.add_argument("--profile", dest="profile", action="store_true")
+
+    args = parser.parse_args()
+    if args.diff and not args.edit_log:
+        parser.error("--diff requires --edit-log")
+    if args.patch_from and not (args.geojson or not args.svg):
+        parser.error("--patch-from requires GeoJSON output")
+
+    recorder = Recorder(parse_start) if args.timings_out or args.profile else None
+    rec = recorder_or_null(recorder)
+    rec.add_span("parse", parse_start, time.perf_counter())
+    profiler = Profiler() if args.profile else None
+    if profiler is not None:
+        profiler.start()
+
+    def finish() -> None:
+        if recorder is None:
+            return
+        report = recorder.report()
+        if profiler is not None:
+            report.update(profiler.stop())
+        filename = args.timings_out or "detailed.profile.json"
+        with open(filename, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Generated timings: {filename}")
+
+    def georeference(pins_: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        # Surveyed pins replace the fixed GEO_ORIGIN with a fitted rotation/scale.
+        if not args.georef:
+            return GEO_ORIGIN, {}
+        import georef
+
+        with rec.span("georef"):
+            survey = georef.load_survey(args.survey) if args.survey else None
+            try:
+                ref = georef.fit(georef.surveyed_points(pins_, survey), args.georef)
+            except ValueError as e:
+                raise SystemExit(f"--georef: {e}")
+        props = ref.metadata_properties()
+        print(f"Georeference: {args.georef} fit from {props['georef_points']} points, rms {props['georef_rms_m']} m, max {props['georef_max_m']} m")
+        return ref.origin(), props
+
+    # The edit log is replayed on the curated collections, as `editlog.py` does, so both
+    # entry points see the same versions; suggested anchors are added afterwards.
+    venue = {
+        "rooms": rooms,
+        "zones": zones,
+        "doors": doors,
+        "polygons": polygons,
+        "pins": pins,
+        "anchors": list(anchors),
+        "levels": levels,
+        "stairs": stairs,
+    }
+    metadata_out: Optional[Dict[str, Any]] = None
+    if args.edit_log:
+        import editlog
+
+        try:
+            with rec.span("edit_log"):
+                log = editlog.EditLog.open(args.edit_log, venue)
+            if args.diff:
+                origin, _ = georeference(log.snapshot().items("pins"))
+                with rec.span("diff"):
+                    diff = editlog.diff_geojson(log, args.diff[0], args.diff[1], origin)
+                with open(args.out_diff, "w") as f:
+                    json.dump(diff, f, indent=2)
+                print(f"Generated GeoJSON diff: {args.out_diff}")
+                finish()
+                return
+            snapshot = log.snapshot(args.at_version)
+        except editlog.EditError as e:
+            parser.error(str(e))
+        venue = snapshot.materialize()
+        metadata_out = {"map_version": snapshot.version}
+
+    with rec.span("anchors"):
+        if args.auto_anchors:
+            venue["anchors"] = venue["anchors"] + recommend_anchors(venue["rooms"])
+
+    with rec.span("validate"):
+        for problem in validate_venue(venue):
+            print(f"Warning: {problem}")
+    origin, georef_properties = georeference(venue["pins"])
+    if georef_properties:
+        metadata_out = {**(metadata_out or {}), **georef_properties}
+
+    subdivide = None
+    if args.subdivide:
+        import subdivide
+
+        with rec.span("subdivide"):
+            plan = subdivide.subdivide_venue(venue["rooms"], args.subdivide, args.max_virtual_area)
+        venue = {**venue, "virtual_rooms": plan.virtual_rooms}
+        if args.auto_anchors:
+            # 3 anchors per virtual room replace the per-room suggestions.
+            venue["anchors"] = [a for a in venue["anchors"] if not a.get("suggested")] + plan.anchors
+    for name, items in venue.items():
+        rec.count(f"venue.{name}", len(items))
 
     if not args.svg and not args.geojson:
         args.svg = True
         args.geojson = True
 
-    if args.svg:
-        generate_svg(
-            rooms_=rooms,
-            zones_=zones,
-            doors_=doors,
-            polygons_=polygons,
-            pins_=pins,
-            anchors_=anchors_out,
-            filename=args.out_svg,
-            include_structure=args.include_structure,
-            include_measurements=args.include_measurements,
-            include_labels=args.include_labels,
-            include_markers=args.include_markers,
-        )
-
-    if args.geojson:
-        generate_geojson(
-            rooms_=rooms,
-            zones_=zones,
-            polygons_=polygons,
-            pins_=pins,
-            anchors_=anchors_out,
-            origin=GEO_ORIGIN,
-            filename=args.out_geojson,
-            include_rooms=args.include_rooms,
-            include_zones=args.include_zones,
-            include_polygons=args.include_polygons,
-            include_pins=args.include_pins,
-            include_anchors=args.include_anchors,
-            include_metadata=args.include_metadata,
-        )
+    outputs = [(venue, args.out_svg, args.out_geojson, None)]
+    if args.per_level:
+        for lv in venue["levels"]:
+            svg_stem, svg_ext = os.path.splitext(args.out_svg)
+            geojson_stem, geojson_ext = os.path.splitext(args.out_geojson)
+            outputs.append(
+                (
+                    venue_on_level(venue, lv["id"], venue["levels"]),
+                    f"{svg_stem}.{lv['id']}{svg_ext}",
+                    f"{geojson_stem}.{lv['id']}{geojson_ext}",
+                    lv["id"],
+                )
+            )
+
+    for venue_out, svg_filename, geojson_filename, level_id in outputs:
+        suffix = f".{level_id}" if level_id else ""
+        with rec.span(f"extent{suffix}"):
+            extent = VenueExtent(venue_out)
+        svg_layers = geojson_layers = None
+        if subdivide is not None:
+            svg_layers = {"virtual-rooms": subdivide.svg_layer(venue_out["virtual_rooms"])}
+            geojson_layers = {"VirtualRoom": subdivide.feature_items(venue_out["virtual_rooms"], venue_out["anchors"])}
+        if args.svg:
+            with rec.span(f"svg{suffix}"):
+                generate_svg(
+                    rooms_=venue_out["rooms"],
+                    zones_=venue_out["zones"],
+                    doors_=venue_out["doors"],
+                    polygons_=venue_out["polygons"],
+                    pins_=venue_out["pins"],
+                    anchors_=venue_out["anchors"],
+                    filename=svg_filename,
+                    include_structure=args.include_structure,
+                    include_measurements=args.include_measurements,
+                    include_labels=args.include_labels,
+                    include_markers=args.include_markers,
+                    recorder=recorder,
+                    stairs_=venue_out["stairs"],
+                    extent=extent,
+                    extra_layers=svg_layers,
+                )
+
+        if args.geojson:
+            with rec.span(f"geojson{suffix}"):
+                generate_geojson(
+                    rooms_=venue_out["rooms"],
+                    zones_=venue_out["zones"],
+                    polygons_=venue_out["polygons"],
+                    pins_=venue_out["pins"],
+                    anchors_=venue_out["anchors"],
+                    origin=origin,
+                    filename=geojson_filename,
+                    include_rooms=args.include_rooms,
+                    include_zones=args.include_zones,
+                    include_polygons=args.include_polygons,
+                    include_pins=args.include_pins,
+                    include_anchors=args.include_anchors,
+                    include_metadata=args.include_metadata,
+                    metadata_properties={**(metadata_out or {}), "level": level_id} if level_id else metadata_out,
+                    recorder=recorder,
+                    levels_=venue_out["levels"],
+                    stairs_=venue_out["stairs"],
+                    include_stairs=args.include_stairs,
+                    extent=extent,
+                    extra_layers=geojson_layers,
+                )
+
+    if args.patch_from:
+        import mappatch
+
+        with rec.span("patch"):
+            with open(args.patch_from) as f:
+                previous = json.load(f)
+            with open(args.out_geojson) as f:
+                current = json.load(f)
+            with open(args.out_patch, "w") as f:
+                json.dump(mappatch.make_patch(previous, current), f, separators=(",", ":"))
+        print(f"Generated patch: {args.out_patch}")
+
+    finish()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+"""Importable handle on the canonical generator (`map-generator-v6.py`).
+
+The generator's file name is not a valid module name, so tools that build on it
+load it through here:
+
+    from mapgen import v6
+    v6.meters_to_gps(1.0, 2.0, v6.GEO_ORIGIN)
+"""
+
+import importlib.util
+import json
+import os
+import sys
+from types import ModuleType
+from typing import Any, Dict, List
+
+GENERATOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "map-generator-v6.py")
+
+
+def _load_generator() -> ModuleType:
+    main = sys.modules.get("__main__")
+    if main is not None and os.path.abspath(getattr(main, "__file__", "") or "") == GENERATOR_PATH:
+        return main
+    if "map_generator_v6" in sys.modules:
+        return sys.modules["map_generator_v6"]
+    spec = importlib.util.spec_from_file_location("map_generator_v6", GENERATOR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["map_generator_v6"] = module
+    spec.loader.exec_module(module)  # type: ignore[union-attr]
+    return module
+
+
+v6 = _load_generator()
+
+
+def venue_collections() -> Dict[str, List[Dict[str, Any]]]:
+    return {
+        "rooms": v6.rooms,
+        "zones": v6.zones,
+        "doors": v6.doors,
+        "polygons": v6.polygons,
+        "pins": v6.pins,
+        "anchors": v6.anchors,
+        "levels": v6.levels,
+        "stairs": v6.stairs,
+    }
+
+
+def default_anchors() -> List[Dict[str, Any]]:
+    return list(v6.anchors) or v6.recommend_anchors(v6.rooms)
+
+
+def load_geojson_venue(filename: str) -> Dict[str, Any]:
+    """Read a `generate_geojson` output back into meter-space collections."""
+    with open(filename) as f:
+        collection = json.load(f)
+
+    origin = dict(v6.GEO_ORIGIN)
+    for feature in collection.get("features", []):
+        props = feature.get("properties", {})
+        if props.get("type") == "Metadata":
+            origin = {"lat": props["geo_origin_lat"], "lon": props["geo_origin_lon"]}
+            if "geo_matrix" in props:
+                origin["matrix"] = props["geo_matrix"]
+
+    def ring_to_meters(ring: List[List[float]]) -> List[List[float]]:
+        pts = [v6.gps_to_meters(lat, lon, origin) for lon, lat in ring]
+        out = [[round(p["x"], 6), round(p["y"], 6)] for p in pts]
+        if len(out) > 1 and out[0] == out[-1]:
+            out.pop()
+        return out
+
+    def shape_from_rings(rings: List[List[List[float]]]) -> Dict[str, Any]:
+        points = rings[0]
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+        if len(rings) == 1 and len(points) == 4 and all(x in (x0, x1) and y in (y0, y1) for x, y in points):
+            return {"x": x0, "y": y0, "w": x1 - x0, "h": y1 - y0}
+        out: Dict[str, Any] = {"points": points}
+        if len(rings) > 1:
+            out["holes"] = rings[1:]
+        return out
+
+    venue: Dict[str, Any] = {"origin": origin, "rooms": [], "zones": [], "polygons": [], "pins": [], "anchors": []}
+    for feature in collection.get("features", []):
+        props = dict(feature.get("properties", {}))
+        kind = props.pop("type", "")
+        geometry = feature.get("geometry") or {}
+        if kind in ("Room", "Zone"):
+            item = {**props, **shape_from_rings([ring_to_meters(ring) for ring in geometry["coordinates"]])}
+            venue["rooms" if kind == "Room" else "zones"].append(item)
+        elif kind == "Polygon":
+            venue["polygons"].append({**props, "points": ring_to_meters(geometry["coordinates"][0])})
+        elif kind in ("Pin", "Anchor"):
+            x, y = props.pop("x_m"), props.pop("y_m")
+            item = {**props, "x": x, "y": y}
+            venue["pins" if kind == "Pin" else "anchors"].append(item)
+    return venue
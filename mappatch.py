@@ -0,0 +1,253 @@
+"""Minimal patches between two `generate_geojson` outputs, plus a reference client applier.
+
+Features are matched by `(properties.type, properties.id)`. A patch lists removed keys,
+added features and, for modified features, RFC 6902 operations against the feature
+(`/properties/<name>`, `/geometry`). Content hashes of the base and target collections,
+plus the id of the previous patch, form a hash chain a client can verify before and
+after applying.
+
+    python3 mappatch.py diff maps/v1.geojson maps/v2.geojson --out v1-v2.patch.json
+    python3 mappatch.py apply maps/v1.geojson v1-v2.patch.json --out v2.geojson
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+PATCH_FORMAT = "venue-map-patch/1"
+
+Key = Tuple[str, str]
+
+
+def canonical_json(value: Any) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def content_hash(collection: Dict[str, Any]) -> str:
+    return "sha256:" + hashlib.sha256(canonical_json(collection)).hexdigest()
+
+
+def feature_key(feature: Dict[str, Any]) -> Key:
+    props = feature.get("properties") or {}
+    return (str(props.get("type", "")), str(props.get("id", "")))
+
+
+def _index(collection: Dict[str, Any]) -> Dict[Key, Dict[str, Any]]:
+    out: Dict[Key, Dict[str, Any]] = {}
+    for feature in collection.get("features", []):
+        key = feature_key(feature)
+        if key in out:
+            raise ValueError(f"Duplicate feature key {key}")
+        out[key] = feature
+    return out
+
+
+def _escape(token: str) -> str:
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def diff_properties(before: Dict[str, Any], after: Dict[str, Any], prefix: str = "/properties") -> List[Dict[str, Any]]:
+    ops: List[Dict[str, Any]] = []
+    for name in before:
+        if name not in after:
+            ops.append({"op": "remove", "path": f"{prefix}/{_escape(name)}"})
+    for name, value in after.items():
+        if name not in before:
+            ops.append({"op": "add", "path": f"{prefix}/{_escape(name)}", "value": value})
+        elif before[name] != value:
+            ops.append({"op": "replace", "path": f"{prefix}/{_escape(name)}", "value": value})
+    return ops
+
+
+def diff_feature(before: Dict[str, Any], after: Dict[str, Any]) -> List[Dict[str, Any]]:
+    ops = diff_properties(before.get("properties") or {}, after.get("properties") or {})
+    if before.get("geometry") != after.get("geometry"):
+        ops.append({"op": "replace", "path": "/geometry", "value": after.get("geometry")})
+    for name in sorted(set(before) | set(after)):
+        if name in ("type", "properties", "geometry"):
+            continue
+        if name not in after:
+            ops.append({"op": "remove", "path": f"/{_escape(name)}"})
+        elif before.get(name) != after[name]:
+            ops.append({"op": "add" if name not in before else "replace", "path": f"/{_escape(name)}", "value": after[name]})
+    return ops
+
+
+def make_patch(base: Dict[str, Any], target: Dict[str, Any], parent: Optional[str] = None) -> Dict[str, Any]:
+    base_index = _index(base)
+    target_index = _index(target)
+
+    removed = [list(k) for k in base_index if k not in target_index]
+    added = []
+    modified = []
+    for position, feature in enumerate(target.get("features", [])):
+        key = feature_key(feature)
+        if key not in base_index:
+            added.append({"index": position, "feature": feature})
+            continue
+        ops = diff_feature(base_index[key], feature)
+        if ops:
+            modified.append({"key": list(key), "ops": ops})
+
+    patch: Dict[str, Any] = {
+        "format": PATCH_FORMAT,
+        "parent": parent,
+        "base": content_hash(base),
+        "target": content_hash(target),
+        "removed": removed,
+        "added": added,
+        "modified": modified,
+    }
+    top_level = {k: v for k, v in target.items() if k != "features"}
+    if top_level != {k: v for k, v in base.items() if k != "features"}:
+        patch["collection"] = top_level
+
+    expected = [feature_key(f) for f in target.get("features", [])]
+    if [feature_key(f) for f in _apply_features(base, patch)] != expected:
+        patch["order"] = [list(k) for k in expected]
+    patch["id"] = patch_id(patch)
+    return patch
+
+
+def patch_id(patch: Dict[str, Any]) -> str:
+    body = {k: v for k, v in patch.items() if k != "id"}
+    return "sha256:" + hashlib.sha256(canonical_json(body)).hexdigest()
+
+
+# --- Reference client applier -------------------------------------------------------
+
+
+class PatchError(ValueError):
+    pass
+
+
+def apply_json_patch(document: Dict[str, Any], ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply RFC 6902 add/remove/replace/test operations in place and return the document."""
+    for op in ops:
+        tokens = [_unescape(t) for t in op["path"].split("/")[1:]]
+        if not tokens:
+            raise PatchError("Patching the document root is not supported")
+        parent: Any = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        kind = op["op"]
+        if isinstance(parent, list):
+            idx = len(parent) if last == "-" else int(last)
+            if kind == "add":
+                parent.insert(idx, op["value"])
+            elif kind == "remove":
+                del parent[idx]
+            elif kind == "replace":
+                parent[idx] = op["value"]
+            elif kind == "test" and parent[idx] != op["value"]:
+                raise PatchError(f"Test failed at {op['path']}")
+        else:
+            if kind in ("add", "replace"):
+                if kind == "replace" and last not in parent:
+                    raise PatchError(f"Cannot replace missing {op['path']}")
+                parent[last] = op["value"]
+            elif kind == "remove":
+                del parent[last]
+            elif kind == "test" and parent.get(last) != op["value"]:
+                raise PatchError(f"Test failed at {op['path']}")
+    return document
+
+
+def _apply_features(base: Dict[str, Any], patch: Dict[str, Any]) -> List[Dict[str, Any]]:
+    removed = {tuple(k) for k in patch["removed"]}
+    modified = {tuple(m["key"]): m["ops"] for m in patch["modified"]}
+    features = []
+    for feature in base.get("features", []):
+        key = feature_key(feature)
+        if key in removed:
+            continue
+        if key in modified:
+            feature = apply_json_patch(copy.deepcopy(feature), modified[key])
+        features.append(feature)
+    for entry in patch["added"]:
+        features.insert(min(entry["index"], len(features)), copy.deepcopy(entry["feature"]))
+    if patch.get("order"):
+        by_key = {feature_key(f): f for f in features}
+        features = [by_key[tuple(k)] for k in patch["order"]]
+    return features
+
+
+def apply_patch(base: Dict[str, Any], patch: Dict[str, Any], verify: bool = True) -> Dict[str, Any]:
+    if patch.get("format") != PATCH_FORMAT:
+        raise PatchError(f"Unsupported patch format {patch.get('format')!r}")
+    if verify and patch_id(patch) != patch.get("id"):
+        raise PatchError("Patch id does not match its contents")
+    if verify and content_hash(base) != patch["base"]:
+        raise PatchError("Base map does not match the patch's base hash")
+    result = dict(patch.get("collection") or {k: v for k, v in base.items() if k != "features"})
+    result["features"] = _apply_features(base, patch)
+    if verify and content_hash(result) != patch["target"]:
+        raise PatchError("Patched map does not match the patch's target hash")
+    return result
+
+
+def verify_chain(patches: List[Dict[str, Any]]) -> None:
+    for prev, nxt in zip(patches, patches[1:]):
+        if nxt.get("parent") != prev["id"] or nxt["base"] != prev["target"]:
+            raise PatchError(f"Patch {nxt.get('id')} does not follow {prev.get('id')}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    diff = sub.add_parser("diff")
+    diff.add_argument("base")
+    diff.add_argument("target")
+    diff.add_argument("--out", dest="out", default="detailed.patch.json")
+    diff.add_argument("--parent", dest="parent", default=None)
+
+    apply = sub.add_parser("apply")
+    apply.add_argument("base")
+    apply.add_argument("patches", nargs="+")
+    apply.add_argument("--out", dest="out", default="detailed.geojson")
+
+    args = parser.parse_args()
+
+    if args.command == "diff":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.target) as f:
+            target = json.load(f)
+        parent = args.parent
+        if parent and parent.endswith(".json"):
+            with open(parent) as f:
+                parent = json.load(f)["id"]
+        patch = make_patch(base, target, parent=parent)
+        with open(args.out, "w") as f:
+            json.dump(patch, f, separators=(",", ":"))
+        full = len(canonical_json(target))
+        size = len(canonical_json(patch))
+        print(
+            f"Generated patch: {args.out} (+{len(patch['added'])} -{len(patch['removed'])} ~{len(patch['modified'])}, "
+            f"{size} bytes vs {full} bytes full map)"
+        )
+    else:
+        with open(args.base) as f:
+            current = json.load(f)
+        patches = []
+        for filename in args.patches:
+            with open(filename) as f:
+                patches.append(json.load(f))
+        verify_chain(patches)
+        for patch in patches:
+            current = apply_patch(current, patch)
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Applied {len(patches)} patch(es): {args.out}")
+
+
+if __name__ == "__main__":
+    main()
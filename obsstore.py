@@ -0,0 +1,502 @@
+"""Columnar on-disk store for walk-test and live-crowd RSSI observations.
+
+One row per (scan time, device, anchor) reading:
+
+- `t`: int64 milliseconds since the Unix epoch (UTC)
+- `device`: int32 code into the store's device dictionary
+- `anchor`: int16 code into the anchors exported by `generate_geojson`
+- `rssi`: int8 dBm
+- `x`, `y`: float32 meters where the position is known (walk tests), NaN otherwise
+
+Rows are partitioned into `hour=<YYYY-MM-DDTHH>/room=<room id>/part-<n>.obs` files. Each
+file is sorted by time and split into chunks whose min/max statistics live in
+`manifest.json`, so time- and place-bounded queries open only the chunks that can match
+and read them through mmap.
+
+    python3 obsstore.py ingest --store obs --geojson detailed.geojson --csv night1.csv
+    python3 obsstore.py query --store obs --near-pin pin_hall_turn --radius 3 \\
+        --from 2026-10-19T22:00 --to 2026-10-19T23:00 --csv hall_turn.csv
+    python3 obsstore.py info --store obs
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from fingerprints import venue_key
+from mapgen import default_anchors, load_geojson_venue, v6
+from spatial import LevelIndex
+
+MAGIC = b"VOBS1\x00\x00\x00"
+ALIGN = 64
+CHUNK_ROWS = 65536
+HOUR_MS = 3_600_000
+UNKNOWN_ROOM = ""
+MANIFEST = "manifest.json"
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("t", "<i8"),
+    ("device", "<i4"),
+    ("anchor", "<i2"),
+    ("rssi", "i1"),
+    ("x", "<f4"),
+    ("y", "<f4"),
+)
+
+
+def _aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def parse_time(value: str) -> int:
+    """Epoch seconds or ISO 8601 (naive times are UTC) -> epoch milliseconds."""
+    try:
+        return int(round(float(value) * 1000))
+    except ValueError:
+        dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(round(dt.timestamp() * 1000))
+
+
+def hour_label(hour: int) -> str:
+    return datetime.fromtimestamp(hour * 3600, tz=timezone.utc).strftime("%Y-%m-%dT%H")
+
+
+def _partition_dir(hour: int, room: str) -> str:
+    return os.path.join(f"hour={hour_label(hour)}", f"room={quote(room or '_unknown', safe='')}")
+
+
+def chunk_stats(cols: Dict[str, np.ndarray], start: int, stop: int) -> Dict[str, Any]:
+    t = cols["t"][start:stop]
+    rssi = cols["rssi"][start:stop]
+    xs = cols["x"][start:stop]
+    ys = cols["y"][start:stop]
+    positioned = ~np.isnan(xs)
+    out: Dict[str, Any] = {
+        "start": start,
+        "count": stop - start,
+        "t": [int(t[0]), int(t[-1])],
+        "rssi": [int(rssi.min()), int(rssi.max())],
+        "anchor": [int(cols["anchor"][start:stop].min()), int(cols["anchor"][start:stop].max())],
+        "positioned": int(positioned.sum()),
+        "x": None,
+        "y": None,
+    }
+    if positioned.any():
+        out["x"] = [float(xs[positioned].min()), float(xs[positioned].max())]
+        out["y"] = [float(ys[positioned].min()), float(ys[positioned].max())]
+    return out
+
+
+def write_part(filename: str, cols: Dict[str, np.ndarray], chunk_rows: int = CHUNK_ROWS) -> List[Dict[str, Any]]:
+    """Write one time-sorted partition file; returns its chunk statistics."""
+    count = len(cols["t"])
+    offsets: Dict[str, int] = {name: 0 for name, _ in COLUMNS}
+    header = {"version": 1, "count": count, "columns": dict(COLUMNS), "offsets": offsets}
+    # Offsets depend on the header length, so size the header with placeholders first.
+    position = _aligned(len(MAGIC) + 8 + len(json.dumps(header)) + 16 * len(COLUMNS))
+    for name, dtype in COLUMNS:
+        offsets[name] = position
+        position = _aligned(position + count * np.dtype(dtype).itemsize)
+    blob = json.dumps(header).encode("utf-8")
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(blob)))
+        f.write(blob)
+        for name, dtype in COLUMNS:
+            f.write(b"\x00" * (offsets[name] - f.tell()))
+            f.write(np.ascontiguousarray(cols[name], dtype=dtype).tobytes())
+    return [chunk_stats(cols, start, min(start + chunk_rows, count)) for start in range(0, count, chunk_rows)]
+
+
+def _dictionary_codes(values: Iterable[Optional[str]], table: Dict[str, int]) -> np.ndarray:
+    """Codes of `values` in `table`, -1 where missing."""
+    return np.fromiter((table.get(v, -1) if v else -1 for v in values), dtype=np.int32)
+
+
+class _PartFile:
+    """mmap views of one partition file's columns; nothing is read until sliced."""
+
+    def __init__(self, filename: str) -> None:
+        with open(filename, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filename} is not an observation file")
+            (blob_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(blob_len).decode("utf-8"))
+        count = header["count"]
+        self.columns = {
+            name: np.memmap(filename, dtype=dtype, mode="r", offset=header["offsets"][name], shape=(count,))
+            for name, dtype in header["columns"].items()
+        }
+
+
+@dataclass(frozen=True)
+class ScanStats:
+    chunks_total: int
+    chunks_read: int
+    rows_read: int
+    rows_matched: int
+
+
+class ObservationStore:
+    def __init__(self, root: str, anchor_ids: Sequence[str], room_ids: Sequence[str]) -> None:
+        self.root = root
+        self.anchor_ids = list(anchor_ids)
+        self.room_ids = list(room_ids)
+        self.key = venue_key(self.anchor_ids, self.room_ids)
+        self.devices: List[str] = []
+        self.parts: List[Dict[str, Any]] = []
+        self._anchor_code = {a: i for i, a in enumerate(self.anchor_ids)}
+        self._device_code: Dict[str, int] = {}
+        self._venue: Optional[Dict[str, Any]] = None
+        self._room_index: Optional[LevelIndex] = None
+        self._open: Dict[str, _PartFile] = {}
+
+    @classmethod
+    def create(cls, root: str, venue: Dict[str, Any]) -> "ObservationStore":
+        store = cls(root, [a["id"] for a in venue["anchors"]], [r["id"] for r in venue["rooms"] if r.get("id")])
+        store.attach_venue(venue)
+        os.makedirs(root, exist_ok=True)
+        store.save_manifest()
+        return store
+
+    @classmethod
+    def open(cls, root: str) -> "ObservationStore":
+        with open(os.path.join(root, MANIFEST)) as f:
+            manifest = json.load(f)
+        store = cls(root, manifest["anchors"], manifest["rooms"])
+        if store.key != manifest["venue_key"]:
+            raise ValueError(f"{root}: venue key mismatch")
+        store.devices = list(manifest["devices"])
+        store._device_code = {d: i for i, d in enumerate(store.devices)}
+        store.parts = manifest["parts"]
+        return store
+
+    def attach_venue(self, venue: Dict[str, Any]) -> None:
+        anchor_ids = [a["id"] for a in venue["anchors"]]
+        if venue_key(anchor_ids, [r["id"] for r in venue["rooms"] if r.get("id")]) != self.key:
+            raise ValueError(f"Venue anchors/rooms do not match observation store {self.key}")
+        self._venue = venue
+        levels_ = venue.get("levels")
+        self._room_index = LevelIndex([r for r in venue["rooms"] if r.get("id")], levels_[0]["id"] if levels_ else None)
+
+    def save_manifest(self) -> None:
+        manifest = {
+            "version": 1,
+            "venue_key": self.key,
+            "anchors": self.anchor_ids,
+            "rooms": self.room_ids,
+            "devices": self.devices,
+            "parts": self.parts,
+        }
+        tmp = os.path.join(self.root, MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(self.root, MANIFEST))
+
+    def __len__(self) -> int:
+        return sum(chunk["count"] for part in self.parts for chunk in part["chunks"])
+
+    # Writing
+
+    def encode_devices(self, devices: Iterable[str]) -> np.ndarray:
+        """Device codes, interning new devices in first-seen order so codes are reproducible."""
+        devices = list(devices)
+        for device in dict.fromkeys(devices):
+            if device and device not in self._device_code:
+                self._device_code[device] = len(self.devices)
+                self.devices.append(device)
+        return _dictionary_codes(devices, self._device_code)
+
+    def _room_codes(
+        self, xs: np.ndarray, ys: np.ndarray, rooms: Optional[Sequence[Optional[str]]], levels: Optional[Sequence[Optional[str]]] = None
+    ) -> np.ndarray:
+        room_code = {r: i for i, r in enumerate(self.room_ids)}
+        codes = np.full(len(xs), -1, dtype=np.int32)
+        if rooms is not None:
+            codes[:] = _dictionary_codes(rooms, room_code)
+        missing = (codes < 0) & ~np.isnan(xs)
+        if not missing.any() or self._room_index is None:
+            return codes
+        level_of_row = np.array([lv or "" for lv in levels], dtype=object) if levels is not None else np.full(len(xs), "", dtype=object)
+        for level in sorted(set(level_of_row[missing])):
+            rows = missing & (level_of_row == level)
+            # A scan reports every anchor from one position, so locate each distinct position once per level.
+            packed = (xs[rows].view(np.uint32).astype(np.uint64) << np.uint64(32)) | ys[rows].view(np.uint32)
+            distinct, inverse = np.unique(packed, return_inverse=True)
+            px = (distinct >> np.uint64(32)).astype(np.uint32).view(np.float32)
+            py = (distinct & np.uint64(0xFFFFFFFF)).astype(np.uint32).view(np.float32)
+            located = np.array(
+                [room_code.get(self._room_index.locate(float(x), float(y), level or None) or UNKNOWN_ROOM, -1) for x, y in zip(px, py)],
+                dtype=np.int32,
+            )
+            codes[rows] = located[inverse.ravel()]
+        return codes
+
+    def append(
+        self,
+        t: Sequence[int],
+        devices: Sequence[str],
+        anchors: Sequence[str],
+        rssi: Sequence[float],
+        xs: Optional[Sequence[float]] = None,
+        ys: Optional[Sequence[float]] = None,
+        rooms: Optional[Sequence[Optional[str]]] = None,
+        levels: Optional[Sequence[Optional[str]]] = None,
+    ) -> int:
+        """Partition and write a batch of readings; rows for anchors not in the venue are dropped.
+
+        Rows without a room are located from x/y on their `levels` entry (the venue's first level when blank).
+        """
+        anchor = _dictionary_codes(anchors, self._anchor_code)
+        keep = anchor >= 0
+        n = len(anchor)
+        # Only devices on kept rows are interned, so dropped readings leave no manifest entries.
+        device = np.full(n, -1, dtype=np.int32)
+        device[keep] = self.encode_devices(d for d, k in zip(devices, keep) if k)
+        cols: Dict[str, np.ndarray] = {
+            "t": np.asarray(t, dtype=np.int64),
+            "device": device,
+            "anchor": anchor.astype(np.int16),
+            "rssi": np.clip(np.rint(np.asarray(rssi, dtype=np.float64)), -128, 127).astype(np.int8),
+            "x": np.full(n, np.nan, dtype=np.float32) if xs is None else np.asarray(xs, dtype=np.float32),
+            "y": np.full(n, np.nan, dtype=np.float32) if ys is None else np.asarray(ys, dtype=np.float32),
+        }
+        room = self._room_codes(cols["x"], cols["y"], rooms, levels)
+        if not keep.all():
+            cols = {name: col[keep] for name, col in cols.items()}
+            room = room[keep]
+        if len(room) == 0:
+            return 0
+
+        hour = cols["t"] // HOUR_MS
+        order = np.lexsort((cols["t"], room, hour))
+        cols = {name: col[order] for name, col in cols.items()}
+        hour, room = hour[order], room[order]
+        bounds = np.flatnonzero((np.diff(hour) != 0) | (np.diff(room) != 0)) + 1
+        for start, stop in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(room)]])):
+            h, code = int(hour[start]), int(room[start])
+            room_id = self.room_ids[code] if code >= 0 else UNKNOWN_ROOM
+            seq = sum(1 for p in self.parts if p["hour"] == h and p["room"] == room_id)
+            path = os.path.join(_partition_dir(h, room_id), f"part-{seq:05d}.obs")
+            chunks = write_part(os.path.join(self.root, path), {name: col[start:stop] for name, col in cols.items()})
+            self.parts.append({"path": path, "hour": h, "room": room_id, "chunks": chunks})
+        self.save_manifest()
+        return len(room)
+
+    # Reading
+
+    def _part(self, path: str) -> _PartFile:
+        part = self._open.get(path)
+        if part is None:
+            part = self._open[path] = _PartFile(os.path.join(self.root, path))
+        return part
+
+    def chunks(
+        self,
+        t0: Optional[int] = None,
+        t1: Optional[int] = None,
+        rooms: Optional[Sequence[str]] = None,
+        box: Optional[Tuple[float, float, float, float]] = None,
+    ) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(part, chunk) pairs whose statistics overlap `[t0, t1)`, `rooms` and `box`.
+
+        Chunks with no positioned rows cannot be ruled out by `box` and are kept; callers
+        that need positions filter rows afterwards.
+        """
+        lo_hour = None if t0 is None else t0 // HOUR_MS
+        hi_hour = None if t1 is None else (t1 - 1) // HOUR_MS
+        room_set = None if rooms is None else set(rooms)
+        for part in self.parts:
+            if lo_hour is not None and part["hour"] < lo_hour or hi_hour is not None and part["hour"] > hi_hour:
+                continue
+            if room_set is not None and part["room"] not in room_set:
+                continue
+            for chunk in part["chunks"]:
+                if t0 is not None and chunk["t"][1] < t0 or t1 is not None and chunk["t"][0] >= t1:
+                    continue
+                if box is not None and chunk["x"] is not None and chunk["positioned"] == chunk["count"]:
+                    if chunk["x"][1] < box[0] or chunk["x"][0] > box[2] or chunk["y"][1] < box[1] or chunk["y"][0] > box[3]:
+                        continue
+                yield part, chunk
+
+    def scan(
+        self,
+        t0: Optional[int] = None,
+        t1: Optional[int] = None,
+        rooms: Optional[Sequence[str]] = None,
+        near: Optional[Tuple[float, float, float]] = None,
+    ) -> Tuple[Dict[str, np.ndarray], ScanStats]:
+        """Rows in `[t0, t1)`, in `rooms`, and within `near=(x, y, radius)` meters.
+
+        Rows without a position pass the `near` test when their room is one of `rooms`.
+        Columns come back as arrays plus `room` (index into `room_ids`, -1 for unknown).
+        """
+        box = None if near is None else (near[0] - near[2], near[1] - near[2], near[0] + near[2], near[1] + near[2])
+        room_code = {r: i for i, r in enumerate(self.room_ids)}
+        pieces: List[Dict[str, np.ndarray]] = []
+        chunks_read = rows_read = 0
+        for part, chunk in self.chunks(t0, t1, rooms, box):
+            columns = self._part(part["path"]).columns
+            window = slice(chunk["start"], chunk["start"] + chunk["count"])
+            t = np.asarray(columns["t"][window])
+            mask = np.ones(len(t), dtype=bool)
+            if t0 is not None:
+                mask &= t >= t0
+            if t1 is not None:
+                mask &= t < t1
+            if near is not None:
+                xs = np.asarray(columns["x"][window])
+                ys = np.asarray(columns["y"][window])
+                positioned = ~np.isnan(xs)
+                close = np.zeros(len(t), dtype=bool)
+                close[positioned] = np.hypot(xs[positioned] - near[0], ys[positioned] - near[1]) <= near[2]
+                if rooms is None or part["room"] == UNKNOWN_ROOM:
+                    mask &= close
+                else:
+                    mask &= close | ~positioned
+            chunks_read += 1
+            rows_read += len(t)
+            if mask.any():
+                piece = {name: np.asarray(columns[name][window])[mask] for name, _ in COLUMNS}
+                piece["room"] = np.full(int(mask.sum()), room_code.get(part["room"], -1), dtype=np.int32)
+                pieces.append(piece)
+
+        names = [name for name, _ in COLUMNS] + ["room"]
+        if pieces:
+            out = {name: np.concatenate([p[name] for p in pieces]) for name in names}
+            order = np.argsort(out["t"], kind="stable")
+            out = {name: col[order] for name, col in out.items()}
+        else:
+            out = {name: np.empty(0, dtype=dtype) for name, dtype in [*COLUMNS, ("room", "<i4")]}
+        total = sum(len(part["chunks"]) for part in self.parts)
+        return out, ScanStats(total, chunks_read, rows_read, len(out["t"]))
+
+    def near(
+        self, x: float, y: float, radius_m: float, t0: Optional[int] = None, t1: Optional[int] = None
+    ) -> Tuple[Dict[str, np.ndarray], ScanStats]:
+        """`scan` around a point; the rooms within `radius_m` (plus unplaced rows) bound the partitions."""
+        if self._room_index is None:
+            raise ValueError("attach_venue() is needed to resolve rooms near a point")
+        rooms = [self._room_index.ids[i] for i in self._room_index.query_radius(x, y, radius_m)]
+        return self.scan(t0, t1, rooms + [UNKNOWN_ROOM], near=(x, y, radius_m))
+
+    def near_pin(
+        self, pin_id: str, radius_m: float, t0: Optional[int] = None, t1: Optional[int] = None
+    ) -> Tuple[Dict[str, np.ndarray], ScanStats]:
+        pins = {p["id"]: p for p in (self._venue or {}).get("pins", [])}
+        if pin_id not in pins:
+            raise KeyError(f"Unknown pin {pin_id!r}")
+        return self.near(float(pins[pin_id]["x"]), float(pins[pin_id]["y"]), radius_m, t0, t1)
+
+
+def read_observations_csv(filename: str) -> Dict[str, List[Any]]:
+    """Long-format CSV: `t,device,anchor,rssi` plus optional `x,y,room,level` columns."""
+    out: Dict[str, List[Any]] = {"t": [], "devices": [], "anchors": [], "rssi": [], "xs": [], "ys": [], "rooms": [], "levels": []}
+    with open(filename, newline="") as f:
+        for row in csv.DictReader(f):
+            out["t"].append(parse_time(row["t"]))
+            out["devices"].append(row["device"])
+            out["anchors"].append(row["anchor"])
+            out["rssi"].append(float(row["rssi"]))
+            out["xs"].append(float(row["x"]) if row.get("x") not in (None, "") else math.nan)
+            out["ys"].append(float(row["y"]) if row.get("y") not in (None, "") else math.nan)
+            out["rooms"].append(row.get("room") or None)
+            out["levels"].append(row.get("level") or None)
+    return out
+
+
+def _load_venue(geojson: Optional[str]) -> Dict[str, Any]:
+    if geojson:
+        return load_geojson_venue(geojson)
+    return {"rooms": v6.rooms, "pins": v6.pins, "anchors": default_anchors(), "levels": v6.levels}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest")
+    ingest.add_argument("--store", dest="store", required=True)
+    ingest.add_argument("--geojson", dest="geojson", default=None)
+    ingest.add_argument("--csv", dest="csv", action="append", required=True)
+
+    query = sub.add_parser("query")
+    query.add_argument("--store", dest="store", required=True)
+    query.add_argument("--geojson", dest="geojson", default=None)
+    query.add_argument("--from", dest="t0", default=None)
+    query.add_argument("--to", dest="t1", default=None)
+    query.add_argument("--room", dest="rooms", action="append", default=None)
+    query.add_argument("--near-pin", dest="near_pin", default=None)
+    query.add_argument("--radius", dest="radius", type=float, default=3.0)
+    query.add_argument("--csv", dest="csv", default=None)
+
+    info = sub.add_parser("info")
+    info.add_argument("--store", dest="store", required=True)
+
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        venue = _load_venue(args.geojson)
+        if os.path.exists(os.path.join(args.store, MANIFEST)):
+            store = ObservationStore.open(args.store)
+            store.attach_venue(venue)
+        else:
+            store = ObservationStore.create(args.store, venue)
+        for filename in args.csv:
+            rows = read_observations_csv(filename)
+            written = store.append(**rows)
+            print(f"Ingested {filename}: {written} of {len(rows['t'])} rows into {args.store}")
+    elif args.command == "query":
+        store = ObservationStore.open(args.store)
+        store.attach_venue(_load_venue(args.geojson))
+        t0 = parse_time(args.t0) if args.t0 else None
+        t1 = parse_time(args.t1) if args.t1 else None
+        if args.near_pin:
+            rows, stats = store.near_pin(args.near_pin, args.radius, t0, t1)
+        else:
+            rows, stats = store.scan(t0, t1, args.rooms)
+        print(
+            f"Matched {stats.rows_matched} rows; read {stats.chunks_read} of {stats.chunks_total} chunks ({stats.rows_read} rows)"
+        )
+        if args.csv:
+            with open(args.csv, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["t", "device", "anchor", "rssi", "x", "y", "room"])
+                for i in range(len(rows["t"])):
+                    room = int(rows["room"][i])
+                    device = int(rows["device"][i])
+                    writer.writerow(
+                        [
+                            int(rows["t"][i]) / 1000.0,
+                            store.devices[device] if device >= 0 else "",
+                            store.anchor_ids[rows["anchor"][i]],
+                            int(rows["rssi"][i]),
+                            "" if math.isnan(rows["x"][i]) else round(float(rows["x"][i]), 3),
+                            "" if math.isnan(rows["y"][i]) else round(float(rows["y"][i]), 3),
+                            store.room_ids[room] if room >= 0 else UNKNOWN_ROOM,
+                        ]
+                    )
+            print(f"Generated observations CSV: {args.csv}")
+    elif args.command == "info":
+        store = ObservationStore.open(args.store)
+        hours = sorted({part["hour"] for part in store.parts})
+        chunks = sum(len(part["chunks"]) for part in store.parts)
+        print(f"{args.store}: {len(store)} rows, {len(store.parts)} files, {chunks} chunks, {len(store.devices)} devices")
+        if hours:
+            print(f"Hours: {hour_label(hours[0])} .. {hour_label(hours[-1])} UTC")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Time-varying crowd occupancy layers and their effect on RF coverage / room classification.
+
+Each room and zone is an occupancy region (a cell belongs to its zone when it has one,
+otherwise to its room). People per square meter in a region turn into extra path loss
+for every anchor signal received in that region, proportional to the distance travelled
+(capped), so dense crowds hurt far anchors more than near ones. When occupancy changes,
+only the cells of the changed regions are recomputed.
+
+    python3 occupancy.py --series crowd.csv --every 900 --out-dir snapshots
+    python3 occupancy.py --full-house --steps 48
+"""
+
+import argparse
+import csv
+import os
+import random
+import time
+from bisect import bisect_right
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import rfmodel
+from mapgen import default_anchors, v6
+
+BODY_LOSS_DB_PER_M = 1.5
+CROWD_PATH_CAP_M = 15.0
+FULL_HOUSE_DENSITY = 2.0
+
+
+class OccupancySeries:
+    """Per-region step functions of people counts: `at(t)` returns the latest value at or before t."""
+
+    def __init__(self) -> None:
+        self._times: Dict[str, List[float]] = {}
+        self._values: Dict[str, List[float]] = {}
+
+    def add(self, region_id: str, t: float, people: float) -> None:
+        times = self._times.setdefault(region_id, [])
+        values = self._values.setdefault(region_id, [])
+        pos = bisect_right(times, t)
+        times.insert(pos, t)
+        values.insert(pos, people)
+
+    @classmethod
+    def from_csv(cls, filename: str) -> "OccupancySeries":
+        series = cls()
+        with open(filename, newline="") as f:
+            for row in csv.DictReader(f):
+                series.add(row["region"], float(row["t"]), float(row["people"]))
+        return series
+
+    def at(self, t: float) -> Dict[str, float]:
+        out = {}
+        for region_id, times in self._times.items():
+            pos = bisect_right(times, t)
+            out[region_id] = self._values[region_id][pos - 1] if pos else 0.0
+        return out
+
+    def span(self) -> Tuple[float, float]:
+        starts = [ts[0] for ts in self._times.values() if ts]
+        ends = [ts[-1] for ts in self._times.values() if ts]
+        return (min(starts), max(ends)) if starts else (0.0, 0.0)
+
+
+class CrowdModel:
+    def __init__(
+        self,
+        rooms_: List[Dict[str, Any]],
+        zones_: List[Dict[str, Any]],
+        anchors_: List[Dict[str, Any]],
+        cell_m: float = 0.5,
+        threshold_dbm: float = rfmodel.COVERAGE_THRESHOLD_DBM,
+        levels_: Optional[List[Dict[str, Any]]] = None,
+        level: Optional[str] = None,
+    ) -> None:
+        if level is not None:
+            default_level = (levels_ or v6.levels)[0]["id"]
+            rooms_ = [r for r in rooms_ if (r.get("level") or default_level) == level]
+            zones_ = [z for z in zones_ if (z.get("level") or default_level) == level]
+        self.grid = rfmodel.build_grid(rooms_, zones_, cell_m=cell_m, level=level)
+        self.threshold_dbm = threshold_dbm
+        grid = self.grid
+
+        self.region_ids = grid.room_ids + grid.zone_ids
+        self._region_code = {r: i for i, r in enumerate(self.region_ids)}
+        region = np.where(grid.zone_code >= 0, grid.zone_code + len(grid.room_ids), grid.room_code)
+        self.cell_region = region.astype(np.int32)
+        order = np.argsort(self.cell_region, kind="stable")
+        bounds = np.searchsorted(self.cell_region[order], np.arange(len(self.region_ids) + 1))
+        self._region_cells = [order[bounds[i] : bounds[i + 1]] for i in range(len(self.region_ids))]
+        self.region_area = np.array([len(c) * cell_m * cell_m for c in self._region_cells], dtype=np.float32)
+
+        distances = rfmodel.anchor_distances(grid, anchors_)
+        self.base_rssi = rfmodel.anchor_rssi(grid, anchors_, levels_)
+        self.crowd_path = np.minimum(distances, CROWD_PATH_CAP_M).astype(np.float32)
+        self.anchor_rooms = rfmodel.anchor_room_codes(grid, rooms_, anchors_, levels_)
+
+        self.people = np.zeros(len(self.region_ids), dtype=np.float32)
+        self.loss_rate = np.zeros(len(self.region_ids), dtype=np.float32)
+        self.rssi = self.base_rssi.copy()
+        self.covered = np.zeros(grid.size, dtype=bool)
+        self.predicted = np.full(grid.size, -1, dtype=np.int32)
+        self._in_room = grid.room_code >= 0
+        self._room_cells = np.bincount(grid.room_code[self._in_room], minlength=len(grid.room_ids)).astype(np.float64)
+        self._room_covered = np.zeros(len(grid.room_ids))
+        self._room_correct = np.zeros(len(grid.room_ids))
+        self.full_recompute()
+
+    def _cells_state(self, cells: np.ndarray) -> None:
+        rate = self.loss_rate[self.cell_region[cells]]
+        rate = np.where(self.cell_region[cells] >= 0, rate, 0.0)
+        rssi = self.base_rssi[:, cells] - rate[None, :] * self.crowd_path[:, cells]
+        self.rssi[:, cells] = rssi
+        self.covered[cells] = rfmodel.coverage(rssi, self.threshold_dbm)
+        self.predicted[cells] = rfmodel.classify(rssi, self.anchor_rooms)
+
+    def _room_tally(self, cells: np.ndarray, sign: float) -> None:
+        codes = self.grid.room_code[cells]
+        keep = codes >= 0
+        codes = codes[keep]
+        n = len(self.grid.room_ids)
+        self._room_covered += sign * np.bincount(codes, weights=self.covered[cells][keep], minlength=n)
+        self._room_correct += sign * np.bincount(codes, weights=self.predicted[cells][keep] == codes, minlength=n)
+
+    def full_recompute(self) -> None:
+        cells = np.arange(self.grid.size)
+        self._cells_state(cells)
+        self._room_covered[:] = 0
+        self._room_correct[:] = 0
+        self._room_tally(cells, 1.0)
+
+    def set_occupancy(self, counts: Dict[str, float]) -> int:
+        """Apply new people counts; returns the number of grid cells recomputed."""
+        changed = []
+        for region_id, people in counts.items():
+            code = self._region_code.get(region_id)
+            if code is None or self.people[code] == people:
+                continue
+            self.people[code] = people
+            density = people / self.region_area[code] if self.region_area[code] > 0 else 0.0
+            self.loss_rate[code] = BODY_LOSS_DB_PER_M * density
+            changed.append(code)
+        if not changed:
+            return 0
+        cells = np.concatenate([self._region_cells[c] for c in changed])
+        self._room_tally(cells, -1.0)
+        self._cells_state(cells)
+        self._room_tally(cells, 1.0)
+        return len(cells)
+
+    def room_metrics(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for code, room_id in enumerate(self.grid.room_ids):
+            n = max(self._room_cells[code], 1.0)
+            out[room_id] = {"coverage": float(self._room_covered[code] / n), "accuracy": float(self._room_correct[code] / n)}
+        return out
+
+    def snapshot_properties(self, t: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        metrics = self.room_metrics()
+        out: Dict[str, Dict[str, Any]] = {}
+        for code, region_id in enumerate(self.region_ids):
+            area = float(self.region_area[code])
+            props: Dict[str, Any] = {
+                "occupancy": float(self.people[code]),
+                "density_ppm2": round(float(self.people[code]) / area, 4) if area > 0 else 0.0,
+                "crowd_loss_db_per_m": round(float(self.loss_rate[code]), 4),
+            }
+            if region_id in metrics:
+                props["coverage"] = round(metrics[region_id]["coverage"], 4)
+                props["accuracy"] = round(metrics[region_id]["accuracy"], 4)
+            if t is not None:
+                props["occupancy_t"] = t
+            out[region_id] = props
+        return out
+
+
+def full_house_trace(model: CrowdModel, steps: int, churn: float = 0.2, seed: int = 7) -> Iterator[Dict[str, float]]:
+    """Synthetic doors-open ramp: each step a fraction of regions move toward full-house density."""
+    rng = random.Random(seed)
+    capacity = {r: float(model.region_area[i]) * FULL_HOUSE_DENSITY for i, r in enumerate(model.region_ids)}
+    current = {r: 0.0 for r in model.region_ids}
+    for step in range(steps):
+        fill = min(1.0, (step + 1) / max(steps * 0.6, 1))
+        update = {}
+        for region_id in rng.sample(model.region_ids, max(1, int(len(model.region_ids) * churn))):
+            target = capacity[region_id] * fill * rng.uniform(0.8, 1.1)
+            current[region_id] = round(target)
+            update[region_id] = current[region_id]
+        yield update
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--series", dest="series", default=None)
+    parser.add_argument("--every", dest="every", type=float, default=900.0)
+    parser.add_argument("--out-dir", dest="out_dir", default=None)
+    parser.add_argument("--cell", dest="cell_m", type=float, default=0.5)
+    parser.add_argument("--full-house", dest="full_house", action="store_true")
+    parser.add_argument("--steps", dest="steps", type=int, default=48)
+    parser.add_argument("--auto-anchors", dest="auto_anchors", action="store_true")
+    parser.add_argument("--level", dest="level", default=None)
+    args = parser.parse_args()
+    if args.steps < 1:
+        parser.error("--steps must be at least 1")
+    if args.every <= 0:
+        parser.error("--every must be positive")
+
+    anchors_out = list(v6.anchors) + v6.recommend_anchors(v6.rooms) if args.auto_anchors else default_anchors()
+    model = CrowdModel(v6.rooms, v6.zones, anchors_out, cell_m=args.cell_m, levels_=v6.levels, level=args.level)
+
+    def write_snapshot(label: str, t: Optional[float]) -> None:
+        if not args.out_dir:
+            return
+        os.makedirs(args.out_dir, exist_ok=True)
+        v6.generate_geojson(
+            rooms_=v6.rooms,
+            zones_=v6.zones,
+            polygons_=v6.polygons,
+            pins_=v6.pins,
+            anchors_=anchors_out,
+            origin=v6.GEO_ORIGIN,
+            filename=os.path.join(args.out_dir, f"occupancy-{label}.geojson"),
+            include_rooms=True,
+            include_zones=True,
+            include_polygons=True,
+            include_pins=True,
+            include_anchors=True,
+            include_metadata=True,
+            extra_properties=model.snapshot_properties(t),
+            levels_=v6.levels,
+            stairs_=v6.stairs,
+        )
+
+    if args.series:
+        series = OccupancySeries.from_csv(args.series)
+        start, end = series.span()
+        t = start
+        while t <= end:
+            cells = model.set_occupancy(series.at(t))
+            print(f"t={t:g}: recomputed {cells}/{model.grid.size} cells")
+            write_snapshot(f"{int(t)}", t)
+            t += args.every
+
+    if args.full_house:
+        incremental = 0.0
+        full = 0.0
+        touched = 0
+        for step, update in enumerate(full_house_trace(model, args.steps)):
+            t0 = time.perf_counter()
+            touched += model.set_occupancy(update)
+            incremental += time.perf_counter() - t0
+            t0 = time.perf_counter()
+            model.full_recompute()
+            full += time.perf_counter() - t0
+        write_snapshot("full-house", None)
+        print(
+            f"Full house: {args.steps} steps, {touched / args.steps:.0f}/{model.grid.size} cells per step, "
+            f"incremental {incremental / args.steps * 1e3:.3f} ms/step vs full {full / args.steps * 1e3:.3f} ms/step"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""Particle-filter tracker: map-matched device tracks from anchor RSSI scans.
+
+Every device is a cloud of particles (x, y, heading) with log-weights. For each scan:
+
+1. Predict: each particle walks for the time since the device's last scan. It pauses
+   with probability `p_stop`, otherwise it moves at about walking speed with a drifting
+   heading. A particle whose step crosses a wall (`walls.build_walls`, so door gaps are
+   open) is killed and stays where it was. If a device loses every particle, the move is
+   undone instead.
+2. Weight: log-distance RSSI likelihood of the heard anchors (`rfmodel.path_loss_rssi`),
+   optionally minus the attenuation of walls between the anchor and the particle.
+3. Resample (systematic) the devices whose effective sample size fell below half.
+
+A device's first scan seeds its particles around its strongest anchor, at points that
+anchor can see without crossing a wall.
+
+All steps run on (devices, particles) arrays at once. A batch is split into rounds (one
+scan per device per round, as in `transitions.scan_rounds`), and with `workers > 1` each
+round's devices are spread over a process pool. Particles are stored as float32:
+16 bytes each, so 10,000 tracks of 200 particles take 32 MB.
+
+    tracker = ParticleTracker(build_walls(rooms, doors), anchors, n_particles=200, workers=4)
+    xs, ys, spread = tracker.process(devices, t, scans)   # scans: [{"anchor_id": rssi, ...}, ...]
+
+    python3 particles.py --devices 10000 --seconds 10 --workers 4
+    python3 particles.py --rooms 200 --devices 2000
+"""
+
+import argparse
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rfmodel import MIN_DISTANCE_M, PATH_LOSS_EXPONENT, TX_POWER_DBM, path_loss_rssi
+from transitions import scan_rounds
+from walls import WallSet, build_walls
+
+N_PARTICLES = 200
+WALK_SPEED_MPS = 1.0
+SPEED_SIGMA_MPS = 0.5
+TURN_SIGMA_RAD = 0.6
+JITTER_M = 0.2
+P_STOP = 0.3
+RSSI_SIGMA_DB = 6.0
+MAX_DT_S = 5.0
+INIT_MAX_M = 8.0
+CHUNK_DEVICES = 2048
+
+
+@dataclass(frozen=True)
+class ParticleModel:
+    walls: WallSet
+    ax: np.ndarray
+    ay: np.ndarray
+    walk_speed: float = WALK_SPEED_MPS
+    speed_sigma: float = SPEED_SIGMA_MPS
+    turn_sigma: float = TURN_SIGMA_RAD
+    jitter_m: float = JITTER_M
+    p_stop: float = P_STOP
+    rssi_sigma_db: float = RSSI_SIGMA_DB
+    wall_loss: bool = False
+
+    def initial(self, n_particles: int, heard: np.ndarray, rssi: np.ndarray, valid: np.ndarray, rng: np.random.Generator) -> Tuple[np.ndarray, ...]:
+        """Particles around each device's strongest anchor, at points visible from it."""
+        d = len(heard)
+        best = np.argmax(np.where(valid, rssi, -np.inf), axis=1)
+        anchor = heard[np.arange(d), best]
+        strongest = rssi[np.arange(d), best]
+        reach = np.clip(10.0 ** ((TX_POWER_DBM - strongest) / (10.0 * PATH_LOSS_EXPONENT)), 1.0, INIT_MAX_M)
+        cx = np.repeat(self.ax[anchor], n_particles).reshape(d, n_particles)
+        cy = np.repeat(self.ay[anchor], n_particles).reshape(d, n_particles)
+        x = cx + rng.normal(0, 1, (d, n_particles)) * reach[:, None]
+        y = cy + rng.normal(0, 1, (d, n_particles)) * reach[:, None]
+        hidden = self.walls.crossings(cx, cy, x, y)[0].reshape(d, n_particles) > 0
+        x = np.where(hidden, cx + rng.normal(0, self.jitter_m, (d, n_particles)), x)
+        y = np.where(hidden, cy + rng.normal(0, self.jitter_m, (d, n_particles)), y)
+        heading = rng.uniform(-np.pi, np.pi, (d, n_particles))
+        return x.astype(np.float32), y.astype(np.float32), heading.astype(np.float32), np.zeros((d, n_particles), dtype=np.float32)
+
+    def predict(self, x: np.ndarray, y: np.ndarray, heading: np.ndarray, logw: np.ndarray, dt: np.ndarray, rng: np.random.Generator) -> Tuple[np.ndarray, ...]:
+        shape = x.shape
+        dt = np.clip(dt, 0.0, MAX_DT_S)[:, None]
+        heading = heading + rng.normal(0, self.turn_sigma, shape) * np.sqrt(dt)
+        speed = np.abs(rng.normal(self.walk_speed, self.speed_sigma, shape)) * (rng.random(shape) >= self.p_stop)
+        nx = x + np.cos(heading) * speed * dt + rng.normal(0, self.jitter_m, shape) * np.sqrt(dt)
+        ny = y + np.sin(heading) * speed * dt + rng.normal(0, self.jitter_m, shape) * np.sqrt(dt)
+        blocked = self.walls.crossings(x, y, nx, ny)[0].reshape(shape) > 0
+        # A device whose every live particle hit a wall keeps its cloud where it was.
+        stuck = (blocked | np.isneginf(logw)).all(axis=1)
+        blocked &= ~stuck[:, None]
+        moved = ~blocked & ~stuck[:, None]
+        x = np.where(moved, nx, x).astype(np.float32)
+        y = np.where(moved, ny, y).astype(np.float32)
+        logw = np.where(blocked, -np.inf, logw).astype(np.float32)
+        return x, y, heading.astype(np.float32), logw
+
+    def log_likelihood(self, x: np.ndarray, y: np.ndarray, heard: np.ndarray, rssi: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        out = np.empty(x.shape, dtype=np.float32)
+        for start in range(0, len(x), CHUNK_DEVICES):
+            s = slice(start, start + CHUNK_DEVICES)
+            ax = self.ax[heard[s]][:, None, :]
+            ay = self.ay[heard[s]][:, None, :]
+            px, py = x[s][:, :, None], y[s][:, :, None]
+            predicted = path_loss_rssi(np.maximum(np.hypot(px - ax, py - ay), MIN_DISTANCE_M))
+            if self.wall_loss:
+                predicted = predicted - self.walls.crossings(ax, ay, px, py)[1].reshape(predicted.shape).astype(np.float32)
+            z = (rssi[s][:, None, :] - predicted) / self.rssi_sigma_db
+            out[s] = -0.5 * np.sum(np.where(valid[s][:, None, :], z * z, 0.0), axis=2)
+        return out
+
+    def update(self, logw: np.ndarray, ll: np.ndarray, rng: np.random.Generator, *arrays: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Add `ll`, normalize, and resample the devices whose effective sample size fell below half."""
+        logw = logw + ll
+        logw -= logw.max(axis=1, keepdims=True)
+        w = np.exp(logw)
+        w /= w.sum(axis=1, keepdims=True)
+        n = w.shape[1]
+        low = np.flatnonzero(1.0 / np.sum(w * w, axis=1) < n / 2)
+        if len(low):
+            # Systematic resampling of every low row at once: search the rows' stacked CDFs.
+            cdf = np.cumsum(w[low], axis=1)
+            cdf[:, -1] = 1.0
+            cdf += np.arange(len(low))[:, None]
+            u = (np.arange(n)[None, :] + rng.random((len(low), 1))) / n + np.arange(len(low))[:, None]
+            picks = np.searchsorted(cdf.ravel(), u.ravel()).reshape(len(low), n) - np.arange(len(low))[:, None] * n
+            arrays = tuple(a.copy() for a in arrays)
+            for a in arrays:
+                a[low] = np.take_along_axis(a[low], picks, axis=1)
+            logw[low] = 0.0
+            w[low] = 1.0 / n
+        return (logw.astype(np.float32), w) + arrays
+
+    def step(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        heading: np.ndarray,
+        logw: np.ndarray,
+        dt: np.ndarray,
+        heard: np.ndarray,
+        rssi: np.ndarray,
+        valid: np.ndarray,
+        new: np.ndarray,
+        rng: np.random.Generator,
+    ) -> Tuple[np.ndarray, ...]:
+        """One scan for each of a batch of devices; returns the new particles and the (x, y, spread) estimates."""
+        x, y, heading, logw = self.predict(x, y, heading, logw, dt, rng)
+        fresh = np.flatnonzero(new & valid.any(axis=1))
+        if len(fresh):
+            x[fresh], y[fresh], heading[fresh], logw[fresh] = self.initial(x.shape[1], heard[fresh], rssi[fresh], valid[fresh], rng)
+        logw, w, x, y, heading = self.update(logw, self.log_likelihood(x, y, heard, rssi, valid), rng, x, y, heading)
+        mx = np.sum(w * x, axis=1)
+        my = np.sum(w * y, axis=1)
+        spread = np.sqrt(np.sum(w * ((x - mx[:, None]) ** 2 + (y - my[:, None]) ** 2), axis=1))
+        return x, y, heading, logw, mx, my, spread
+
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(model: ParticleModel) -> None:
+    _WORKER["model"] = model
+
+
+def _step_chunk(args: Tuple[Any, ...]) -> Tuple[np.ndarray, ...]:
+    seed, *arrays = args
+    return _WORKER["model"].step(*arrays, rng=np.random.default_rng(seed))
+
+
+class ParticleTracker:
+    """Particle clouds for every device seen, in (devices, particles) float32 arrays."""
+
+    def __init__(
+        self,
+        walls: WallSet,
+        anchors_: List[Dict[str, Any]],
+        n_particles: int = N_PARTICLES,
+        workers: int = 1,
+        seed: int = 0,
+        capacity: int = 1024,
+        **params: Any,
+    ) -> None:
+        self.anchor_index = {a["id"]: i for i, a in enumerate(anchors_) if a.get("id")}
+        self.model = ParticleModel(
+            walls,
+            np.array([float(a["x"]) for a in anchors_], dtype=np.float32),
+            np.array([float(a["y"]) for a in anchors_], dtype=np.float32),
+            **params,
+        )
+        self.n_particles = n_particles
+        self.workers = workers
+        self.seed = seed
+        self._rounds = 0
+        self.slots: Dict[str, int] = {}
+        self.x = np.zeros((capacity, n_particles), dtype=np.float32)
+        self.y = np.zeros((capacity, n_particles), dtype=np.float32)
+        self.heading = np.zeros((capacity, n_particles), dtype=np.float32)
+        self.logw = np.zeros((capacity, n_particles), dtype=np.float32)
+        self.last_t = np.full(capacity, np.nan)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "ParticleTracker":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    @property
+    def nbytes(self) -> int:
+        n = len(self.slots)
+        return n * self.n_particles * 16 + n * self.last_t.itemsize
+
+    def _slots_for(self, devices: Sequence[str]) -> np.ndarray:
+        for device in devices:
+            if device not in self.slots:
+                self.slots[device] = len(self.slots)
+        if len(self.slots) > len(self.last_t):
+            grow = max(len(self.slots), 2 * len(self.last_t)) - len(self.last_t)
+            pad = np.zeros((grow, self.n_particles), dtype=np.float32)
+            self.x, self.y, self.heading, self.logw = (np.concatenate([a, pad]) for a in (self.x, self.y, self.heading, self.logw))
+            self.last_t = np.append(self.last_t, np.full(grow, np.nan))
+        return np.fromiter((self.slots[d] for d in devices), dtype=np.int64, count=len(devices))
+
+    def _scans(self, scans: Sequence[Dict[str, float]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Pad {anchor_id: rssi} scans into (scans, k) anchor index / RSSI / valid arrays."""
+        k = max((len(s) for s in scans), default=0) or 1
+        heard = np.zeros((len(scans), k), dtype=np.int64)
+        rssi = np.zeros((len(scans), k), dtype=np.float32)
+        valid = np.zeros((len(scans), k), dtype=bool)
+        for i, scan in enumerate(scans):
+            j = 0
+            for anchor_id, value in scan.items():
+                code = self.anchor_index.get(anchor_id)
+                if code is not None and value is not None and not math.isnan(value):
+                    heard[i, j], rssi[i, j], valid[i, j] = code, value, True
+                    j += 1
+        return heard, rssi, valid
+
+    def process(self, devices: Sequence[str], t: Sequence[float], scans: Sequence[Dict[str, float]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Filter a batch of scans (any mix of devices, times in seconds); returns (x, y, spread) per scan.
+
+        Scans that hear none of the tracker's anchors only advance the motion model.
+        """
+        n = len(t)
+        slots = self._slots_for(devices)
+        tt = np.asarray(t, dtype=np.float64)
+        heard, rssi, valid = self._scans(scans)
+        out = np.full((3, n), np.nan, dtype=np.float32)
+        if n == 0:
+            return out[0], out[1], out[2]
+        if self.workers > 1 and self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.model,))
+
+        for idx in scan_rounds(slots, tt):
+            s = slots[idx]
+            new = np.isnan(self.last_t[s])
+            dt = np.where(new, 0.0, tt[idx] - self.last_t[s])
+            # A device starts being tracked with its first scan that hears a known anchor.
+            started = ~new | valid[idx].any(axis=1)
+            self.last_t[s] = np.where(started, tt[idx], np.nan)
+            self._rounds += 1
+            parts = np.array_split(np.arange(len(s)), self.workers if self._pool is not None else 1)
+            jobs = [
+                ((self.seed, self._rounds, k), self.x[s[p]], self.y[s[p]], self.heading[s[p]], self.logw[s[p]], dt[p], heard[idx[p]], rssi[idx[p]], valid[idx[p]], new[p])
+                for k, p in enumerate(parts)
+                if len(p)
+            ]
+            if self._pool is not None:
+                results = list(self._pool.map(_step_chunk, jobs))
+            else:
+                _init_worker(self.model)
+                results = [_step_chunk(job) for job in jobs]
+            for p, (x, y, heading, logw, mx, my, spread) in zip((p for p in parts if len(p)), results):
+                self.x[s[p]], self.y[s[p]], self.heading[s[p]], self.logw[s[p]] = x, y, heading, logw
+                out[0, idx[p]], out[1, idx[p]], out[2, idx[p]] = np.where(started[p], [mx, my, spread], np.nan)
+        return out[0], out[1], out[2]
+
+
+def simulate(
+    walls: WallSet, anchors_: List[Dict[str, Any]], n_devices: int, seconds: int, rate_hz: float = 1.0, noise_db: float = 4.0, max_heard: int = 6, seed: int = 1
+) -> Any:
+    """Ground-truth walks that respect walls, with the RSSI scans they would produce.
+
+    Yields (devices, t, truth_x, truth_y, scans) per tick. Devices start next to random
+    anchors; each scan holds the `max_heard` strongest anchors above -95 dBm.
+    """
+    rng = np.random.default_rng(seed)
+    model = ParticleModel(walls, np.array([float(a["x"]) for a in anchors_]), np.array([float(a["y"]) for a in anchors_]), p_stop=0.1, jitter_m=0.05)
+    ids = [a["id"] for a in anchors_]
+    start = rng.integers(0, len(anchors_), n_devices)
+    x = (model.ax[start] + rng.normal(0, 0.3, n_devices))[:, None]
+    y = (model.ay[start] + rng.normal(0, 0.3, n_devices))[:, None]
+    heading = rng.uniform(-np.pi, np.pi, (n_devices, 1))
+    logw = np.zeros((n_devices, 1))
+    devices = [f"dev{i}" for i in range(n_devices)]
+    dt = 1.0 / rate_hz
+    for k in range(int(seconds * rate_hz)):
+        if k:
+            x, y, heading, logw = model.predict(x, y, heading, logw, np.full(n_devices, dt), rng)
+        px, py = x[:, 0].astype(np.float64), y[:, 0].astype(np.float64)
+        distances = np.maximum(np.hypot(px[:, None] - model.ax[None, :], py[:, None] - model.ay[None, :]), MIN_DISTANCE_M)
+        loss = walls.crossings(model.ax[None, :], model.ay[None, :], px[:, None], py[:, None])[1].reshape(distances.shape)
+        rssi = path_loss_rssi(distances) - loss + rng.normal(0, noise_db, distances.shape)
+        top = np.argsort(-rssi, axis=1)[:, :max_heard]
+        scans = [{ids[j]: float(rssi[i, j]) for j in top[i] if rssi[i, j] > -95.0} for i in range(n_devices)]
+        yield devices, np.full(n_devices, k * dt), px, py, scans
+
+
+def main() -> None:
+    from mapgen import default_anchors, venue_collections, v6
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", dest="devices", type=int, default=1000)
+    parser.add_argument("--particles", dest="particles", type=int, default=N_PARTICLES)
+    parser.add_argument("--seconds", dest="seconds", type=int, default=10)
+    parser.add_argument("--workers", dest="workers", type=int, default=1)
+    parser.add_argument("--rooms", dest="rooms", type=int, default=0, help="track on a synthetic venue of this many rooms")
+    parser.add_argument("--wall-loss", dest="wall_loss", action="store_true")
+    parser.add_argument("--seed", dest="seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.rooms:
+        import synthetic
+
+        venue = synthetic.build_venue(args.rooms)
+        anchors_ = venue["anchors"] + v6.recommend_anchors(venue["rooms"])
+    else:
+        venue = venue_collections()
+        anchors_ = default_anchors()
+    walls = build_walls(venue["rooms"], venue["doors"])
+    print(f"{len(walls)} walls, {len(anchors_)} anchors, {args.devices} devices x {args.particles} particles")
+
+    errors: List[np.ndarray] = []
+    elapsed = 0.0
+    with ParticleTracker(walls, anchors_, args.particles, args.workers, args.seed, wall_loss=args.wall_loss) as tracker:
+        for devices, t, truth_x, truth_y, scans in simulate(walls, anchors_, args.devices, args.seconds):
+            start = time.perf_counter()
+            xs, ys, _spread = tracker.process(devices, t, scans)
+            elapsed += time.perf_counter() - start
+            errors.append(np.hypot(xs - truth_x, ys - truth_y))
+        scans_total = args.devices * args.seconds
+        print(f"{scans_total} scans in {elapsed:.2f} s ({scans_total / elapsed:,.0f} scans/s), {tracker.nbytes / args.devices / 1024:.1f} KiB per track")
+    final = errors[-1][~np.isnan(errors[-1])]
+    print(f"Error after {args.seconds} s: median {np.median(final):.2f} m, p90 {np.percentile(final, 90):.2f} m")
+
+
+if __name__ == "__main__":
+    main()
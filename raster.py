@@ -0,0 +1,646 @@
+"""Raster backend: PNG/WebP images and tiles painted with NumPy from the SVG layer model.
+
+The four layers `generate_svg` draws (structure, measurements, labels, markers) plus
+optional simulation overlays are turned into display lists in full-image pixel space.
+Each tile culls the display list against its window, paints the surviving ops into a
+premultiplied RGBA array and composites the layers. Tiles are rendered across a process
+pool, and every layer tile is cached on disk under a hash of that layer's content, so
+editing markers does not repaint the structure.
+
+At `--scale 20` (the SVG's pixels per meter) a PNG matches `detailed.svg` pixel for
+pixel, apart from antialiasing and the built-in 5x7 font (upper case only).
+
+    python3 raster.py                                  # detailed.png
+    python3 raster.py --scale 40 --out detailed@2x.png
+    python3 raster.py --tiles tiles --scales 10,20,40 --tile-px 256 --workers 4
+    python3 raster.py --overlay coverage --out coverage.png
+    python3 raster.py --format webp --out detailed.webp   # needs Pillow
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from extent import VenueExtent
+from geometry import Shape, shape_of
+from labels import ANCHOR_RADIUS_PX, MARKER_FONT_PX, PIN_RADIUS_PX, ROOM_FONT_PX, ZONE_FONT_PX, map_labels
+from mapgen import default_anchors, load_geojson_venue, v6, venue_collections
+
+try:
+    from PIL import Image
+except ImportError:  # WebP output is optional
+    Image = None
+
+SVG_SCALE = 20
+SVG_PADDING = 50
+STYLE_VERSION = 4
+LAYERS = ("structure", "overlay", "measurements", "labels", "markers")
+LAYER_COLLECTIONS = {
+    "structure": ("rooms", "zones", "polygons", "doors", "stairs"),
+    "measurements": ("rooms",),
+    # Labels and marker names are placed together (labels.map_labels), so each depends on both.
+    "labels": ("rooms", "zones", "polygons", "pins", "anchors"),
+    "markers": ("rooms", "zones", "polygons", "pins", "anchors"),
+}
+
+# 5x7 glyphs, one byte per column, bit 0 = top row.
+FONT_5X7: Dict[str, Tuple[int, ...]] = {
+    " ": (0x00, 0x00, 0x00, 0x00, 0x00),
+    "0": (0x3E, 0x51, 0x49, 0x45, 0x3E),
+    "1": (0x00, 0x42, 0x7F, 0x40, 0x00),
+    "2": (0x42, 0x61, 0x51, 0x49, 0x46),
+    "3": (0x21, 0x41, 0x45, 0x4B, 0x31),
+    "4": (0x18, 0x14, 0x12, 0x7F, 0x10),
+    "5": (0x27, 0x45, 0x45, 0x45, 0x39),
+    "6": (0x3C, 0x4A, 0x49, 0x49, 0x30),
+    "7": (0x01, 0x71, 0x09, 0x05, 0x03),
+    "8": (0x36, 0x49, 0x49, 0x49, 0x36),
+    "9": (0x06, 0x49, 0x49, 0x29, 0x1E),
+    "A": (0x7E, 0x11, 0x11, 0x11, 0x7E),
+    "B": (0x7F, 0x49, 0x49, 0x49, 0x36),
+    "C": (0x3E, 0x41, 0x41, 0x41, 0x22),
+    "D": (0x7F, 0x41, 0x41, 0x22, 0x1C),
+    "E": (0x7F, 0x49, 0x49, 0x49, 0x41),
+    "F": (0x7F, 0x09, 0x09, 0x09, 0x01),
+    "G": (0x3E, 0x41, 0x49, 0x49, 0x7A),
+    "H": (0x7F, 0x08, 0x08, 0x08, 0x7F),
+    "I": (0x00, 0x41, 0x7F, 0x41, 0x00),
+    "J": (0x20, 0x40, 0x41, 0x3F, 0x01),
+    "K": (0x7F, 0x08, 0x14, 0x22, 0x41),
+    "L": (0x7F, 0x40, 0x40, 0x40, 0x40),
+    "M": (0x7F, 0x02, 0x0C, 0x02, 0x7F),
+    "N": (0x7F, 0x04, 0x08, 0x10, 0x7F),
+    "O": (0x3E, 0x41, 0x41, 0x41, 0x3E),
+    "P": (0x7F, 0x09, 0x09, 0x09, 0x06),
+    "Q": (0x3E, 0x41, 0x51, 0x21, 0x5E),
+    "R": (0x7F, 0x09, 0x19, 0x29, 0x46),
+    "S": (0x46, 0x49, 0x49, 0x49, 0x31),
+    "T": (0x01, 0x01, 0x7F, 0x01, 0x01),
+    "U": (0x3F, 0x40, 0x40, 0x40, 0x3F),
+    "V": (0x1F, 0x20, 0x40, 0x20, 0x1F),
+    "W": (0x3F, 0x40, 0x38, 0x40, 0x3F),
+    "X": (0x63, 0x14, 0x08, 0x14, 0x63),
+    "Y": (0x07, 0x08, 0x70, 0x08, 0x07),
+    "Z": (0x61, 0x51, 0x49, 0x45, 0x43),
+    ".": (0x00, 0x60, 0x60, 0x00, 0x00),
+    ",": (0x00, 0x50, 0x30, 0x00, 0x00),
+    ":": (0x00, 0x36, 0x36, 0x00, 0x00),
+    "-": (0x08, 0x08, 0x08, 0x08, 0x08),
+    "_": (0x40, 0x40, 0x40, 0x40, 0x40),
+    "+": (0x08, 0x08, 0x3E, 0x08, 0x08),
+    "/": (0x20, 0x10, 0x08, 0x04, 0x02),
+    ">": (0x00, 0x41, 0x22, 0x14, 0x08),
+    "<": (0x08, 0x14, 0x22, 0x41, 0x00),
+    "(": (0x00, 0x1C, 0x22, 0x41, 0x00),
+    ")": (0x00, 0x41, 0x22, 0x1C, 0x00),
+    "&": (0x36, 0x49, 0x55, 0x22, 0x50),
+    "'": (0x00, 0x05, 0x03, 0x00, 0x00),
+    "%": (0x23, 0x13, 0x08, 0x64, 0x62),
+    "#": (0x14, 0x7F, 0x14, 0x7F, 0x14),
+    "?": (0x02, 0x01, 0x51, 0x09, 0x06),
+}
+
+NAMED_COLORS = {"white": "#FFFFFF", "black": "#000000"}
+
+Color = Tuple[float, float, float, float]
+Op = Tuple[Tuple[float, float, float, float], str, Tuple[Any, ...]]
+
+
+def rgba(color: str, opacity: float = 1.0) -> Color:
+    color = NAMED_COLORS.get(color, color).lstrip("#")
+    if len(color) == 3:
+        color = "".join(c * 2 for c in color)
+    r, g, b = (int(color[i : i + 2], 16) / 255.0 for i in (0, 2, 4))
+    return r, g, b, opacity
+
+
+@dataclass(frozen=True)
+class Overlay:
+    """Per-cell values on a regular meter grid, drawn as a semi-transparent heat layer."""
+
+    name: str
+    x0: float
+    y0: float
+    cell_m: float
+    nx: int
+    ny: int
+    values: np.ndarray
+    vmin: float
+    vmax: float
+    opacity: float = 0.45
+
+    def content_hash(self) -> str:
+        h = hashlib.sha256(json.dumps([self.name, self.x0, self.y0, self.cell_m, self.nx, self.ny, self.vmin, self.vmax, self.opacity]).encode())
+        h.update(np.ascontiguousarray(self.values, dtype=np.float32).tobytes())
+        return h.hexdigest()
+
+
+def heat_colors(t: np.ndarray) -> np.ndarray:
+    """Blue -> green -> yellow -> red ramp for t in [0, 1]."""
+    stops = np.array([[0.19, 0.30, 0.85], [0.15, 0.75, 0.35], [0.98, 0.85, 0.20], [0.86, 0.15, 0.15]], dtype=np.float32)
+    pos = np.clip(t, 0.0, 1.0) * (len(stops) - 1)
+    lo = np.minimum(pos.astype(np.int32), len(stops) - 2)
+    frac = (pos - lo)[..., None]
+    return stops[lo] * (1 - frac) + stops[lo + 1] * frac
+
+
+class Canvas:
+    """Premultiplied RGBA float32 pixels for a window of the full image."""
+
+    def __init__(self, x0: int, y0: int, width: int, height: int) -> None:
+        self.x0 = x0
+        self.y0 = y0
+        self.width = width
+        self.height = height
+        self.pixels = np.zeros((height, width, 4), dtype=np.float32)
+
+    def _region(self, x0: float, y0: float, x1: float, y1: float) -> Optional[Tuple[int, int, int, int]]:
+        # Pixel (i, j) is covered when its center lies inside [x0, x1) x [y0, y1).
+        i0 = max(int(math.ceil(x0 - 0.5)) - self.x0, 0)
+        j0 = max(int(math.ceil(y0 - 0.5)) - self.y0, 0)
+        i1 = min(int(math.ceil(x1 - 0.5)) - self.x0, self.width)
+        j1 = min(int(math.ceil(y1 - 0.5)) - self.y0, self.height)
+        if i0 >= i1 or j0 >= j1:
+            return None
+        return i0, j0, i1, j1
+
+    def _centers(self, region: Tuple[int, int, int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        i0, j0, i1, j1 = region
+        xs = np.arange(i0, i1, dtype=np.float32) + self.x0 + 0.5
+        ys = np.arange(j0, j1, dtype=np.float32) + self.y0 + 0.5
+        return np.meshgrid(xs, ys)
+
+    def _blend(self, region: Tuple[int, int, int, int], color: Color, mask: Optional[np.ndarray] = None) -> None:
+        i0, j0, i1, j1 = region
+        r, g, b, a = color
+        src = np.array([r * a, g * a, b * a, a], dtype=np.float32)
+        dst = self.pixels[j0:j1, i0:i1]
+        if mask is None:
+            dst *= 1.0 - a
+            dst += src
+        else:
+            dst[mask] = dst[mask] * (1.0 - a) + src
+
+    def fill_rect(self, x0: float, y0: float, x1: float, y1: float, color: Color) -> None:
+        region = self._region(x0, y0, x1, y1)
+        if region is not None:
+            self._blend(region, color)
+
+    def fill_shape(self, rings: Sequence[Sequence[Tuple[float, float]]], color: Color) -> None:
+        shape = Shape(tuple(rings[0]), tuple(tuple(r) for r in rings[1:]))
+        region = self._region(*shape.bbox)
+        if region is None:
+            return
+        gx, gy = self._centers(region)
+        mask = np.asarray(shape.contains_many(gx.ravel(), gy.ravel())).reshape(gx.shape)
+        self._blend(region, color, mask)
+
+    def stroke(self, points: Sequence[Tuple[float, float]], closed: bool, width: float, color: Color, dash: float = 0.0) -> None:
+        half = width / 2.0
+        segments = list(zip(points, points[1:] + points[:1] if closed else points[1:]))
+        for (ax, ay), (bx, by) in segments:
+            region = self._region(min(ax, bx) - half, min(ay, by) - half, max(ax, bx) + half, max(ay, by) + half)
+            if region is None:
+                continue
+            gx, gy = self._centers(region)
+            dx, dy = bx - ax, by - ay
+            length2 = dx * dx + dy * dy
+            t = np.clip(((gx - ax) * dx + (gy - ay) * dy) / length2, 0.0, 1.0) if length2 > 0 else np.zeros_like(gx)
+            px = ax + t * dx - gx
+            py = ay + t * dy - gy
+            mask = px * px + py * py <= half * half
+            if dash > 0:
+                mask &= (t * math.sqrt(length2)) % (2 * dash) < dash
+            self._blend(region, color, mask)
+
+    def fill_circle(self, cx: float, cy: float, radius: float, color: Color) -> None:
+        region = self._region(cx - radius, cy - radius, cx + radius, cy + radius)
+        if region is None:
+            return
+        gx, gy = self._centers(region)
+        self._blend(region, color, (gx - cx) ** 2 + (gy - cy) ** 2 <= radius * radius)
+
+    def text(self, x: float, baseline: float, label: str, glyph_px: int, color: Color, anchor: str, bold: bool) -> None:
+        width = text_width(label, glyph_px)
+        left = x - width / 2 if anchor == "middle" else x - width if anchor == "end" else x
+        top = baseline - 7 * glyph_px
+        region = self._region(left, top, left + width + (1 if bold else 0), baseline)
+        if region is None:
+            return
+        i0, j0, i1, j1 = region
+        bitmap = text_bitmap(label, glyph_px, bold)
+        ox = i0 + self.x0 - int(math.ceil(left - 0.5))
+        oy = j0 + self.y0 - int(math.ceil(top - 0.5))
+        mask = bitmap[oy : oy + (j1 - j0), ox : ox + (i1 - i0)]
+        if mask.shape != (j1 - j0, i1 - i0):
+            padded = np.zeros((j1 - j0, i1 - i0), dtype=bool)
+            padded[: mask.shape[0], : mask.shape[1]] = mask
+            mask = padded
+        self._blend(region, color, mask)
+
+    def heat(self, overlay: Overlay, x0: float, y0: float, cell_px: float) -> None:
+        region = self._region(x0, y0, x0 + overlay.nx * cell_px, y0 + overlay.ny * cell_px)
+        if region is None:
+            return
+        gx, gy = self._centers(region)
+        ix = np.clip(((gx - x0) / cell_px).astype(np.int32), 0, overlay.nx - 1)
+        iy = np.clip(((gy - y0) / cell_px).astype(np.int32), 0, overlay.ny - 1)
+        values = np.asarray(overlay.values, dtype=np.float32).reshape(overlay.ny, overlay.nx)[iy, ix]
+        valid = np.isfinite(values)
+        span = max(overlay.vmax - overlay.vmin, 1e-9)
+        colors = heat_colors((values[valid] - overlay.vmin) / span)
+        a = overlay.opacity
+        i0, j0, i1, j1 = region
+        dst = self.pixels[j0:j1, i0:i1]
+        src = np.concatenate([colors * a, np.full((len(colors), 1), a, dtype=np.float32)], axis=-1)
+        dst[valid] = dst[valid] * (1.0 - a) + src
+
+
+def text_width(label: str, glyph_px: int) -> float:
+    return max(len(label) * 6 - 1, 0) * glyph_px
+
+
+def text_bitmap(label: str, glyph_px: int, bold: bool) -> np.ndarray:
+    columns: List[int] = []
+    for ch in label.upper():
+        columns.extend(FONT_5X7.get(ch, FONT_5X7["?"]))
+        columns.append(0)
+    cols = np.array(columns[:-1] or [0], dtype=np.uint8)
+    bits = ((cols[None, :] >> np.arange(7, dtype=np.uint8)[:, None]) & 1).astype(bool)
+    bitmap = np.repeat(np.repeat(bits, glyph_px, axis=0), glyph_px, axis=1)
+    if bold:
+        bitmap = np.pad(bitmap, ((0, 0), (0, 1)))
+        bitmap[:, 1:] |= bitmap[:, :-1].copy()
+    return bitmap
+
+
+@dataclass(frozen=True)
+class Frame:
+    """Maps meters to full-image pixels the same way `generate_svg` does."""
+
+    min_x: float
+    min_y: float
+    scale: float
+    padding: float
+    width: int
+    height: int
+
+    @property
+    def zoom(self) -> float:
+        return self.scale / SVG_SCALE
+
+    def px(self, x: float, y: float) -> Tuple[float, float]:
+        return (x - self.min_x) * self.scale + self.padding, (y - self.min_y) * self.scale + self.padding
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"min_x_m": self.min_x, "min_y_m": self.min_y, "px_per_m": self.scale, "padding_px": self.padding, "width_px": self.width, "height_px": self.height}
+
+
+def make_frame(extent: VenueExtent, scale: float) -> Frame:
+    box = extent.frame()
+    padding = SVG_PADDING * scale / SVG_SCALE
+    return Frame(
+        min_x=float(box.min_x),
+        min_y=float(box.min_y),
+        scale=scale,
+        padding=padding,
+        width=int(math.ceil(box.width * scale + 2 * padding)),
+        height=int(math.ceil(box.height * scale + 2 * padding)),
+    )
+
+
+def _rings_px(item: Dict[str, Any], frame: Frame) -> List[List[Tuple[float, float]]]:
+    return [[frame.px(x, y) for x, y in ring] for ring in shape_of(item).rings()]
+
+
+def _box(points: Sequence[Tuple[float, float]], margin: float = 0.0) -> Tuple[float, float, float, float]:
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin
+
+
+def _text_op(x: float, baseline: float, label: str, font_px: float, color: str, anchor: str, bold: bool, frame: Frame) -> Op:
+    glyph_px = max(1, int(round(font_px * frame.zoom / 7)))
+    width = text_width(label, glyph_px)
+    left = x - width / 2 if anchor == "middle" else x - width if anchor == "end" else x
+    return (left, baseline - 7 * glyph_px, left + width + 1, baseline), "text", (x, baseline, label, glyph_px, rgba(color), anchor, bold)
+
+
+def layer_ops(
+    layer: str, venue: Dict[str, List[Dict[str, Any]]], frame: Frame, overlays: Sequence[Overlay] = (), layers: Sequence[str] = LAYERS
+) -> List[Op]:
+    """Display list for one layer, in the same paint order as `generate_svg`."""
+    z = frame.zoom
+    ops: List[Op] = []
+    rooms_ = venue.get("rooms", [])
+    zones_ = venue.get("zones", [])
+    polygons_ = venue.get("polygons", [])
+
+    if layer == "structure":
+        for r in rooms_:
+            rings = _rings_px(r, frame)
+            ops.append((_box(rings[0]), "fill_shape", (rings, rgba(r["color"], 0.2))))
+        for zn in zones_:
+            rings = _rings_px(zn, frame)
+            ops.append((_box(rings[0]), "fill_shape", (rings, rgba(zn["color"], 0.5))))
+            for ring in rings:
+                ops.append((_box(ring, z), "stroke", (ring, True, 1 * z, rgba("#333333"), 5 * z)))
+        for p in polygons_:
+            ring = [frame.px(pt[0], pt[1]) for pt in p["points"]]
+            ops.append((_box(ring), "fill_shape", ([ring], rgba(p["color"], 0.2))))
+        for r in rooms_:
+            for ring in _rings_px(r, frame):
+                ops.append((_box(ring, 2 * z), "stroke", (ring, True, 3 * z, rgba("#000000"), 0.0)))
+        for d in venue.get("doors", []):
+            x0, y0 = frame.px(d["x"], d["y"])
+            x1, y1 = frame.px(d["x"] + d["w"], d["y"] + d["h"])
+            box = (x0 - 2 * z, y0 - 2 * z, x1 + 2 * z, y1 + 2 * z)
+            ops.append((box, "fill_rect", (*box, rgba("white"))))
+        for st in venue.get("stairs", []):
+            x0, y0 = frame.px(st["x"], st["y"])
+            x1, y1 = frame.px(st["x"] + st["w"], st["y"] + st["h"])
+            ring = [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+            ops.append(((x0, y0, x1, y1), "fill_rect", (x0, y0, x1, y1, rgba("#EEEEEE"))))
+            ops.append((_box(ring, z), "stroke", (ring, True, 1 * z, rgba("#777777"), 0.0)))
+
+    elif layer == "overlay":
+        for overlay in overlays:
+            x0, y0 = frame.px(overlay.x0, overlay.y0)
+            x1, y1 = frame.px(overlay.x0 + overlay.nx * overlay.cell_m, overlay.y0 + overlay.ny * overlay.cell_m)
+            ops.append(((x0, y0, x1, y1), "heat", (overlay, x0, y0, overlay.cell_m * frame.scale)))
+
+    elif layer == "measurements":
+        for r in rooms_:
+            if "points" in r:
+                shape = shape_of(r)
+                x, y, w, h = shape.bbox[0], shape.bbox[1], round(shape.width, 2), round(shape.height, 2)
+            else:
+                x, y, w, h = float(r["x"]), float(r["y"]), float(r["w"]), float(r["h"])
+            sx, sy = frame.px(x, y)
+            ex, ey = frame.px(x + w, y + h)
+            line = [(sx, sy - 10 * z), (ex, sy - 10 * z)]
+            ops.append((_box(line, z), "stroke", (line, False, 1 * z, rgba("#555555"), 2 * z)))
+            ops.append(_text_op((sx + ex) / 2, sy - 15 * z, f"{w}m", 10, "#666666", "middle", False, frame))
+            line = [(sx - 10 * z, sy), (sx - 10 * z, ey)]
+            ops.append((_box(line, z), "stroke", (line, False, 1 * z, rgba("#555555"), 2 * z)))
+            ops.append(_text_op(sx - 25 * z, (sy + ey) / 2, f"{h}m", 10, "#666666", "middle", False, frame))
+
+    elif layer == "labels":
+        layout = _label_layout(venue, frame, layers)
+        for name, font_px, color, bold in (("rooms", ROOM_FONT_PX, "#000000", True), ("zones", ZONE_FONT_PX, "#333333", False), ("polygons", ROOM_FONT_PX, "#000000", True)):
+            for item, slot in zip(venue.get(name, []), layout[name]):
+                if slot is not None:
+                    ops.append(_text_op(slot[0], slot[1], item.get("name", ""), font_px, color, slot[2], bold, frame))
+
+    elif layer == "markers":
+        layout = _label_layout(venue, frame, layers)
+        for name, radius in (("pins", PIN_RADIUS_PX), ("anchors", ANCHOR_RADIUS_PX)):
+            for item, slot in zip(venue.get(name, []), layout[name]):
+                x, y = frame.px(float(item["x"]), float(item["y"]))
+                r = radius * z
+                ops.append(((x - r - z, y - r - z, x + r + z, y + r + z), "fill_circle", (x, y, r + z, rgba("white"))))
+                ops.append(((x - r, y - r, x + r, y + r), "fill_circle", (x, y, max(r - z, 0.5), rgba(item.get("color", "#FF1493")))))
+                if slot is not None:
+                    ops.append(_text_op(slot[0], slot[1], item.get("name") or item.get("id"), MARKER_FONT_PX, "#111111", slot[2], False, frame))
+
+    return ops
+
+
+def _label_layout(venue: Dict[str, List[Dict[str, Any]]], frame: Frame, layers: Sequence[str]) -> Dict[str, List[Optional[Tuple[float, float, str]]]]:
+    def measure(label: str, font_px: float, bold: bool) -> float:
+        return text_width(label, max(1, int(round(font_px / 7)))) + (1 if bold else 0)
+
+    return map_labels(venue, frame.px, frame.zoom, "labels" in layers, "markers" in layers, measure, (0.0, 0.0, frame.width, frame.height))
+
+
+class DisplayList:
+    """A layer's ops with their pixel bounding boxes in arrays, for vectorized tile culling."""
+
+    def __init__(self, ops: List[Op]) -> None:
+        self.ops = ops
+        self.boxes = np.array([op[0] for op in ops], dtype=np.float64).reshape(-1, 4)
+
+    def render(self, canvas: Canvas) -> bool:
+        b = self.boxes
+        hit = (b[:, 2] >= canvas.x0) & (b[:, 0] <= canvas.x0 + canvas.width) & (b[:, 3] >= canvas.y0) & (b[:, 1] <= canvas.y0 + canvas.height)
+        indices = np.flatnonzero(hit)
+        for i in indices:
+            _, method, args = self.ops[i]
+            getattr(canvas, method)(*args)
+        return len(indices) > 0
+
+
+def layer_hash(layer: str, venue: Dict[str, List[Dict[str, Any]]], frame: Frame, overlays: Sequence[Overlay], layers: Sequence[str] = LAYERS) -> str:
+    payload: Dict[str, Any] = {"layer": layer, "style": STYLE_VERSION, "frame": frame.to_json()}
+    if layer in ("labels", "markers"):
+        payload["placed_with"] = [name for name in ("labels", "markers") if name in layers]
+    if layer == "overlay":
+        payload["overlays"] = [o.content_hash() for o in overlays]
+    else:
+        payload["data"] = {name: venue.get(name, []) for name in LAYER_COLLECTIONS[layer]}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(venue: Dict[str, List[Dict[str, Any]]], frame: Frame, layers: Sequence[str], overlays: Sequence[Overlay], cache_dir: Optional[str]) -> None:
+    _WORKER["frame"] = frame
+    _WORKER["cache_dir"] = cache_dir
+    _WORKER["layers"] = [
+        (name, layer_hash(name, venue, frame, overlays, layers), DisplayList(layer_ops(name, venue, frame, overlays, layers))) for name in layers
+    ]
+
+
+def _render_tile(window: Tuple[int, int, int, int]) -> Tuple[Tuple[int, int, int, int], np.ndarray, int]:
+    """Composite all layers for one window; returns the window, RGBA uint8 pixels and cache hits."""
+    x0, y0, w, h = window
+    out = np.zeros((h, w, 4), dtype=np.float32)
+    hits = 0
+    cache_dir = _WORKER["cache_dir"]
+    for _name, digest, display in _WORKER["layers"]:
+        path = os.path.join(cache_dir, f"{digest[:24]}-{x0}-{y0}-{w}x{h}.npy") if cache_dir else None
+        if path and os.path.exists(path):
+            layer_px = np.load(path).astype(np.float32) / 255.0
+            hits += 1
+        else:
+            canvas = Canvas(x0, y0, w, h)
+            if not display.render(canvas):
+                continue
+            # Composite the same 8-bit layer the cache stores, so cold, warm and uncached renders match.
+            quantized = np.round(canvas.pixels * 255.0).astype(np.uint8)
+            layer_px = quantized.astype(np.float32) / 255.0
+            if path:
+                tmp = f"{path}.{os.getpid()}.tmp.npy"
+                np.save(tmp, quantized)
+                os.replace(tmp, path)
+        out = layer_px + out * (1.0 - layer_px[..., 3:4])
+    return window, np.round(out * 255.0).astype(np.uint8), hits
+
+
+def tile_windows(frame: Frame, tile_px: int) -> List[Tuple[int, int, int, int]]:
+    return [
+        (x, y, min(tile_px, frame.width - x), min(tile_px, frame.height - y))
+        for y in range(0, frame.height, tile_px)
+        for x in range(0, frame.width, tile_px)
+    ]
+
+
+def render_tiles(
+    venue: Dict[str, List[Dict[str, Any]]],
+    frame: Frame,
+    windows: List[Tuple[int, int, int, int]],
+    layers: Sequence[str] = LAYERS,
+    overlays: Sequence[Overlay] = (),
+    workers: int = 1,
+    cache_dir: Optional[str] = None,
+) -> List[Tuple[Tuple[int, int, int, int], np.ndarray, int]]:
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    init_args = (venue, frame, layers, overlays, cache_dir)
+    if workers <= 1 or len(windows) <= 1:
+        _init_worker(*init_args)
+        return [_render_tile(w) for w in windows]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+        return list(pool.map(_render_tile, windows, chunksize=max(1, len(windows) // (workers * 4))))
+
+
+def composite_background(pixels: np.ndarray, background: Optional[str]) -> np.ndarray:
+    if background is None:
+        # Un-premultiply for a straight-alpha PNG.
+        alpha = pixels[..., 3:4].astype(np.float32)
+        rgb = np.where(alpha > 0, pixels[..., :3] * 255.0 / np.maximum(alpha, 1), 0)
+        return np.concatenate([np.round(rgb).astype(np.uint8), pixels[..., 3:4]], axis=-1)
+    bg = np.array([c * 255.0 for c in rgba(background)[:3]], dtype=np.float32)
+    alpha = pixels[..., 3:4].astype(np.float32) / 255.0
+    return np.round(pixels[..., :3] + bg * (1.0 - alpha)).astype(np.uint8)
+
+
+def encode_png(pixels: np.ndarray, level: int = 6) -> bytes:
+    """PNG from an (h, w, 3|4) uint8 array, using the Up filter on every row."""
+    height, width, channels = pixels.shape
+    rows = pixels.reshape(height, width * channels)
+    filtered = np.empty((height, width * channels + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[:, 1:] = rows
+    filtered[1:, 1:] -= rows[:-1]
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6 if channels == 4 else 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(filtered.tobytes(), level)) + chunk(b"IEND", b"")
+
+
+def write_image(pixels: np.ndarray, filename: str, fmt: str) -> None:
+    if fmt == "webp":
+        if Image is None:
+            raise SystemExit("WebP output needs Pillow (pip install pillow); use --format png")
+        Image.fromarray(pixels).save(filename, format="WEBP", lossless=True)
+        return
+    with open(filename, "wb") as f:
+        f.write(encode_png(pixels))
+
+
+def rf_overlay(venue: Dict[str, List[Dict[str, Any]]], kind: str, cell_m: float) -> Overlay:
+    import rfmodel
+
+    grid = rfmodel.build_grid(venue["rooms"], venue["zones"], cell_m=cell_m)
+    if not venue["anchors"]:
+        raise SystemExit("Overlays need anchors; add some or pass --auto-anchors")
+    rssi = rfmodel.anchor_rssi(grid, venue["anchors"])
+    if kind == "coverage":
+        values = (rssi >= rfmodel.COVERAGE_THRESHOLD_DBM).sum(axis=0).astype(np.float32)
+        vmin, vmax = 0.0, float(max(values.max(), 1))
+    else:
+        values = rssi.max(axis=0)
+        vmin, vmax = rfmodel.RSSI_FLOOR, rfmodel.TX_POWER_DBM
+    values = np.where(grid.room_code >= 0, values, np.nan).astype(np.float32)
+    return Overlay(kind, grid.x0, grid.y0, grid.cell_m, grid.nx, grid.ny, values, vmin, vmax)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--geojson", dest="geojson", default=None)
+    parser.add_argument("--auto-anchors", dest="auto_anchors", action="store_true")
+    parser.add_argument("--scale", dest="scale", type=float, default=SVG_SCALE)
+    parser.add_argument("--out", dest="out", default=None)
+    parser.add_argument("--format", dest="format", choices=("png", "webp"), default="png")
+    parser.add_argument("--tiles", dest="tiles", default=None)
+    parser.add_argument("--scales", dest="scales", default=None)
+    parser.add_argument("--tile-px", dest="tile_px", type=int, default=256)
+    parser.add_argument("--workers", dest="workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cache-dir", dest="cache_dir", default=".raster-cache")
+    parser.add_argument("--no-cache", dest="cache_dir", action="store_const", const=None)
+    parser.add_argument("--transparent", dest="transparent", action="store_true")
+    parser.add_argument("--overlay", dest="overlays", action="append", choices=("coverage", "rssi"), default=[])
+    parser.add_argument("--cell", dest="cell_m", type=float, default=0.5)
+    parser.add_argument("--no-structure", dest="include_structure", action="store_false", default=True)
+    parser.add_argument("--no-measurements", dest="include_measurements", action="store_false", default=True)
+    parser.add_argument("--no-labels", dest="include_labels", action="store_false", default=True)
+    parser.add_argument("--no-markers", dest="include_markers", action="store_false", default=True)
+    args = parser.parse_args()
+
+    if args.geojson:
+        venue = load_geojson_venue(args.geojson)
+        venue.setdefault("doors", [])
+        venue.setdefault("stairs", [])
+    else:
+        venue = dict(venue_collections())
+        venue["anchors"] = default_anchors() if args.auto_anchors else list(v6.anchors)
+    if args.auto_anchors and args.geojson:
+        venue["anchors"] = venue["anchors"] or v6.recommend_anchors(venue["rooms"])
+
+    overlays = [rf_overlay(venue, kind, args.cell_m) for kind in args.overlays]
+    enabled = {
+        "structure": args.include_structure,
+        "overlay": bool(overlays),
+        "measurements": args.include_measurements,
+        "labels": args.include_labels,
+        "markers": args.include_markers,
+    }
+    layers = [name for name in LAYERS if enabled[name]]
+    extent = VenueExtent(venue)
+    background = None if args.transparent else "white"
+    ext = args.format
+
+    if args.tiles:
+        scales = [float(s) for s in (args.scales or str(args.scale)).split(",") if s]
+        index: Dict[str, Any] = {"tile_px": args.tile_px, "format": ext, "scales": []}
+        for scale in scales:
+            frame = make_frame(extent, scale)
+            results = render_tiles(venue, frame, tile_windows(frame, args.tile_px), layers, overlays, args.workers, args.cache_dir)
+            scale_dir = os.path.join(args.tiles, f"{scale:g}")
+            os.makedirs(scale_dir, exist_ok=True)
+            hits = 0
+            for (x, y, _w, _h), pixels, tile_hits in results:
+                hits += tile_hits
+                write_image(composite_background(pixels, background), os.path.join(scale_dir, f"{x // args.tile_px}_{y // args.tile_px}.{ext}"), ext)
+            index["scales"].append({**frame.to_json(), "dir": f"{scale:g}", "tiles": len(results)})
+            print(f"Generated {len(results)} tiles at {scale:g} px/m ({hits} cached layer tiles): {scale_dir}")
+        index_file = os.path.join(args.tiles, "tiles.json")
+        with open(index_file, "w") as f:
+            json.dump(index, f, indent=2)
+        print(f"Generated tile index: {index_file}")
+        return
+
+    frame = make_frame(extent, args.scale)
+    image = np.zeros((frame.height, frame.width, 4), dtype=np.uint8)
+    for (x, y, w, h), pixels, _hits in render_tiles(venue, frame, tile_windows(frame, 512), layers, overlays, args.workers, args.cache_dir):
+        image[y : y + h, x : x + w] = pixels
+    filename = args.out or f"detailed.{ext}"
+    write_image(composite_background(image, background), filename, ext)
+    print(f"Generated {ext.upper()}: {filename}")
+
+
+if __name__ == "__main__":
+    main()
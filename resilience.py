@@ -0,0 +1,292 @@
+"""Anchor failure (N-1, optionally N-2) resilience report.
+
+For every anchor, `IncrementalScorer.score_without` switches it off and rescores. Only
+the cells that anchor covered or won are touched, so a failure costs one row update
+rather than a full rescore. With `pairs=True`, every pair is also scored. The work is
+split over a process pool, and each worker builds its own scorer once.
+
+Anchors are ranked by criticality: the share of room cells that lose coverage plus
+the share that lose a correct room prediction when the anchor fails. Results export
+as Anchor `extra_properties` (`resilience_*` keys) and as a `generate_svg` overlay
+of circles colored by criticality.
+
+    python3 resilience.py                                   # curated anchors (or recommended if none)
+    python3 resilience.py --anchors both --pairs --workers 4 --out-geojson resilience.geojson --out-svg resilience.svg
+    python3 resilience.py --anchors both --pairs --check        # compare every result with a scorer built without those anchors
+"""
+
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from analytics import heat_color
+from scoring import IncrementalScorer
+
+Failure = Tuple[str, ...]
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(rooms_: List[Dict[str, Any]], zones_: List[Dict[str, Any]], anchors_: List[Dict[str, Any]], scorer_kwargs: Dict[str, Any]) -> None:
+    _WORKER["scorer"] = IncrementalScorer(rooms_, zones_, anchors_, **scorer_kwargs)
+
+
+def _evaluate(failures: Sequence[Failure]) -> List[Tuple[Failure, Dict[str, float], Dict[str, Dict[str, float]]]]:
+    scorer = _WORKER["scorer"]
+    return [(failure, *scorer.score_without(failure)) for failure in failures]
+
+
+def _change(drop: float, digits: int) -> str:
+    """A drop as a signed percent change (-4.26%, +0.58%), never -0.00%."""
+    return f"{round(-drop, digits + 2) + 0.0:+.{digits}%}"
+
+
+def _batches(failures: List[Failure], n: int) -> List[List[Failure]]:
+    size = max(1, -(-len(failures) // n))
+    return [failures[i : i + size] for i in range(0, len(failures), size)]
+
+
+class ResilienceReport:
+    def __init__(self, baseline: Dict[str, float], baseline_rooms: Dict[str, Dict[str, float]], anchors_: List[Dict[str, Any]]) -> None:
+        self.baseline = baseline
+        self.baseline_rooms = baseline_rooms
+        self.anchors = {a["id"]: a for a in anchors_}
+        self.single: Dict[str, Dict[str, Any]] = {}
+        self.pairs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def _impact(self, score: Dict[str, float], rooms: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+        coverage_drop = self.baseline["coverage"] - score["coverage"]
+        accuracy_drop = self.baseline["accuracy"] - score["accuracy"]
+        worst_room, worst_drop = "", 0.0
+        for room_id, metrics in rooms.items():
+            drop = self.baseline_rooms[room_id]["coverage"] - metrics["coverage"]
+            if drop > worst_drop:
+                worst_room, worst_drop = room_id, drop
+        return {
+            "coverage": round(score["coverage"], 4),
+            "accuracy": round(score["accuracy"], 4),
+            "coverage_drop": round(coverage_drop, 4),
+            "accuracy_drop": round(accuracy_drop, 4),
+            "criticality": round(coverage_drop + accuracy_drop, 4),
+            "worst_room": worst_room,
+            "worst_room_coverage_drop": round(worst_drop, 4),
+        }
+
+    def add(self, failure: Failure, score: Dict[str, float], rooms: Dict[str, Dict[str, float]]) -> None:
+        impact = self._impact(score, rooms)
+        if len(failure) == 1:
+            self.single[failure[0]] = impact
+        else:
+            self.pairs[(failure[0], failure[1])] = impact
+
+    def ranking(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return sorted(self.single.items(), key=lambda kv: (-kv[1]["criticality"], kv[0]))
+
+    def worst_pairs(self, limit: int = 10) -> List[Tuple[Tuple[str, str], Dict[str, Any]]]:
+        return sorted(self.pairs.items(), key=lambda kv: (-kv[1]["criticality"], kv[0]))[:limit]
+
+    def anchor_properties(self) -> Dict[str, Dict[str, Any]]:
+        """Per-anchor `extra_properties` for `generate_geojson`."""
+        worst_partner: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for (a, b), impact in self.pairs.items():
+            for anchor_id, partner in ((a, b), (b, a)):
+                if anchor_id not in worst_partner or impact["criticality"] > worst_partner[anchor_id][1]["criticality"]:
+                    worst_partner[anchor_id] = (partner, impact)
+        out = {}
+        for rank, (anchor_id, impact) in enumerate(self.ranking(), start=1):
+            props = {f"resilience_{key}": value for key, value in impact.items()}
+            props["resilience_rank"] = rank
+            if anchor_id in worst_partner:
+                partner, pair_impact = worst_partner[anchor_id]
+                props["resilience_worst_partner"] = partner
+                props["resilience_pair_criticality"] = pair_impact["criticality"]
+            out[anchor_id] = props
+        return out
+
+    def svg_layer(self, pair_lines: int = 5) -> Callable[[float], List[str]]:
+        """An `extra_layers` renderer for `generate_svg`: anchors colored and sized by criticality, worst pairs linked."""
+        ranking = self.ranking()
+        top = max((impact["criticality"] for _, impact in ranking), default=0.0)
+        worst_pairs = self.worst_pairs(pair_lines)
+
+        def render(scale: float) -> List[str]:
+            out = []
+            for (a, b), impact in worst_pairs:
+                pa, pb = self.anchors[a], self.anchors[b]
+                out.append(
+                    f'<line x1="{pa["x"] * scale}" y1="{pa["y"] * scale}" x2="{pb["x"] * scale}" y2="{pb["y"] * scale}" '
+                    f'stroke="#B22222" stroke-width="2" stroke-dasharray="6,4"><title>{a} + {b}: '
+                    f'{_change(impact["coverage_drop"], 1)} coverage, {_change(impact["accuracy_drop"], 1)} accuracy</title></line>'
+                )
+            for rank, (anchor_id, impact) in enumerate(ranking, start=1):
+                anchor = self.anchors[anchor_id]
+                level = impact["criticality"] / top if top > 0 else 0.0
+                out.append(
+                    f'<circle cx="{anchor["x"] * scale}" cy="{anchor["y"] * scale}" r="{(0.4 + 0.8 * level) * scale}" '
+                    f'fill="{heat_color(level)}" fill-opacity="0.6" stroke="#333333" stroke-width="1"><title>#{rank} {anchor_id}: '
+                    f'{_change(impact["coverage_drop"], 1)} coverage, {_change(impact["accuracy_drop"], 1)} accuracy, worst room '
+                    f'{impact["worst_room"] or "none"}</title></circle>'
+                )
+            return out
+
+        return render
+
+
+def analyze(
+    rooms_: List[Dict[str, Any]],
+    zones_: List[Dict[str, Any]],
+    anchors_: List[Dict[str, Any]],
+    pairs: bool = False,
+    workers: int = 1,
+    **scorer_kwargs: Any,
+) -> ResilienceReport:
+    """Score every single (and with `pairs`, every pairwise) anchor failure."""
+    init_args = (rooms_, zones_, anchors_, scorer_kwargs)
+    _init_worker(*init_args)
+    scorer = _WORKER["scorer"]
+    report = ResilienceReport(scorer.score(), scorer.room_metrics(), anchors_)
+    ids = list(scorer.anchors)
+    failures: List[Failure] = [(anchor_id,) for anchor_id in ids]
+    if pairs:
+        failures.extend(itertools.combinations(ids, 2))
+    if workers <= 1 or len(failures) <= 1:
+        results = _evaluate(failures)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+            results = [r for batch in pool.map(_evaluate, _batches(failures, workers * 4)) for r in batch]
+    for failure, score, rooms in results:
+        report.add(failure, score, rooms)
+    return report
+
+
+def check(report: ResilienceReport, rooms_: List[Dict[str, Any]], zones_: List[Dict[str, Any]], anchors_: List[Dict[str, Any]], **scorer_kwargs: Any) -> List[Failure]:
+    """Failures whose result differs from a scorer built without those anchors, or that left the scorer changed."""
+    scorer = IncrementalScorer(rooms_, zones_, anchors_, **scorer_kwargs)
+    state = scorer.score(), scorer.room_metrics()
+    failures = [(anchor_id,) for anchor_id in report.single] + list(report.pairs)
+    mismatches = []
+    for failure in failures:
+        impact = report.single[failure[0]] if len(failure) == 1 else report.pairs[(failure[0], failure[1])]
+        fresh = IncrementalScorer(rooms_, zones_, [a for a in anchors_ if a["id"] not in failure], **scorer_kwargs)
+        expected = report._impact(fresh.score(), fresh.room_metrics())
+        if impact != expected or scorer.score_without(failure) != (fresh.score(), fresh.room_metrics()) or (scorer.score(), scorer.room_metrics()) != state:
+            mismatches.append(failure)
+    return mismatches
+
+
+def main() -> None:
+    from mapgen import default_anchors, v6
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--anchors", dest="anchors", choices=("default", "curated", "recommended", "both"), default="default")
+    parser.add_argument("--pairs", dest="pairs", action="store_true", help="also score every pair of failures (N-2)")
+    parser.add_argument("--workers", dest="workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cell", dest="cell_m", type=float, default=0.5)
+    parser.add_argument("--min-anchors", dest="min_anchors", type=int, default=1)
+    parser.add_argument("--level", dest="level", default=None)
+    parser.add_argument("--walls", dest="walls", action="store_true", help="subtract wall attenuation (see walls.py)")
+    parser.add_argument("--top", dest="top", type=int, default=10)
+    parser.add_argument("--check", dest="check", action="store_true", help="verify every result against a scorer built without the failed anchors")
+    parser.add_argument("--out-geojson", dest="out_geojson", default=None)
+    parser.add_argument("--out-svg", dest="out_svg", default=None)
+    parser.add_argument("--out-json", dest="out_json", default=None)
+    args = parser.parse_args()
+
+    anchors_ = {
+        "default": default_anchors,
+        "curated": lambda: list(v6.anchors),
+        "recommended": lambda: v6.recommend_anchors(v6.rooms),
+        "both": lambda: list(v6.anchors) + v6.recommend_anchors(v6.rooms),
+    }[args.anchors]()
+    if not anchors_:
+        parser.error("no anchors to analyze")
+    walls = None
+    if args.walls:
+        from walls import build_walls
+
+        rooms_on_level = [r for r in v6.rooms if args.level is None or v6.level_of(r, v6.levels) == args.level]
+        walls = build_walls(rooms_on_level, [d for d in v6.doors if args.level is None or v6.level_of(d, v6.levels) == args.level])
+
+    report = analyze(
+        v6.rooms,
+        v6.zones,
+        anchors_,
+        pairs=args.pairs,
+        workers=args.workers,
+        cell_m=args.cell_m,
+        min_anchors=args.min_anchors,
+        levels_=v6.levels,
+        level=args.level,
+        walls=walls,
+    )
+    print(f"Baseline: {json.dumps(report.baseline)}")
+    if args.check:
+        scorer_kwargs = {"cell_m": args.cell_m, "min_anchors": args.min_anchors, "levels_": v6.levels, "level": args.level, "walls": walls}
+        mismatches = check(report, v6.rooms, v6.zones, anchors_, **scorer_kwargs)
+        print(f"Check: {len(report.single) + len(report.pairs)} failures rescored from scratch, {len(mismatches)} mismatches")
+        for failure in mismatches:
+            print(f"  mismatch: {' + '.join(failure)}")
+        if mismatches:
+            raise SystemExit(1)
+    for rank, (anchor_id, impact) in enumerate(report.ranking()[: args.top], start=1):
+        print(
+            f"{rank:3d}. {anchor_id}: {_change(impact['coverage_drop'], 2)} coverage, {_change(impact['accuracy_drop'], 2)} accuracy"
+            + (f", {impact['worst_room']} loses {impact['worst_room_coverage_drop']:.0%}" if impact["worst_room"] else "")
+        )
+    for (a, b), impact in report.worst_pairs(args.top if args.pairs else 0):
+        print(f"     {a} + {b}: {_change(impact['coverage_drop'], 2)} coverage, {_change(impact['accuracy_drop'], 2)} accuracy")
+
+    if args.out_json:
+        with open(args.out_json, "w") as f:
+            json.dump(
+                {
+                    "baseline": report.baseline,
+                    "anchors": report.anchor_properties(),
+                    "pairs": [{"anchors": list(pair), **impact} for pair, impact in report.worst_pairs(len(report.pairs))],
+                },
+                f,
+                indent=2,
+            )
+        print(f"Generated JSON: {args.out_json}")
+    if args.out_geojson:
+        v6.generate_geojson(
+            rooms_=v6.rooms,
+            zones_=v6.zones,
+            polygons_=v6.polygons,
+            pins_=v6.pins,
+            anchors_=anchors_,
+            origin=v6.GEO_ORIGIN,
+            filename=args.out_geojson,
+            include_rooms=True,
+            include_zones=True,
+            include_polygons=True,
+            include_pins=True,
+            include_anchors=True,
+            include_metadata=True,
+            extra_properties=report.anchor_properties(),
+            levels_=v6.levels,
+            stairs_=v6.stairs,
+        )
+    if args.out_svg:
+        v6.generate_svg(
+            rooms_=v6.rooms,
+            zones_=v6.zones,
+            doors_=v6.doors,
+            polygons_=v6.polygons,
+            pins_=v6.pins,
+            anchors_=anchors_,
+            filename=args.out_svg,
+            include_structure=True,
+            include_measurements=False,
+            include_labels=True,
+            include_markers=True,
+            stairs_=v6.stairs,
+            extra_layers={"resilience": report.svg_layer()},
+        )
+
+
+if __name__ == "__main__":
+    main()
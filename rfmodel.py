@@ -0,0 +1,188 @@
+"""Grid-based RF model of a venue: log-distance RSSI, coverage and strongest-anchor classification.
+
+This is a planning model, not a calibrated one. Constants follow typical BLE beacon
+numbers and can be overridden per call.
+"""
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import numpy as np
+
+from extent import VenueExtent
+from geometry import shape_of
+from spatial import LevelIndex
+
+if TYPE_CHECKING:
+    from walls import WallSet
+
+TX_POWER_DBM = -59.0
+PATH_LOSS_EXPONENT = 2.2
+RSSI_FLOOR = -100.0
+COVERAGE_THRESHOLD_DBM = -85.0
+MIN_DISTANCE_M = 0.5
+FLOOR_ATTENUATION_DB = 15.0
+
+
+@dataclass(frozen=True)
+class VenueGrid:
+    x0: float
+    y0: float
+    cell_m: float
+    nx: int
+    ny: int
+    xs: np.ndarray
+    ys: np.ndarray
+    room_ids: List[str]
+    room_code: np.ndarray
+    zone_ids: List[str]
+    zone_code: np.ndarray
+    level: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return self.nx * self.ny
+
+    def cells_of_room(self, room_id: str) -> np.ndarray:
+        return np.flatnonzero(self.room_code == self.room_ids.index(room_id))
+
+    def cells_of_zone(self, zone_id: str) -> np.ndarray:
+        return np.flatnonzero(self.zone_code == self.zone_ids.index(zone_id))
+
+
+def _rect_codes(xs: np.ndarray, ys: np.ndarray, items: List[Dict[str, Any]]) -> np.ndarray:
+    codes = np.full(xs.shape, -1, dtype=np.int32)
+    best_area = np.full(xs.shape, np.inf)
+    for code, item in enumerate(items):
+        shape = shape_of(item)
+        x0, y0, x1, y1 = shape.bbox
+        inside = (xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1) & (shape.area < best_area)
+        if not shape.is_rect:
+            candidates = np.flatnonzero(inside)
+            inside[candidates] = shape.contains_many(xs[candidates], ys[candidates])
+        codes[inside] = code
+        best_area[inside] = shape.area
+    return codes
+
+
+def build_grid(
+    rooms_: List[Dict[str, Any]],
+    zones_: List[Dict[str, Any]],
+    cell_m: float = 0.5,
+    x0: Optional[float] = None,
+    y0: Optional[float] = None,
+    width_m: Optional[float] = None,
+    height_m: Optional[float] = None,
+    level: Optional[str] = None,
+    extent: Optional[VenueExtent] = None,
+) -> VenueGrid:
+    """Grid over the rooms' and zones' extent (including the origin) unless a window is given."""
+    if extent is None:
+        extent = VenueExtent({"rooms": rooms_, "zones": zones_})
+    frame = extent.frame(("rooms", "zones"))
+    x0 = float(frame.min_x) if x0 is None else x0
+    y0 = float(frame.min_y) if y0 is None else y0
+    if width_m is None:
+        width_m = frame.max_x - x0
+    if height_m is None:
+        height_m = frame.max_y - y0
+    nx = max(1, int(np.ceil(width_m / cell_m)))
+    ny = max(1, int(np.ceil(height_m / cell_m)))
+    gx, gy = np.meshgrid(x0 + (np.arange(nx) + 0.5) * cell_m, y0 + (np.arange(ny) + 0.5) * cell_m)
+    xs = gx.ravel().astype(np.float32)
+    ys = gy.ravel().astype(np.float32)
+    room_items = [r for r in rooms_ if r.get("id")]
+    zone_items = [z for z in zones_ if z.get("id")]
+    return VenueGrid(
+        x0=x0,
+        y0=y0,
+        cell_m=cell_m,
+        nx=nx,
+        ny=ny,
+        xs=xs,
+        ys=ys,
+        room_ids=[r["id"] for r in room_items],
+        room_code=_rect_codes(xs, ys, room_items),
+        zone_ids=[z["id"] for z in zone_items],
+        zone_code=_rect_codes(xs, ys, zone_items),
+        level=level,
+    )
+
+
+def anchor_distances(grid: VenueGrid, anchors_: List[Dict[str, Any]], cells: Optional[np.ndarray] = None) -> np.ndarray:
+    ax = np.array([float(a["x"]) for a in anchors_], dtype=np.float32)[:, None]
+    ay = np.array([float(a["y"]) for a in anchors_], dtype=np.float32)[:, None]
+    xs = grid.xs if cells is None else grid.xs[cells]
+    ys = grid.ys if cells is None else grid.ys[cells]
+    return np.maximum(np.hypot(xs[None, :] - ax, ys[None, :] - ay), MIN_DISTANCE_M)
+
+
+def path_loss_rssi(distances: np.ndarray, tx_power_dbm: float = TX_POWER_DBM, exponent: float = PATH_LOSS_EXPONENT) -> np.ndarray:
+    return (tx_power_dbm - 10.0 * exponent * np.log10(distances)).astype(np.float32)
+
+
+def anchor_rssi(
+    grid: VenueGrid,
+    anchors_: List[Dict[str, Any]],
+    levels_: Optional[List[Dict[str, Any]]] = None,
+    walls: Optional["WallSet"] = None,
+) -> np.ndarray:
+    """RSSI of every anchor at every cell of `grid`, including anchors on other levels.
+
+    Anchors on another level add the elevation difference to the path length and lose
+    FLOOR_ATTENUATION_DB per floor slab between the two levels. With `walls` (built for
+    the grid's level), anchors on that level also lose each crossed wall's attenuation.
+    """
+    distances = anchor_distances(grid, anchors_)
+    if not levels_ or grid.level is None:
+        rssi = path_loss_rssi(distances)
+        if walls is not None and anchors_:
+            rssi -= walls.loss_grid(grid, anchors_)
+        return rssi
+    elevation = {lv["id"]: float(lv.get("elevation_m", 0.0)) for lv in levels_}
+    floor_index = {lv["id"]: i for i, lv in enumerate(sorted(levels_, key=lambda lv: elevation[lv["id"]]))}
+    default_level = levels_[0]["id"]
+    anchor_levels = [a.get("level") or default_level for a in anchors_]
+    dz = np.array([elevation[lv] - elevation[grid.level] for lv in anchor_levels], dtype=np.float32)[:, None]
+    floors = np.array([abs(floor_index[lv] - floor_index[grid.level]) for lv in anchor_levels], dtype=np.float32)[:, None]
+    rssi = path_loss_rssi(np.sqrt(distances * distances + dz * dz)) - floors * FLOOR_ATTENUATION_DB
+    same_level = np.flatnonzero(floors[:, 0] == 0)
+    if walls is not None and len(same_level):
+        rssi[same_level] -= walls.loss_grid(grid, [anchors_[i] for i in same_level])
+    return rssi
+
+
+def anchor_room_codes(
+    grid: VenueGrid, rooms_: List[Dict[str, Any]], anchors_: List[Dict[str, Any]], levels_: Optional[List[Dict[str, Any]]] = None
+) -> np.ndarray:
+    # An anchor without a room is placed by a lookup on its own level only.
+    index = LevelIndex([r for r in rooms_ if r.get("id")], levels_[0]["id"] if levels_ else None)
+    codes = []
+    for a in anchors_:
+        room = a.get("room") or index.locate(float(a["x"]), float(a["y"]), a.get("level"))
+        codes.append(grid.room_ids.index(room) if room in grid.room_ids else -1)
+    return np.array(codes, dtype=np.int32)
+
+
+def coverage(rssi: np.ndarray, threshold_dbm: float = COVERAGE_THRESHOLD_DBM, min_anchors: int = 1) -> np.ndarray:
+    return (rssi >= threshold_dbm).sum(axis=0) >= min_anchors
+
+
+def classify(rssi: np.ndarray, anchor_rooms: np.ndarray) -> np.ndarray:
+    if rssi.shape[0] == 0:
+        return np.full(rssi.shape[1], -1, dtype=np.int32)
+    return anchor_rooms[np.argmax(rssi, axis=0)]
+
+
+def room_metrics(grid: VenueGrid, covered: np.ndarray, predicted: np.ndarray) -> Dict[str, Dict[str, float]]:
+    n_rooms = len(grid.room_ids)
+    in_room = grid.room_code >= 0
+    codes = grid.room_code[in_room]
+    cells = np.bincount(codes, minlength=n_rooms)
+    cov = np.bincount(codes, weights=covered[in_room], minlength=n_rooms)
+    hit = np.bincount(codes, weights=(predicted[in_room] == codes), minlength=n_rooms)
+    out = {}
+    for code, room_id in enumerate(grid.room_ids):
+        n = max(int(cells[code]), 1)
+        out[room_id] = {"cells": int(cells[code]), "coverage": float(cov[code] / n), "accuracy": float(hit[code] / n)}
+    return out
@@ -0,0 +1,286 @@
+"""Incremental anchor-placement scoring for interactive what-if layout.
+
+`IncrementalScorer` keeps one RSSI contribution row per anchor over the venue grid,
+plus per-cell coverage counts and the strongest anchor. Moving, adding or removing an
+anchor recomputes only that anchor's row and the cells whose coverage or strongest
+anchor it affects, then adjusts per-room tallies, so each edit returns fresh per-room
+metrics without rescoring the other anchors.
+
+    python3 scoring.py --auto-anchors --move anchor_suggested_annex_0 12 20
+    python3 scoring.py --auto-anchors --bench 1000
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import rfmodel
+from mapgen import default_anchors, v6
+from spatial import LevelIndex
+
+if TYPE_CHECKING:
+    from walls import WallSet
+
+
+class IncrementalScorer:
+    def __init__(
+        self,
+        rooms_: List[Dict[str, Any]],
+        zones_: List[Dict[str, Any]],
+        anchors_: List[Dict[str, Any]],
+        cell_m: float = 0.5,
+        threshold_dbm: float = rfmodel.COVERAGE_THRESHOLD_DBM,
+        min_anchors: int = 1,
+        levels_: Optional[List[Dict[str, Any]]] = None,
+        level: Optional[str] = None,
+        walls: Optional["WallSet"] = None,
+    ) -> None:
+        if level is not None:
+            default_level = (levels_ or v6.levels)[0]["id"]
+            rooms_ = [r for r in rooms_ if (r.get("level") or default_level) == level]
+            zones_ = [z for z in zones_ if (z.get("level") or default_level) == level]
+        self.grid = rfmodel.build_grid(rooms_, zones_, cell_m=cell_m, level=level)
+        self.threshold_dbm = threshold_dbm
+        self.min_anchors = min_anchors
+        self.levels_ = levels_
+        self.walls = walls
+        self._room_index = LevelIndex([r for r in rooms_ if r.get("id")], levels_[0]["id"] if levels_ else None)
+        self._room_code = {room_id: i for i, room_id in enumerate(self.grid.room_ids)}
+
+        size = self.grid.size
+        capacity = max(len(anchors_), 4)
+        self.anchors: Dict[str, Dict[str, Any]] = {}
+        self._slot: Dict[str, int] = {}
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+        self._rssi = np.full((capacity, size), -np.inf, dtype=np.float32)
+        self._anchor_room = np.full(capacity, -1, dtype=np.int32)
+
+        self._count = np.zeros(size, dtype=np.int32)
+        self._best = np.full(size, -np.inf, dtype=np.float32)
+        self._best_slot = np.full(size, -1, dtype=np.int32)
+        self.covered = np.zeros(size, dtype=bool)
+        self.correct = np.zeros(size, dtype=bool)
+        n_rooms = len(self.grid.room_ids)
+        self._room_cells = np.bincount(self.grid.room_code[self.grid.room_code >= 0], minlength=n_rooms).astype(np.float64)
+        self._room_covered = np.zeros(n_rooms)
+        self._room_correct = np.zeros(n_rooms)
+
+        for anchor in anchors_:
+            self._place(anchor)
+        self.full_recompute()
+
+    # Contribution rows
+
+    def _contribution(self, anchor: Dict[str, Any]) -> np.ndarray:
+        return rfmodel.anchor_rssi(self.grid, [anchor], self.levels_, walls=self.walls)[0]
+
+    def _room_of(self, anchor: Dict[str, Any]) -> int:
+        # Same rule as rfmodel.anchor_room_codes, so incremental and full scores agree.
+        room = anchor.get("room") or self._room_index.locate(float(anchor["x"]), float(anchor["y"]), anchor.get("level"))
+        return self._room_code.get(room, -1) if room else -1
+
+    def _grow(self) -> None:
+        capacity = len(self._rssi)
+        self._rssi = np.concatenate([self._rssi, np.full((capacity, self.grid.size), -np.inf, dtype=np.float32)])
+        self._anchor_room = np.concatenate([self._anchor_room, np.full(capacity, -1, dtype=np.int32)])
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def _place(self, anchor: Dict[str, Any]) -> int:
+        anchor_id = anchor["id"]
+        slot = self._slot.get(anchor_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._slot[anchor_id] = slot
+        self.anchors[anchor_id] = anchor
+        self._rssi[slot] = self._contribution(anchor)
+        self._anchor_room[slot] = self._room_of(anchor)
+        return slot
+
+    # Cell state and room tallies
+
+    def _room_tally(self, cells: np.ndarray, sign: float) -> None:
+        codes = self.grid.room_code[cells]
+        keep = codes >= 0
+        codes = codes[keep]
+        n = len(self.grid.room_ids)
+        self._room_covered += sign * np.bincount(codes, weights=self.covered[cells][keep], minlength=n)
+        self._room_correct += sign * np.bincount(codes, weights=self.correct[cells][keep], minlength=n)
+
+    def _cell_flags(self, cells: np.ndarray) -> None:
+        self.covered[cells] = self._count[cells] >= self.min_anchors
+        slots = self._best_slot[cells]
+        predicted = np.where(slots >= 0, self._anchor_room[np.maximum(slots, 0)], -1)
+        self.correct[cells] = predicted == self.grid.room_code[cells]
+
+    def full_recompute(self) -> None:
+        active = self._rssi
+        self._count = (active >= self.threshold_dbm).sum(axis=0).astype(np.int32)
+        self._best_slot = np.argmax(active, axis=0).astype(np.int32)
+        self._best = active[self._best_slot, np.arange(self.grid.size)]
+        self._best_slot[~np.isfinite(self._best)] = -1
+        cells = np.arange(self.grid.size)
+        self._cell_flags(cells)
+        self._room_covered[:] = 0
+        self._room_correct[:] = 0
+        self._room_tally(cells, 1.0)
+
+    def _update_slot(self, slot: int, new_row: np.ndarray, new_room: int) -> int:
+        """Swap in one anchor's row and fix up only the cells it can affect."""
+        old_row = self._rssi[slot].copy()
+        room_changed = new_room != self._anchor_room[slot]
+        self._rssi[slot] = new_row
+        self._anchor_room[slot] = new_room
+
+        delta = (new_row >= self.threshold_dbm).astype(np.int32) - (old_row >= self.threshold_dbm)
+        owned = self._best_slot == slot
+        gained = new_row > self._best
+        lost = owned & (new_row < old_row)
+        touched = (delta != 0) | gained | lost | (owned if room_changed else False)
+        cells = np.flatnonzero(touched)
+        if len(cells) == 0:
+            return 0
+
+        self._room_tally(cells, -1.0)
+        self._count[cells] += delta[cells]
+        gain_cells = np.flatnonzero(gained)
+        self._best[gain_cells] = new_row[gain_cells]
+        self._best_slot[gain_cells] = slot
+        lost_cells = np.flatnonzero(lost & ~gained)
+        if len(lost_cells):
+            column = self._rssi[:, lost_cells]
+            best_slots = np.argmax(column, axis=0)
+            self._best[lost_cells] = column[best_slots, np.arange(len(lost_cells))]
+            self._best_slot[lost_cells] = np.where(np.isfinite(self._best[lost_cells]), best_slots, -1)
+        self._cell_flags(cells)
+        self._room_tally(cells, 1.0)
+        return len(cells)
+
+    # What-if API
+
+    def move(self, anchor_id: str, x: float, y: float) -> Dict[str, Dict[str, float]]:
+        # A dragged anchor belongs to the room it is dropped in, not the one it came from.
+        anchor = {**self.anchors[anchor_id], "x": x, "y": y, "room": self._room_index.locate(x, y, self.anchors[anchor_id].get("level"))}
+        self.anchors[anchor_id] = anchor
+        self._update_slot(self._slot[anchor_id], self._contribution(anchor), self._room_of(anchor))
+        return self.room_metrics()
+
+    def add(self, anchor: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+        if anchor["id"] in self._slot:
+            return self.move(anchor["id"], float(anchor["x"]), float(anchor["y"]))
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self._slot[anchor["id"]] = slot
+        self.anchors[anchor["id"]] = anchor
+        self._update_slot(slot, self._contribution(anchor), self._room_of(anchor))
+        return self.room_metrics()
+
+    def remove(self, anchor_id: str) -> Dict[str, Dict[str, float]]:
+        slot = self._slot.pop(anchor_id)
+        del self.anchors[anchor_id]
+        self._update_slot(slot, np.full(self.grid.size, -np.inf, dtype=np.float32), -1)
+        self._free.append(slot)
+        return self.room_metrics()
+
+    def score_without(self, anchor_ids: Sequence[str]) -> Tuple[Dict[str, float], Dict[str, Dict[str, float]]]:
+        """Score and room metrics with `anchor_ids` switched off; the scorer is left exactly as it was."""
+        # Replaying the anchors back in would keep RSSI ties with whichever slot holds the
+        # cell, not the lowest slot a full recompute picks, so restore a snapshot instead.
+        state = {name: getattr(self, name).copy() for name in ("_count", "_best", "_best_slot", "covered", "correct", "_room_covered", "_room_correct")}
+        slots = [self._slot[anchor_id] for anchor_id in anchor_ids]
+        rows = self._rssi[slots].copy()
+        rooms = self._anchor_room[slots].copy()
+        try:
+            for slot in slots:
+                self._update_slot(slot, np.full(self.grid.size, -np.inf, dtype=np.float32), -1)
+            return self.score(), self.room_metrics()
+        finally:
+            self._rssi[slots] = rows
+            self._anchor_room[slots] = rooms
+            for name, values in state.items():
+                setattr(self, name, values)
+
+    def room_metrics(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for code, room_id in enumerate(self.grid.room_ids):
+            n = max(self._room_cells[code], 1.0)
+            out[room_id] = {
+                "cells": int(self._room_cells[code]),
+                "coverage": float(self._room_covered[code] / n),
+                "accuracy": float(self._room_correct[code] / n),
+            }
+        return out
+
+    def score(self) -> Dict[str, float]:
+        cells = max(float(self._room_cells.sum()), 1.0)
+        return {"coverage": float(self._room_covered.sum() / cells), "accuracy": float(self._room_correct.sum() / cells)}
+
+    def anchor_properties(self) -> Dict[str, Dict[str, Any]]:
+        """Per-anchor `extra_properties`: the cells each anchor wins and how many it covers."""
+        won = np.bincount(self._best_slot[self._best_slot >= 0], minlength=len(self._rssi))
+        out = {}
+        for anchor_id, slot in self._slot.items():
+            out[anchor_id] = {
+                "strongest_cells": int(won[slot]),
+                "covered_cells": int((self._rssi[slot] >= self.threshold_dbm).sum()),
+            }
+        return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--auto-anchors", dest="auto_anchors", action="store_true")
+    parser.add_argument("--cell", dest="cell_m", type=float, default=0.5)
+    parser.add_argument("--min-anchors", dest="min_anchors", type=int, default=1)
+    parser.add_argument("--move", dest="moves", nargs=3, action="append", metavar=("ANCHOR", "X", "Y"), default=[])
+    parser.add_argument("--remove", dest="removes", action="append", default=[])
+    parser.add_argument("--bench", dest="bench", type=int, default=0)
+    parser.add_argument("--level", dest="level", default=None)
+    parser.add_argument("--walls", dest="walls", action="store_true", help="subtract wall attenuation (see walls.py)")
+    args = parser.parse_args()
+
+    anchors_ = list(v6.anchors) + v6.recommend_anchors(v6.rooms) if args.auto_anchors else default_anchors()
+    walls = None
+    if args.walls:
+        from walls import build_walls
+
+        rooms_on_level = [r for r in v6.rooms if args.level is None or v6.level_of(r, v6.levels) == args.level]
+        walls = build_walls(rooms_on_level, [d for d in v6.doors if args.level is None or v6.level_of(d, v6.levels) == args.level])
+    scorer = IncrementalScorer(
+        v6.rooms, v6.zones, anchors_, cell_m=args.cell_m, min_anchors=args.min_anchors, levels_=v6.levels, level=args.level, walls=walls
+    )
+    print(f"Baseline: {json.dumps(scorer.score())}")
+
+    for anchor_id, x, y in args.moves:
+        start = time.perf_counter()
+        scorer.move(anchor_id, float(x), float(y))
+        print(f"Moved {anchor_id} to ({x}, {y}) in {(time.perf_counter() - start) * 1e3:.3f} ms: {json.dumps(scorer.score())}")
+    for anchor_id in args.removes:
+        start = time.perf_counter()
+        scorer.remove(anchor_id)
+        print(f"Removed {anchor_id} in {(time.perf_counter() - start) * 1e3:.3f} ms: {json.dumps(scorer.score())}")
+    if args.moves or args.removes:
+        print(json.dumps(scorer.room_metrics(), indent=2))
+
+    if args.bench:
+        rng = random.Random(7)
+        ids = list(scorer.anchors)
+        timings = []
+        for _ in range(args.bench):
+            x = rng.uniform(scorer.grid.x0, scorer.grid.x0 + scorer.grid.nx * scorer.grid.cell_m)
+            y = rng.uniform(scorer.grid.y0, scorer.grid.y0 + scorer.grid.ny * scorer.grid.cell_m)
+            start = time.perf_counter()
+            scorer.move(rng.choice(ids), x, y)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"{args.bench} moves on {scorer.grid.size} cells x {len(ids)} anchors: median {timings[len(timings) // 2] * 1e3:.3f} ms, p99 {timings[int(len(timings) * 0.99)] * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Uniform-grid spatial index over venue items (rooms, zones, ...), rectangular or polygonal."""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from geometry import Shape, shape_of
+
+
+class RectIndex:
+    """Buckets item bounding boxes into square cells so point lookups only test nearby items.
+
+    Polygon items are bucketed by their bounding box and confirmed with an exact
+    point-in-polygon test.
+    """
+
+    def __init__(self, items: List[Dict[str, Any]], cell_m: float = 4.0) -> None:
+        self.cell_m = cell_m
+        self.items: List[Dict[str, Any]] = []
+        self.ids: List[str] = []
+        self._rects: List[Tuple[float, float, float, float]] = []
+        self._shapes: List[Optional[Shape]] = []
+        self._areas: List[float] = []
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for item in items:
+            self.insert(item)
+
+    def _cell_range(self, x0: float, y0: float, x1: float, y1: float) -> Tuple[int, int, int, int]:
+        c = self.cell_m
+        return math.floor(x0 / c), math.floor(y0 / c), math.floor(x1 / c), math.floor(y1 / c)
+
+    def insert(self, item: Dict[str, Any]) -> int:
+        shape = shape_of(item)
+        x0, y0, x1, y1 = shape.bbox
+        idx = len(self.items)
+        self.items.append(item)
+        self.ids.append(item.get("id", ""))
+        self._rects.append(shape.bbox)
+        self._shapes.append(None if shape.is_rect else shape)
+        self._areas.append(shape.area)
+        cx0, cy0, cx1, cy1 = self._cell_range(x0, y0, x1, y1)
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                self._cells.setdefault((cx, cy), []).append(idx)
+        return idx
+
+    def query(self, x: float, y: float) -> List[int]:
+        c = self.cell_m
+        out = []
+        for idx in self._cells.get((math.floor(x / c), math.floor(y / c)), ()):
+            x0, y0, x1, y1 = self._rects[idx]
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                shape = self._shapes[idx]
+                if shape is None or shape.contains(x, y):
+                    out.append(idx)
+        return out
+
+    def query_radius(self, x: float, y: float, radius: float) -> List[int]:
+        cx0, cy0, cx1, cy1 = self._cell_range(x - radius, y - radius, x + radius, y + radius)
+        seen = set()
+        out = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                for idx in self._cells.get((cx, cy), ()):
+                    if idx in seen:
+                        continue
+                    seen.add(idx)
+                    x0, y0, x1, y1 = self._rects[idx]
+                    dx = max(x0 - x, 0.0, x - x1)
+                    dy = max(y0 - y, 0.0, y - y1)
+                    if dx * dx + dy * dy <= radius * radius:
+                        out.append(idx)
+        return out
+
+    def locate(self, x: float, y: float) -> Optional[str]:
+        hits = self.query(x, y)
+        if not hits:
+            return None
+        return self.ids[min(hits, key=lambda i: self._areas[i])]
+
+
+class LevelIndex:
+    """One RectIndex per level, so (x, y, level) lookups never touch other floors.
+
+    Items and lookups without a level use `default_level` (the venue's first level),
+    else the first item's level. Without any levels this is a single RectIndex.
+    """
+
+    def __init__(self, items: List[Dict[str, Any]], default_level: Optional[str] = None, cell_m: float = 4.0) -> None:
+        default_level = default_level or (items[0].get("level") if items else None)
+        self.default_level = default_level
+        self.cell_m = cell_m
+        grouped: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        for item in items:
+            grouped.setdefault(item.get("level") or default_level, []).append(item)
+        self.levels: Dict[Optional[str], RectIndex] = {level: RectIndex(group, cell_m=cell_m) for level, group in grouped.items()}
+
+    def insert(self, item: Dict[str, Any]) -> None:
+        level = item.get("level") or self.default_level
+        if level not in self.levels:
+            self.levels[level] = RectIndex([], cell_m=self.cell_m)
+        self.levels[level].insert(item)
+
+    def locate(self, x: float, y: float, level: Optional[str] = None) -> Optional[str]:
+        index = self.levels.get(level or self.default_level)
+        return index.locate(x, y) if index is not None else None
+
+    def query(self, x: float, y: float, level: Optional[str] = None) -> List[Dict[str, Any]]:
+        index = self.levels.get(level or self.default_level)
+        if index is None:
+            return []
+        return [index.items[i] for i in index.query(x, y)]
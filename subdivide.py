@@ -0,0 +1,362 @@
+"""Virtual rooms: split large physical rooms into regions with 3 anchors each.
+
+A virtual room (see plan.md) is the unit that inference and UX report. Small rooms are
+one virtual room each; a room larger than `max_area_m2` (or holding more people than
+`capacity_per_virtual`) is split into k virtual rooms. Modes:
+
+- `grid`: k from area; split into nx x ny cells (every factorization of k is a candidate)
+- `voronoi`: k from area; cells around k seeds (several k-means starts are candidates)
+- `capacity`: k from the room's `capacity` (or area x density); grid and Voronoi candidates
+
+Each candidate gets 3 anchors per virtual room (one coverage anchor near the center and
+two disambiguation anchors, as `recommend_anchors(per_room=3)` places them; narrow rooms
+take the missing ones along their long axis). These are the anchors exported. All candidates
+for a room are scored together as one NumPy tensor: RSSI from every anchor at every grid point
+of the room, the virtual room whose anchor triple is strongest on average wins, and the
+candidate that classifies the most points correctly (then the widest margin) is kept.
+
+    python3 subdivide.py --mode grid --max-area 150
+    python3 map-generator-v6.py --subdivide voronoi --auto-anchors
+"""
+
+import argparse
+import json
+import math
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import rfmodel
+from geometry import shape_of
+from mapgen import v6
+
+MODES = ("grid", "voronoi", "capacity")
+MAX_AREA_M2 = 150.0
+CAPACITY_PER_VIRTUAL = 200
+DENSITY_PER_M2 = 1.5
+ANCHORS_PER_VIRTUAL = 3
+EVAL_CELL_M = 0.5
+VORONOI_STARTS = 6
+
+Point = Tuple[float, float]
+
+
+def _clip(ring: Sequence[Point], a: float, b: float, c: float) -> List[Point]:
+    """Sutherland-Hodgman clip of `ring` to the half-plane a*x + b*y <= c."""
+    out: List[Point] = []
+    n = len(ring)
+    for i in range(n):
+        p, q = ring[i], ring[(i + 1) % n]
+        fp = a * p[0] + b * p[1] - c
+        fq = a * q[0] + b * q[1] - c
+        if fp <= 0:
+            out.append(p)
+        if (fp < 0 < fq) or (fq < 0 < fp):
+            s = fp / (fp - fq)
+            out.append((p[0] + s * (q[0] - p[0]), p[1] + s * (q[1] - p[1])))
+    return out
+
+
+def _ring_area(ring: Sequence[Point]) -> float:
+    return abs(sum(ring[i][0] * ring[(i + 1) % len(ring)][1] - ring[(i + 1) % len(ring)][0] * ring[i][1] for i in range(len(ring)))) / 2.0
+
+
+@dataclass(frozen=True)
+class Candidate:
+    layout: str
+    cells: List[Dict[str, Any]]
+    labels: np.ndarray
+    anchors: np.ndarray
+
+
+@dataclass(frozen=True)
+class Subdivision:
+    virtual_rooms: List[Dict[str, Any]]
+    anchors: List[Dict[str, Any]]
+    scores: Dict[str, Dict[str, Any]]
+
+
+def _cell_item(room: Dict[str, Any], ring: Sequence[Point], rect: Optional[Tuple[float, float, float, float]]) -> Dict[str, Any]:
+    item: Dict[str, Any] = {"color": room.get("color", "#CCCCCC")}
+    if room.get("level"):
+        item["level"] = room["level"]
+    if rect is not None:
+        item.update({"x": rect[0], "y": rect[1], "w": rect[2], "h": rect[3]})
+    else:
+        item["points"] = [[round(x, 6), round(y, 6)] for x, y in ring]
+    return item
+
+
+def grid_candidates(room: Dict[str, Any], k: int, points: np.ndarray) -> List[Tuple[str, List[Dict[str, Any]], np.ndarray]]:
+    shape = shape_of(room)
+    x0, y0, x1, y1 = shape.bbox
+    out = []
+    for nx in range(1, k + 1):
+        if k % nx:
+            continue
+        ny = k // nx
+        dx, dy = (x1 - x0) / nx, (y1 - y0) / ny
+        cells = []
+        for j in range(ny):
+            for i in range(nx):
+                cx0, cy0 = x0 + i * dx, y0 + j * dy
+                if shape.is_rect:
+                    cells.append(_cell_item(room, (), (cx0, cy0, dx, dy)))
+                    continue
+                ring = list(shape.outer)
+                for a, b, c in ((-1, 0, -cx0), (1, 0, cx0 + dx), (0, -1, -cy0), (0, 1, cy0 + dy)):
+                    ring = _clip(ring, a, b, c)
+                cells.append(_cell_item(room, ring, None) if len(ring) >= 3 and _ring_area(ring) > 0 else {})
+        ix = np.clip(((points[:, 0] - x0) // dx).astype(np.int64), 0, nx - 1)
+        iy = np.clip(((points[:, 1] - y0) // dy).astype(np.int64), 0, ny - 1)
+        out.append((f"grid {nx}x{ny}", cells, iy * nx + ix))
+    return out
+
+
+def voronoi_candidates(
+    room: Dict[str, Any], k: int, points: np.ndarray, starts: int = VORONOI_STARTS, seed: int = 0
+) -> List[Tuple[str, List[Dict[str, Any]], np.ndarray]]:
+    shape = shape_of(room)
+    rng = np.random.default_rng(seed)
+    out = []
+    for start in range(starts):
+        # Lloyd iterations over the room's grid points give area-balanced seeds.
+        seeds = points[rng.choice(len(points), size=k, replace=False)]
+        for _ in range(20):
+            d2 = ((points[:, None, :] - seeds[None, :, :]) ** 2).sum(axis=2)
+            labels = d2.argmin(axis=1)
+            moved = np.array([points[labels == i].mean(axis=0) if np.any(labels == i) else seeds[i] for i in range(k)])
+            if np.allclose(moved, seeds):
+                break
+            seeds = moved
+        labels = ((points[:, None, :] - seeds[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        cells = []
+        for i in range(k):
+            ring = list(shape.outer)
+            for j in range(k):
+                if i == j:
+                    continue
+                # Closer to seed i than seed j: 2 (sj - si) . p <= |sj|^2 - |si|^2.
+                a, b = 2 * (seeds[j] - seeds[i])
+                c = float(seeds[j] @ seeds[j] - seeds[i] @ seeds[i])
+                ring = _clip(ring, float(a), float(b), c)
+            cells.append(_cell_item(room, ring, None) if len(ring) >= 3 and _ring_area(ring) > 0 else {})
+        out.append((f"voronoi #{start + 1}", cells, labels))
+    return out
+
+
+def room_points(room: Dict[str, Any], cell_m: float = EVAL_CELL_M) -> np.ndarray:
+    shape = shape_of(room)
+    x0, y0, x1, y1 = shape.bbox
+    xs = np.arange(x0 + cell_m / 2, x1, cell_m)
+    ys = np.arange(y0 + cell_m / 2, y1, cell_m)
+    gx, gy = (g.ravel() for g in np.meshgrid(xs, ys))
+    inside = np.asarray(shape.contains_many(gx, gy), dtype=bool)
+    return np.stack([gx[inside], gy[inside]], axis=1)
+
+
+def virtual_anchors(vroom: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """`recommend_anchors(per_room=3)` for one virtual room, padded to 3 in narrow rooms.
+
+    `recommend_anchors` drops offsets within half a meter of a wall, so a 1 m wide strip
+    keeps only its center. The missing anchors go along the room's long axis (a quarter,
+    then an eighth of its length either side of the center), else on the room's grid
+    point farthest from the anchors already placed.
+    """
+    placed = v6.recommend_anchors([vroom], per_room=ANCHORS_PER_VIRTUAL)
+    if not placed or len(placed) >= ANCHORS_PER_VIRTUAL:
+        return placed
+    shape = shape_of(vroom)
+    xy = [(float(a["x"]), float(a["y"])) for a in placed]
+    cx, cy = xy[0]
+    x0, y0, x1, y1 = shape.bbox
+    ux, uy = (x1 - x0, 0.0) if x1 - x0 >= y1 - y0 else (0.0, y1 - y0)
+    for f in (0.25, -0.25, 0.125, -0.125):
+        px, py = cx + f * ux, cy + f * uy
+        if len(xy) < ANCHORS_PER_VIRTUAL and shape.contains(px, py) and min(math.hypot(px - ax, py - ay) for ax, ay in xy) >= 0.5:
+            xy.append((px, py))
+    points = room_points(vroom, EVAL_CELL_M / 2)
+    while len(xy) < ANCHORS_PER_VIRTUAL and len(points):
+        gap = np.min(np.hypot(points[:, None, 0] - np.array(xy)[None, :, 0], points[:, None, 1] - np.array(xy)[None, :, 1]), axis=1)
+        if gap.max() <= 0:
+            break
+        xy.append(tuple(float(c) for c in points[int(gap.argmax())]))
+    return placed + [
+        {**placed[0], "id": f"anchor_suggested_{vroom['id']}_{idx}", "name": f"Suggested Anchor {idx + 1}", "x": x, "y": y}
+        for idx, (x, y) in enumerate(xy[len(placed) :], start=len(placed))
+    ]
+
+
+def _anchor_triples(cells: List[Dict[str, Any]]) -> np.ndarray:
+    out = np.full((len(cells), ANCHORS_PER_VIRTUAL, 2), np.nan)
+    for i, cell in enumerate(cells):
+        if not cell:
+            continue
+        # Scored with exactly the anchors `subdivide_venue` exports for this cell.
+        xy = [(float(a["x"]), float(a["y"])) for a in virtual_anchors({**cell, "id": "cell"})]
+        out[i, : len(xy)] = xy[:ANCHORS_PER_VIRTUAL]
+    return out
+
+
+def evaluate(candidates: List[Candidate], points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Accuracy and mean top-1/top-2 margin (dB) of every candidate, in one batched pass.
+
+    Candidates are padded to the largest k; padded virtual rooms score -inf and never win.
+    A virtual room too small for 3 anchors averages over the anchors it has.
+    """
+    k_max = max(len(c.cells) for c in candidates)
+    anchors = np.full((len(candidates), k_max, ANCHORS_PER_VIRTUAL, 2), np.nan)
+    labels = np.stack([c.labels for c in candidates])
+    for i, c in enumerate(candidates):
+        anchors[i, : len(c.cells)] = c.anchors
+    delta = anchors[:, :, :, None, :] - points[None, None, None, :, :]
+    distances = np.maximum(np.hypot(delta[..., 0], delta[..., 1]), rfmodel.MIN_DISTANCE_M)
+    rssi = rfmodel.path_loss_rssi(distances)
+    present = (~np.isnan(rssi)).sum(axis=2)
+    score = np.where(present > 0, np.nansum(rssi, axis=2) / np.maximum(present, 1), -np.inf)
+    predicted = score.argmax(axis=1)
+    accuracy = (predicted == labels).mean(axis=1)
+    if k_max > 1:
+        top2 = np.sort(score, axis=1)[:, -2:, :]
+        gap = top2[:, 1] - top2[:, 0]
+        margin = np.where(np.isfinite(gap), gap, 0.0).mean(axis=1)
+    else:
+        margin = np.zeros(len(candidates))
+    return accuracy, margin
+
+
+def virtual_count(room: Dict[str, Any], mode: str, max_area_m2: float, capacity_per_virtual: int, density: float) -> int:
+    area = shape_of(room).area
+    if mode == "capacity":
+        capacity = float(room.get("capacity", area * density))
+        return max(1, math.ceil(capacity / capacity_per_virtual))
+    return max(1, math.ceil(area / max_area_m2))
+
+
+def subdivide_room(
+    room: Dict[str, Any],
+    mode: str = "grid",
+    max_area_m2: float = MAX_AREA_M2,
+    capacity_per_virtual: int = CAPACITY_PER_VIRTUAL,
+    density: float = DENSITY_PER_M2,
+    cell_m: float = EVAL_CELL_M,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Virtual rooms for one physical room, and the winning candidate's score."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown subdivision mode {mode!r}; expected one of {', '.join(MODES)}")
+    room_id = room["id"]
+    k = virtual_count(room, mode, max_area_m2, capacity_per_virtual, density)
+    points = room_points(room, cell_m)
+    if k == 1 or len(points) < k:
+        whole = {key: value for key, value in room.items() if key in ("x", "y", "w", "h", "points", "holes", "level", "color")}
+        layouts = [("whole", [whole], np.zeros(len(points), dtype=np.int64))]
+    else:
+        layouts = []
+        if mode in ("grid", "capacity"):
+            layouts += grid_candidates(room, k, points)
+        if mode in ("voronoi", "capacity"):
+            layouts += voronoi_candidates(room, k, points)
+    candidates = [Candidate(name, cells, labels, _anchor_triples(cells)) for name, cells, labels in layouts]
+    accuracy, margin = evaluate(candidates, points) if len(points) else (np.ones(len(candidates)), np.zeros(len(candidates)))
+    best = int(np.lexsort((-margin, -accuracy))[0])
+    winner = candidates[best]
+
+    out = []
+    name = room.get("name") or room_id
+    for i, cell in enumerate(winner.cells):
+        if not cell:
+            continue
+        vroom_id = f"{room_id}_v{i}"
+        vroom = {**cell, "id": vroom_id, "name": f"{name} {i + 1}" if len(winner.cells) > 1 else name, "parent": room_id}
+        out.append(vroom)
+    score = {
+        "layout": winner.layout,
+        "virtual_rooms": len(out),
+        "accuracy": round(float(accuracy[best]), 4),
+        "margin_db": round(float(margin[best]), 2),
+        "candidates": len(candidates),
+    }
+    return out, score
+
+
+def subdivide_venue(
+    rooms_: List[Dict[str, Any]],
+    mode: str = "grid",
+    max_area_m2: float = MAX_AREA_M2,
+    capacity_per_virtual: int = CAPACITY_PER_VIRTUAL,
+    density: float = DENSITY_PER_M2,
+) -> Subdivision:
+    virtual_rooms: List[Dict[str, Any]] = []
+    scores: Dict[str, Dict[str, Any]] = {}
+    for room in rooms_:
+        if not room.get("id") or shape_of(room).area <= 0:
+            continue
+        vrooms, score = subdivide_room(room, mode, max_area_m2, capacity_per_virtual, density)
+        virtual_rooms.extend(vrooms)
+        scores[room["id"]] = score
+    anchors_out = [a for v in virtual_rooms for a in virtual_anchors(v)]
+    parents = {v["id"]: v["parent"] for v in virtual_rooms}
+    for a in anchors_out:
+        a["parent_room"] = parents[a["room"]]
+    return Subdivision(virtual_rooms, anchors_out, scores)
+
+
+def feature_items(virtual_rooms: List[Dict[str, Any]], anchors_: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """`VirtualRoom` items for `generate_geojson(extra_layers=...)`."""
+    by_room: Dict[str, List[str]] = {}
+    for a in anchors_ or []:
+        if a.get("room"):
+            by_room.setdefault(a["room"], []).append(a["id"])
+    out = []
+    for v in virtual_rooms:
+        props = {
+            "id": v["id"],
+            "name": v.get("name", ""),
+            "parent": v["parent"],
+            "area_m2": round(shape_of(v).area, 3),
+            "anchors": by_room.get(v["id"], []),
+        }
+        out.append({**v, "properties": props})
+    return out
+
+
+def svg_layer(virtual_rooms: List[Dict[str, Any]]) -> Callable[[float], List[str]]:
+    """`generate_svg(extra_layers=...)` renderer: dashed virtual room outlines."""
+
+    def render(scale: float) -> List[str]:
+        out = []
+        for v in virtual_rooms:
+            if "points" in v:
+                d = " ".join("M " + " L ".join(f"{x * scale},{y * scale}" for x, y in ring) + " Z" for ring in shape_of(v).rings())
+                out.append(f'<path d="{d}" fill="none" stroke="#5A2D82" stroke-width="1.5" stroke-dasharray="8,4" />')
+            else:
+                out.append(
+                    f'<rect x="{v["x"] * scale}" y="{v["y"] * scale}" width="{v["w"] * scale}" height="{v["h"] * scale}" '
+                    'fill="none" stroke="#5A2D82" stroke-width="1.5" stroke-dasharray="8,4" />'
+                )
+        return out
+
+    return render
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", dest="mode", choices=MODES, default="grid")
+    parser.add_argument("--max-area", dest="max_area_m2", type=float, default=MAX_AREA_M2)
+    parser.add_argument("--capacity-per-virtual", dest="capacity_per_virtual", type=int, default=CAPACITY_PER_VIRTUAL)
+    parser.add_argument("--density", dest="density", type=float, default=DENSITY_PER_M2)
+    parser.add_argument("--out-json", dest="out_json", default=None)
+    args = parser.parse_args()
+
+    plan = subdivide_venue(v6.rooms, args.mode, args.max_area_m2, args.capacity_per_virtual, args.density)
+    for room_id, score in plan.scores.items():
+        print(f"{room_id}: {score['virtual_rooms']} virtual room(s), {score['layout']}, accuracy {score['accuracy']:.3f}, margin {score['margin_db']} dB ({score['candidates']} candidates)")
+    if args.out_json:
+        with open(args.out_json, "w") as f:
+            json.dump({"virtual_rooms": plan.virtual_rooms, "anchors": plan.anchors, "scores": plan.scores}, f, indent=2)
+        print(f"Generated virtual rooms: {args.out_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Synthetic venues built by tiling the real Substation layout from map-generator-v6.py."""
+
+import math
+from typing import Any, Dict, List
+
+from mapgen import default_anchors, v6
+
+TILE_GAP_M = 2.0
+
+
+def _shift(item: Dict[str, Any], dx: float, dy: float, suffix: str) -> Dict[str, Any]:
+    out = dict(item)
+    if "id" in out and out["id"]:
+        out["id"] = f"{out['id']}{suffix}"
+    if "name" in out and "id" not in item:
+        out["name"] = f"{out['name']}{suffix}"
+    if out.get("parent"):
+        out["parent"] = f"{out['parent']}{suffix}"
+    if out.get("room"):
+        out["room"] = f"{out['room']}{suffix}"
+    if "points" in out:
+        out["points"] = [[pt[0] + dx, pt[1] + dy] for pt in out["points"]]
+        if out.get("holes"):
+            out["holes"] = [[[pt[0] + dx, pt[1] + dy] for pt in ring] for ring in out["holes"]]
+    else:
+        out["x"] = float(out["x"]) + dx
+        out["y"] = float(out["y"]) + dy
+    return out
+
+
+def build_venue(n_rooms: int) -> Dict[str, List[Dict[str, Any]]]:
+    """Tile copies of the Substation venue on a square grid until `n_rooms` rooms exist.
+
+    Every collection is tiled with its rooms, so zones/doors/pins/anchors scale in the
+    same proportions as the real venue. Ids get a `_<copy>` suffix to stay unique.
+    """
+    base = {
+        "rooms": v6.rooms,
+        "zones": v6.zones,
+        "doors": v6.doors,
+        "polygons": v6.polygons,
+        "pins": v6.pins,
+        "anchors": default_anchors(),
+    }
+    bounds = v6.compute_bounds_m(v6.rooms, v6.zones, v6.doors, v6.polygons, v6.pins, base["anchors"])
+    copies = max(1, math.ceil(n_rooms / len(v6.rooms)))
+    cols = max(1, math.ceil(math.sqrt(copies)))
+    venue: Dict[str, List[Dict[str, Any]]] = {name: [] for name in base}
+    for copy_idx in range(copies):
+        dx = (copy_idx % cols) * (bounds.width_m + TILE_GAP_M)
+        dy = (copy_idx // cols) * (bounds.height_m + TILE_GAP_M)
+        suffix = f"_{copy_idx}"
+        room_budget = n_rooms - len(venue["rooms"])
+        kept_rooms = {r["id"] for r in v6.rooms[:room_budget]}
+        for name, items in base.items():
+            for item in items:
+                if name == "rooms" and item["id"] not in kept_rooms:
+                    continue
+                if name == "zones" and item.get("parent") not in kept_rooms:
+                    continue
+                if name == "anchors" and item.get("room") and item["room"] not in kept_rooms:
+                    continue
+                venue[name].append(_shift(item, dx, dy, suffix))
+    return venue
+
+
+def feature_count(venue: Dict[str, List[Dict[str, Any]]]) -> int:
+    return sum(len(items) for items in venue.values())
@@ -0,0 +1,396 @@
+"""Room/zone transition engine: per-device hysteresis compiled from the venue map.
+
+`compile_venue` turns rooms, zones and doors into two `TransitionModel`s. Each holds:
+
+- `adjacency`: which places a device can move between directly. Rooms are linked through
+  doors; rooms that no door reaches fall back to the rooms they share a wall with. Zones
+  are linked to "no zone" (their parent room's floor) and to zones they touch or share a door with.
+- `enter_threshold`: summed classifier confidence needed, over consecutive scans, before
+  a device is moved into a place. It is higher for places with a long shared boundary.
+- `min_dwell_s`: how long a device stays in a place before it may leave, roughly the time
+  to walk across the place's short side.
+
+A jump between non-adjacent places needs `jump_factor` times the usual evidence, so a
+device that really did move out of sight still gets through eventually.
+
+`TransitionEngine` keeps the state of every device in arrays and advances all of them
+with the same handful of vectorized operations, without per-device branching:
+
+    rooms_model, zones_model = compile_venue(v6.rooms, v6.zones, v6.doors)
+    engine = TransitionEngine(rooms_model)
+    smoothed = engine.process(devices, t, predicted_rooms, confidence)
+
+    python3 transitions.py --out-geojson transitions.geojson        # parameters as feature properties
+    python3 transitions.py --replay labelled.csv                    # flip-flops before/after
+"""
+
+import argparse
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geometry import shape_of
+
+WALK_SPEED_MPS = 1.2
+BASE_ENTER = 1.5
+JUMP_FACTOR = 3.0
+MIN_DWELL_RANGE_S = (1.0, 8.0)
+DOOR_REACH_M = 0.3
+EDGE_TOL_M = 0.05
+NO_ZONE = ""
+
+
+def _segments(item: Dict[str, Any]) -> List[Tuple[float, float, float, float]]:
+    out = []
+    for ring in shape_of(item).rings():
+        n = len(ring)
+        for i in range(n):
+            (x0, y0), (x1, y1) = ring[i], ring[(i + 1) % n]
+            out.append((x0, y0, x1, y1))
+    return out
+
+
+def _overlap(a: Tuple[float, float, float, float], b: Tuple[float, float, float, float]) -> float:
+    """Length over which two segments lie on the same line (within EDGE_TOL_M)."""
+    ax, ay, bx, by = a
+    dx, dy = bx - ax, by - ay
+    length = (dx * dx + dy * dy) ** 0.5
+    if length == 0:
+        return 0.0
+    ux, uy = dx / length, dy / length
+    # Both endpoints of b must lie on a's line.
+    for px, py in ((b[0], b[1]), (b[2], b[3])):
+        if abs((px - ax) * uy - (py - ay) * ux) > EDGE_TOL_M:
+            return 0.0
+    s0 = (b[0] - ax) * ux + (b[1] - ay) * uy
+    s1 = (b[2] - ax) * ux + (b[3] - ay) * uy
+    return max(0.0, min(length, max(s0, s1)) - max(0.0, min(s0, s1)))
+
+
+def shared_boundaries(items: List[Dict[str, Any]]) -> Dict[Tuple[int, int], float]:
+    """Shared outline length for every pair of items whose boundaries touch.
+
+    Candidate pairs come from a sweep over bounding boxes sorted by min x, so only
+    items whose boxes touch are compared edge by edge.
+    """
+    boxes = [shape_of(item).bbox for item in items]
+    order = sorted(range(len(items)), key=lambda i: boxes[i][0])
+    segments: Dict[int, List[Tuple[float, float, float, float]]] = {}
+    active: List[int] = []
+    out: Dict[Tuple[int, int], float] = {}
+    for i in order:
+        x0, y0, x1, y1 = boxes[i]
+        active = [j for j in active if boxes[j][2] >= x0 - EDGE_TOL_M]
+        for j in active:
+            if boxes[j][1] > y1 + EDGE_TOL_M or boxes[j][3] < y0 - EDGE_TOL_M:
+                continue
+            seg_i = segments.setdefault(i, _segments(items[i]))
+            seg_j = segments.setdefault(j, _segments(items[j]))
+            shared = sum(_overlap(a, b) for a in seg_i for b in seg_j)
+            if shared > EDGE_TOL_M:
+                out[(min(i, j), max(i, j))] = shared
+        active.append(i)
+    return out
+
+
+def door_links(items: List[Dict[str, Any]], doors_: List[Dict[str, Any]], reach_m: float = DOOR_REACH_M) -> List[List[int]]:
+    """For each door, the items its rectangle (grown by `reach_m`) overlaps."""
+    shapes = [shape_of(item) for item in items]
+    out = []
+    for d in doors_:
+        x0, y0 = d["x"] - reach_m, d["y"] - reach_m
+        x1, y1 = d["x"] + d["w"] + reach_m, d["y"] + d["h"] + reach_m
+        xs = np.linspace(x0, x1, 5)
+        ys = np.linspace(y0, y1, 5)
+        gx, gy = (g.ravel() for g in np.meshgrid(xs, ys))
+        hits = []
+        for i, shape in enumerate(shapes):
+            bx0, by0, bx1, by1 = shape.bbox
+            if bx1 < x0 or bx0 > x1 or by1 < y0 or by0 > y1:
+                continue
+            if shape.is_rect or np.any(shape.contains_many(gx, gy)):
+                hits.append(i)
+        out.append(hits)
+    return out
+
+
+@dataclass(frozen=True)
+class TransitionModel:
+    ids: List[str]
+    adjacency: np.ndarray
+    enter_threshold: np.ndarray
+    min_dwell_s: np.ndarray
+    jump_factor: float = JUMP_FACTOR
+
+    def code(self, place_id: Optional[str]) -> int:
+        try:
+            return self.ids.index(place_id or NO_ZONE)
+        except ValueError:
+            return -1
+
+    def codes(self, place_ids: Sequence[Optional[str]]) -> np.ndarray:
+        lookup = {place_id: i for i, place_id in enumerate(self.ids)}
+        return np.fromiter((lookup.get(p if p is not None else NO_ZONE, -1) for p in place_ids), dtype=np.int32, count=len(place_ids))
+
+    def neighbours(self, code: int) -> List[str]:
+        return [self.ids[j] for j in np.flatnonzero(self.adjacency[code]) if j != code and self.ids[j] != NO_ZONE]
+
+    def properties(self) -> Dict[str, Dict[str, Any]]:
+        """Per-place tuning parameters for `generate_geojson(extra_properties=...)`."""
+        out = {}
+        for code, place_id in enumerate(self.ids):
+            if place_id == NO_ZONE:
+                continue
+            out[place_id] = {
+                "fsm_enter_threshold": round(float(self.enter_threshold[code]), 3),
+                "fsm_min_dwell_s": round(float(self.min_dwell_s[code]), 2),
+                "fsm_jump_factor": self.jump_factor,
+                "fsm_neighbours": self.neighbours(code),
+            }
+        return out
+
+
+def _parameters(items: List[Dict[str, Any]], shared: Dict[Tuple[int, int], float], base_enter: float) -> Tuple[np.ndarray, np.ndarray]:
+    perimeter = np.zeros(len(items))
+    shared_len = np.zeros(len(items))
+    short_side = np.zeros(len(items))
+    for i, item in enumerate(items):
+        shape = shape_of(item)
+        perimeter[i] = sum(((x1 - x0) ** 2 + (y1 - y0) ** 2) ** 0.5 for x0, y0, x1, y1 in _segments(item))
+        short_side[i] = min(shape.width, shape.height)
+    for (i, j), length in shared.items():
+        shared_len[i] += length
+        shared_len[j] += length
+    enter = base_enter * (1.0 + np.clip(shared_len / np.maximum(perimeter, 1e-9), 0.0, 1.0))
+    dwell = np.clip(short_side / WALK_SPEED_MPS, *MIN_DWELL_RANGE_S)
+    # Items may pin their own values.
+    for i, item in enumerate(items):
+        if "fsm_enter_threshold" in item:
+            enter[i] = float(item["fsm_enter_threshold"])
+        if "fsm_min_dwell_s" in item:
+            dwell[i] = float(item["fsm_min_dwell_s"])
+    return enter, dwell
+
+
+def compile_rooms(rooms_: List[Dict[str, Any]], doors_: List[Dict[str, Any]], base_enter: float = BASE_ENTER) -> TransitionModel:
+    items = [r for r in rooms_ if r.get("id")]
+    n = len(items)
+    adjacency = np.eye(n, dtype=bool)
+    shared = shared_boundaries(items)
+    doored = np.zeros(n, dtype=bool)
+    for hits in door_links(items, doors_):
+        for a in hits:
+            for b in hits:
+                adjacency[a, b] = True
+        if len(hits) > 1:
+            doored[hits] = True
+    for (i, j) in shared:
+        # Maps rarely draw every door: a room no door reaches is linked to its wall neighbours.
+        if not doored[i] or not doored[j]:
+            adjacency[i, j] = adjacency[j, i] = True
+    enter, dwell = _parameters(items, shared, base_enter)
+    return TransitionModel([r["id"] for r in items], adjacency, enter, dwell)
+
+
+def compile_zones(zones_: List[Dict[str, Any]], doors_: List[Dict[str, Any]], base_enter: float = BASE_ENTER) -> TransitionModel:
+    items = [z for z in zones_ if z.get("id")]
+    n = len(items)
+    # The last state is "no zone": the open floor of the parent room.
+    adjacency = np.eye(n + 1, dtype=bool)
+    adjacency[n, :] = adjacency[:, n] = True
+    shared = shared_boundaries(items)
+    for (i, j) in shared:
+        adjacency[i, j] = adjacency[j, i] = True
+    for hits in door_links(items, doors_):
+        for a in hits:
+            for b in hits:
+                adjacency[a, b] = True
+    enter, dwell = _parameters(items, shared, base_enter)
+    return TransitionModel(
+        [z["id"] for z in items] + [NO_ZONE],
+        adjacency,
+        np.append(enter, base_enter),
+        np.append(dwell, MIN_DWELL_RANGE_S[0]),
+    )
+
+
+def compile_venue(
+    rooms_: List[Dict[str, Any]], zones_: List[Dict[str, Any]], doors_: List[Dict[str, Any]], base_enter: float = BASE_ENTER
+) -> Tuple[TransitionModel, TransitionModel]:
+    return compile_rooms(rooms_, doors_, base_enter), compile_zones(zones_, doors_, base_enter)
+
+
+def scan_rounds(slots: np.ndarray, t: np.ndarray) -> List[np.ndarray]:
+    """Split a batch of scans into rounds: round k holds the k-th scan (in time) of every device."""
+    n = len(t)
+    order = np.lexsort((t, slots))
+    sorted_slots = slots[order]
+    first = np.ones(n, dtype=bool)
+    first[1:] = sorted_slots[1:] != sorted_slots[:-1]
+    group_start = np.maximum.accumulate(np.where(first, np.arange(n), 0))
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n) - group_start
+    by_round = np.argsort(rank, kind="stable")
+    bounds = np.searchsorted(rank[by_round], np.arange(int(rank.max()) + 2))
+    return [by_round[bounds[r] : bounds[r + 1]] for r in range(len(bounds) - 1)]
+
+
+class TransitionEngine:
+    """Per-device hysteresis state in flat arrays, advanced for many devices at once."""
+
+    def __init__(self, model: TransitionModel, capacity: int = 1024) -> None:
+        self.model = model
+        self.slots: Dict[str, int] = {}
+        self.current = np.full(capacity, -1, dtype=np.int32)
+        self.entered_at = np.zeros(capacity)
+        self.candidate = np.full(capacity, -1, dtype=np.int32)
+        self.evidence = np.zeros(capacity, dtype=np.float32)
+
+    def _slots_for(self, devices: Sequence[str]) -> np.ndarray:
+        for device in devices:
+            if device not in self.slots:
+                self.slots[device] = len(self.slots)
+        if len(self.slots) > len(self.current):
+            grow = max(len(self.slots), 2 * len(self.current)) - len(self.current)
+            self.current = np.append(self.current, np.full(grow, -1, dtype=np.int32))
+            self.entered_at = np.append(self.entered_at, np.zeros(grow))
+            self.candidate = np.append(self.candidate, np.full(grow, -1, dtype=np.int32))
+            self.evidence = np.append(self.evidence, np.zeros(grow, dtype=np.float32))
+        return np.fromiter((self.slots[d] for d in devices), dtype=np.int64, count=len(devices))
+
+    def step(self, slots: np.ndarray, t: np.ndarray, pred: np.ndarray, conf: np.ndarray) -> np.ndarray:
+        """Advance distinct device `slots` by one scan each; returns their places after the scan.
+
+        A prediction of -1 (unknown place) leaves the device's state untouched.
+        """
+        m = self.model
+        cur = self.current[slots]
+        cand = self.candidate[slots]
+        ev = self.evidence[slots]
+        valid = pred >= 0
+        p = np.maximum(pred, 0)
+        c = np.maximum(cur, 0)
+
+        continuing = pred == cand
+        ev_new = np.where(continuing, ev + conf, conf).astype(np.float32)
+        need = m.enter_threshold[p] * np.where(m.adjacency[c, p], 1.0, m.jump_factor)
+        dwelt = t - self.entered_at[slots] >= m.min_dwell_s[c]
+        same = pred == cur
+        switch = valid & ~same & ((cur < 0) | ((ev_new >= need) & dwelt))
+        settled = switch | same
+
+        self.current[slots] = np.where(switch, pred, cur)
+        self.entered_at[slots] = np.where(switch, t, self.entered_at[slots])
+        self.candidate[slots] = np.where(valid, np.where(settled, -1, pred), cand)
+        self.evidence[slots] = np.where(valid, np.where(settled, 0.0, ev_new), ev)
+        return self.current[slots]
+
+    def process(
+        self,
+        devices: Sequence[str],
+        t: Sequence[float],
+        predicted: Sequence[Optional[str]],
+        confidence: Optional[Sequence[float]] = None,
+    ) -> List[Optional[str]]:
+        """Smooth a batch of scans (any mix of devices, times in seconds); returns one place per scan.
+
+        Scans are replayed in rounds: round k holds the k-th scan of every device, so each
+        round is a single vectorized `step`.
+        """
+        n = len(t)
+        if n == 0:
+            return []
+        slots = self._slots_for(devices)
+        tt = np.asarray(t, dtype=np.float64)
+        pred = self.model.codes(predicted)
+        conf = np.ones(n, dtype=np.float32) if confidence is None else np.nan_to_num(np.asarray(confidence, dtype=np.float32), nan=1.0)
+
+        out = np.empty(n, dtype=np.int32)
+        for idx in scan_rounds(slots, tt):
+            out[idx] = self.step(slots[idx], tt[idx], pred[idx], conf[idx])
+        ids = self.model.ids
+        return [ids[code] if code >= 0 else None for code in out.tolist()]
+
+
+class FlipCounter:
+    """Counts place changes per device across any number of batches (scans in time order)."""
+
+    def __init__(self) -> None:
+        self.last: Dict[str, str] = {}
+        self.count = 0
+
+    def update(self, devices: Sequence[str], places: Sequence[Optional[str]]) -> None:
+        for device, place in zip(devices, places):
+            if place is None:
+                continue
+            if self.last.get(device, place) != place:
+                self.count += 1
+            self.last[device] = place
+
+
+def main() -> None:
+    from analytics import read_labelled_csv
+    from mapgen import default_anchors, venue_collections, v6
+    from obsstore import parse_time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out-geojson", dest="out_geojson", default=None)
+    parser.add_argument("--out-json", dest="out_json", default=None)
+    parser.add_argument("--replay", dest="replay", default=None)
+    parser.add_argument("--base-enter", dest="base_enter", type=float, default=BASE_ENTER)
+    args = parser.parse_args()
+
+    venue = venue_collections()
+    rooms_model, zones_model = compile_venue(venue["rooms"], venue["zones"], venue["doors"], args.base_enter)
+    properties = {**rooms_model.properties(), **zones_model.properties()}
+
+    if args.out_json:
+        with open(args.out_json, "w") as f:
+            json.dump(properties, f, indent=2)
+        print(f"Generated transition parameters: {args.out_json}")
+    if args.out_geojson:
+        anchors_out = default_anchors()
+        v6.generate_geojson(
+            rooms_=venue["rooms"],
+            zones_=venue["zones"],
+            polygons_=venue["polygons"],
+            pins_=venue["pins"],
+            anchors_=anchors_out,
+            origin=v6.GEO_ORIGIN,
+            filename=args.out_geojson,
+            include_rooms=True,
+            include_zones=True,
+            include_polygons=True,
+            include_pins=True,
+            include_anchors=True,
+            include_metadata=True,
+            extra_properties=properties,
+            levels_=venue["levels"],
+            stairs_=venue["stairs"],
+        )
+    if args.replay:
+        engine = TransitionEngine(rooms_model)
+        raw, smoothed = FlipCounter(), FlipCounter()
+        correct_raw = correct_smoothed = total = 0
+        for rows in read_labelled_csv(args.replay):
+            devices = [row.get("device", "") for row in rows]
+            predicted = [row.get("predicted_room") or None for row in rows]
+            confidence = [float(row["confidence"]) if row.get("confidence") else 1.0 for row in rows]
+            out = engine.process(devices, [parse_time(row["t"]) / 1000.0 for row in rows], predicted, confidence)
+            raw.update(devices, predicted)
+            smoothed.update(devices, out)
+            for row, p, s in zip(rows, predicted, out):
+                # Rows without a label score nothing; a file with none prints no accuracy.
+                if row.get("true_room"):
+                    total += 1
+                    correct_raw += p == row["true_room"]
+                    correct_smoothed += s == row["true_room"]
+        print(f"Flip-flops: {raw.count} raw -> {smoothed.count} smoothed")
+        if total:
+            print(f"Accuracy: {correct_raw / total:.3f} raw -> {correct_smoothed / total:.3f} smoothed")
+
+
+if __name__ == "__main__":
+    main()
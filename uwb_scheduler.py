@@ -0,0 +1,408 @@
+"""Capacity-aware UWB session scheduler for handoff zones.
+
+An anchor set can only range with a few devices at once, so each handoff zone carries a
+`uwb_capacity` (concurrent sessions). The scheduler consumes per-device zone confidence
+updates, in time order, and decides who gets a session:
+
+- A device becomes eligible in a zone when its confidence reaches `admit_confidence`. It
+  stays eligible, active or queued, until its confidence drops below `release_confidence`,
+  it reports another zone, or it goes `timeout_s` without an update.
+- An eligible device gets a free slot at once. Otherwise it may preempt the lowest-ranked
+  active session: it must have a higher priority, or the same priority and at least
+  `preempt_margin` more confidence. The preempted device goes back to the queue.
+- Otherwise it waits. A freed slot goes to the best waiting device: highest priority, then
+  highest confidence, then longest wait.
+
+Each zone keeps its active sessions in a min-heap (the next preemption victim on top) and
+its waiting devices in a max-heap. Entries are invalidated lazily with a sequence number,
+so every update costs O(log n).
+
+    scheduler = UwbScheduler(zone_capacity(v6.zones, default=2))
+    events = scheduler.update(t, "device-1", "stage", 0.93, priority=0)
+    scheduler.stats(t)
+
+    python3 uwb_scheduler.py --simulate --devices 2000 --duration 900 --default-capacity 4
+    python3 uwb_scheduler.py --trace confidence.csv --default-capacity 4 --out-csv sessions.csv --out-geojson uwb.geojson
+
+The bundled venue's zones carry no `uwb_capacity`, so the CLI needs `--default-capacity`
+(applied to every zone without one) unless the venue sets it per zone.
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import random
+import statistics
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+ADMIT_CONFIDENCE = 0.8
+RELEASE_CONFIDENCE = 0.5
+PREEMPT_MARGIN = 0.15
+TIMEOUT_S = 5.0
+
+ACTIVE, QUEUED = "active", "queued"
+
+
+class SessionEvent(NamedTuple):
+    t: float
+    device: str
+    zone: str
+    kind: str  # admit, queue, preempt, end, abandon
+
+
+@dataclass
+class _Device:
+    zone: Optional[str] = None
+    status: Optional[str] = None
+    priority: int = 0
+    confidence: float = 0.0
+    since: float = 0.0
+    last_seen: float = 0.0
+    seq: int = 0
+    armed: bool = False
+
+
+@dataclass
+class _Zone:
+    capacity: int
+    n_active: int = 0
+    # (priority, confidence, seq, device): the lowest-ranked session on top.
+    active: List[Tuple[int, float, int, str]] = field(default_factory=list)
+    # (-priority, -confidence, since, seq, device): the best waiting device on top.
+    waiting: List[Tuple[int, float, float, int, str]] = field(default_factory=list)
+    n_waiting: int = 0
+    busy_s: float = 0.0
+    changed_at: Optional[float] = None
+    admitted: int = 0
+    preempted: int = 0
+    abandoned: int = 0
+    waits: List[float] = field(default_factory=list)
+
+
+def zone_capacity(zones_: List[Dict[str, Any]], default: int = 0) -> Dict[str, int]:
+    """`uwb_capacity` per zone id; zones without one get `default` (0: not a handoff zone)."""
+    return {z["id"]: int(z.get("uwb_capacity", default)) for z in zones_ if z.get("id")}
+
+
+class UwbScheduler:
+    def __init__(
+        self,
+        capacity: Dict[str, int],
+        admit_confidence: float = ADMIT_CONFIDENCE,
+        release_confidence: float = RELEASE_CONFIDENCE,
+        preempt_margin: float = PREEMPT_MARGIN,
+        timeout_s: float = TIMEOUT_S,
+    ) -> None:
+        self.zones = {zone_id: _Zone(cap) for zone_id, cap in capacity.items() if cap > 0}
+        self.admit_confidence = admit_confidence
+        self.release_confidence = release_confidence
+        self.preempt_margin = preempt_margin
+        self.timeout_s = timeout_s
+        self.devices: Dict[str, _Device] = {}
+        # (deadline, device) for every eligible device; re-armed lazily when it has been seen since.
+        self._deadlines: List[Tuple[float, str]] = []
+        self._seq = 0
+        self.started_at: Optional[float] = None
+
+    # Heap bookkeeping
+
+    def _push(self, zone: _Zone, name: str, dev: _Device) -> None:
+        self._seq += 1
+        dev.seq = self._seq
+        if dev.status == ACTIVE:
+            heapq.heappush(zone.active, (dev.priority, dev.confidence, dev.seq, name))
+            if len(zone.active) > 4 * (zone.n_active + 8):
+                zone.active = [e for e in zone.active if self._live(e[3], e[2], ACTIVE)]
+                heapq.heapify(zone.active)
+        else:
+            heapq.heappush(zone.waiting, (-dev.priority, -dev.confidence, dev.since, dev.seq, name))
+            if len(zone.waiting) > 4 * (zone.n_waiting + 8):
+                zone.waiting = [e for e in zone.waiting if self._live(e[4], e[3], QUEUED)]
+                heapq.heapify(zone.waiting)
+
+    def _live(self, name: str, seq: int, status: str) -> bool:
+        dev = self.devices.get(name)
+        return dev is not None and dev.seq == seq and dev.status == status
+
+    def _set_active(self, t: float, zone: _Zone, delta: int) -> None:
+        if zone.changed_at is not None:
+            zone.busy_s += zone.n_active * (t - zone.changed_at)
+        zone.changed_at = t
+        zone.n_active += delta
+
+    # Transitions
+
+    def _admit(self, t: float, zone_id: str, name: str, dev: _Device, out: List[SessionEvent]) -> None:
+        zone = self.zones[zone_id]
+        if dev.status == QUEUED:
+            zone.n_waiting -= 1
+        zone.waits.append(t - dev.since)
+        zone.admitted += 1
+        dev.status = ACTIVE
+        self._set_active(t, zone, 1)
+        self._push(zone, name, dev)
+        out.append(SessionEvent(t, name, zone_id, "admit"))
+
+    def _queue(self, t: float, zone_id: str, name: str, dev: _Device, kind: str, out: List[SessionEvent]) -> None:
+        zone = self.zones[zone_id]
+        dev.status = QUEUED
+        zone.n_waiting += 1
+        self._push(zone, name, dev)
+        out.append(SessionEvent(t, name, zone_id, kind))
+
+    def _victim(self, zone: _Zone) -> Optional[Tuple[int, float, int, str]]:
+        while zone.active and not self._live(zone.active[0][3], zone.active[0][2], ACTIVE):
+            heapq.heappop(zone.active)
+        return zone.active[0] if zone.active else None
+
+    def _request(self, t: float, zone_id: str, name: str, dev: _Device, out: List[SessionEvent]) -> None:
+        zone = self.zones[zone_id]
+        if zone.n_active < zone.capacity:
+            self._admit(t, zone_id, name, dev, out)
+            return
+        victim = self._victim(zone)
+        if victim is not None and (dev.priority > victim[0] or (dev.priority == victim[0] and dev.confidence >= victim[1] + self.preempt_margin)):
+            heapq.heappop(zone.active)
+            loser = self.devices[victim[3]]
+            self._set_active(t, zone, -1)
+            zone.preempted += 1
+            loser.since = t
+            self._queue(t, zone_id, victim[3], loser, "preempt", out)
+            self._admit(t, zone_id, name, dev, out)
+        elif dev.status != QUEUED:
+            self._queue(t, zone_id, name, dev, "queue", out)
+
+    def _fill(self, t: float, zone_id: str, out: List[SessionEvent]) -> None:
+        zone = self.zones[zone_id]
+        while zone.n_active < zone.capacity and zone.waiting:
+            _, _, _, seq, name = heapq.heappop(zone.waiting)
+            if self._live(name, seq, QUEUED):
+                self._admit(t, zone_id, name, self.devices[name], out)
+
+    def _leave(self, t: float, name: str, dev: _Device, out: List[SessionEvent]) -> None:
+        zone_id = dev.zone
+        if zone_id is None or dev.status is None:
+            dev.zone = None
+            return
+        zone = self.zones[zone_id]
+        if dev.status == ACTIVE:
+            self._set_active(t, zone, -1)
+            out.append(SessionEvent(t, name, zone_id, "end"))
+        else:
+            zone.n_waiting -= 1
+            zone.abandoned += 1
+            out.append(SessionEvent(t, name, zone_id, "abandon"))
+        dev.status = None
+        dev.zone = None
+        dev.seq = 0
+        self._fill(t, zone_id, out)
+
+    # Public API
+
+    def update(self, t: float, device: str, zone: Optional[str], confidence: float, priority: int = 0) -> List[SessionEvent]:
+        """One confidence update (times must not go backwards); returns the session events it caused."""
+        out = self.advance(t)
+        if self.started_at is None:
+            self.started_at = t
+        dev = self.devices.get(device)
+        if dev is None:
+            dev = self.devices[device] = _Device()
+        dev.last_seen = t
+        if zone not in self.zones:
+            zone = None
+        if dev.zone is not None and (zone != dev.zone or confidence < self.release_confidence):
+            self._leave(t, device, dev, out)
+        if zone is None:
+            return out
+
+        if dev.zone is None:
+            if confidence < self.admit_confidence:
+                return out
+            dev.zone = zone
+            dev.since = t
+            dev.priority = priority
+            dev.confidence = confidence
+            if not dev.armed:
+                dev.armed = True
+                heapq.heappush(self._deadlines, (t + self.timeout_s, device))
+            self._request(t, zone, device, dev, out)
+            return out
+
+        # Still eligible in the same zone: re-rank, and let a queued device try again.
+        if (priority, confidence) != (dev.priority, dev.confidence):
+            dev.priority = priority
+            dev.confidence = confidence
+            self._push(self.zones[zone], device, dev)
+        if dev.status == QUEUED:
+            self._request(t, zone, device, dev, out)
+        return out
+
+    def advance(self, t: float) -> List[SessionEvent]:
+        """Expire devices that have been silent for `timeout_s`."""
+        out: List[SessionEvent] = []
+        while self._deadlines and self._deadlines[0][0] <= t:
+            _, name = heapq.heappop(self._deadlines)
+            dev = self.devices.get(name)
+            if dev is None or dev.zone is None:
+                if dev is not None:
+                    dev.armed = False
+                continue
+            deadline = dev.last_seen + self.timeout_s
+            if deadline > t:
+                heapq.heappush(self._deadlines, (deadline, name))
+            else:
+                self._leave(deadline, name, dev, out)
+        return out
+
+    def process(self, updates: Iterable[Tuple[Any, ...]]) -> Iterator[SessionEvent]:
+        """Replay (t, device, zone, confidence[, priority]) updates in time order."""
+        for update in updates:
+            yield from self.update(*update)
+
+    def stats(self, t: float) -> Dict[str, Dict[str, Any]]:
+        """Per-zone admissions, preemptions, abandoned requests, wait percentiles and utilization up to `t`."""
+        out = {}
+        elapsed = t - self.started_at if self.started_at is not None else 0.0
+        for zone_id, zone in self.zones.items():
+            busy = zone.busy_s + (zone.n_active * (t - zone.changed_at) if zone.changed_at is not None else 0.0)
+            waits = sorted(zone.waits)
+            out[zone_id] = {
+                "uwb_capacity": zone.capacity,
+                "uwb_admitted": zone.admitted,
+                "uwb_preempted": zone.preempted,
+                "uwb_abandoned": zone.abandoned,
+                "uwb_wait_p50_s": round(statistics.median(waits), 2) if waits else None,
+                "uwb_wait_p95_s": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))], 2) if waits else None,
+                "uwb_utilization": round(busy / (zone.capacity * elapsed), 3) if elapsed > 0 else None,
+            }
+        return out
+
+
+def crowd_trace(
+    zones_: List[str], n_devices: int, duration_s: float, rate_hz: float = 1.0, high_priority: float = 0.05, seed: int = 0
+) -> Iterator[Tuple[float, str, Optional[str], float, int]]:
+    """Synthetic confidence updates: devices arrive uniformly, walk up to a zone, stay a while, leave.
+
+    Confidence ramps from about 0.3 to 0.95 over the approach, with noise, and falls off
+    again on the way out. A `high_priority` share of devices has priority 1.
+    """
+    rng = random.Random(seed)
+    dt = 1.0 / rate_hz
+
+    def device(i: int) -> Iterator[Tuple[float, str, Optional[str], float, int]]:
+        name = f"dev{i}"
+        zone = rng.choice(zones_)
+        priority = 1 if rng.random() < high_priority else 0
+        t = rng.uniform(0, duration_s)
+        approach = rng.uniform(3, 10)
+        stay = rng.expovariate(1 / 30)
+        leave = rng.uniform(2, 6)
+        # Draw the noise up front: the generators are consumed interleaved by heapq.merge.
+        noise = [rng.gauss(0, 0.05) for _ in range(int((approach + stay + leave) * rate_hz) + 2)]
+        k = 0
+        while k < len(noise):
+            s = k * dt
+            if s < approach:
+                level = 0.3 + 0.65 * s / approach
+            elif s < approach + stay:
+                level = 0.95
+            else:
+                level = 0.95 - 0.6 * (s - approach - stay) / leave
+            yield t + s, name, zone, min(1.0, max(0.0, level + noise[k])), priority
+            k += 1
+        yield t + k * dt, name, None, 0.0, priority
+
+    return heapq.merge(*(device(i) for i in range(n_devices)), key=lambda u: u[0])
+
+
+def main() -> None:
+    from mapgen import venue_collections, v6
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trace", dest="trace", default=None)
+    parser.add_argument("--simulate", dest="simulate", action="store_true")
+    parser.add_argument("--devices", dest="devices", type=int, default=2000)
+    parser.add_argument("--duration", dest="duration", type=float, default=900.0)
+    parser.add_argument("--high-priority", dest="high_priority", type=float, default=0.05)
+    parser.add_argument("--seed", dest="seed", type=int, default=0)
+    parser.add_argument("--default-capacity", dest="default_capacity", type=int, default=0)
+    parser.add_argument("--admit", dest="admit", type=float, default=ADMIT_CONFIDENCE)
+    parser.add_argument("--release", dest="release", type=float, default=RELEASE_CONFIDENCE)
+    parser.add_argument("--margin", dest="margin", type=float, default=PREEMPT_MARGIN)
+    parser.add_argument("--timeout", dest="timeout", type=float, default=TIMEOUT_S)
+    parser.add_argument("--out-csv", dest="out_csv", default=None)
+    parser.add_argument("--out-json", dest="out_json", default=None)
+    parser.add_argument("--out-geojson", dest="out_geojson", default=None)
+    args = parser.parse_args()
+
+    venue = venue_collections()
+    capacity = zone_capacity(venue["zones"], args.default_capacity)
+    scheduler = UwbScheduler(capacity, args.admit, args.release, args.margin, args.timeout)
+    if not scheduler.zones:
+        parser.error("no zone has a uwb_capacity; set one on the Zone items or pass --default-capacity")
+
+    if args.simulate:
+        updates: Iterable[Tuple[Any, ...]] = crowd_trace(sorted(scheduler.zones), args.devices, args.duration, high_priority=args.high_priority, seed=args.seed)
+    elif args.trace:
+        with open(args.trace, newline="") as f:
+            rows = list(csv.DictReader(f))
+        updates = sorted(
+            (float(r["t"]), r["device"], r.get("zone") or None, float(r.get("confidence") or 1.0), int(r.get("priority") or 0)) for r in rows
+        )
+    else:
+        parser.error("pass --simulate or --trace")
+
+    events: List[SessionEvent] = []
+    t = 0.0
+    n = 0
+    for update in updates:
+        t = update[0]
+        n += 1
+        events.extend(scheduler.update(*update))
+    # Stats cover the trace up to its last update; the final advance only closes the sessions still open.
+    stats = scheduler.stats(t)
+    events.extend(scheduler.advance(t + args.timeout))
+    print(f"{n} updates, {sum(e.kind == 'admit' for e in events)} sessions, {sum(e.kind == 'preempt' for e in events)} preemptions")
+    for zone_id, zone_stats in sorted(stats.items()):
+        print(
+            f"  {zone_id}: capacity {zone_stats['uwb_capacity']}, admitted {zone_stats['uwb_admitted']}, abandoned {zone_stats['uwb_abandoned']}, "
+            f"wait p50/p95 {zone_stats['uwb_wait_p50_s']}/{zone_stats['uwb_wait_p95_s']} s, utilization {zone_stats['uwb_utilization']}"
+        )
+
+    if args.out_csv:
+        with open(args.out_csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(SessionEvent._fields)
+            writer.writerows(events)
+        print(f"Generated UWB sessions: {args.out_csv}")
+    if args.out_json:
+        with open(args.out_json, "w") as f:
+            json.dump(stats, f, indent=2)
+        print(f"Generated UWB stats: {args.out_json}")
+    if args.out_geojson:
+        from mapgen import default_anchors
+
+        v6.generate_geojson(
+            rooms_=venue["rooms"],
+            zones_=venue["zones"],
+            polygons_=venue["polygons"],
+            pins_=venue["pins"],
+            anchors_=default_anchors(),
+            origin=v6.GEO_ORIGIN,
+            filename=args.out_geojson,
+            include_rooms=True,
+            include_zones=True,
+            include_polygons=True,
+            include_pins=True,
+            include_anchors=True,
+            include_metadata=True,
+            extra_properties=stats,
+            levels_=venue["levels"],
+            stairs_=venue["stairs"],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,622 @@
+"""Compact struct-of-arrays venue model.
+
+The generator's collections are lists of dicts: every feature is a dict of boxed floats
+and strings, and hot paths pay for `.get()` and `float()` on each one. `VenueModel` keeps
+the same data in contiguous columns instead:
+
+- geometry in `array('d')` columns (`x`, `y`, `w`, `h`), plus per-row bounding boxes;
+- a type code per row (`kind`, an index into `KINDS`) and a `parent` row index
+  (a zone's room, an anchor's room; -1 if none);
+- ids, names, colors, kinds and levels as codes into one interned UTF-8 string table;
+- polygon rings in one flat coordinate array with offsets;
+- anything else an item carries in a sparse per-row dict.
+
+`from_dicts` / `to_dicts` convert losslessly (ints stay ints). `collection(name)` returns
+read-only row views that behave like the original dicts, so existing functions such as
+`v6.generate_svg` accept them unchanged. `bbox` / `bounds` and `write_geojson` read
+the columns directly; `write_geojson` produces byte-identical output to
+`v6.generate_geojson` for the same venue.
+
+    model = VenueModel.from_dicts(synthetic.build_venue(100_000))
+    model.write_geojson("venue.geojson", v6.GEO_ORIGIN)
+    v6.recommend_anchors(model.collection("rooms"))
+
+    python3 venue_model.py --rooms 20000
+"""
+
+import argparse
+import json
+import math
+import time
+import tracemalloc
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from extent import BBox, ORIGIN
+from geometry import shape_of
+from mapgen import v6
+
+KINDS = ("rooms", "zones", "doors", "polygons", "pins", "anchors", "stairs")
+KIND_CODE = {name: code for code, name in enumerate(KINDS)}
+
+# Row flags: which keys are present and which numbers were ints.
+X_INT, Y_INT, W_INT, H_INT = 1, 2, 4, 8
+HAS_XY, HAS_WH, HAS_POINTS, HAS_HOLES = 16, 32, 64, 128
+REF_ROOM, TAG_KIND, HAS_SUGGESTED, SUGGESTED = 256, 512, 1024, 2048
+
+COLUMN_KEYS = frozenset(("id", "name", "x", "y", "w", "h", "points", "holes", "color", "parent", "room", "kind", "type", "level", "suggested"))
+GEOJSON_EXPORTED = ("rooms", "zones", "polygons", "pins", "anchors", "stairs")
+BOUNDS_COLLECTIONS = ("rooms", "zones", "doors", "polygons", "pins", "anchors")
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class StringTable:
+    """Interned strings stored back to back as UTF-8, addressed by code."""
+
+    def __init__(self) -> None:
+        self._blob = bytearray()
+        self._offsets = array("i", [0])
+        self._codes: Optional[Dict[str, int]] = {}
+
+    def intern(self, value: str) -> int:
+        if self._codes is None:
+            self._codes = {self[i]: i for i in range(len(self))}
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._offsets) - 1
+            self._blob += value.encode("utf-8")
+            self._offsets.append(len(self._blob))
+            self._codes[value] = code
+        return code
+
+    def freeze(self) -> None:
+        """Drop the build-time lookup dict; `intern` rebuilds it if called again."""
+        self._codes = None
+
+    def __getitem__(self, code: int) -> str:
+        return self._blob[self._offsets[code] : self._offsets[code + 1]].decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._blob) + self._offsets.itemsize * len(self._offsets)
+
+
+class Row(Mapping):
+    """Read-only dict view of one model row."""
+
+    __slots__ = ("_model", "_i")
+
+    def __init__(self, model: "VenueModel", i: int) -> None:
+        self._model = model
+        self._i = i
+
+    def __getitem__(self, key: str) -> Any:
+        return self._model.value(self._i, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._model.get(self._i, key, default)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._model.keys(self._i)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._model.keys(self._i))
+
+    def __len__(self) -> int:
+        return len(self._model.keys(self._i))
+
+    def __repr__(self) -> str:
+        return f"Row({self._model.row_dict(self._i)!r})"
+
+
+class CollectionView(Sequence):
+    """The rows of one collection as a read-only sequence of `Row`s."""
+
+    def __init__(self, model: "VenueModel", start: int, stop: int) -> None:
+        self._model = model
+        self._start = start
+        self._stop = stop
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [Row(self._model, self._start + i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return Row(self._model, self._start + index)
+
+    def __iter__(self) -> Iterator[Row]:
+        return (Row(self._model, i) for i in range(self._start, self._stop))
+
+
+class VenueModel:
+    def __init__(self) -> None:
+        self.strings = StringTable()
+        self.kind = array("b")
+        self.flags = array("H")
+        self.x = array("d")
+        self.y = array("d")
+        self.w = array("d")
+        self.h = array("d")
+        self.parent = array("i")
+        self.id = array("i")
+        self.name = array("i")
+        self.color = array("i")
+        self.tag = array("i")
+        self.ref = array("i")
+        self.level = array("i")
+        # Per-row bounding box (outer ring for polygons) and which of its values were ints.
+        self.min_x = array("d")
+        self.min_y = array("d")
+        self.max_x = array("d")
+        self.max_y = array("d")
+        self.extent_int = array("B")
+        # Polygon rows: rings [ring_first, ring_first + ring_count) of ring_start offsets into coords.
+        self.ring_first = array("i")
+        self.ring_count = array("H")
+        self.ring_start = array("i", [0])
+        self.coords = array("d")
+        self.coord_int = bytearray()
+        self.extras: Dict[int, Dict[str, Any]] = {}
+        self.ranges: Dict[str, Tuple[int, int]] = {}
+        self.other: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    # Building
+
+    def _code(self, value: Any) -> int:
+        return self.strings.intern(value) if isinstance(value, str) else -1
+
+    def _append(self, kind: int, item: Dict[str, Any]) -> None:
+        flags = 0
+        extras = {k: v for k, v in item.items() if k not in COLUMN_KEYS}
+        for key in ("id", "name", "color", "level"):
+            if key in item and not isinstance(item[key], str):
+                extras[key] = item[key]
+        x = y = w = h = 0.0
+        if "x" in item:
+            flags |= HAS_XY | (X_INT if _is_int(item["x"]) else 0) | (Y_INT if _is_int(item["y"]) else 0)
+            x, y = float(item["x"]), float(item["y"])
+        if "w" in item:
+            flags |= HAS_WH | (W_INT if _is_int(item["w"]) else 0) | (H_INT if _is_int(item["h"]) else 0)
+            w, h = float(item["w"]), float(item["h"])
+
+        # One string column each for the parent reference and the type tag; a second key
+        # of the pair (or a non-string value) stays in extras.
+        ref = self._code(item.get("parent"))
+        if ref < 0:
+            ref = self._code(item.get("room"))
+            flags |= REF_ROOM if ref >= 0 else 0
+        tag = self._code(item.get("kind"))
+        if tag >= 0:
+            flags |= TAG_KIND
+        else:
+            tag = self._code(item.get("type"))
+        ref_key = ("room" if flags & REF_ROOM else "parent") if ref >= 0 else None
+        tag_key = ("kind" if flags & TAG_KIND else "type") if tag >= 0 else None
+        for key in ("parent", "room", "kind", "type"):
+            if key in item and key not in (ref_key, tag_key):
+                extras[key] = item[key]
+        if "suggested" in item:
+            if isinstance(item["suggested"], bool):
+                flags |= HAS_SUGGESTED | (SUGGESTED if item["suggested"] else 0)
+            else:
+                extras["suggested"] = item["suggested"]
+
+        ring_first = -1
+        ring_count = 0
+        if "points" in item:
+            flags |= HAS_POINTS
+            rings = [item["points"]]
+            if "holes" in item:
+                flags |= HAS_HOLES
+                rings.extend(item["holes"] or ())
+                if not item["holes"]:
+                    extras["holes"] = item["holes"]
+            ring_first = len(self.ring_start) - 1
+            ring_count = len(rings)
+            for ring in rings:
+                for pt in ring:
+                    self.coords.append(float(pt[0]))
+                    self.coords.append(float(pt[1]))
+                    self.coord_int.append(_is_int(pt[0]) | (_is_int(pt[1]) << 1))
+                self.ring_start.append(len(self.coords) // 2)
+        # Same precedence as extent.collection_bbox: w/h, then the outer ring, then the point.
+        if flags & HAS_WH:
+            box = (item["x"], item["y"], item["x"] + item["w"], item["y"] + item["h"])
+        elif flags & HAS_POINTS:
+            xs = [pt[0] for pt in item["points"]]
+            ys = [pt[1] for pt in item["points"]]
+            box = (min(xs), min(ys), max(xs), max(ys))
+        elif flags & HAS_XY:
+            box = (item["x"], item["y"], item["x"], item["y"])
+        else:
+            box = (math.nan,) * 4
+        extent_int = 0
+        for bit, value in enumerate(box):
+            extent_int |= _is_int(value) << bit
+
+        self.kind.append(kind)
+        self.flags.append(flags)
+        self.x.append(x)
+        self.y.append(y)
+        self.w.append(w)
+        self.h.append(h)
+        self.parent.append(-1)
+        self.id.append(self._code(item.get("id")))
+        self.name.append(self._code(item.get("name")))
+        self.color.append(self._code(item.get("color")))
+        self.level.append(self._code(item.get("level")))
+        self.tag.append(tag)
+        self.ref.append(ref)
+        self.min_x.append(float(box[0]))
+        self.min_y.append(float(box[1]))
+        self.max_x.append(float(box[2]))
+        self.max_y.append(float(box[3]))
+        self.extent_int.append(extent_int)
+        self.ring_first.append(ring_first)
+        self.ring_count.append(ring_count)
+        if extras:
+            self.extras[len(self.kind) - 1] = extras
+
+    @classmethod
+    def from_dicts(cls, venue: Dict[str, Any]) -> "VenueModel":
+        model = cls()
+        for name, items in venue.items():
+            if name not in KIND_CODE:
+                model.other[name] = items
+                continue
+            start = len(model)
+            for item in items:
+                model._append(KIND_CODE[name], item)
+            model.ranges[name] = (start, len(model))
+        # Parent links: a zone's (or virtual room's) parent room, an anchor's room.
+        room_rows = {model.strings[model.id[i]]: i for i in range(*model.ranges.get("rooms", (0, 0))) if model.id[i] >= 0}
+        for i in range(len(model)):
+            if model.ref[i] >= 0:
+                model.parent[i] = room_rows.get(model.strings[model.ref[i]], -1)
+        model.strings.freeze()
+        return model
+
+    # Row access
+
+    def _number(self, column: array, i: int, bit: int) -> Any:
+        value = column[i]
+        return int(value) if self.flags[i] & bit else value
+
+    def _ring(self, ring: int) -> List[List[Any]]:
+        out = []
+        for p in range(self.ring_start[ring], self.ring_start[ring + 1]):
+            xi = self.coord_int[p]
+            x, y = self.coords[2 * p], self.coords[2 * p + 1]
+            out.append([int(x) if xi & 1 else x, int(y) if xi & 2 else y])
+        return out
+
+    def keys(self, i: int) -> List[str]:
+        flags = self.flags[i]
+        out = []
+        if self.id[i] >= 0:
+            out.append("id")
+        if self.name[i] >= 0:
+            out.append("name")
+        if self.ref[i] >= 0:
+            out.append("room" if flags & REF_ROOM else "parent")
+        if flags & HAS_XY:
+            out += ["x", "y"]
+        if flags & HAS_WH:
+            out += ["w", "h"]
+        if flags & HAS_POINTS:
+            out.append("points")
+        if flags & HAS_HOLES:
+            out.append("holes")
+        if self.color[i] >= 0:
+            out.append("color")
+        if self.tag[i] >= 0:
+            out.append("kind" if flags & TAG_KIND else "type")
+        if self.level[i] >= 0:
+            out.append("level")
+        if flags & HAS_SUGGESTED:
+            out.append("suggested")
+        extras = self.extras.get(i)
+        if extras:
+            out += [k for k in extras if k not in out]
+        return out
+
+    def value(self, i: int, key: str) -> Any:
+        flags = self.flags[i]
+        if key == "x" and flags & HAS_XY:
+            return self._number(self.x, i, X_INT)
+        if key == "y" and flags & HAS_XY:
+            return self._number(self.y, i, Y_INT)
+        if key == "w" and flags & HAS_WH:
+            return self._number(self.w, i, W_INT)
+        if key == "h" and flags & HAS_WH:
+            return self._number(self.h, i, H_INT)
+        code = -1
+        if key == "id":
+            code = self.id[i]
+        elif key == "name":
+            code = self.name[i]
+        elif key == "color":
+            code = self.color[i]
+        elif key == "level":
+            code = self.level[i]
+        elif key == ("room" if flags & REF_ROOM else "parent"):
+            code = self.ref[i]
+        elif key == ("kind" if flags & TAG_KIND else "type"):
+            code = self.tag[i]
+        elif key == "suggested" and flags & HAS_SUGGESTED:
+            return bool(flags & SUGGESTED)
+        elif key == "points" and flags & HAS_POINTS:
+            return self._ring(self.ring_first[i])
+        elif key == "holes" and flags & HAS_HOLES and self.ring_count[i] > 1:
+            first = self.ring_first[i]
+            return [self._ring(r) for r in range(first + 1, first + self.ring_count[i])]
+        if code >= 0:
+            return self.strings[code]
+        extras = self.extras.get(i)
+        if extras is not None and key in extras:
+            return extras[key]
+        raise KeyError(key)
+
+    def get(self, i: int, key: str, default: Any = None) -> Any:
+        try:
+            return self.value(i, key)
+        except KeyError:
+            return default
+
+    def row_dict(self, i: int) -> Dict[str, Any]:
+        return {key: self.value(i, key) for key in self.keys(i)}
+
+    def collection(self, name: str) -> CollectionView:
+        start, stop = self.ranges.get(name, (0, 0))
+        return CollectionView(self, start, stop)
+
+    def to_dicts(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for name, (start, stop) in self.ranges.items():
+            out[name] = [self.row_dict(i) for i in range(start, stop)]
+        out.update(self.other)
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        columns = [self.kind, self.flags, self.x, self.y, self.w, self.h, self.parent, self.id, self.name, self.color, self.tag, self.ref, self.level]
+        columns += [self.min_x, self.min_y, self.max_x, self.max_y, self.extent_int, self.ring_first, self.ring_count, self.ring_start, self.coords]
+        return sum(c.itemsize * len(c) for c in columns) + len(self.coord_int) + self.strings.nbytes
+
+    # Extents (the same values and number types as extent.VenueExtent)
+
+    def _collection_bbox(self, name: str) -> Optional[BBox]:
+        start, stop = self.ranges.get(name, (0, 0))
+        if stop <= start:
+            return None
+        out = []
+        for column, pick, bit in ((self.min_x, min, 1), (self.min_y, min, 2), (self.max_x, max, 4), (self.max_y, max, 8)):
+            values = column[start:stop]
+            value = pick(values)
+            # The first row holding the extreme decides whether it was an int, as in collection_bbox.
+            out.append(int(value) if self.extent_int[start + values.index(value)] & bit else value)
+        return BBox(*out)
+
+    def bbox(self, collections: Tuple[str, ...] = KINDS) -> Optional[BBox]:
+        out: Optional[BBox] = None
+        for name in collections:
+            box = self._collection_bbox(name)
+            if box is not None:
+                out = box if out is None else out.union(box)
+        return out
+
+    def frame(self, collections: Tuple[str, ...] = KINDS) -> BBox:
+        return ORIGIN.union(self.bbox(collections))
+
+    def bounds(self) -> Any:
+        """`v6.compute_bounds_m` for the whole model."""
+        frame = self.frame(BOUNDS_COLLECTIONS)
+        return v6.Bounds(width_m=frame.width, height_m=frame.height)
+
+    # GeoJSON
+
+    def write_geojson(
+        self,
+        filename: str,
+        origin: Dict[str, Any],
+        levels_: Optional[List[Dict[str, Any]]] = None,
+        metadata_properties: Optional[Dict[str, Any]] = None,
+        include_metadata: bool = True,
+    ) -> int:
+        """Stream the text `v6.generate_geojson` writes with every layer on and no extras; returns its length.
+
+        Features are formatted straight from the columns, with each interned string
+        JSON-encoded once, instead of building a dict per feature and serializing it.
+        """
+        levels_ = levels_ or self.other.get("levels") or v6.levels
+        elevation = {lv["id"]: float(lv.get("elevation_m", 0.0)) for lv in levels_}
+        default_level = levels_[0]["id"]
+        strings = self.strings
+        encoded: Dict[int, str] = {}
+
+        def text(i: int, code: int, key: str, default: str = '""') -> str:
+            if code >= 0:
+                out = encoded.get(code)
+                if out is None:
+                    out = encoded[code] = json.dumps(strings[code])
+                return out
+            extras = self.extras.get(i)
+            if extras is None or key not in extras:
+                return default
+            return json.dumps(extras[key], indent=2).replace("\n", "\n        ")
+
+        def level_text(level_id: Any) -> str:
+            level_id = level_id or default_level
+            return f'        "level": {json.dumps(level_id)},\n        "elevation_m": {elevation.get(level_id, 0.0)!r},\n'
+
+        def row_level(i: int) -> Any:
+            return strings[self.level[i]] if self.level[i] >= 0 else (self.extras.get(i) or {}).get("level")
+
+        # Same operations as meters_to_gps, so coordinates match to the last bit.
+        earth_radius = 6378137
+        lat0, lon0 = origin["lat"], origin["lon"]
+        lon_radius = earth_radius * math.cos(math.pi * lat0 / 180)
+        matrix = origin.get("matrix")
+
+        def lon_lat(x: float, y: float) -> Tuple[float, float]:
+            if matrix is None:
+                dx, dy = x, -y
+            else:
+                dx = matrix[0][0] * x + matrix[0][1] * y
+                dy = matrix[1][0] * x + matrix[1][1] * y
+            return lon0 + (dx / lon_radius) * (180 / math.pi), lat0 + (dy / earth_radius) * (180 / math.pi)
+
+        def polygon(rings: List[List[Tuple[float, float]]]) -> str:
+            ring_texts = []
+            for ring in rings:
+                coords = [lon_lat(x, y) for x, y in ring]
+                coords.append(coords[0])
+                ring_texts.append("          [\n" + ",\n".join(f"            [\n              {lon!r},\n              {lat!r}\n            ]" for lon, lat in coords) + "\n          ]")
+            body = ",\n".join(ring_texts)
+            return f'      "geometry": {{\n        "type": "Polygon",\n        "coordinates": [\n{body}\n        ]\n      }}\n'
+
+        def rect_rings(i: int) -> List[List[Tuple[float, float]]]:
+            if self.flags[i] & HAS_WH:
+                x, y = self.value(i, "x"), self.value(i, "y")
+                w, h = self.value(i, "w"), self.value(i, "h")
+                return [[(x, y), (x + w, y), (x + w, y + h), (x, y + h)]]
+            return [list(ring) for ring in shape_of(Row(self, i)).rings()]
+
+        def feature(props: str, geometry: str) -> str:
+            return f'    {{\n      "type": "Feature",\n      "properties": {{\n{props}      }},\n{geometry}    }}'
+
+        def marker(i: int, props: str, point_type: str) -> str:
+            x, y = self.x[i], self.y[i]
+            lon, lat = lon_lat(x, y)
+            props += level_text(row_level(i)) + f'        "type": "{point_type}",\n        "x_m": {x!r},\n        "y_m": {y!r}\n'
+            return feature(props, f'      "geometry": {{\n        "type": "Point",\n        "coordinates": [\n          {lon!r},\n          {lat!r}\n        ]\n      }}\n')
+
+        def head(i: int) -> str:
+            return f'        "id": {text(i, self.id[i], "id")},\n        "name": {text(i, self.name[i], "name")},\n'
+
+        written = 0
+        with open(filename, "w") as f:
+
+            def emit(text: str) -> None:
+                nonlocal written
+                written += f.write((",\n" if written else '{\n  "type": "FeatureCollection",\n  "features": [\n') + text)
+
+            if include_metadata:
+                metadata = v6.build_geojson(
+                    [], [], [], [], [], origin,
+                    include_rooms=False, include_zones=False, include_polygons=False, include_pins=False, include_anchors=False,
+                    include_stairs=False, metadata_properties=metadata_properties, levels_=levels_, extent=self,
+                )["features"][0]
+                emit("    " + json.dumps(metadata, indent=2).replace("\n", "\n    "))
+
+            for i in range(*self.ranges.get("rooms", (0, 0))):
+                flags = self.flags[i]
+                if flags & HAS_WH:
+                    depth = repr(self.value(i, "h"))
+                elif flags & HAS_POINTS:
+                    depth = repr(round(shape_of(Row(self, i)).height, 6))
+                else:
+                    depth = "null"
+                props = head(i) + f'        "height": {depth},\n        "depth_m": {depth},\n'
+                emit(feature(props + level_text(row_level(i)) + '        "type": "Room"\n', polygon(rect_rings(i))))
+
+            for i in range(*self.ranges.get("zones", (0, 0))):
+                parent = text(i, -1 if self.flags[i] & REF_ROOM else self.ref[i], "parent")
+                props = head(i) + f'        "parent": {parent},\n'
+                emit(feature(props + level_text(row_level(i)) + '        "type": "Zone"\n', polygon(rect_rings(i))))
+
+            for i in range(*self.ranges.get("polygons", (0, 0))):
+                ring = [(p[0], p[1]) for p in self._ring(self.ring_first[i])]
+                emit(feature(head(i) + level_text(row_level(i)) + '        "type": "Polygon"\n', polygon([ring])))
+
+            for i in range(*self.ranges.get("pins", (0, 0))):
+                kind = text(i, self.tag[i] if self.flags[i] & TAG_KIND else -1, "kind", '"pin"')
+                props = head(i) + f'        "kind": {kind},\n        "color": {text(i, self.color[i], "color")},\n'
+                emit(marker(i, props, "Pin"))
+
+            for i in range(*self.ranges.get("anchors", (0, 0))):
+                flags = self.flags[i]
+                kind = text(i, self.tag[i] if flags & TAG_KIND else -1, "kind", '"beacon"')
+                room = text(i, self.ref[i] if flags & REF_ROOM else -1, "room")
+                suggested = "true" if self.get(i, "suggested", False) else "false"
+                props = head(i) + (
+                    f'        "kind": {kind},\n        "room": {room},\n        "suggested": {suggested},\n'
+                    f'        "color": {text(i, self.color[i], "color")},\n'
+                    f'        "roleId": {text(i, -1, "roleId", "null")},\n        "tgId": {text(i, -1, "tgId", "null")},\n'
+                )
+                emit(marker(i, props, "Anchor"))
+
+            for i in range(*self.ranges.get("stairs", (0, 0))):
+                props = head(i) + f'        "from_level": {text(i, -1, "from_level")},\n        "to_level": {text(i, -1, "to_level")},\n'
+                from_level = (self.extras.get(i) or {}).get("from_level")
+                emit(feature(props + level_text(from_level) + '        "type": "Stairs"\n', polygon(rect_rings(i))))
+
+            written += f.write("\n  ]\n}" if written else '{\n  "type": "FeatureCollection",\n  "features": []\n}')
+        print(f"Generated GeoJSON: {filename}")
+        return written
+
+
+def main() -> None:
+    import io
+    import os
+    from contextlib import redirect_stdout
+
+    import synthetic
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", dest="rooms", type=int, default=20000)
+    parser.add_argument("--out-geojson", dest="out_geojson", default=os.devnull)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    venue = synthetic.build_venue(args.rooms)
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    features = synthetic.feature_count(venue)
+
+    tracemalloc.start()
+    model = VenueModel.from_dicts(venue)
+    model_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    model = VenueModel.from_dicts(venue)
+    build_s = time.perf_counter() - start
+    print(f"{features} features: dicts {dict_bytes / features:.0f} B/feature, model {model_bytes / features:.0f} B/feature ({model.nbytes / features:.0f} B in columns); from_dicts {build_s:.2f} s")
+
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        v6.compute_bounds_m(venue["rooms"], venue["zones"], venue["doors"], venue["polygons"], venue["pins"], venue["anchors"])
+        dict_bounds = time.perf_counter() - start
+        start = time.perf_counter()
+        model.bounds()
+        model_bounds = time.perf_counter() - start
+        start = time.perf_counter()
+        v6.generate_geojson(
+            venue["rooms"], venue["zones"], venue["polygons"], venue["pins"], venue["anchors"], v6.GEO_ORIGIN, os.devnull,
+            True, True, True, True, True, True,
+        )
+        dict_geojson = time.perf_counter() - start
+        start = time.perf_counter()
+        model.write_geojson(args.out_geojson, v6.GEO_ORIGIN)
+        model_geojson = time.perf_counter() - start
+    print(f"bounds: dicts {dict_bounds * 1e3:.1f} ms, model {model_bounds * 1e3:.1f} ms")
+    print(f"GeoJSON: dicts {dict_geojson / features * 1e6:.1f} us/feature, model {model_geojson / features * 1e6:.1f} us/feature")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,543 @@
+"""Explicit wall segments and a grid-accelerated ray/wall intersection engine.
+
+The generator draws walls implicitly (room outlines with door-gap rectangles painted
+over them). `build_walls` turns the same data into explicit segments:
+
+- every room outline edge (outer ring and holes) is a wall candidate;
+- collinear edges are merged per supporting line, so a wall shared by two rooms is one segment;
+- door gaps are cut out of the walls running along them; a door with a `material` is a
+  closed door and replaces that stretch of wall instead;
+- each segment has a `material` and `attenuation_db` (dB lost per crossing). Rooms set
+  their walls with `wall_material` / `wall_attenuation_db`; a shared wall takes the
+  stronger of its two rooms. `overrides` set the material of individual stretches.
+
+`WallSet.crossings` counts walls crossed by many rays at once. Walls are bucketed into
+square tiles; all rays step through the tiles together (a vectorized grid traversal), and
+each step only tests the walls in the rays' current tiles.
+
+    walls = build_walls(v6.rooms, v6.doors)
+    rssi = rfmodel.anchor_rssi(grid, anchors_, walls=walls)
+
+    python3 walls.py --auto-anchors --out-svg walls.svg --out-json walls.json
+    python3 walls.py --auto-anchors --bench --rooms 50
+"""
+
+import argparse
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geometry import shape_of
+from mapgen import default_anchors, v6, venue_collections
+
+MATERIALS: Dict[str, float] = {
+    "glass": 2.0,
+    "drywall": 3.0,
+    "wood": 4.0,
+    "brick": 8.0,
+    "concrete": 12.0,
+    "metal": 20.0,
+}
+DEFAULT_MATERIAL = "drywall"
+MATERIAL_COLORS = {"glass": "#4FA3D1", "drywall": "#333333", "wood": "#8B5A2B", "brick": "#B5482F", "concrete": "#666666", "metal": "#1F1F5F"}
+EDGE_TOL_M = 0.05
+TILE_M = 2.0
+RAY_CHUNK = 1 << 18
+
+
+def _material(item: Dict[str, Any], default: str = DEFAULT_MATERIAL) -> Tuple[str, float]:
+    material = item.get("wall_material") or item.get("material") or default
+    attenuation = item.get("wall_attenuation_db", item.get("attenuation_db"))
+    if attenuation is None:
+        attenuation = MATERIALS.get(material, MATERIALS[DEFAULT_MATERIAL])
+    return material, float(attenuation)
+
+
+def _line_key(x0: float, y0: float, x1: float, y1: float) -> Optional[Tuple[float, float]]:
+    """(direction angle in [0, pi), signed offset) of the line through a segment."""
+    dx, dy = x1 - x0, y1 - y0
+    if dx * dx + dy * dy < 1e-12:
+        return None
+    theta = math.atan2(dy, dx) % math.pi
+    if theta > math.pi - 1e-9:
+        theta = 0.0
+    theta = round(theta, 9)
+    return theta, round(-math.sin(theta) * x0 + math.cos(theta) * y0, 3)
+
+
+def _line_interval(theta: float, offset: float, rect: Tuple[float, float, float, float]) -> Optional[Tuple[float, float]]:
+    """Stretch of the line (as positions along it) that lies inside an axis-aligned rectangle."""
+    ux, uy = math.cos(theta), math.sin(theta)
+    ox, oy = -uy * offset, ux * offset
+    lo, hi = -math.inf, math.inf
+    for o, u, r0, r1 in ((ox, ux, rect[0], rect[2]), (oy, uy, rect[1], rect[3])):
+        if abs(u) < 1e-12:
+            if not r0 <= o <= r1:
+                return None
+            continue
+        s0, s1 = (r0 - o) / u, (r1 - o) / u
+        lo, hi = max(lo, min(s0, s1)), min(hi, max(s0, s1))
+    return (lo, hi) if lo < hi else None
+
+
+def _door_runs_along(door: Dict[str, Any], theta: float) -> bool:
+    # A door cuts the walls parallel to its long side (both, for a square door).
+    w, h = float(door["w"]), float(door["h"])
+    horizontal = abs(math.cos(theta)) >= math.sqrt(0.5) - 1e-9
+    if abs(w - h) < 1e-9:
+        return True
+    return horizontal == (w > h)
+
+
+@dataclass
+class WallSet:
+    x0: np.ndarray
+    y0: np.ndarray
+    x1: np.ndarray
+    y1: np.ndarray
+    attenuation_db: np.ndarray
+    materials: List[str]
+    rooms: List[Tuple[str, ...]]
+    tile_m: float = TILE_M
+    _grid: Optional[Tuple[float, float, int, int, np.ndarray, np.ndarray]] = field(default=None, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.x0)
+
+    def segments(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "x0": float(self.x0[i]),
+                "y0": float(self.y0[i]),
+                "x1": float(self.x1[i]),
+                "y1": float(self.y1[i]),
+                "length_m": round(float(math.hypot(self.x1[i] - self.x0[i], self.y1[i] - self.y0[i])), 3),
+                "material": self.materials[i],
+                "attenuation_db": float(self.attenuation_db[i]),
+                "rooms": list(self.rooms[i]),
+            }
+            for i in range(len(self))
+        ]
+
+    # Tile buckets
+
+    def _tiles(self) -> Tuple[float, float, int, int, np.ndarray, np.ndarray]:
+        """(x0, y0, nx, ny, tile_start, tile_walls): CSR lists of the walls touching each tile."""
+        if self._grid is not None:
+            return self._grid
+        tile = self.tile_m
+        pad = EDGE_TOL_M
+        if len(self):
+            gx0 = float(min(self.x0.min(), self.x1.min())) - 2 * pad
+            gy0 = float(min(self.y0.min(), self.y1.min())) - 2 * pad
+            gx1 = float(max(self.x0.max(), self.x1.max())) + 2 * pad
+            gy1 = float(max(self.y0.max(), self.y1.max())) + 2 * pad
+        else:
+            gx0 = gy0 = 0.0
+            gx1 = gy1 = tile
+        nx = max(1, int(math.ceil((gx1 - gx0) / tile)))
+        ny = max(1, int(math.ceil((gy1 - gy0) / tile)))
+        tile_ids: List[np.ndarray] = []
+        wall_ids: List[np.ndarray] = []
+        for i in range(len(self)):
+            # Tiles overlapping the (padded) segment: its bounding tiles, then a distance test
+            # against each tile's center so long diagonals are not bucketed into every tile of their box.
+            ax, ay, bx, by = float(self.x0[i]), float(self.y0[i]), float(self.x1[i]), float(self.y1[i])
+            tx0 = int((min(ax, bx) - pad - gx0) // tile)
+            tx1 = int((max(ax, bx) + pad - gx0) // tile)
+            ty0 = int((min(ay, by) - pad - gy0) // tile)
+            ty1 = int((max(ay, by) + pad - gy0) // tile)
+            tx, ty = np.meshgrid(np.arange(max(tx0, 0), min(tx1, nx - 1) + 1), np.arange(max(ty0, 0), min(ty1, ny - 1) + 1))
+            tx, ty = tx.ravel(), ty.ravel()
+            if (ax != bx) and (ay != by) and len(tx) > 2:
+                cx = gx0 + (tx + 0.5) * tile
+                cy = gy0 + (ty + 0.5) * tile
+                length = math.hypot(bx - ax, by - ay)
+                distance = np.abs((bx - ax) * (cy - ay) - (by - ay) * (cx - ax)) / length
+                keep = distance <= tile * math.sqrt(0.5) + pad
+                tx, ty = tx[keep], ty[keep]
+            tile_ids.append(ty * nx + tx)
+            wall_ids.append(np.full(len(tx), i, dtype=np.int32))
+        flat_tiles = np.concatenate(tile_ids) if tile_ids else np.zeros(0, dtype=np.int64)
+        flat_walls = np.concatenate(wall_ids) if wall_ids else np.zeros(0, dtype=np.int32)
+        order = np.argsort(flat_tiles, kind="stable")
+        tile_start = np.zeros(nx * ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(flat_tiles, minlength=nx * ny), out=tile_start[1:])
+        self._grid = (gx0, gy0, nx, ny, tile_start, flat_walls[order])
+        return self._grid
+
+    # Ray queries
+
+    def _hits(self, px: np.ndarray, py: np.ndarray, qx: np.ndarray, qy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Unique (ray, wall) pairs for rays p -> q, found by stepping all rays through the tiles."""
+        gx0, gy0, nx, ny, tile_start, tile_walls = self._tiles()
+        tile = self.tile_m
+        dx, dy = qx - px, qy - py
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv_x = np.where(dx != 0, 1.0 / dx, np.inf)
+            inv_y = np.where(dy != 0, 1.0 / dy, np.inf)
+            # Clip each ray to the tile grid (slab test), as t in [t_in, t_out] within [0, 1].
+            tx_a, tx_b = (gx0 - px) * inv_x, (gx0 + nx * tile - px) * inv_x
+            ty_a, ty_b = (gy0 - py) * inv_y, (gy0 + ny * tile - py) * inv_y
+            inside_x = (px >= gx0) & (px <= gx0 + nx * tile)
+            inside_y = (py >= gy0) & (py <= gy0 + ny * tile)
+            t_in = np.maximum(np.where(dx != 0, np.minimum(tx_a, tx_b), np.where(inside_x, -np.inf, np.inf)), np.where(dy != 0, np.minimum(ty_a, ty_b), np.where(inside_y, -np.inf, np.inf)))
+            t_out = np.minimum(np.where(dx != 0, np.maximum(tx_a, tx_b), np.where(inside_x, np.inf, -np.inf)), np.where(dy != 0, np.maximum(ty_a, ty_b), np.where(inside_y, np.inf, -np.inf)))
+        t_in = np.maximum(t_in, 0.0)
+        t_out = np.minimum(t_out, 1.0)
+        active = np.flatnonzero(t_in <= t_out)
+        if len(active) == 0 or len(tile_walls) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        t_mid = t_in[active]
+        ix = np.clip(((px[active] + t_mid * dx[active] - gx0) // tile).astype(np.int64), 0, nx - 1)
+        iy = np.clip(((py[active] + t_mid * dy[active] - gy0) // tile).astype(np.int64), 0, ny - 1)
+        step_x = np.sign(dx[active]).astype(np.int64)
+        step_y = np.sign(dy[active]).astype(np.int64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            next_x = gx0 + (ix + (step_x > 0)) * tile
+            next_y = gy0 + (iy + (step_y > 0)) * tile
+            t_max_x = np.where(step_x != 0, (next_x - px[active]) * inv_x[active], np.inf)
+            t_max_y = np.where(step_y != 0, (next_y - py[active]) * inv_y[active], np.inf)
+            t_delta_x = np.abs(tile * inv_x[active])
+            t_delta_y = np.abs(tile * inv_y[active])
+        t_end = t_out[active]
+
+        rays_out: List[np.ndarray] = []
+        walls_out: List[np.ndarray] = []
+        wx0, wy0, wx1, wy1 = self.x0, self.y0, self.x1, self.y1
+        while len(active):
+            tiles = iy * nx + ix
+            starts = tile_start[tiles]
+            counts = tile_start[tiles + 1] - starts
+            total = int(counts.sum())
+            if total:
+                ray = np.repeat(active, counts)
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                wall = tile_walls[np.repeat(starts, counts) + offsets]
+                rx, ry = dx[ray], dy[ray]
+                sx, sy = wx1[wall] - wx0[wall], wy1[wall] - wy0[wall]
+                ax, ay = wx0[wall] - px[ray], wy0[wall] - py[ray]
+                denom = rx * sy - ry * sx
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    t = (ax * sy - ay * sx) / denom
+                    u = (ax * ry - ay * rx) / denom
+                hit = (denom != 0) & (t > 1e-9) & (t <= 1.0) & (u >= 0.0) & (u <= 1.0)
+                rays_out.append(ray[hit])
+                walls_out.append(wall[hit].astype(np.int64))
+
+            # Advance every ray one tile along its cheaper axis; drop rays past their end or off the grid.
+            go_x = t_max_x < t_max_y
+            t_next = np.where(go_x, t_max_x, t_max_y)
+            ix = np.where(go_x, ix + step_x, ix)
+            iy = np.where(go_x, iy, iy + step_y)
+            t_max_x = np.where(go_x, t_max_x + t_delta_x, t_max_x)
+            t_max_y = np.where(go_x, t_max_y, t_max_y + t_delta_y)
+            keep = (t_next <= t_end) & (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+            active, ix, iy = active[keep], ix[keep], iy[keep]
+            step_x, step_y = step_x[keep], step_y[keep]
+            t_max_x, t_max_y, t_delta_x, t_delta_y, t_end = t_max_x[keep], t_max_y[keep], t_delta_x[keep], t_delta_y[keep], t_end[keep]
+
+        if not rays_out:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        # A wall spanning several tiles is met once per tile; keep each (ray, wall) pair once.
+        keys = np.unique(np.concatenate(rays_out) * len(self) + np.concatenate(walls_out))
+        return keys // len(self), keys % len(self)
+
+    def crossings(self, px: Sequence[float], py: Sequence[float], qx: Sequence[float], qy: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Walls crossed and total attenuation (dB) along each ray p -> q."""
+        px, py, qx, qy = (np.asarray(a, dtype=np.float64) for a in (px, py, qx, qy))
+        px, py, qx, qy = np.broadcast_arrays(px, py, qx, qy)
+        n = px.size
+        px, py, qx, qy = px.ravel(), py.ravel(), qx.ravel(), qy.ravel()
+        count = np.zeros(n, dtype=np.int32)
+        loss = np.zeros(n, dtype=np.float64)
+        for start in range(0, n, RAY_CHUNK):
+            stop = min(start + RAY_CHUNK, n)
+            ray, wall = self._hits(px[start:stop], py[start:stop], qx[start:stop], qy[start:stop])
+            count[start:stop] = np.bincount(ray, minlength=stop - start)
+            loss[start:stop] = np.bincount(ray, weights=self.attenuation_db[wall], minlength=stop - start)
+        return count, loss
+
+    def loss_matrix(self, xs: np.ndarray, ys: np.ndarray, anchors_: List[Dict[str, Any]]) -> np.ndarray:
+        """Wall attenuation (dB) from every anchor to every point, shape (anchors, points)."""
+        ax = np.array([float(a["x"]) for a in anchors_])[:, None]
+        ay = np.array([float(a["y"]) for a in anchors_])[:, None]
+        loss = self.crossings(ax, ay, np.asarray(xs)[None, :], np.asarray(ys)[None, :])[1]
+        return loss.reshape(len(anchors_), len(xs)).astype(np.float32)
+
+    def _shadow_rows(self, grid: Any, px: float, py: float, weights: np.ndarray) -> np.ndarray:
+        """Sum of `weights` of the walls between (px, py) and every cell center of a regular grid.
+
+        A cell is behind a wall when its center is on the far side of the wall's line and
+        inside the wedge the wall spans as seen from the anchor: three half-planes, the same
+        test as the ray/segment intersection. Per grid row that region is one x interval,
+        so each wall adds its weight to a run of cells through a row-wise difference array.
+        """
+        ax, ay, bx, by = self.x0, self.y0, self.x1, self.y1
+        # Walls whose line passes through the anchor cast no shadow.
+        side = (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+        keep = np.abs(side) > 1e-9
+        ax, ay, bx, by, weights, side = ax[keep], ay[keep], bx[keep], by[keep], weights[keep], side[keep]
+        nx, ny, cell = grid.nx, grid.ny, grid.cell_m
+        out = np.zeros((ny, nx + 1), dtype=np.float64)
+        if len(ax) == 0:
+            return out[:, :nx]
+
+        sign = np.sign(side)
+        orient = np.sign((ax - px) * (by - py) - (ay - py) * (bx - px))
+        # Half-planes A*x + B*y + C >= 0: beyond the wall's line, then the two wedge edges.
+        planes = (
+            (sign * (by - ay), -sign * (bx - ax), -sign * ((by - ay) * ax - (bx - ax) * ay)),
+            (-orient * (ay - py), orient * (ax - px), orient * ((ay - py) * px - (ax - px) * py)),
+            (orient * (by - py), -orient * (bx - px), -orient * ((by - py) * px - (bx - px) * py)),
+        )
+        rows_y = grid.y0 + (np.arange(ny) + 0.5) * cell
+        lo = np.full((len(ax), ny), -np.inf)
+        hi = np.full((len(ax), ny), np.inf)
+        for a_, b_, c_ in planes:
+            rest = b_[:, None] * rows_y[None, :] + c_[:, None]
+            a_col = a_[:, None]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                bound = -rest / a_col
+            lo = np.where(a_col > 1e-12, np.maximum(lo, bound), lo)
+            hi = np.where(a_col < -1e-12, np.minimum(hi, bound), hi)
+            flat = np.abs(a_col) <= 1e-12
+            hi = np.where(flat & (rest < -1e-9), -np.inf, hi)
+        j_lo = np.maximum(np.ceil((lo - 1e-9 - grid.x0) / cell - 0.5), 0)
+        j_hi = np.minimum(np.floor((hi + 1e-9 - grid.x0) / cell - 0.5), nx - 1)
+        wall, row = np.nonzero(j_lo <= j_hi)
+        start = row * (nx + 1) + j_lo[wall, row].astype(np.int64)
+        stop = row * (nx + 1) + j_hi[wall, row].astype(np.int64) + 1
+        size = ny * (nx + 1)
+        diff = np.bincount(start, weights=weights[wall], minlength=size) - np.bincount(stop, weights=weights[wall], minlength=size)
+        return np.cumsum(diff.reshape(ny, nx + 1), axis=1)[:, :nx]
+
+    def loss_grid(self, grid: Any, anchors_: List[Dict[str, Any]], count: bool = False) -> np.ndarray:
+        """Wall attenuation (dB) from every anchor to every cell of an `rfmodel.VenueGrid`.
+
+        Shape (anchors, cells). With `count=True`, the number of walls crossed instead.
+        """
+        weights = np.ones(len(self)) if count else self.attenuation_db
+        out = np.zeros((len(anchors_), grid.size), dtype=np.float32)
+        for i, a in enumerate(anchors_):
+            out[i] = self._shadow_rows(grid, float(a["x"]), float(a["y"]), weights).ravel()
+        return out
+
+
+def build_walls(
+    rooms_: List[Dict[str, Any]],
+    doors_: Optional[List[Dict[str, Any]]] = None,
+    overrides: Optional[List[Dict[str, Any]]] = None,
+    tile_m: float = TILE_M,
+) -> WallSet:
+    """Deduplicated wall segments from room outlines minus door gaps.
+
+    `overrides` are `{"x0", "y0", "x1", "y1", "material", "attenuation_db"}` stretches that
+    set the material of the collinear wall they lie on.
+    """
+    # Per supporting line: (start, end, priority, attenuation, material, room) intervals.
+    lines: Dict[Tuple[float, float], List[Tuple[float, float, int, float, str, str]]] = {}
+
+    def add(x0: float, y0: float, x1: float, y1: float, priority: int, attenuation: float, material: str, room: str) -> None:
+        key = _line_key(x0, y0, x1, y1)
+        if key is None:
+            return
+        ux, uy = math.cos(key[0]), math.sin(key[0])
+        s0, s1 = x0 * ux + y0 * uy, x1 * ux + y1 * uy
+        lines.setdefault(key, []).append((min(s0, s1), max(s0, s1), priority, attenuation, material, room))
+
+    for r in rooms_:
+        material, attenuation = _material(r)
+        for ring in shape_of(r).rings():
+            for i in range(len(ring)):
+                (x0, y0), (x1, y1) = ring[i], ring[(i + 1) % len(ring)]
+                add(x0, y0, x1, y1, 0, attenuation, material, r.get("id") or "")
+    for o in overrides or []:
+        material, attenuation = _material(o)
+        add(float(o["x0"]), float(o["y0"]), float(o["x1"]), float(o["y1"]), 1, attenuation, material, "")
+
+    # Doors, bucketed by tile so each line only checks the doors near it.
+    door_rects = []
+    for d in doors_ or []:
+        # Grown across the wall only, so a gap on a wall line catches it without widening.
+        gx = EDGE_TOL_M if d["w"] <= d["h"] else 0.0
+        gy = EDGE_TOL_M if d["h"] <= d["w"] else 0.0
+        rect = (d["x"] - gx, d["y"] - gy, d["x"] + d["w"] + gx, d["y"] + d["h"] + gy)
+        closed = _material(d, "wood") if d.get("material") else None
+        door_rects.append((d, rect, closed))
+    door_tiles: Dict[Tuple[int, int], List[int]] = {}
+    for j, (_, rect, _) in enumerate(door_rects):
+        for tx in range(int(rect[0] // tile_m), int(rect[2] // tile_m) + 1):
+            for ty in range(int(rect[1] // tile_m), int(rect[3] // tile_m) + 1):
+                door_tiles.setdefault((tx, ty), []).append(j)
+
+    x0s: List[float] = []
+    y0s: List[float] = []
+    x1s: List[float] = []
+    y1s: List[float] = []
+    attenuations: List[float] = []
+    materials: List[str] = []
+    rooms: List[Tuple[str, ...]] = []
+    for (theta, offset), intervals in lines.items():
+        ux, uy = math.cos(theta), math.sin(theta)
+        ox, oy = -uy * offset, ux * offset
+        lo = min(iv[0] for iv in intervals)
+        hi = max(iv[1] for iv in intervals)
+        ends = [(ox + lo * ux, oy + lo * uy), (ox + hi * ux, oy + hi * uy)]
+        nearby = set()
+        for tx in range(int(min(e[0] for e in ends) // tile_m), int(max(e[0] for e in ends) // tile_m) + 1):
+            for ty in range(int(min(e[1] for e in ends) // tile_m), int(max(e[1] for e in ends) // tile_m) + 1):
+                nearby.update(door_tiles.get((tx, ty), ()))
+        gaps: List[Tuple[float, float]] = []
+        for j in sorted(nearby):
+            door, rect, closed = door_rects[j]
+            if not _door_runs_along(door, theta):
+                continue
+            stretch = _line_interval(theta, offset, rect)
+            if stretch is None:
+                continue
+            if closed is None:
+                gaps.append(stretch)
+            else:
+                intervals.append((stretch[0], stretch[1], 2, closed[1], closed[0], ""))
+
+        # Split the line at every interval end and resolve each elementary piece.
+        cuts = sorted({iv[0] for iv in intervals} | {iv[1] for iv in intervals} | {g for gap in gaps for g in gap if lo < g < hi})
+        pieces: List[Tuple[float, float, float, str, Tuple[str, ...]]] = []
+        for a, b in zip(cuts, cuts[1:]):
+            if b - a < 1e-6:
+                continue
+            mid = (a + b) / 2
+            if any(g0 <= mid <= g1 for g0, g1 in gaps):
+                continue
+            covering = [iv for iv in intervals if iv[0] <= mid <= iv[1]]
+            if not covering:
+                continue
+            top = max(iv[2] for iv in covering)
+            attenuation, material = max((iv[3], iv[4]) for iv in covering if iv[2] == top)
+            walled_rooms = tuple(sorted({iv[5] for iv in covering if iv[5]}))
+            if pieces and abs(pieces[-1][1] - a) < 1e-6 and pieces[-1][2] == attenuation and pieces[-1][3] == material:
+                prev = pieces[-1]
+                pieces[-1] = (prev[0], b, attenuation, material, tuple(sorted(set(prev[4]) | set(walled_rooms))))
+            else:
+                pieces.append((a, b, attenuation, material, walled_rooms))
+        for a, b, attenuation, material, walled_rooms in pieces:
+            x0s.append(round(ox + a * ux, 6) + 0.0)
+            y0s.append(round(oy + a * uy, 6) + 0.0)
+            x1s.append(round(ox + b * ux, 6) + 0.0)
+            y1s.append(round(oy + b * uy, 6) + 0.0)
+            attenuations.append(attenuation)
+            materials.append(material)
+            rooms.append(walled_rooms)
+
+    return WallSet(
+        x0=np.array(x0s, dtype=np.float64),
+        y0=np.array(y0s, dtype=np.float64),
+        x1=np.array(x1s, dtype=np.float64),
+        y1=np.array(y1s, dtype=np.float64),
+        attenuation_db=np.array(attenuations, dtype=np.float64),
+        materials=materials,
+        rooms=rooms,
+        tile_m=tile_m,
+    )
+
+
+def svg_layer(walls: WallSet) -> Callable[[float], List[str]]:
+    """`generate_svg(extra_layers=...)` renderer: wall segments colored by material."""
+    segments = walls.segments()
+
+    def render(scale: float) -> List[str]:
+        return [
+            f'<line x1="{s["x0"] * scale}" y1="{s["y0"] * scale}" x2="{s["x1"] * scale}" y2="{s["y1"] * scale}" '
+            f'stroke="{MATERIAL_COLORS.get(s["material"], "#333333")}" stroke-width="{2 + s["attenuation_db"] / 4:.1f}" stroke-linecap="round">'
+            f'<title>{s["material"]} {s["attenuation_db"]:g} dB</title></line>'
+            for s in segments
+        ]
+
+    return render
+
+
+def main() -> None:
+    import rfmodel
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--auto-anchors", dest="auto_anchors", action="store_true")
+    parser.add_argument("--level", dest="level", default=None)
+    parser.add_argument("--cell", dest="cell_m", type=float, default=0.5)
+    parser.add_argument("--tile", dest="tile_m", type=float, default=TILE_M)
+    parser.add_argument("--out-json", dest="out_json", default=None)
+    parser.add_argument("--out-svg", dest="out_svg", default=None)
+    parser.add_argument("--bench", dest="bench", action="store_true")
+    parser.add_argument("--rooms", dest="rooms", type=int, default=0, help="benchmark on a synthetic venue of this many rooms")
+    args = parser.parse_args()
+
+    if args.rooms:
+        import synthetic
+
+        venue = synthetic.build_venue(args.rooms)
+        if args.auto_anchors:
+            venue["anchors"] = venue["anchors"] + v6.recommend_anchors(venue["rooms"])
+    else:
+        venue = venue_collections()
+        venue["anchors"] = list(v6.anchors) + v6.recommend_anchors(v6.rooms) if args.auto_anchors else default_anchors()
+    if args.level is not None:
+        venue = v6.venue_on_level(venue, args.level, venue.get("levels") or v6.levels)
+
+    start = time.perf_counter()
+    walls = build_walls(venue["rooms"], venue["doors"], tile_m=args.tile_m)
+    built = time.perf_counter() - start
+    print(f"Walls: {len(walls)} segments from {len(venue['rooms'])} rooms and {len(venue['doors'])} doors in {built * 1e3:.1f} ms")
+
+    if args.out_json:
+        with open(args.out_json, "w") as f:
+            json.dump({"walls": walls.segments()}, f, indent=2)
+        print(f"Generated walls: {args.out_json}")
+    if args.out_svg:
+        v6.generate_svg(
+            rooms_=venue["rooms"],
+            zones_=venue["zones"],
+            doors_=venue["doors"],
+            polygons_=venue["polygons"],
+            pins_=venue["pins"],
+            anchors_=venue["anchors"],
+            filename=args.out_svg,
+            include_structure=False,
+            include_measurements=False,
+            include_labels=True,
+            include_markers=True,
+            stairs_=venue["stairs"],
+            extra_layers={"walls": svg_layer(walls)},
+        )
+
+    if args.bench:
+        grid = rfmodel.build_grid(venue["rooms"], venue["zones"], cell_m=args.cell_m, level=args.level)
+        start = time.perf_counter()
+        free = rfmodel.anchor_rssi(grid, venue["anchors"], venue.get("levels"))
+        free_s = time.perf_counter() - start
+        start = time.perf_counter()
+        walled = rfmodel.anchor_rssi(grid, venue["anchors"], venue.get("levels"), walls=walls)
+        walled_s = time.perf_counter() - start
+        rays = len(venue["anchors"]) * grid.size
+        covered = rfmodel.coverage(free).mean(), rfmodel.coverage(walled).mean()
+        print(
+            f"{rays} rays ({len(venue['anchors'])} anchors x {grid.size} cells): free space {free_s:.3f} s, "
+            f"with walls {walled_s:.3f} s ({rays / max(walled_s, 1e-9) / 1e6:.2f} M rays/s)"
+        )
+        print(f"Coverage: {covered[0]:.3f} free space, {covered[1]:.3f} with walls")
+        rng = np.random.default_rng(7)
+        n = 100_000
+        px, qx = rng.uniform(grid.x0, grid.x0 + grid.nx * grid.cell_m, (2, n))
+        py, qy = rng.uniform(grid.y0, grid.y0 + grid.ny * grid.cell_m, (2, n))
+        start = time.perf_counter()
+        count, _ = walls.crossings(px, py, qx, qy)
+        elapsed = time.perf_counter() - start
+        print(f"{n} random rays: {elapsed:.3f} s, {count.mean():.2f} walls crossed on average")
+
+
+if __name__ == "__main__":
+    main()